@@ -1,7 +1,9 @@
 import os
+import asyncio
 import logging
 import uuid
 import importlib
+import threading
 from typing import Optional, Dict, Any, List, Union, Callable
 from functools import partial
 
@@ -42,9 +44,11 @@ class DefaulResourceInitializer(BaseResourceInitializer):
             except Exception as e:
                 logger.error(f"Tool {name} is not registered, error: {e}")
                 continue
+            # registered tools expose their compiled spec, no need to build a Tool
+            spec = getattr(func, "spec", None) or func()
             tool_registry[tool_id] = {
-                "name": func().name,
-                "description": func().description,
+                "name": spec.name,
+                "description": spec.description,
                 "execute": func,
                 "fixed_args": tool.get("fixed_args", {}),
             }
@@ -97,6 +101,9 @@ class Env:
             for id, resource in {**self.tools, **self.workers}.items()
         }
         self.slotfillapi: SlotFilling = self.initialize_slotfillapi(slotsfillapi)
+        # thread-safe workers are built once and shared by every conversation
+        self._worker_instances: Dict[str, BaseWorker] = {}
+        self._worker_lock: threading.Lock = threading.Lock()
 
         if planner_enabled:
             self.planner: Union[ReactPlanner, DefaultPlanner] = ReactPlanner(
@@ -110,67 +117,134 @@ class Env:
     def initialize_slotfillapi(self, slotsfillapi: str) -> SlotFilling:
         return SlotFilling(slotsfillapi)
 
+    def _init_tool(self, id: str) -> Tool:
+        logger.info(f"{self.tools[id]['name']} tool selected")
+        tool: Tool = self.tools[id]["execute"]()
+        # slotfilling is in the basetoool class
+        tool.init_slotfilling(self.slotfillapi)
+        return tool
+
+    def _build_worker(self, id: str) -> BaseWorker:
+        worker: BaseWorker = self.workers[id]["execute"]()
+        # If the worker need to do the slotfilling, then it should have this method
+        if hasattr(worker, "init_slotfilling"):
+            worker.init_slotfilling(self.slotfillapi)
+        return worker
+
+    def _init_worker(self, id: str) -> BaseWorker:
+        logger.info(f"{self.workers[id]['name']} worker selected")
+        execute: Callable = self.workers[id]["execute"]
+        worker_cls: Any = getattr(execute, "func", execute)
+        if not getattr(worker_cls, "thread_safe", False):
+            return self._build_worker(id)
+        # the id determines the fixed_args, so one shared instance per id
+        worker: Optional[BaseWorker] = self._worker_instances.get(id)
+        if worker is None:
+            with self._worker_lock:
+                worker = self._worker_instances.get(id)
+                if worker is None:
+                    worker = self._build_worker(id)
+                    self._worker_instances[id] = worker
+        return worker
+
+    def _update_tool_params(
+        self, response_state: MessageState, params: Params
+    ) -> Params:
+        params.memory.function_calling_trajectory = (
+            response_state.function_calling_trajectory
+        )
+        params.taskgraph.dialog_states = response_state.slots
+        params.taskgraph.node_status[params.taskgraph.curr_node] = response_state.status
+        return params
+
+    def _update_worker_params(
+        self, id: str, response_state: MessageState, params: Params
+    ) -> Params:
+        call_id: str = str(uuid.uuid4())
+        params.memory.function_calling_trajectory.append(
+            {
+                "content": None,
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "function": {"arguments": "{}", "name": self.id2name[id]},
+                        "id": call_id,
+                        "type": "function",
+                    }
+                ],
+                "function_call": None,
+            }
+        )
+        params.memory.function_calling_trajectory.append(
+            {
+                "role": "tool",
+                "tool_call_id": call_id,
+                "name": self.id2name[id],
+                "content": response_state.response
+                if response_state.response
+                else response_state.message_flow,
+            }
+        )
+        params.taskgraph.node_status[params.taskgraph.curr_node] = response_state.status
+        return params
+
     def step(
         self, id: str, message_state: MessageState, params: Params, node_info: NodeInfo
     ) -> tuple[MessageState, Params]:
         response_state: MessageState
         if id in self.tools:
-            logger.info(f"{self.tools[id]['name']} tool selected")
-            tool: Tool = self.tools[id]["execute"]()
-            # slotfilling is in the basetoool class
-            tool.init_slotfilling(self.slotfillapi)
+            tool: Tool = self._init_tool(id)
             response_state = tool.execute(message_state, **self.tools[id]["fixed_args"])
-            params.memory.function_calling_trajectory = (
-                response_state.function_calling_trajectory
-            )
-            params.taskgraph.dialog_states = response_state.slots
-            params.taskgraph.node_status[params.taskgraph.curr_node] = (
-                response_state.status
-            )
+            params = self._update_tool_params(response_state, params)
 
         elif id in self.workers:
-            logger.info(f"{self.workers[id]['name']} worker selected")
-            worker: BaseWorker = self.workers[id]["execute"]()
-            # If the worker need to do the slotfilling, then it should have this method
-            if hasattr(worker, "init_slotfilling"):
-                worker.init_slotfilling(self.slotfillapi)
+            worker: BaseWorker = self._init_worker(id)
             response_state = worker.execute(message_state, **node_info.additional_args)
-            call_id: str = str(uuid.uuid4())
-            params.memory.function_calling_trajectory.append(
-                {
-                    "content": None,
-                    "role": "assistant",
-                    "tool_calls": [
-                        {
-                            "function": {"arguments": "{}", "name": self.id2name[id]},
-                            "id": call_id,
-                            "type": "function",
-                        }
-                    ],
-                    "function_call": None,
-                }
-            )
-            params.memory.function_calling_trajectory.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": call_id,
-                    "name": self.id2name[id],
-                    "content": response_state.response
-                    if response_state.response
-                    else response_state.message_flow,
-                }
-            )
-            params.taskgraph.node_status[params.taskgraph.curr_node] = (
-                response_state.status
-            )
+            params = self._update_worker_params(id, response_state, params)
         else:
             logger.info("planner selected")
             action: str
-            response_state: MessageState
             msg_history: List[Dict[str, Any]]
             action, response_state, msg_history = self.planner.execute(
                 message_state, params.memory.function_calling_trajectory
             )
 
-        logger.info(f"Response state from {id}: {response_state}")
+        logger.info("Response state from %s: %s", id, response_state)
+        return response_state, params
+
+    async def astep(
+        self, id: str, message_state: MessageState, params: Params, node_info: NodeInfo
+    ) -> tuple[MessageState, Params]:
+        """Async counterpart of step, resources without an async path run in a worker thread."""
+        response_state: MessageState
+        if id in self.tools:
+            tool: Tool = self._init_tool(id)
+            response_state = await tool.aexecute(
+                message_state, **self.tools[id]["fixed_args"]
+            )
+            params = self._update_tool_params(response_state, params)
+
+        elif id in self.workers:
+            # a first construction may load models or indexes, keep it off the loop
+            worker: BaseWorker = await asyncio.to_thread(self._init_worker, id)
+            if hasattr(worker, "aexecute"):
+                response_state = await worker.aexecute(
+                    message_state, **node_info.additional_args
+                )
+            else:
+                response_state = await asyncio.to_thread(
+                    worker.execute, message_state, **node_info.additional_args
+                )
+            params = self._update_worker_params(id, response_state, params)
+        else:
+            logger.info("planner selected")
+            action: str
+            msg_history: List[Dict[str, Any]]
+            action, response_state, msg_history = await asyncio.to_thread(
+                self.planner.execute,
+                message_state,
+                params.memory.function_calling_trajectory,
+            )
+
+        logger.info("Response state from %s: %s", id, response_state)
         return response_state, params
@@ -6,18 +6,15 @@ import traceback
 import uuid
 
 from langchain.schema import AIMessage
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.documents import Document
 from langchain_community.vectorstores.faiss import FAISS
-from langchain_openai import OpenAIEmbeddings
 
 from arklex.utils.graph_state import MessageState, LLMConfig
 from arklex.utils.model_config import MODEL
 from arklex.utils.model_provider_config import (
-    PROVIDER_MAP,
-    PROVIDER_EMBEDDINGS,
     PROVIDER_EMBEDDING_MODELS,
+    model_client_pool,
 )
 from arklex.orchestrator.prompts import (
     RESPOND_ACTION_NAME,
@@ -151,9 +148,8 @@ class ReactPlanner(DefaultPlanner):
         # Set initial model and provider info
         self.llm_provider: str = self.llm_config.llm_provider
         self.model_name: str = self.llm_config.model_type_or_path
-        self.llm: Any = PROVIDER_MAP.get(self.llm_provider, ChatOpenAI)(
-            model=self.model_name,
-            temperature=0.0,
+        self.llm: Any = model_client_pool.get_llm(
+            self.llm_provider, self.model_name, temperature=0.0
         )
         self.system_role: str = "user" if self.llm_provider == "gemini" else "system"
 
@@ -190,9 +186,8 @@ class ReactPlanner(DefaultPlanner):
         # Update model provider info
         self.llm_provider: str = self.llm_config.llm_provider
         self.model_name: str = self.llm_config.model_type_or_path
-        self.llm: Any = PROVIDER_MAP.get(self.llm_provider, ChatOpenAI)(
-            model=self.model_name,
-            temperature=0.0,
+        self.llm: Any = model_client_pool.get_llm(
+            self.llm_provider, self.model_name, temperature=0.0
         )
         self.system_role: str = "user" if self.llm_provider == "gemini" else "system"
 
@@ -203,12 +198,8 @@ class ReactPlanner(DefaultPlanner):
 
         # Init embedding model and FAISS retriever for RAG resource signature retrieval
         self.embedding_model_name: str = PROVIDER_EMBEDDING_MODELS[self.llm_provider]
-        self.embedding_model: Any = PROVIDER_EMBEDDINGS.get(
-            self.llm_provider, OpenAIEmbeddings
-        )(
-            **{"model": self.embedding_model_name}
-            if self.llm_provider != "anthropic"
-            else {"model_name": self.embedding_model_name}
+        self.embedding_model: Any = model_client_pool.get_embedding_model(
+            self.llm_provider, self.embedding_model_name
         )
         docsearch: FAISS = FAISS.from_documents(resource_docs, self.embedding_model)
         self.retriever: Any = docsearch.as_retriever()
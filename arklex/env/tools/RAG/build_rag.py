@@ -1,25 +1,108 @@
 import os
 import argparse
+import json
 import pickle
 from pathlib import Path
 import logging
 import zipfile
 import tempfile
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
+from langchain_core.documents import Document
+
+from arklex.utils.crawler import CrawlState, WebCrawler
 from arklex.utils.loader import Loader
+from arklex.env.tools.RAG.retrievers.bm25_index import BM25_INDEX_DIR, BM25Index
+from arklex.env.tools.RAG.retrievers.chunk_store import (
+    CHUNK_STORE_DIR,
+    ChunkStore,
+    content_hash,
+)
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+# Chunk range of every source in the chunk store, by hash of its content
+SOURCES_MANIFEST: str = "sources.json"
+
+
+def chunk_incrementally(folder_path: str, docs: List[Any]) -> List[Document]:
+    """Chunk docs, reusing the chunks of the sources unchanged since the last build.
+
+    The FAISS retriever in turn only embeds the chunks it has no vector for,
+    so a refresh only pays for the sources that changed.
+    """
+    store: Optional[ChunkStore] = ChunkStore.open(
+        os.path.join(folder_path, CHUNK_STORE_DIR)
+    )
+    manifest_path: str = os.path.join(folder_path, SOURCES_MANIFEST)
+    previous: Dict[str, Tuple[int, int]] = {}
+    if store is not None and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest: Dict[str, Any] = json.load(f)
+        # a manifest left from a build that failed before writing it is ignored
+        if manifest.get("corpus_hash") == store.corpus_hash:
+            previous = {
+                entry["hash"]: (entry["start"], entry["end"])
+                for entry in manifest["sources"]
+            }
+
+    chunked_docs: List[Document] = []
+    sources: List[Dict[str, Any]] = []
+    for doc in docs:
+        if doc.is_error or doc.content is None:
+            # skipped, and logged, by Loader.chunk
+            chunked_docs.extend(Loader.chunk([doc]))
+            continue
+        doc_hash: str = content_hash(f"{doc.source}\0{doc.content}")
+        start: int = len(chunked_docs)
+        if doc_hash in previous:
+            chunked_docs.extend(store[slice(*previous[doc_hash])])
+        else:
+            chunked_docs.extend(Loader.chunk([doc]))
+        sources.append(
+            {
+                "source": doc.source,
+                "hash": doc_hash,
+                "start": start,
+                "end": len(chunked_docs),
+            }
+        )
+    reused: int = sum(1 for entry in sources if entry["hash"] in previous)
+    logger.info(f"Reused the chunks of {reused} of {len(sources)} sources")
+
+    written_hash: str = ChunkStore.write(
+        os.path.join(folder_path, CHUNK_STORE_DIR), chunked_docs
+    )
+    with open(manifest_path, "w") as f:
+        json.dump({"corpus_hash": written_hash, "sources": sources}, f)
+    return chunked_docs
+
 
-def build_rag(folder_path: str, rag_docs: List[Dict[str, Any]]) -> None:
+def build_rag(
+    folder_path: str, rag_docs: List[Dict[str, Any]], refresh: bool = False
+) -> None:
+    """Crawl rag_docs into folder_path and write its chunk store and BM25 index.
+
+    A previous crawl is reused as is, unless refresh is set: then the sources
+    are crawled again, with conditional requests for the pages of the last
+    crawl, and only the sources whose content changed are re-chunked.
+    """
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
     filepath: str = os.path.join(folder_path, "documents.pkl")
-    loader: Loader = Loader()
+    # pages of the last complete crawl, with their ETag and Last-Modified
+    state_path: str = os.path.join(folder_path, "crawl_state.jsonl")
+    # an interrupted crawl resumes from the pages it already fetched
+    crawl_state: CrawlState = CrawlState(state_path + ".partial")
+    loader: Loader = Loader(
+        WebCrawler(
+            state=crawl_state,
+            previous=CrawlState(state_path).pages if refresh else None,
+        )
+    )
     docs: List[Any] = []
-    if Path(filepath).exists():
+    if Path(filepath).exists() and not refresh:
         logger.warning(
             f"Loading existing documents from {os.path.join(folder_path, 'documents.pkl')}! If you want to recrawl, please delete the file or specify a new --output-dir when initiate Generator."
         )
@@ -80,11 +163,16 @@ def build_rag(folder_path: str, rag_docs: List[Dict[str, Any]]) -> None:
 
         logging.info(f"Content: {[doc.content for doc in docs]}")
         Loader.save(filepath, docs)
+        if os.path.exists(crawl_state.path):
+            os.replace(crawl_state.path, state_path)
 
     logging.info(f"crawled sources: {[c.source for c in docs]}")
-    chunked_docs: List[Any] = Loader.chunk(docs)
-    filepath_chunk: str = os.path.join(folder_path, "chunked_documents.pkl")
-    Loader.save(filepath_chunk, chunked_docs)
+    # memory-mapped by the retrievers instead of unpickled by every worker
+    chunked_docs: List[Document] = chunk_incrementally(folder_path, docs)
+    # lexical index over the same chunks, in the same order
+    BM25Index.build([doc.page_content for doc in chunked_docs]).save(
+        os.path.join(folder_path, BM25_INDEX_DIR)
+    )
 
 
 if __name__ == "__main__":
@@ -97,9 +185,15 @@ if __name__ == "__main__":
     parser.add_argument(
         "--max_num", type=int, default=10, help="maximum number of urls to crawl"
     )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="crawl again and only re-chunk the sources that changed",
+    )
     args: argparse.Namespace = parser.parse_args()
 
     build_rag(
         folder_path=args.folder_path,
-        docs=[{"source": args.base_url, "num": args.max_num}],
+        rag_docs=[{"source": args.base_url, "num": args.max_num, "type": "url"}],
+        refresh=args.refresh,
     )
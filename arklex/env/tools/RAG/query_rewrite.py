@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from arklex.utils.graph_state import LLMConfig, QueryRewriteConfig
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+QUERY_REWRITE_MODES: List[str] = ["always", "auto", "parallel"]
+
+# Words that usually point back at something said in an earlier turn
+ANAPHORA_PATTERN: re.Pattern = re.compile(
+    r"\b(it|its|they|them|their|theirs|this|that|these|those|he|him|his|she|her|"
+    r"hers|one|ones|same|such|former|latter|above|previous|there|else|another|"
+    r"other|others)\b",
+    re.IGNORECASE,
+)
+# Chinese pronouns and demonstratives, which have no word boundaries
+CJK_ANAPHORA_PATTERN: re.Pattern = re.compile(r"[它他她这那其该此]|上述|刚才|前面")
+# Openings of elliptical follow-ups such as "and the price?"
+FOLLOW_UP_PATTERN: re.Pattern = re.compile(
+    r"^\s*(and|also|but|so|or|then|what about|how about|why|how come)\b",
+    re.IGNORECASE,
+)
+# Replies that only acknowledge the previous answer, not questions to rewrite
+ACKNOWLEDGEMENT_WORDS: FrozenSet[str] = frozenset(
+    "ok okay k kk thanks thank you thx ty much very cool great nice good fine "
+    "perfect awesome sure yes yeah yep no nope got it alright bye goodbye "
+    "hi hello hey cheers".split()
+)
+WORD_PATTERN: re.Pattern = re.compile(r"[a-z']+")
+# "role: " at the start of a line of format_chat_history
+TURN_PATTERN: re.Pattern = re.compile(r"^(\w+): ", re.MULTILINE)
+
+
+def split_turns(chat_history_str: str) -> List[str]:
+    """Split a format_chat_history string into its turns, multi-line contents included."""
+    starts: List[int] = [m.start() for m in TURN_PATTERN.finditer(chat_history_str)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    return [
+        chat_history_str[start:end].strip()
+        for start, end in zip(starts, starts[1:] + [len(chat_history_str)])
+        if chat_history_str[start:end].strip()
+    ]
+
+
+def recent_history(chat_history_str: str, turns: int) -> str:
+    return "\n".join(split_turns(chat_history_str)[-turns:])
+
+
+def is_acknowledgement(query: str) -> bool:
+    """Whether query only acknowledges the previous answer, e.g. "ok" or "thanks!"."""
+    words: List[str] = WORD_PATTERN.findall(query.lower())
+    return bool(words) and all(word in ACKNOWLEDGEMENT_WORDS for word in words)
+
+
+def needs_rewrite(query: str, chat_history_str: str) -> bool:
+    """Whether query may depend on earlier turns and has to be made standalone.
+
+    The first question of a conversation, acknowledgements, and later
+    questions that neither refer back with a pronoun nor read like an
+    elliptical follow-up, are searched as they are.
+    """
+    if len(split_turns(chat_history_str)) <= 1:
+        return False
+    if query.isascii() and is_acknowledgement(query):
+        # "thanks" or "got it" asks nothing a rewrite could make standalone
+        return False
+    if query.isascii() and len(query.split()) <= 2:
+        # too short to stand on its own, e.g. "price?" or "in red"
+        return True
+    return bool(
+        ANAPHORA_PATTERN.search(query)
+        or CJK_ANAPHORA_PATTERN.search(query)
+        or FOLLOW_UP_PATTERN.search(query)
+    )
+
+
+class QueryRewriteCache:
+    """Process-wide cache of standalone questions.
+
+    Entries are keyed by the LLM, the prompt and the last turns of history the
+    rewrite saw, so a retrieval repeated within a turn, or by another worker of the
+    same turn, reuses the rewrite instead of calling the LLM again. The least
+    recently used rewrite is evicted once max_size are stored.
+    """
+
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size: int = max_size
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.skipped: int = 0
+
+    @staticmethod
+    def key(llm_provider: str, model: str, prompt: str, history: str) -> str:
+        return hashlib.sha256(
+            f"{llm_provider}\0{model}\0{prompt}\0{history}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            rewrite: Optional[str] = self._entries.get(key)
+            if rewrite is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rewrite
+
+    def put(self, key: str, rewrite: str) -> None:
+        with self._lock:
+            self._entries[key] = rewrite
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.skipped = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+            }
+
+
+query_rewrite_cache: QueryRewriteCache = QueryRewriteCache()
+
+
+class QueryRewriter:
+    """Turns the latest user question into a standalone retrieval query.
+
+    The retrieve_contextualize_q_prompt LLM chain only runs when the policy
+    says the question depends on earlier turns and the rewrite is not cached.
+    Without a raw query (callers that only have the history) every question
+    is rewritten, as before. llm_config names the LLM in the cache keys, the
+    class and model of llm do when it is not given.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        prompt: str,
+        config: Optional[QueryRewriteConfig] = None,
+        llm_config: Optional[LLMConfig] = None,
+    ) -> None:
+        self.config: QueryRewriteConfig = config or QueryRewriteConfig()
+        if self.config.mode not in QUERY_REWRITE_MODES:
+            raise ValueError(
+                f"Unknown query rewrite mode {self.config.mode}, expected one of {QUERY_REWRITE_MODES}"
+            )
+        self.prompt: str = prompt
+        self.llm_provider: str
+        self.model: str
+        if llm_config is not None:
+            self.llm_provider = llm_config.llm_provider
+            self.model = llm_config.model_type_or_path
+        else:
+            self.llm_provider = type(llm).__name__
+            self.model = str(
+                getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+            )
+        self.chain: Any = PromptTemplate.from_template(prompt) | llm | StrOutputParser()
+
+    @property
+    def parallel(self) -> bool:
+        return self.config.mode == "parallel"
+
+    def should_rewrite(self, query: Optional[str], chat_history_str: str) -> bool:
+        if self.config.mode == "always" or query is None:
+            return True
+        return needs_rewrite(query, chat_history_str)
+
+    def rewrite(self, query: Optional[str], chat_history_str: str) -> str:
+        if not self.should_rewrite(query, chat_history_str):
+            query_rewrite_cache.record_skip()
+            logger.info(f"Searching with the standalone question: {query}")
+            return query
+        history: str = (
+            chat_history_str
+            if query is None
+            else recent_history(chat_history_str, self.config.history_turns)
+        )
+        key: str = QueryRewriteCache.key(
+            self.llm_provider, self.model, self.prompt, history
+        )
+        rewrite: Optional[str] = query_rewrite_cache.get(key)
+        if rewrite is None:
+            start: float = time.perf_counter()
+            rewrite = self.chain.invoke({"chat_history": history})
+            logger.info(
+                f"Rewrote the question in {time.perf_counter() - start:.2f}s: {rewrite}"
+            )
+            query_rewrite_cache.put(key, rewrite)
+        return rewrite
+
+
+def rerank_union(
+    result_lists: List[List[Tuple[Any, float]]],
+    key: Callable[[Any], Hashable],
+    k: int,
+    higher_is_better: bool = False,
+) -> List[Tuple[Any, float]]:
+    """Merge the results of several searches, keeping the best score of each item."""
+    best: Dict[Hashable, Tuple[Any, float]] = {}
+    for results in result_lists:
+        for item, score in results:
+            item_key: Hashable = key(item)
+            current: Optional[Tuple[Any, float]] = best.get(item_key)
+            if (
+                current is None
+                or (higher_is_better and score > current[1])
+                or (not higher_is_better and score < current[1])
+            ):
+                best[item_key] = (item, score)
+    return sorted(best.values(), key=lambda pair: pair[1], reverse=higher_is_better)[:k]
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from arklex.env.tools.RAG.retrievers.versions import (
+    corpus_hash,
+    current_version,
+    publish_version,
+)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Directory of the index next to the chunk store
+BM25_INDEX_DIR: str = "bm25"
+BM25_FORMAT_VERSION: int = 1
+
+# Words, numbers and codes such as "sku-1234-b" or "v2.1", kept whole
+TOKEN_PATTERN: re.Pattern = re.compile(r"[0-9a-z]+(?:[-_./][0-9a-z]+)*")
+CJK_PATTERN: re.Pattern = re.compile(r"[㐀-鿿]")
+# Tokens that look like identifiers: SKU codes and model names mixing letters
+# and digits. Bare numbers are left out, years and prices are not identifiers
+IDENTIFIER_PATTERN: re.Pattern = re.compile(
+    r"^(?=.*\d)(?=.*[a-z])[0-9a-z]+(?:[-_./][0-9a-z]+)*$"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of text.
+
+    A code like "sku-1234" is indexed whole and by its parts, so it matches
+    both exactly and partially. Chinese text is indexed by character.
+    """
+    text = text.lower()
+    tokens: List[str] = []
+    for match in TOKEN_PATTERN.finditer(text):
+        token: str = match.group()
+        tokens.append(token)
+        parts: List[str] = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    tokens.extend(CJK_PATTERN.findall(text))
+    return tokens
+
+
+def identifier_terms(text: str) -> List[str]:
+    return [
+        m.group()
+        for m in TOKEN_PATTERN.finditer(text.lower())
+        if IDENTIFIER_PATTERN.match(m.group())
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index stored as flat numpy arrays.
+
+    The vocabulary is a sorted blob of UTF-8 terms with their offsets, and
+    the postings of term i are docs[postings[i]:postings[i + 1]] with their
+    term frequencies. Every array is saved as its own .npy file and loaded
+    with mmap_mode, so opening an index is constant time and its pages are
+    shared between the processes serving the same bot.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        term_offsets: np.ndarray,
+        postings: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+        corpus_hash: str = "",
+    ) -> None:
+        self.terms: np.ndarray = terms
+        self.term_offsets: np.ndarray = term_offsets
+        self.postings: np.ndarray = postings
+        self.docs: np.ndarray = docs
+        self.tfs: np.ndarray = tfs
+        self.doc_lengths: np.ndarray = doc_lengths
+        self.k1: float = k1
+        self.b: float = b
+        self.n_docs: int = len(doc_lengths)
+        self.avgdl: float = float(doc_lengths.mean()) if self.n_docs else 0.0
+        # of the texts indexed, compared with the chunk store's by the retriever
+        self.corpus_hash: str = corpus_hash
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        doc_lengths: List[int] = []
+        for doc_id, text in enumerate(texts):
+            counts: Counter = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        vocabulary: List[str] = sorted(postings)
+        encoded: List[bytes] = [term.encode("utf-8") for term in vocabulary]
+        term_offsets: np.ndarray = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=term_offsets[1:])
+        posting_offsets: np.ndarray = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in vocabulary], out=posting_offsets[1:])
+        pairs: List[Tuple[int, int]] = [p for t in vocabulary for p in postings[t]]
+        return cls(
+            np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            term_offsets,
+            posting_offsets,
+            np.array([d for d, _ in pairs], dtype=np.int32),
+            np.array([min(tf, 65535) for _, tf in pairs], dtype=np.uint16),
+            np.array(doc_lengths, dtype=np.int32),
+            k1,
+            b,
+            corpus_hash(texts),
+        )
+
+    def save(self, path: str) -> None:
+        """Write the index as a new version of path, see publish_version."""
+
+        def write_version(tmp_path: str) -> str:
+            arrays: Dict[str, np.ndarray] = {
+                "terms": self.terms,
+                "term_offsets": self.term_offsets,
+                "postings": self.postings,
+                "docs": self.docs,
+                "tfs": self.tfs,
+                "doc_lengths": self.doc_lengths,
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "version": BM25_FORMAT_VERSION,
+                        "n_docs": self.n_docs,
+                        "k1": self.k1,
+                        "b": self.b,
+                        "corpus_hash": self.corpus_hash,
+                    },
+                    f,
+                )
+            return hashlib.sha256(
+                f"{self.corpus_hash}\0{self.k1}\0{self.b}".encode("utf-8")
+            ).hexdigest()
+
+        publish_version(path, write_version)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Memory-map the current version of the index at path, None if there is none."""
+        version_path: Optional[str] = current_version(path)
+        if version_path is None:
+            return None
+        meta_file: str = os.path.join(version_path, "meta.json")
+        try:
+            with open(meta_file) as f:
+                meta: Dict[str, Any] = json.load(f)
+            if meta.get("version") != BM25_FORMAT_VERSION:
+                logger.warning(f"Ignoring BM25 index {path} of an older format")
+                return None
+            arrays: Dict[str, np.ndarray] = {
+                name: np.load(os.path.join(version_path, f"{name}.npy"), mmap_mode="r")
+                for name in [
+                    "terms",
+                    "term_offsets",
+                    "postings",
+                    "docs",
+                    "tfs",
+                    "doc_lengths",
+                ]
+            }
+        except (OSError, ValueError) as err:
+            logger.error(f"Failed to load BM25 index {path}: {err}")
+            return None
+        index: BM25Index = cls(
+            **arrays, k1=meta["k1"], b=meta["b"], corpus_hash=meta["corpus_hash"]
+        )
+        if index.n_docs != meta["n_docs"]:
+            logger.warning(f"BM25 index {path} is incomplete, ignoring it")
+            return None
+        return index
+
+    def _term_id(self, term: str) -> int:
+        """Binary search of the sorted vocabulary, -1 if term is not indexed."""
+        target: bytes = term.encode("utf-8")
+        lo: int = 0
+        hi: int = len(self.term_offsets) - 1
+        while lo < hi:
+            mid: int = (lo + hi) // 2
+            current: bytes = self.terms[
+                self.term_offsets[mid] : self.term_offsets[mid + 1]
+            ].tobytes()
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def scores(self, query: str) -> np.ndarray:
+        scores: np.ndarray = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id: int = self._term_id(term)
+            if term_id < 0:
+                continue
+            start, end = self.postings[term_id], self.postings[term_id + 1]
+            docs: np.ndarray = self.docs[start:end]
+            tfs: np.ndarray = self.tfs[start:end].astype(np.float32)
+            df: int = end - start
+            idf: float = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm: np.ndarray = self.k1 * (
+                1 - self.b + self.b * self.doc_lengths[docs] / self.avgdl
+            )
+            # a term occurs once in a posting list, so docs has no duplicates
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """Indices of the k best matching documents with their BM25 scores."""
+        if not self.n_docs:
+            return []
+        scores: np.ndarray = self.scores(query)
+        k = min(k, self.n_docs)
+        top: np.ndarray = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def matches_identifier(self, query: str) -> bool:
+        """Whether query mentions a code or number that occurs in the corpus."""
+        return any(self._term_id(term) >= 0 for term in identifier_terms(query))
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Any]],
+    key: Callable[[Any], Hashable],
+    k: int = 4,
+    rrf_k: int = 60,
+) -> List[Tuple[Any, float]]:
+    """Fuse ranked lists by summing 1 / (rrf_k + rank) over the lists each item is in."""
+    fused: Dict[Hashable, List[Any]] = {}
+    for results in result_lists:
+        for rank, item in enumerate(results):
+            entry: Optional[List[Any]] = fused.get(key(item))
+            if entry is None:
+                fused[key(item)] = entry = [item, 0.0]
+            entry[1] += 1.0 / (rrf_k + rank + 1)
+    return sorted(
+        ((item, score) for item, score in fused.values()),
+        key=lambda pair: pair[1],
+        reverse=True,
+    )[:k]
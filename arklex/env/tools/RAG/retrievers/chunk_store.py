@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+from arklex.env.tools.RAG.retrievers.versions import (
+    current_version,
+    publish_version,
+    texts_hash,
+)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Directory of the store next to the FAISS index
+CHUNK_STORE_DIR: str = "chunks"
+CHUNK_STORE_FORMAT_VERSION: int = 1
+ARRAYS: List[str] = ["text_offsets", "metadata_ids", "metadata_offsets"]
+BLOBS: List[str] = ["text", "metadata"]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _map_blob(path: str) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class ChunkStore(Sequence[Document]):
+    """Read-only columnar store of chunked documents.
+
+    Chunk i's text is text[text_offsets[i]:text_offsets[i + 1]] in a UTF-8
+    blob. Its metadata is row metadata_ids[i] of a table of distinct metadata
+    dicts, stored as JSON in a second blob, since every chunk of a source
+    shares the same metadata. Everything is memory-mapped, so opening a
+    store costs a few syscalls whatever the corpus size, and the worker
+    processes serving the same bot share one copy in the page cache.
+    Documents are decoded when they are accessed.
+
+    Every write is a new version of the store's directory, switched to
+    atomically, and corpus_hash identifies the texts of a version.
+    """
+
+    def __init__(self, path: str, corpus_hash: Optional[str] = None) -> None:
+        self.path: str = path
+        self.text_offsets: np.ndarray = np.load(
+            os.path.join(path, "text_offsets.npy"), mmap_mode="r"
+        )
+        self.metadata_ids: np.ndarray = np.load(
+            os.path.join(path, "metadata_ids.npy"), mmap_mode="r"
+        )
+        self.metadata_offsets: np.ndarray = np.load(
+            os.path.join(path, "metadata_offsets.npy"), mmap_mode="r"
+        )
+        self.text: np.ndarray = _map_blob(os.path.join(path, "text.bin"))
+        self.metadata: np.ndarray = _map_blob(os.path.join(path, "metadata.bin"))
+        self._metadata_rows: Dict[int, Dict[str, Any]] = {}
+        # stores of the flat layout predating versions do not record it
+        self.corpus_hash: str = corpus_hash or texts_hash(self.text, self.text_offsets)
+
+    @staticmethod
+    def write(path: str, documents: List[Document]) -> str:
+        """Write documents as a new version of the store at path and return its corpus hash.
+
+        Metadata values that are not JSON serializable are stored as strings.
+        """
+        written: Dict[str, str] = {}
+
+        def write_version(tmp_path: str) -> str:
+            metadata_rows: Dict[str, int] = {}
+            metadata_ids: List[int] = []
+            text_offsets: List[int] = [0]
+            # texts_hash of the text blob and its offsets, computed as it is written
+            text_digest = hashlib.sha256()
+            with open(os.path.join(tmp_path, "text.bin"), "wb") as f:
+                for doc in documents:
+                    encoded: bytes = doc.page_content.encode("utf-8")
+                    f.write(encoded)
+                    text_digest.update(encoded)
+                    text_offsets.append(text_offsets[-1] + len(encoded))
+                    row: str = json.dumps(doc.metadata, sort_keys=True, default=str)
+                    metadata_ids.append(
+                        metadata_rows.setdefault(row, len(metadata_rows))
+                    )
+            text_digest.update(np.array(text_offsets, dtype=np.int64).tobytes())
+            written["corpus_hash"] = text_digest.hexdigest()
+            # versions also differ by the metadata of the same texts
+            version_digest = hashlib.sha256(written["corpus_hash"].encode("ascii"))
+            metadata_offsets: List[int] = [0]
+            with open(os.path.join(tmp_path, "metadata.bin"), "wb") as f:
+                for row in metadata_rows:
+                    encoded = row.encode("utf-8")
+                    f.write(encoded)
+                    version_digest.update(encoded)
+                    metadata_offsets.append(metadata_offsets[-1] + len(encoded))
+            version_digest.update(np.array(metadata_ids, dtype=np.int32).tobytes())
+            np.save(
+                os.path.join(tmp_path, "text_offsets.npy"),
+                np.array(text_offsets, dtype=np.int64),
+            )
+            np.save(
+                os.path.join(tmp_path, "metadata_ids.npy"),
+                np.array(metadata_ids, dtype=np.int32),
+            )
+            np.save(
+                os.path.join(tmp_path, "metadata_offsets.npy"),
+                np.array(metadata_offsets, dtype=np.int64),
+            )
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "version": CHUNK_STORE_FORMAT_VERSION,
+                        "n_chunks": len(documents),
+                        "corpus_hash": written["corpus_hash"],
+                    },
+                    f,
+                )
+            return version_digest.hexdigest()
+
+        publish_version(path, write_version)
+        return written["corpus_hash"]
+
+    @classmethod
+    def open(cls, path: str) -> Optional["ChunkStore"]:
+        """Map the current version of the store at path, None if there is no usable store."""
+        # stores written before versions sit directly in path
+        version_path: str = current_version(path) or path
+        meta_file: str = os.path.join(version_path, "meta.json")
+        if not os.path.exists(meta_file):
+            return None
+        try:
+            with open(meta_file) as f:
+                meta: Dict[str, Any] = json.load(f)
+            if meta.get("version") != CHUNK_STORE_FORMAT_VERSION:
+                logger.warning(f"Ignoring chunk store {path} of an older format")
+                return None
+            store: ChunkStore = cls(version_path, meta.get("corpus_hash"))
+        except (OSError, ValueError) as err:
+            logger.error(f"Failed to open chunk store {path}: {err}")
+            return None
+        if len(store) != meta["n_chunks"]:
+            logger.warning(f"Chunk store {path} is incomplete, ignoring it")
+            return None
+        return store
+
+    def __len__(self) -> int:
+        return len(self.metadata_ids)
+
+    def page_content(self, i: int) -> str:
+        return (
+            self.text[self.text_offsets[i] : self.text_offsets[i + 1]]
+            .tobytes()
+            .decode("utf-8")
+        )
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        # rows are few and shared by many chunks, so decoded ones are kept
+        metadata: Optional[Dict[str, Any]] = self._metadata_rows.get(row)
+        if metadata is None:
+            metadata = json.loads(
+                self.metadata[
+                    self.metadata_offsets[row] : self.metadata_offsets[row + 1]
+                ].tobytes()
+            )
+            self._metadata_rows[row] = metadata
+        return metadata
+
+    def __getitem__(self, i: int) -> Document:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"chunk {i} out of range")
+        return Document(
+            page_content=self.page_content(i),
+            metadata=dict(self._metadata(int(self.metadata_ids[i]))),
+        )
+
+    def __iter__(self) -> Iterator[Document]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.page_content(i)
+
+
+class ChunkStoreDocstore(Docstore):
+    """LangChain docstore over a ChunkStore, where a chunk's id is its position.
+
+    Vector i of the FAISS index built from the store is chunk i, so this
+    replaces the pickled InMemoryDocstore and its id mapping.
+    """
+
+    def __init__(self, store: ChunkStore) -> None:
+        self.store: ChunkStore = store
+
+    def search(self, search: Any) -> Any:
+        try:
+            return self.store[int(search)]
+        except (IndexError, ValueError):
+            return f"ID {search} not found."
+
+
+class PositionIds(Mapping):
+    """index_to_docstore_id of a ChunkStoreDocstore: every position is its own id."""
+
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+
+    def __getitem__(self, i: int) -> int:
+        if not 0 <= i < self.size:
+            raise KeyError(i)
+        return int(i)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+
+    def __contains__(self, i: object) -> bool:
+        return isinstance(i, (int, np.integer)) and 0 <= i < self.size
@@ -1,27 +1,62 @@
+import json
 import os
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Hashable, Sequence, Tuple, Optional
 import pickle
 
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
+import faiss
+import numpy as np
+
 from langchain_core.documents import Document
 from langchain_community.vectorstores.faiss import FAISS
-from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores.utils import DistanceStrategy
 
 from arklex.env.prompts import load_prompts
-from arklex.utils.graph_state import MessageState, LLMConfig
+from arklex.utils.graph_state import (
+    MessageState,
+    LLMConfig,
+    LexicalSearchConfig,
+    QueryRewriteConfig,
+)
 from arklex.utils.model_provider_config import (
-    PROVIDER_MAP,
-    PROVIDER_EMBEDDINGS,
-    PROVIDER_EMBEDDING_MODELS,
+    default_embedding_model,
+    model_client_pool,
+)
+from arklex.utils.embedding_cache import embed_queries
+from arklex.env.tools.RAG.query_rewrite import QueryRewriter, rerank_union
+from arklex.env.tools.RAG.retrievers.bm25_index import (
+    BM25_INDEX_DIR,
+    BM25Index,
+    reciprocal_rank_fusion,
+)
+from arklex.env.tools.RAG.retrievers.chunk_store import (
+    CHUNK_STORE_DIR,
+    ChunkStore,
+    ChunkStoreDocstore,
+    PositionIds,
+    content_hash,
+)
+from arklex.env.tools.RAG.retrievers.versions import (
+    CURRENT_FILE,
+    corpus_hash,
+    current_version,
+    publish_version,
+    published_mtime,
 )
 from arklex.env.tools.utils import trace
 
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+# Hash of the chunk text of every vector of index.faiss
+INDEX_HASHES_FILE: str = "index_hashes.npy"
+# Provider and model the vectors of index.faiss were embedded with, and the
+# corpus hash of the chunk store they were embedded from
+INDEX_META_FILE: str = "index_meta.json"
+
 
 class RetrieveEngine:
     @staticmethod
@@ -38,7 +73,11 @@ class RetrieveEngine:
         retrieved_text: str
         retriever_returns: List[Dict[str, Any]]
         retrieved_text, retriever_returns = docs.search(
-            user_message.history, prompts["retrieve_contextualize_q_prompt"]
+            user_message.history,
+            prompts["retrieve_contextualize_q_prompt"],
+            query=user_message.message,
+            rewrite_config=state.bot_config.query_rewrite,
+            lexical_config=state.bot_config.lexical_search,
         )
 
         state.message_flow = retrieved_text
@@ -49,22 +88,22 @@ class RetrieveEngine:
 class FaissRetrieverExecutor:
     def __init__(
         self,
-        texts: List[Document],
+        texts: Sequence[Document],
         index_path: str,
         llm_config: LLMConfig,
         index: Optional[FAISS] = None,
+        lexical_index: Optional[BM25Index] = None,
     ) -> None:
-        self.texts: List[Document] = texts
+        self.texts: Sequence[Document] = texts
+        # BM25 over texts, in the same order
+        self.lexical_index: Optional[BM25Index] = lexical_index
         self.index_path: str = index_path
-        self.embedding_model = PROVIDER_EMBEDDINGS.get(
-            llm_config.llm_provider, OpenAIEmbeddings
-        )(
-            **{"model": PROVIDER_EMBEDDING_MODELS[llm_config.llm_provider]}
-            if llm_config.llm_provider != "anthropic"
-            else {"model_name": PROVIDER_EMBEDDING_MODELS[llm_config.llm_provider]}
+        self.llm_config: LLMConfig = llm_config
+        self.embedding_model = model_client_pool.get_embedding_model(
+            llm_config.llm_provider
         )
-        self.llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path
+        self.llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path
         )
         self.index: Optional[FAISS] = index
         self.retriever = self._init_retriever()
@@ -79,85 +118,577 @@ class FaissRetrieverExecutor:
         retriever = docsearch.as_retriever(**kwargs)
         return retriever
 
-    def retrieve_w_score(self, query: str) -> List[Tuple[Document, float]]:
-        k_value: int = (
+    def _k_value(self) -> int:
+        return (
             4
             if not self.retriever.search_kwargs.get("k")
             else self.retriever.search_kwargs.get("k")
         )
+
+    def retrieve_w_score(self, query: str) -> List[Tuple[Document, float]]:
         docs_and_scores: List[Tuple[Document, float]] = (
-            self.retriever.vectorstore.similarity_search_with_score(query, k=k_value)
+            self.retriever.vectorstore.similarity_search_with_score(
+                query, k=self._k_value()
+            )
         )
         return docs_and_scores
 
+    def retrieve_lexical(
+        self, query: str, k: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        """BM25 matches of query with their scores, no embedding needed."""
+        if self.lexical_index is None:
+            return []
+        return [
+            (self.texts[i], score)
+            for i, score in self.lexical_index.search(query, k or self._k_value())
+        ]
+
+    def retrieve_hybrid(
+        self, query: str, config: LexicalSearchConfig
+    ) -> List[Tuple[Document, Optional[float], Dict[str, float]]]:
+        """Dense and BM25 results fused by reciprocal rank.
+
+        Every result keeps its dense score, None for the ones only BM25 found,
+        and carries its fused score as "fused_score".
+        """
+        dense: List[Tuple[Document, float]] = (
+            self.retriever.vectorstore.similarity_search_with_score(
+                query, k=config.candidates
+            )
+        )
+        lexical: List[Tuple[Document, Optional[float]]] = [
+            (doc, None) for doc, _ in self.retrieve_lexical(query, config.candidates)
+        ]
+        return self._fuse([dense, lexical], config)
+
+    def _higher_is_better(self) -> bool:
+        return self.retriever.vectorstore.distance_strategy in (
+            DistanceStrategy.MAX_INNER_PRODUCT,
+            DistanceStrategy.JACCARD,
+        )
+
+    def _fuse(
+        self,
+        result_lists: List[List[Tuple[Document, Optional[float]]]],
+        config: LexicalSearchConfig,
+    ) -> List[Tuple[Document, Optional[float], Dict[str, float]]]:
+        def key(doc: Document) -> Hashable:
+            return doc.page_content, doc.metadata.get("source")
+
+        # the best dense score of each document over the lists it is in
+        dense_scores: Dict[Hashable, float] = {}
+        higher_is_better: bool = self._higher_is_better()
+        for results in result_lists:
+            for doc, score in results:
+                best: Optional[float] = dense_scores.get(key(doc))
+                if score is not None and (
+                    best is None or (score > best if higher_is_better else score < best)
+                ):
+                    dense_scores[key(doc)] = score
+        fused: List[Tuple[Tuple[Document, Optional[float]], float]] = (
+            reciprocal_rank_fusion(
+                result_lists,
+                key=lambda pair: key(pair[0]),
+                k=self._k_value(),
+                rrf_k=config.rrf_k,
+            )
+        )
+        return [
+            (pair[0], dense_scores.get(key(pair[0])), {"fused_score": fused_score})
+            for pair, fused_score in fused
+        ]
+
+    def _lexical_enabled(self, config: Optional[LexicalSearchConfig]) -> bool:
+        return (
+            config is not None
+            and config.mode != "off"
+            and self.lexical_index is not None
+        )
+
+    def _retrieve(
+        self, query: str, config: Optional[LexicalSearchConfig]
+    ) -> List[Tuple[Document, Optional[float], Dict[str, float]]]:
+        if self._lexical_enabled(config):
+            return self.retrieve_hybrid(query, config)
+        return [(doc, score, {}) for doc, score in self.retrieve_w_score(query)]
+
+    def search_many(
+        self, queries: List[str], k: Optional[int] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """retrieve_w_score for every query, aligned with queries.
+
+        The queries are embedded in one batch and looked up with a single
+        FAISS search over the whole query matrix.
+        """
+        if not queries:
+            return []
+        vectorstore: FAISS = self.retriever.vectorstore
+        vectors: np.ndarray = np.array(
+            embed_queries(self.embedding_model, queries), dtype=np.float32
+        )
+        if vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        scores, indices = vectorstore.index.search(vectors, k or self._k_value())
+        results: List[List[Tuple[Document, float]]] = []
+        for row_scores, row_indices in zip(scores, indices):
+            docs_and_scores: List[Tuple[Document, float]] = []
+            for score, i in zip(row_scores, row_indices):
+                # -1 pads the rows when the index has fewer than k vectors
+                if i == -1:
+                    continue
+                doc: Any = vectorstore.docstore.search(
+                    vectorstore.index_to_docstore_id[i]
+                )
+                docs_and_scores.append((doc, score))
+            results.append(docs_and_scores)
+        return results
+
     def search(
-        self, chat_history_str: str, contextualize_prompt: str
+        self,
+        chat_history_str: str,
+        contextualize_prompt: str,
+        query: Optional[str] = None,
+        rewrite_config: Optional[QueryRewriteConfig] = None,
+        lexical_config: Optional[LexicalSearchConfig] = None,
     ) -> Tuple[str, List[Dict[str, Any]]]:
-        contextualize_q_prompt: PromptTemplate = PromptTemplate.from_template(
-            contextualize_prompt
+        """Retrieve the documents relevant to the latest question of chat_history_str.
+
+        With the raw query, the question is only rewritten by the LLM when the
+        rewrite policy says it depends on earlier turns. With lexical_config,
+        BM25 results are fused with the dense ones, and in auto mode a
+        standalone question naming a code found in the corpus skips the
+        embedding. The confidence of a result is always its dense score, None
+        when only BM25 found it; fused and BM25 scores are returned apart.
+        """
+        rewriter: QueryRewriter = QueryRewriter(
+            self.llm, contextualize_prompt, rewrite_config, self.llm_config
         )
-        ret_input_chain = contextualize_q_prompt | self.llm | StrOutputParser()
-        ret_input: str = ret_input_chain.invoke({"chat_history": chat_history_str})
-        logger.info(f"Reformulated input for retriever search: {ret_input}")
-        docs_and_score: List[Tuple[Document, float]] = self.retrieve_w_score(ret_input)
+        docs_and_score: List[Tuple[Document, Optional[float], Dict[str, float]]] = (
+            self._lexical_fast_path(query, chat_history_str, rewriter, lexical_config)
+        )
+        if docs_and_score:
+            logger.info(f"Answered from the lexical index: {query}")
+        elif (
+            query is not None
+            and rewriter.parallel
+            and rewriter.should_rewrite(query, chat_history_str)
+        ):
+            docs_and_score = self._search_while_rewriting(
+                rewriter, query, chat_history_str, lexical_config
+            )
+        else:
+            ret_input: str = rewriter.rewrite(query, chat_history_str)
+            logger.info(f"Reformulated input for retriever search: {ret_input}")
+            docs_and_score = self._retrieve(ret_input, lexical_config)
         retrieved_text: str = ""
         retriever_returns: List[Dict[str, Any]] = []
-        for doc, score in docs_and_score:
+        for doc, score, other_scores in docs_and_score:
             retrieved_text += f"{doc.page_content} \n"
             item: Dict[str, Any] = {
                 "title": doc.metadata.get("title"),
                 "content": doc.page_content,
                 "source": doc.metadata.get("source"),
-                "confidence": float(score),
+                "confidence": float(score) if score is not None else None,
+                **other_scores,
             }
             retriever_returns.append(item)
         return retrieved_text, retriever_returns
 
+    def _lexical_fast_path(
+        self,
+        query: Optional[str],
+        chat_history_str: str,
+        rewriter: QueryRewriter,
+        config: Optional[LexicalSearchConfig],
+    ) -> List[Tuple[Document, Optional[float], Dict[str, float]]]:
+        """BM25 results for a standalone question naming a code found in the corpus."""
+        if (
+            query is None
+            or not self._lexical_enabled(config)
+            or config.mode != "auto"
+            # a follow-up is made standalone first, its code may not be the subject
+            or rewriter.should_rewrite(query, chat_history_str)
+            or not self.lexical_index.matches_identifier(query)
+        ):
+            return []
+        return [
+            (doc, None, {"lexical_score": float(score)})
+            for doc, score in self.retrieve_lexical(query)
+        ]
+
+    def _search_while_rewriting(
+        self,
+        rewriter: QueryRewriter,
+        query: str,
+        chat_history_str: str,
+        lexical_config: Optional[LexicalSearchConfig] = None,
+    ) -> List[Tuple[Document, Optional[float], Dict[str, float]]]:
+        """Search with the raw query during the rewrite, then re-rank both result sets."""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            raw_future = executor.submit(self._retrieve, query, lexical_config)
+            ret_input: str = rewriter.rewrite(query, chat_history_str)
+            raw_docs: List[Tuple[Document, Optional[float], Dict[str, float]]] = (
+                raw_future.result()
+            )
+        logger.info(f"Reformulated input for retriever search: {ret_input}")
+        if ret_input.strip() == query.strip():
+            return raw_docs
+        if self._lexical_enabled(lexical_config):
+            # fused scores are ranks, not distances, so fuse the two rankings again
+            return self._fuse(
+                [
+                    [(doc, score) for doc, score, _ in results]
+                    for results in [raw_docs, self._retrieve(ret_input, lexical_config)]
+                ],
+                lexical_config,
+            )
+        return [
+            (doc, score, {})
+            for doc, score in rerank_union(
+                [
+                    [(doc, score) for doc, score, _ in raw_docs],
+                    self.retrieve_w_score(ret_input),
+                ],
+                key=lambda doc: doc.page_content,
+                k=self._k_value(),
+                higher_is_better=self._higher_is_better(),
+            )
+        ]
+
     @staticmethod
     def load_docs(
         database_path: str, llm_config: LLMConfig, index_path: str = "./index"
     ) -> "FaissRetrieverExecutor":
-        document_path: str = os.path.join(database_path, "chunked_documents.pkl")
+        """Return the retriever for database_path, loading the index only when it changed."""
+        return faiss_index_cache.get(database_path, llm_config, index_path)
+
+    @staticmethod
+    def build_executor(
+        database_path: str, llm_config: LLMConfig, index_path: str = "./index"
+    ) -> "FaissRetrieverExecutor":
         idx_path: str = os.path.join(database_path, index_path)
-        # logger.info(f"Loaded documents from {document_path}")
-        # with open(document_path, "rb") as fread:
-        #     documents: List[Document] = pickle.load(fread)
-        # logger.info(f"Loaded {len(documents)} documents")
 
         index: Optional[FAISS] = None
-        documents: List[Document] = []
+        store: ChunkStore = load_chunk_store(database_path)
+        embedding_model: Any = model_client_pool.get_embedding_model(
+            llm_config.llm_provider
+        )
+        meta: Dict[str, str] = {
+            "llm_provider": llm_config.llm_provider,
+            "embedding_model": default_embedding_model(llm_config.llm_provider),
+            "corpus_hash": store.corpus_hash,
+        }
+        # read once, a build of another process may switch versions meanwhile
+        version_path: Optional[str] = current_version(idx_path)
+        saved_meta: Optional[Dict[str, str]] = (
+            saved_index_meta(version_path) if version_path else None
+        )
+        # vectors of another embedding model are neither searched nor reused
+        same_model: bool = saved_meta is not None and all(
+            saved_meta.get(key) == meta[key]
+            for key in ["llm_provider", "embedding_model"]
+        )
 
-        if os.path.isdir(idx_path):
+        # other chunks than the index was built from mean build_rag ran again
+        if saved_meta == meta:
             try:
-                index = FAISS.load_local(
-                    idx_path,
-                    PROVIDER_EMBEDDINGS.get(
-                        llm_config.llm_provider, OpenAIEmbeddings
-                    )(),
-                    allow_dangerous_deserialization=True,
-                )
-                documents = list(index.docstore._dict.values())
-                logger.info(f"Loaded FAISS index from {idx_path}")
+                index = load_faiss_index(version_path, embedding_model, store)
+                logger.info(f"Loaded FAISS index from {version_path}")
             except Exception as err:
                 logger.error(f"Failed to load index: {err}")
                 index = None
 
         if index is None:
-            logger.info(f"Loaded documents from {document_path}")
-            with open(document_path, "rb") as fread:
-                documents = pickle.load(fread)
-            logger.info(f"Loaded {len(documents)} documents")
-            index = FAISS.from_documents(
-                documents,
-                PROVIDER_EMBEDDINGS.get(llm_config.llm_provider, OpenAIEmbeddings)(),
+            texts: List[str] = list(store.texts())
+            hashes: List[str] = [content_hash(text) for text in texts]
+            vectors: np.ndarray = embed_chunks(
+                texts,
+                hashes,
+                embedding_model,
+                previous_vectors(version_path) if same_model else {},
+            )
+            raw_index: Any = faiss.IndexFlatL2(vectors.shape[1])
+            raw_index.add(vectors)
+            save_faiss_index(raw_index, idx_path, hashes, meta)
+            index = FAISS(
+                embedding_model,
+                raw_index,
+                ChunkStoreDocstore(store),
+                PositionIds(len(store)),
             )
-            os.makedirs(idx_path, exist_ok=True)
-            index.save_local(idx_path)
 
         return FaissRetrieverExecutor(
-            # texts=documents, index_path=index_path, llm_config=llm_config
-            texts=documents,
+            texts=store,
             index_path=index_path,
             llm_config=llm_config,
             index=index,
+            lexical_index=load_bm25_index(database_path, store),
+        )
+
+
+def saved_index_meta(version_path: str) -> Optional[Dict[str, str]]:
+    """Meta of a saved index version, see INDEX_META_FILE, None if unknown."""
+    try:
+        with open(os.path.join(version_path, INDEX_META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def previous_vectors(version_path: str) -> Dict[str, np.ndarray]:
+    """Vectors of a saved index version, by hash of their chunk text."""
+    hashes_file: str = os.path.join(version_path, INDEX_HASHES_FILE)
+    index_file: str = os.path.join(version_path, "index.faiss")
+    try:
+        hashes: np.ndarray = np.load(hashes_file)
+        raw_index: Any = faiss.read_index(index_file)
+        if raw_index.ntotal != len(hashes):
+            return {}
+        vectors: np.ndarray = raw_index.reconstruct_n(0, raw_index.ntotal)
+    except (OSError, ValueError, RuntimeError) as err:
+        logger.warning(f"Cannot reuse the vectors of {index_file}: {err}")
+        return {}
+    return dict(zip((h.decode("ascii") for h in hashes), vectors))
+
+
+def embed_chunks(
+    texts: List[str],
+    hashes: List[str],
+    embedding_model: Any,
+    previous: Dict[str, np.ndarray],
+) -> np.ndarray:
+    """Vectors of texts, embedding only the chunks the previous index has no vector for.
+
+    Chunks of removed sources are simply not carried over.
+    """
+    missing: List[int] = [i for i, h in enumerate(hashes) if h not in previous]
+    embedded: List[List[float]] = embedding_model.embed_documents(
+        [texts[i] for i in missing]
+    )
+    if previous and embedded and len(embedded[0]) != len(next(iter(previous.values()))):
+        # vectors of another embedding model cannot be mixed with these
+        logger.info("Embedding dimension changed, re-embedding every chunk")
+        previous = {}
+        missing = list(range(len(texts)))
+        embedded = embedding_model.embed_documents(texts)
+    logger.info(
+        f"Embedded {len(missing)} of {len(texts)} chunks, reused the other vectors"
+    )
+    new_vectors: Dict[int, List[float]] = dict(zip(missing, embedded))
+    return np.array(
+        [
+            new_vectors[i] if i in new_vectors else previous[h]
+            for i, h in enumerate(hashes)
+        ],
+        dtype=np.float32,
+    )
+
+
+def load_chunk_store(database_path: str) -> ChunkStore:
+    """Map the chunk store of database_path, converting a legacy chunked_documents.pkl.
+
+    Corpora built before the store only have the pickled chunk list; it is
+    converted once, and again whenever it is newer than the store.
+    """
+    store_path: str = os.path.join(database_path, CHUNK_STORE_DIR)
+    store: Optional[ChunkStore] = ChunkStore.open(store_path)
+    document_path: str = os.path.join(database_path, "chunked_documents.pkl")
+    if os.path.exists(document_path) and (
+        store is None or os.path.getmtime(document_path) > _store_mtime(store_path)
+    ):
+        with open(document_path, "rb") as fread:
+            documents: List[Document] = pickle.load(fread)
+        ChunkStore.write(store_path, documents)
+        logger.info(f"Converted {len(documents)} documents to {store_path}")
+        store = ChunkStore.open(store_path)
+    if store is None:
+        raise FileNotFoundError(f"No chunked documents found in {database_path}")
+    return store
+
+
+def _store_mtime(store_path: str) -> float:
+    mtime: float = published_mtime(store_path)
+    legacy_meta: str = os.path.join(store_path, "meta.json")
+    if mtime < 0 and os.path.exists(legacy_meta):
+        # a store written before versions
+        mtime = os.path.getmtime(legacy_meta)
+    return mtime
+
+
+def load_bm25_index(
+    database_path: str, documents: Sequence[Document]
+) -> Optional[BM25Index]:
+    """Map the BM25 index of database_path, building it for corpora that predate it."""
+    bm25_path: str = os.path.join(database_path, BM25_INDEX_DIR)
+    lexical_index: Optional[BM25Index] = BM25Index.load(bm25_path)
+    texts: Optional[List[str]] = None
+    if isinstance(documents, ChunkStore):
+        documents_hash: str = documents.corpus_hash
+    else:
+        texts = [doc.page_content for doc in documents]
+        documents_hash = corpus_hash(texts)
+    # an index of other texts, even as many, would return the wrong chunks
+    if lexical_index is not None and lexical_index.corpus_hash == documents_hash:
+        return lexical_index
+    try:
+        if texts is None:
+            texts = list(documents.texts())
+        lexical_index = BM25Index.build(texts)
+        lexical_index.save(bm25_path)
+        logger.info(f"Built BM25 index of {len(documents)} documents at {bm25_path}")
+    except OSError as err:
+        # a read-only data directory still gets lexical search, just not persisted
+        logger.warning(f"Could not save the BM25 index to {bm25_path}: {err}")
+    return lexical_index
+
+
+def load_faiss_index(
+    version_path: str, embedding_model: Any, store: ChunkStore
+) -> FAISS:
+    """Load the index of a chunk store, memory-mapping the vectors when supported.
+
+    A mapped index is shared with the page cache instead of being copied onto
+    the heap, so large corpora load in roughly constant time. Vector i is
+    chunk i of the store, which serves the documents without unpickling them.
+    """
+    index_file: str = os.path.join(version_path, "index.faiss")
+    mmap_flag: int = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        raw_index: Any = faiss.read_index(
+            index_file, mmap_flag | faiss.IO_FLAG_READ_ONLY
+        )
+    except RuntimeError as err:
+        logger.info(f"Index {index_file} cannot be memory-mapped ({err}), reading it")
+        raw_index = faiss.read_index(index_file)
+    if raw_index.ntotal != len(store):
+        raise ValueError(
+            f"Index {index_file} has {raw_index.ntotal} vectors for {len(store)} chunks"
+        )
+    return FAISS(
+        embedding_model, raw_index, ChunkStoreDocstore(store), PositionIds(len(store))
+    )
+
+
+def save_faiss_index(
+    raw_index: Any, idx_path: str, hashes: List[str], meta: Dict[str, str]
+) -> None:
+    """Save an index as a new version of idx_path, see publish_version.
+
+    faiss.write_index truncates the file in place, which would invalidate live
+    memory maps, so every index gets its own directory. The hashes of the
+    chunk texts and the embedding model are saved with it, so the next
+    rebuild can reuse the vectors of unchanged chunks embedded by the same
+    model.
+    """
+
+    def write_version(tmp_path: str) -> str:
+        faiss.write_index(raw_index, os.path.join(tmp_path, "index.faiss"))
+        np.save(
+            os.path.join(tmp_path, INDEX_HASHES_FILE), np.array(hashes, dtype="S64")
+        )
+        with open(os.path.join(tmp_path, INDEX_META_FILE), "w") as f:
+            json.dump(meta, f)
+        return content_hash(json.dumps([meta, hashes], sort_keys=True))
+
+    publish_version(idx_path, write_version)
+
+
+# (absolute index path, llm provider, model)
+IndexKey = Tuple[str, str, str]
+# (mtimes of the files the executor was loaded from, executor)
+CacheEntry = Tuple[Tuple[float, ...], FaissRetrieverExecutor]
+
+
+class FaissIndexCache:
+    """Process-wide cache of loaded FAISS retrievers.
+
+    Entries are keyed by index path and model and validated against the mtimes
+    of the index and chunk store, so an index rewritten by build_rag is
+    reloaded on the next retrieval without restarting the server. The least
+    recently used index is evicted once more than max_size bots are resident.
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        self.max_size: int = max_size
+        self._entries: "OrderedDict[IndexKey, CacheEntry]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self._build_locks: Dict[IndexKey, threading.Lock] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def _signature(database_path: str, idx_path: str) -> Tuple[float, ...]:
+        files: List[str] = [
+            os.path.join(idx_path, CURRENT_FILE),
+            os.path.join(database_path, CHUNK_STORE_DIR, CURRENT_FILE),
+            os.path.join(database_path, "chunked_documents.pkl"),
+            os.path.join(database_path, BM25_INDEX_DIR, CURRENT_FILE),
+        ]
+        return tuple(os.path.getmtime(f) if os.path.exists(f) else -1.0 for f in files)
+
+    def _lookup(
+        self, key: IndexKey, signature: Tuple[float, ...]
+    ) -> Optional[FaissRetrieverExecutor]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            return None
+
+    def get(
+        self, database_path: str, llm_config: LLMConfig, index_path: str = "./index"
+    ) -> FaissRetrieverExecutor:
+        idx_path: str = os.path.abspath(os.path.join(database_path, index_path))
+        key: IndexKey = (
+            idx_path,
+            llm_config.llm_provider,
+            llm_config.model_type_or_path,
         )
+        executor: Optional[FaissRetrieverExecutor] = self._lookup(
+            key, self._signature(database_path, idx_path)
+        )
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            build_lock: threading.Lock = self._build_locks.setdefault(
+                key, threading.Lock()
+            )
+        # concurrent requests for the same index wait for a single load
+        with build_lock:
+            executor = self._lookup(key, self._signature(database_path, idx_path))
+            if executor is not None:
+                return executor
+            executor = FaissRetrieverExecutor.build_executor(
+                database_path, llm_config, index_path
+            )
+            # taken after the build so an index written by it counts as current
+            signature: Tuple[float, ...] = self._signature(database_path, idx_path)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (signature, executor)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    evicted_key, _ = self._entries.popitem(last=False)
+                    logger.info(f"Evicted FAISS index {evicted_key[0]}")
+        return executor
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+faiss_index_cache: FaissIndexCache = FaissIndexCache()
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from arklex.env.tools.RAG.retrievers.retriever_document import RetrieverDocument
+
+logger = logging.getLogger(__name__)
+
+
+class FakeEmbedder:
+    """Deterministic offline embedder for tests and ingestion benchmarks.
+
+    Vectors are derived from a hash of the text, and latency simulates the
+    round trip of one embeddings request.
+    """
+
+    def __init__(self, dimension: int = 1536, latency: float = 0.0) -> None:
+        self.dimension: int = dimension
+        self.latency: float = latency
+        self.requests: int = 0
+        self.retries: int = 0
+
+    def _embed(self, text: str) -> List[float]:
+        seed: int = int.from_bytes(
+            hashlib.sha256(text.encode("utf-8")).digest()[:8], "big"
+        )
+        vector: np.ndarray = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class IngestionCheckpoint:
+    """Ids of the documents already upserted, appended to a file batch by batch.
+
+    Appending one JSON line per batch keeps the cost of a checkpoint
+    proportional to the batch rather than to the whole index, so an
+    interrupted re-index resumes from the last upserted batch.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self.done.update(json.loads(line))
+                    except json.JSONDecodeError:
+                        # a batch interrupted mid-write is simply redone
+                        logger.warning(f"Ignoring truncated checkpoint line in {path}")
+
+    def mark_done(self, ids: List[str]) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(ids) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(ids)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = set()
+
+
+async def ingest_documents(
+    client: Any,
+    collection_name: str,
+    documents: List["RetrieverDocument"],
+    embedder: Any,
+    batch_size: int = 256,
+    queue_size: int = 4,
+    embed_concurrency: int = 2,
+    checkpoint: Optional[IngestionCheckpoint] = None,
+) -> Dict[str, Any]:
+    """Embed documents in batches and upsert them into a Milvus collection.
+
+    embedder is anything with an async aembed(texts) returning one vector per
+    text, e.g. OpenAIBatchEmbedder or FakeEmbedder.
+
+    Up to embed_concurrency embedding requests of batch_size texts are in
+    flight while the previous batches are upserted, and the bounded queue
+    between the two stops embedding from running ahead of a slow Milvus.
+    Documents recorded in the checkpoint are skipped.
+    """
+    if checkpoint is not None and checkpoint.done:
+        skipped: int = len(documents)
+        documents = [doc for doc in documents if doc.id not in checkpoint.done]
+        skipped -= len(documents)
+        logger.info(f"Resuming ingestion, {skipped} documents already upserted")
+    batches: List[List["RetrieverDocument"]] = [
+        documents[i : i + batch_size] for i in range(0, len(documents), batch_size)
+    ]
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    next_batch: List[int] = [0]
+    stats: Dict[str, Any] = {
+        "documents": len(documents),
+        "batches": len(batches),
+        "embed_seconds": 0.0,
+        "upsert_seconds": 0.0,
+    }
+
+    async def produce() -> None:
+        while next_batch[0] < len(batches):
+            batch: List["RetrieverDocument"] = batches[next_batch[0]]
+            next_batch[0] += 1
+            start: float = time.perf_counter()
+            vectors: List[List[float]] = await embedder.aembed([d.text for d in batch])
+            stats["embed_seconds"] += time.perf_counter() - start
+            await queue.put(
+                [doc.to_milvus_schema_dict(v) for doc, v in zip(batch, vectors)]
+            )
+
+    async def consume() -> None:
+        count: int = 0
+        while True:
+            data: Optional[List[Dict]] = await queue.get()
+            if data is None:
+                return
+            start: float = time.perf_counter()
+            await asyncio.to_thread(
+                client.upsert, collection_name=collection_name, data=data
+            )
+            stats["upsert_seconds"] += time.perf_counter() - start
+            if checkpoint is not None:
+                checkpoint.mark_done([d["id"] for d in data])
+            count += len(data)
+            logger.info(f"Added {count}/{len(documents)} docs")
+
+    async def feed() -> None:
+        await asyncio.gather(*producers)
+        await queue.put(None)
+
+    start: float = time.perf_counter()
+    consumer: asyncio.Task = asyncio.create_task(consume())
+    producers: List[asyncio.Task] = [
+        asyncio.create_task(produce()) for _ in range(max(1, embed_concurrency))
+    ]
+    feeder: asyncio.Task = asyncio.create_task(feed())
+    try:
+        # a failed upsert must stop the producers instead of blocking them on put
+        done, _ = await asyncio.wait(
+            [consumer, feeder], return_when=asyncio.FIRST_EXCEPTION
+        )
+        for task in done:
+            task.result()
+    finally:
+        for task in [consumer, feeder, *producers]:
+            task.cancel()
+    stats["seconds"] = time.perf_counter() - start
+    stats["embedding_requests"] = getattr(embedder, "requests", 0)
+    stats["embedding_retries"] = getattr(embedder, "retries", 0)
+    return stats
+
+
+def document_hash(text: str, metadata: Any) -> str:
+    """Content hash of a stored chunk, metadata included since tags live there."""
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return hashlib.sha256(
+        f"{text}\0{json.dumps(metadata, sort_keys=True, default=str)}".encode("utf-8")
+    ).hexdigest()
+
+
+def plan_sync(
+    existing: Dict[str, str], documents: List["RetrieverDocument"]
+) -> Tuple[List["RetrieverDocument"], List[str]]:
+    """Documents to upsert and ids to delete to make a collection hold documents.
+
+    existing maps the id of every chunk stored for the bot to its
+    document_hash. Unchanged chunks are neither re-embedded nor rewritten,
+    and chunks that are gone, such as the tail of a shortened source, are
+    deleted.
+    """
+    changed: List["RetrieverDocument"] = [
+        doc
+        for doc in documents
+        if existing.get(doc.id) != document_hash(doc.text, doc.metadata)
+    ]
+    kept: Set[str] = {doc.id for doc in documents}
+    removed: List[str] = [doc_id for doc_id in existing if doc_id not in kept]
+    return changed, removed
@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from arklex.utils.graph_state import VectorIndexConfig
+
+# Build parameters of every supported index type, overridable per bot
+DEFAULT_INDEX_PARAMS: Dict[str, Dict[str, Any]] = {
+    "FLAT": {},
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 16, "nbits": 8},
+}
+
+# Per-query knobs trading recall for latency
+DEFAULT_SEARCH_PARAMS: Dict[str, Dict[str, Any]] = {
+    "FLAT": {},
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+}
+
+SUPPORTED_METRICS: List[str] = ["L2", "IP", "COSINE"]
+
+
+def validate_index_config(config: VectorIndexConfig, dimension: int) -> None:
+    if config.index_type not in DEFAULT_INDEX_PARAMS:
+        raise ValueError(
+            f"Unsupported index type {config.index_type}, expected one of {list(DEFAULT_INDEX_PARAMS)}"
+        )
+    if config.metric_type not in SUPPORTED_METRICS:
+        raise ValueError(
+            f"Unsupported metric {config.metric_type}, expected one of {SUPPORTED_METRICS}"
+        )
+    if config.index_type == "IVF_PQ":
+        m: int = index_build_params(config)["m"]
+        if dimension % m:
+            raise ValueError(f"IVF_PQ m={m} must divide the dimension {dimension}")
+
+
+def index_build_params(config: VectorIndexConfig) -> Dict[str, Any]:
+    return {**DEFAULT_INDEX_PARAMS[config.index_type], **config.params}
+
+
+def embedding_index(config: VectorIndexConfig, dimension: int) -> Dict[str, Any]:
+    """Keyword arguments of IndexParams.add_index for the embedding field."""
+    validate_index_config(config, dimension)
+    return {
+        "field_name": "embedding",
+        "index_type": config.index_type,
+        "metric_type": config.metric_type,
+        "params": index_build_params(config),
+    }
+
+
+def search_params(
+    index_type: str,
+    metric_type: str,
+    config: Optional[VectorIndexConfig] = None,
+    top_k: int = 4,
+) -> Dict[str, Any]:
+    """Search parameters for a collection indexed with index_type and metric_type.
+
+    The index type and metric come from the collection itself, since a
+    collection built before its bot's config changed keeps its old index,
+    while the ef/nprobe knobs come from the bot config.
+    """
+    params: Dict[str, Any] = dict(DEFAULT_SEARCH_PARAMS.get(index_type, {}))
+    if config is not None:
+        params.update({k: v for k, v in config.search_params.items() if k in params})
+    if "ef" in params:
+        # HNSW cannot return more neighbours than it explores
+        params["ef"] = max(params["ef"], top_k)
+    return {"metric_type": metric_type, "params": params}
+
+
+def confidence(distance: float, metric_type: str, sigma: float = 0.5) -> float:
+    """Map a search distance to a 0-100 confidence score."""
+    if metric_type == "L2":
+        similarity: float = np.exp(-(distance**2) / (2 * sigma**2)) * 100
+    else:
+        # IP and COSINE return similarities, where higher is closer
+        similarity = max(0.0, min(1.0, distance)) * 100
+    return round(float(similarity), 2)
@@ -1,30 +1,41 @@
 # TODO(christian): add annotations to the code
 
 import logging
+import threading
 import time
 import os
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing.pool import Pool
 from pymilvus import Collection, DataType, MilvusClient, connections
 
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai.chat_models import ChatOpenAI
-
 from arklex.env.prompts import load_prompts
 from arklex.utils.mysql import mysql_pool
-from arklex.utils.model_provider_config import PROVIDER_MAP
-from arklex.utils.graph_state import MessageState
+from arklex.utils.model_provider_config import model_client_pool
+from arklex.utils.graph_state import MessageState, VectorIndexConfig
 from arklex.env.tools.RAG.retrievers.retriever_document import (
+    OpenAIBatchEmbedder,
     RetrieverDocument,
     RetrieverDocumentType,
     RetrieverResult,
-    embed,
-    embed_retriever_document,
+    embed_many,
+)
+from arklex.env.tools.RAG.retrievers.milvus_index import (
+    confidence,
+    embedding_index,
+    search_params,
+)
+from arklex.env.tools.RAG.retrievers.ingestion import (
+    IngestionCheckpoint,
+    document_hash,
+    ingest_documents,
+    plan_sync,
 )
+from arklex.env.tools.RAG.query_rewrite import QueryRewriter, rerank_union
 from arklex.env.tools.utils import trace
+from arklex.utils.utils import run_coroutine_sync
 
 EMBED_DIMENSION = 1536
 MAX_TEXT_LENGTH = 65535
@@ -44,7 +55,7 @@ class RetrieveEngine:
         # Search for the relevant documents
         milvus_retriever = MilvusRetrieverExecutor(state.bot_config)
         retrieved_text, retriever_params = milvus_retriever.retrieve(
-            user_message.history, tags
+            user_message.history, tags, query=user_message.message
         )
 
         state.message_flow = retrieved_text
@@ -53,6 +64,10 @@ class RetrieveEngine:
 
 
 class MilvusRetriever:
+    # (index_type, metric_type) of the embedding index of every collection seen
+    _collection_indexes: Dict[str, Dict[str, str]] = {}
+    _collection_indexes_lock: threading.Lock = threading.Lock()
+
     def __enter__(self):
         self.uri = os.getenv("MILVUS_URI", "")
         self.token = os.getenv("MILVUS_TOKEN", "")
@@ -65,7 +80,9 @@ class MilvusRetriever:
     def get_bot_uid(self, bot_id: str, version: str):
         return f"{bot_id}__{version}"
 
-    def create_collection_with_partition_key(self, collection_name: str):
+    def create_collection_with_partition_key(
+        self, collection_name: str, index_config: Optional[VectorIndexConfig] = None
+    ):
         schema = MilvusClient.create_schema(
             auto_id=False,
             enable_dynamic_field=True,
@@ -99,12 +116,13 @@ class MilvusRetriever:
         index_params.add_index(field_name="qa_doc_id")
         index_params.add_index(field_name="bot_uid")
         index_params.add_index(
-            field_name="embedding", index_type="FLAT", metric_type="L2"
+            **embedding_index(index_config or VectorIndexConfig(), EMBED_DIMENSION)
         )
 
         self.client.create_collection(
             collection_name=collection_name, schema=schema, index_params=index_params
         )
+        self._forget_collection_index(collection_name)
 
     def delete_documents_by_qa_doc_id(self, collection_name: str, qa_doc_id: str):
         logger.info(
@@ -134,17 +152,7 @@ class MilvusRetriever:
         else:
             documents_to_insert = retriever_documents
 
-        res = []
-        for doc in documents_to_insert:
-            data = doc.to_milvus_schema_dict_and_embed()
-            try:
-                res.append(
-                    self.client.upsert(collection_name=collection_name, data=[data])
-                )
-            except Exception as e:
-                logger.error(f"Error adding document id: {data['id']} error: {e}")
-                raise e
-        return res
+        return self.add_documents_batched(collection_name, documents_to_insert)
 
     def update_tag_by_qa_doc_id(self, collection_name: str, qa_doc_id: str, tags: dict):
         """
@@ -244,22 +252,8 @@ class MilvusRetriever:
         else:
             documents_to_insert = documents
 
-        res = []
-        # process 100 documents at a time
-        count = 0
-        for i in range(0, len(documents_to_insert), 100):
-            batch_docs = documents_to_insert[i : i + 100]
-            embedded_batch_docs = process_pool.map(embed_retriever_document, batch_docs)
-
-            res.extend(
-                self.client.upsert(
-                    collection_name=collection_name, data=embedded_batch_docs
-                )
-            )
-            count += len(batch_docs)
-            logger.info(f"Added {count}/{len(documents_to_insert)} docs")
-
-        return res
+        # embedding now happens in batched API requests, the process pool is not needed
+        return self.add_documents_batched(collection_name, documents_to_insert)
 
     def add_documents(
         self,
@@ -288,17 +282,116 @@ class MilvusRetriever:
         else:
             documents_to_insert = documents
 
-        res = []
-        for doc in documents_to_insert:
-            data = doc.to_milvus_schema_dict_and_embed()
+        return self.add_documents_batched(collection_name, documents_to_insert)
+
+    def add_documents_batched(
+        self,
+        collection_name: str,
+        documents: List[RetrieverDocument],
+        embedder: Optional[Any] = None,
+        batch_size: int = 256,
+        queue_size: int = 4,
+        checkpoint_path: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Embed documents batch_size texts per request while earlier batches are upserted.
+
+        With checkpoint_path, the ids of upserted documents are recorded so an
+        interrupted re-index can be resumed by calling this again with the same
+        path. The checkpoint is removed once every document is in.
+        """
+        checkpoint = IngestionCheckpoint(checkpoint_path) if checkpoint_path else None
+        try:
+            stats = run_coroutine_sync(
+                ingest_documents(
+                    self.client,
+                    collection_name,
+                    documents,
+                    embedder if embedder is not None else OpenAIBatchEmbedder(),
+                    batch_size=batch_size,
+                    queue_size=queue_size,
+                    checkpoint=checkpoint,
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error adding documents to collection {collection_name}: {e}")
+            raise e
+        if checkpoint is not None:
+            checkpoint.remove()
+        logger.info(
+            f"Added {stats['documents']} docs in {stats['batches']} batches, {stats['seconds']:.1f}s"
+        )
+        return stats
+
+    def sync_documents(
+        self,
+        collection_name: str,
+        documents: List[RetrieverDocument],
+        bot_id: str,
+        version: str,
+        embedder: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        """Make the chunks stored for a bot exactly documents, embedding only what changed.
+
+        Chunks are compared by the hash of their text and metadata, so a
+        refresh of a large corpus only embeds and upserts the chunks of the
+        sources that changed, and deletes the chunks of removed sources.
+        """
+        partition_key = self.get_bot_uid(bot_id, version)
+        connections.connect(
+            uri=self.uri,
+            token=self.token,
+        )
+        iterator = Collection(collection_name).query_iterator(
+            batch_size=1000,
+            expr=f"bot_uid == '{partition_key}'",
+            output_fields=["id", "text", "metadata"],
+        )
+        existing: Dict[str, str] = {}
+        while True:
+            result = iterator.next()
+            if len(result) == 0:
+                iterator.close()
+                break
+            for r in result:
+                existing[r["id"]] = document_hash(r["text"], r["metadata"])
+
+        changed, removed = plan_sync(existing, documents)
+        logger.info(
+            f"Syncing {len(documents)} docs of {partition_key}: {len(changed)} changed, {len(removed)} removed"
+        )
+        if removed:
+            self.client.delete(collection_name=collection_name, ids=removed)
+        stats = self.add_documents_batched(collection_name, changed, embedder=embedder)
+        stats["unchanged"] = len(documents) - len(changed)
+        stats["removed"] = len(removed)
+        return stats
+
+    def collection_index(self, collection_name: str) -> Dict[str, str]:
+        """Index type and metric of the embedding field of a collection."""
+        with self._collection_indexes_lock:
+            index = self._collection_indexes.get(collection_name)
+        if index is None:
             try:
-                res.append(
-                    self.client.upsert(collection_name=collection_name, data=[data])
+                res = self.client.describe_index(
+                    collection_name=collection_name, index_name="embedding"
                 )
+                index = {
+                    "index_type": res.get("index_type", "FLAT"),
+                    "metric_type": res.get("metric_type", "L2"),
+                }
             except Exception as e:
-                logger.error(f"Error adding document id: {data['id']} error: {e}")
-                raise e
-        return res
+                # collections created before the index was configurable
+                logger.warning(
+                    f"Could not describe the index of collection {collection_name}, assuming FLAT/L2: {e}"
+                )
+                index = {"index_type": "FLAT", "metric_type": "L2"}
+            with self._collection_indexes_lock:
+                self._collection_indexes[collection_name] = index
+        return index
+
+    def _forget_collection_index(self, collection_name: str):
+        with self._collection_indexes_lock:
+            self._collection_indexes.pop(collection_name, None)
 
     def search(
         self,
@@ -308,29 +401,57 @@ class MilvusRetriever:
         query: str,
         tags: dict = {},
         top_k: int = 4,
+        index_config: Optional[VectorIndexConfig] = None,
     ) -> List[RetrieverResult]:
         logger.info(
             f"Retreiver search for query: {query} on collection {collection_name} for bot_id: {bot_id} version: {version}"
         )
 
+        return self.search_many(
+            collection_name, bot_id, version, [query], tags, top_k, index_config
+        )[0]
+
+    def search_many(
+        self,
+        collection_name: str,
+        bot_id: str,
+        version: str,
+        queries: List[str],
+        tags: dict = {},
+        top_k: int = 4,
+        index_config: Optional[VectorIndexConfig] = None,
+    ) -> List[List[RetrieverResult]]:
+        """search for every query, aligned with queries.
+
+        The queries are embedded in one batch and sent to Milvus as a single
+        multi-vector search request.
+        """
+        if not queries:
+            return []
         partition_key = self.get_bot_uid(bot_id, version)
-        query_embedding = embed(query)
+        query_embeddings = embed_many(queries)
         filter = f'bot_uid == "{partition_key}"'
         if tags:
             # NOTE: Only support one tag for now
             for key, value in tags.items():
                 filter += f' and metadata["tags"]["{key}"] == "{value}"'
                 break
+        index = self.collection_index(collection_name)
         res = self.client.search(
             collection_name=collection_name,
-            data=[query_embedding],
+            data=query_embeddings,
             limit=top_k,
             filter=filter,
+            search_params=search_params(
+                index["index_type"], index["metric_type"], index_config, top_k
+            ),
             output_fields=["qa_doc_id", "chunk_id", "qa_doc_type", "metadata", "text"],
         )
+        return [self._to_retriever_results(hits) for hits in res]
 
+    def _to_retriever_results(self, hits) -> List[RetrieverResult]:
         ret_results: List[RetrieverResult] = []
-        for r in res[0]:
+        for r in hits:
             logger.info(f"Milvus search result: {r}")
             qa_doc_id = r["entity"]["qa_doc_id"]
             chunk_id = r["entity"]["chunk_id"]
@@ -521,6 +642,7 @@ class MilvusRetriever:
         return self.client.release_collection(collection_name)
 
     def drop_collection(self, collection_name: str):
+        self._forget_collection_index(collection_name)
         return self.client.drop_collection(collection_name)
 
     def get_all_vectors(self, collection_name: str):
@@ -666,7 +788,13 @@ class MilvusRetriever:
         bot_id: str,
         version: str,
         new_collection_name: str,
+        index_config: Optional[VectorIndexConfig] = None,
     ):
+        """Move the vectors of a bot to another collection.
+
+        This is also how an existing FLAT collection is moved to an ANN index:
+        the new collection is created with index_config if it does not exist.
+        """
         partition_key = self.get_bot_uid(bot_id, version)
         connections.connect(
             uri=self.uri,
@@ -710,7 +838,7 @@ class MilvusRetriever:
             logger.info(
                 f"No collection found hence creating collection: {new_collection_name}"
             )
-            self.create_collection_with_partition_key(new_collection_name)
+            self.create_collection_with_partition_key(new_collection_name, index_config)
         self.add_vectors_parallel(new_collection_name, bot_id, version, vectors)
 
         # delete vectors from old collection
@@ -728,8 +856,9 @@ class MilvusRetriever:
 class MilvusRetrieverExecutor:
     def __init__(self, bot_config):
         self.bot_config = bot_config
-        self.llm = PROVIDER_MAP.get(bot_config.llm_config.llm_provider, ChatOpenAI)(
-            model=bot_config.llm_config.model_type_or_path
+        self.llm = model_client_pool.get_llm(
+            bot_config.llm_config.llm_provider,
+            bot_config.llm_config.model_type_or_path,
         )
 
     def generate_thought(self, retriever_results: List[RetrieverResult]) -> str:
@@ -744,13 +873,14 @@ class MilvusRetrieverExecutor:
         return retrieved_str
 
     def _gaussian_similarity(self, distance, sigma=0.5):
-        similarity = np.exp(-(distance**2) / (2 * sigma**2)) * 100
-        return round(float(similarity), 2)
+        return confidence(distance, "L2", sigma)
 
-    def postprocess(self, retriever_results: List[RetrieverResult]):
+    def postprocess(
+        self, retriever_results: List[RetrieverResult], metric_type: str = "L2"
+    ):
         retriever_returns = []
         for doc in retriever_results:
-            confidence_score = self._gaussian_similarity(doc.distance)
+            confidence_score = confidence(doc.distance, metric_type)
             item = {
                 "qa_doc_id": doc.qa_doc_id,
                 "qa_doc_type": doc.qa_doc_type.value,
@@ -763,34 +893,79 @@ class MilvusRetrieverExecutor:
             retriever_returns.append(item)
         return {"retriever": retriever_returns}
 
-    def retrieve(self, chat_history_str, tags: dict = {}):
-        """Given a chat history, retrieve relevant information from the database."""
-        st = time.time()
-        prompts = load_prompts(self.bot_config)
-        contextualize_q_prompt = PromptTemplate.from_template(
-            prompts.get("retrieve_contextualize_q_prompt", "")
-        )
-        ret_input_chain = contextualize_q_prompt | self.llm | StrOutputParser()
-        ret_input = ret_input_chain.invoke({"chat_history": chat_history_str})
-        rit = time.time() - st
-
-        ret_results: List[RetrieverResult] = []
-        st = time.time()
+    def _search(self, query: str, tags: dict) -> Tuple[List[RetrieverResult], str]:
+        """Search the bot's collection, returning the results and the metric of its index."""
         milvus_db = mysql_pool.fetchone(
             "SELECT collection_name FROM qa_bot WHERE id=%s AND version=%s",
             (self.bot_config.bot_id, self.bot_config.version),
         )
+        index_config = self.bot_config.vector_index
         with MilvusRetriever() as retriever:
             ret_results = retriever.search(
                 milvus_db["collection_name"],
                 self.bot_config.bot_id,
                 self.bot_config.version,
-                ret_input,
+                query,
                 tags,
+                top_k=index_config.top_k,
+                index_config=index_config,
             )
+            metric_type = retriever.collection_index(milvus_db["collection_name"])[
+                "metric_type"
+            ]
+        return ret_results, metric_type
+
+    def retrieve(self, chat_history_str, tags: dict = {}, query: Optional[str] = None):
+        """Given a chat history, retrieve relevant information from the database.
+
+        With the raw query, the LLM rewrite of the question follows the bot's
+        query rewrite policy, otherwise every question is rewritten.
+        """
+        st = time.time()
+        prompts = load_prompts(self.bot_config)
+        rewriter = QueryRewriter(
+            self.llm,
+            prompts.get("retrieve_contextualize_q_prompt", ""),
+            self.bot_config.query_rewrite,
+            self.bot_config.llm_config,
+        )
+        raw_results: Optional[List[RetrieverResult]] = None
+        if (
+            query is not None
+            and rewriter.parallel
+            and rewriter.should_rewrite(query, chat_history_str)
+        ):
+            # search with the raw question while the LLM rewrites it
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                raw_future = executor.submit(self._search, query, tags)
+                ret_input = rewriter.rewrite(query, chat_history_str)
+                rit = time.time() - st
+                raw_results, metric_type = raw_future.result()
+        else:
+            ret_input = rewriter.rewrite(query, chat_history_str)
+            rit = time.time() - st
+
+        st = time.time()
+        if raw_results is not None and ret_input.strip() == query.strip():
+            ret_results = raw_results
+        else:
+            ret_results, metric_type = self._search(ret_input, tags)
+            if raw_results is not None:
+                ret_results = [
+                    doc
+                    for doc, _ in rerank_union(
+                        [
+                            [(doc, doc.distance) for doc in raw_results],
+                            [(doc, doc.distance) for doc in ret_results],
+                        ],
+                        key=lambda doc: (doc.qa_doc_id, doc.start_chunk_idx),
+                        k=self.bot_config.vector_index.top_k,
+                        higher_is_better=metric_type != "L2",
+                    )
+                ]
         rt = time.time() - st
         logger.info(f"MilvusRetriever search took {rt} seconds")
-        retriever_params = self.postprocess(ret_results)
+        retriever_params = self.postprocess(ret_results, metric_type)
         retriever_params["timing"] = {"retriever_input": rit, "retriever_search": rt}
         thought = self.generate_thought(ret_results)
         return thought, retriever_params
@@ -1,13 +1,18 @@
 # TODO(christian): add annotations to the code
 
+import asyncio
 import json
+import random
 from enum import Enum
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Optional
+import numpy as np
+import openai
+from openai import AsyncOpenAI, OpenAI
 import logging
 
 import tiktoken
 from arklex.utils.mysql import mysql_pool
+from arklex.utils.embedding_cache import EmbeddingStore, embedding_store
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 DEFAULT_CHUNK_ENCODING = "cl100k_base"
@@ -15,10 +20,13 @@ DEFAULT_CHUNK_ENCODING = "cl100k_base"
 logger = logging.getLogger(__name__)
 
 
-def embed(text: str):
+EMBED_MODEL = "text-embedding-ada-002"
+
+
+def _embed_uncached(text: str):
     client = OpenAI()
     try:
-        response = client.embeddings.create(input=text, model="text-embedding-ada-002")
+        response = client.embeddings.create(input=text, model=EMBED_MODEL)
     except Exception as e:
         logger.error(f"Error embedding text of length {len(text)}")
         logger.error(text[:1000])
@@ -27,6 +35,113 @@ def embed(text: str):
     return response.data[0].embedding
 
 
+def embed(text: str):
+    # documents re-ingested unchanged and repeated queries skip the API call
+    vector = embedding_store.get_or_compute(
+        f"openai-api:{EMBED_MODEL}",
+        [text],
+        lambda texts: [_embed_uncached(texts[0])],
+    )[0]
+    return vector.tolist()
+
+
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """embed for many texts, with the missing ones sent in batched requests."""
+
+    def compute(missing: List[str]) -> List[List[float]]:
+        client = OpenAI()
+        vectors: List[List[float]] = []
+        # the embeddings endpoint takes at most 2048 inputs per request
+        for start in range(0, len(missing), 2048):
+            response = client.embeddings.create(
+                input=missing[start : start + 2048], model=EMBED_MODEL
+            )
+            vectors.extend(
+                d.embedding for d in sorted(response.data, key=lambda d: d.index)
+            )
+        return vectors
+
+    vectors = embedding_store.get_or_compute(
+        f"openai-api:{EMBED_MODEL}", texts, compute
+    )
+    return [v.tolist() for v in vectors]
+
+
+# Errors worth retrying: rate limits, timeouts and transient server failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class OpenAIBatchEmbedder:
+    """Embeds many texts per request to the OpenAI embeddings API.
+
+    Texts already in the embedding store are not sent again, and requests
+    that hit a rate limit or a transient error are retried with exponential
+    backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBED_MODEL,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        store: Optional[EmbeddingStore] = None,
+    ) -> None:
+        self.model: str = model
+        self.max_retries: int = max_retries
+        self.initial_backoff: float = initial_backoff
+        self.max_backoff: float = max_backoff
+        self.store: EmbeddingStore = store if store is not None else embedding_store
+        self.client: AsyncOpenAI = AsyncOpenAI()
+        self.requests: int = 0
+        self.retries: int = 0
+
+    async def _create(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.requests += 1
+                response = await self.client.embeddings.create(
+                    input=texts, model=self.model
+                )
+                return [
+                    d.embedding for d in sorted(response.data, key=lambda d: d.index)
+                ]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise e
+                self.retries += 1
+                delay: float = min(self.max_backoff, self.initial_backoff * 2**attempt)
+                delay *= 0.5 + random.random() / 2
+                logger.warning(
+                    f"Embedding request of {len(texts)} texts failed ({e}), retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        # same key as embed, so later searches reuse the document vectors
+        model: str = f"openai-api:{self.model}"
+        results: List[Optional[np.ndarray]] = self.store.get_many(model, texts)
+        missing: List[str] = list(
+            dict.fromkeys(t for t, v in zip(texts, results) if v is None)
+        )
+        if missing:
+            computed: Dict[str, np.ndarray] = dict(
+                zip(
+                    missing,
+                    self.store.put_many(model, missing, await self._create(missing)),
+                )
+            )
+            results = [
+                v if v is not None else computed[t] for t, v in zip(texts, results)
+            ]
+        return [v.tolist() for v in results]
+
+
 class RetrieverDocumentType(Enum):
     WEBSITE = "website"
     FAQ = "faq"
@@ -136,6 +251,9 @@ class RetrieverDocument:
         }
 
     def to_milvus_schema_dict_and_embed(self) -> Dict:
+        return self.to_milvus_schema_dict(embed(self.text))
+
+    def to_milvus_schema_dict(self, embedding: List[float]) -> Dict:
         # check if values exists
         if (
             self.id is None
@@ -159,7 +277,7 @@ class RetrieverDocument:
             "metadata": self.metadata,
             "timestamp": self.timestamp,
             # "num_tokens": self.num_tokens,
-            "embedding": embed(self.text),
+            "embedding": embedding,
             "bot_uid": self.bot_uid,
         }
 
@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterable, List, Optional, Set, Union
+
+import numpy as np
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Name of the current version of a versioned directory, replaced atomically
+CURRENT_FILE: str = "CURRENT"
+VERSION_PREFIX: str = "v-"
+
+
+def corpus_hash(texts: Iterable[str]) -> str:
+    """Content hash of a sequence of texts, see texts_hash."""
+    encoded: List[bytes] = [text.encode("utf-8") for text in texts]
+    offsets: np.ndarray = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return texts_hash(b"".join(encoded), offsets)
+
+
+def texts_hash(blob: Union[bytes, np.ndarray], offsets: np.ndarray) -> str:
+    """Content hash of the texts stored as a UTF-8 blob and their offsets in it."""
+    digest = hashlib.sha256(memoryview(blob))
+    digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def current_version(path: str) -> Optional[str]:
+    """Directory of the current version saved at path, None if there is none."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            name: str = f.read().strip()
+    except OSError:
+        return None
+    version_path: str = os.path.join(path, name)
+    return version_path if name and os.path.isdir(version_path) else None
+
+
+def published_mtime(path: str) -> float:
+    """When the current version of path was switched to, -1 if it has none."""
+    pointer: str = os.path.join(path, CURRENT_FILE)
+    return os.path.getmtime(pointer) if os.path.exists(pointer) else -1.0
+
+
+def publish_version(path: str, write: Callable[[str], str]) -> str:
+    """Build a new version of path and make it the current one.
+
+    write fills an empty directory and returns the content hash of what it
+    wrote, which names the version. The version is renamed into place whole
+    and then switched to by replacing the CURRENT pointer, so readers see
+    either the previous version or the new one, never a mix. The previous
+    version is kept for readers that read the pointer just before the switch,
+    older ones are removed. Returns the directory of the new version.
+    """
+    os.makedirs(path, exist_ok=True)
+    previous: Optional[str] = current_version(path)
+    tmp_path: str = tempfile.mkdtemp(dir=path, prefix=".tmp-")
+    try:
+        name: str = VERSION_PREFIX + write(tmp_path)[:16]
+        version_path: str = os.path.join(path, name)
+        if not os.path.isdir(version_path):
+            os.rename(tmp_path, version_path)
+        pointer_fd, pointer_tmp = tempfile.mkstemp(dir=path, prefix=".tmp-")
+        with os.fdopen(pointer_fd, "w") as f:
+            f.write(name)
+        os.replace(pointer_tmp, os.path.join(path, CURRENT_FILE))
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    keep: Set[str] = {name, os.path.basename(previous) if previous else name}
+    for entry in os.listdir(path):
+        if entry.startswith(VERSION_PREFIX) and entry not in keep:
+            # processes still mapping its files keep them until they unmap
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+    return version_path
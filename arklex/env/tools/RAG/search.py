@@ -1,13 +1,11 @@
 import logging
 from typing import List, Dict, Any
 
-from arklex.utils.model_provider_config import PROVIDER_MAP
+from arklex.utils.model_provider_config import model_client_pool
 from arklex.env.prompts import load_prompts
 from arklex.utils.graph_state import MessageState, LLMConfig
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
 from langchain_community.tools import TavilySearchResults
+from arklex.env.tools.RAG.query_rewrite import QueryRewriter
 
 
 logger: logging.Logger = logging.getLogger(__name__)
@@ -28,8 +26,9 @@ class TavilySearchExecutor:
         llm_config: LLMConfig,
         **kwargs: Any,
     ) -> None:
-        self.llm: Any = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path
+        self.llm_config: LLMConfig = llm_config
+        self.llm: Any = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path
         )
         self.search_tool: TavilySearchResults = TavilySearchResults(
             max_results=kwargs.get("max_results", 5),
@@ -48,12 +47,14 @@ class TavilySearchExecutor:
 
     def search(self, state: MessageState) -> str:
         prompts: Dict[str, str] = load_prompts(state.bot_config)
-        contextualize_q_prompt: PromptTemplate = PromptTemplate.from_template(
-            prompts["retrieve_contextualize_q_prompt"]
+        rewriter: QueryRewriter = QueryRewriter(
+            self.llm,
+            prompts["retrieve_contextualize_q_prompt"],
+            state.bot_config.query_rewrite,
+            self.llm_config,
         )
-        ret_input_chain: Any = contextualize_q_prompt | self.llm | StrOutputParser()
-        ret_input: str = ret_input_chain.invoke(
-            {"chat_history": state.user_message.history}
+        ret_input: str = rewriter.rewrite(
+            state.user_message.message, state.user_message.history
         )
         logger.info(f"Reformulated input for search engine: {ret_input}")
         search_results: List[Dict[str, Any]] = self.search_tool.invoke(
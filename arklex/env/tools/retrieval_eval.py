@@ -2,7 +2,7 @@ import argparse
 import json
 import logging
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from arklex.utils.graph_state import LLMConfig
 from arklex.utils.model_config import MODEL
@@ -53,8 +53,10 @@ def evaluate_query(
         retriever: FaissRetrieverExecutor,
         k: int,
         rerank_model: str = "",
+        docs_scores: Optional[List[Tuple[Any, float]]] = None,
 ) -> Tuple[float, float]:
-    docs_scores = retriever.retrieve_w_score(query)
+    if docs_scores is None:
+        docs_scores = retriever.retrieve_w_score(query)
     if rerank_model is not None:
         docs_scores =_rerank(query, docs_scores, retriever, rerank_model)
     top = [doc.metadata.get("source") or doc.metadata.get("title") for doc, _ in docs_scores[:k]]
@@ -74,10 +76,12 @@ def evaluate(index_dir: str, gt_file: str, k: int, rerank_model: str = "") -> No
     precisions: List[float] = []
     recalls: List[float] = []
 
-    for item in data:
+    # every query is embedded and searched in one batch
+    results = retriever.search_many([item["query"] for item in data])
+    for item, docs_scores in zip(data, results):
         q = item["query"]
         rel = item.get("relevant", [])
-        p, r = evaluate_query(q, rel, retriever, k, rerank_model)
+        p, r = evaluate_query(q, rel, retriever, k, rerank_model, docs_scores)
         precisions.append(p)
         recalls.append(r)
         print(f"Query: {q}\n Precision@{k}: {p:.3f} Recall@{k}: {r:.3f}\n")
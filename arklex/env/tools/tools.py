@@ -1,15 +1,17 @@
 import os
+import asyncio
 import logging
 import json
 import uuid
 import inspect
 import traceback
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, Generator, List, Optional, Tuple
 
 from arklex.utils.graph_state import MessageState, StatusEnum
 from arklex.utils.slot import Slot
 from arklex.orchestrator.NLU.nlu import SlotFilling
-from arklex.utils.utils import format_chat_history
+from arklex.utils.utils import Step, arun_steps, format_chat_history, run_steps
+from arklex.utils.trace import TraceRunName, span
 from arklex.exceptions import ToolExecutionError, AuthenticationError
 
 logger = logging.getLogger(__name__)
@@ -32,16 +34,26 @@ def register_tool(
             relative_path.replace("/", "-").replace("\\", "-").replace(".py", "")
         )
         key: str = f"{relative_path}-{func.__name__}"
+        # compiled once here, every Tool built by the factory shares it
+        spec: ToolSpec = ToolSpec(func, key, desc, slots, outputs, isResponse)
 
         def tool() -> "Tool":
-            return Tool(func, key, desc, slots, outputs, isResponse)
+            return Tool(func, key, desc, slots, outputs, isResponse, spec=spec)
 
+        tool.spec = spec
         return tool
 
     return inner
 
 
-class Tool:
+class ToolSpec:
+    """Metadata of a tool function, compiled once per registration.
+
+    Holds the signature facts _filter_kwargs needs, the function calling
+    schema and the validated slot templates, so a Tool built for one call
+    only copies the slots it fills.
+    """
+
     def __init__(
         self,
         func: Callable,
@@ -54,30 +66,30 @@ class Tool:
         self.func: Callable = func
         self.name: str = name
         self.description: str = description
-        self.output: List[str] = outputs
-        self.slotfillapi: Optional[SlotFilling] = None
-        self.info: Dict[str, Any] = self.get_info(slots)
-        self.slots: List[Slot] = [Slot.model_validate(slot) for slot in slots]
+        self.outputs: List[str] = outputs
         self.isResponse: bool = isResponse
-        self.properties: Dict[str, Dict[str, Any]] = {}
-        self.llm_config: Dict[str, Any] = {}
-
-    def get_info(self, slots: List[Dict[str, Any]]) -> Dict[str, Any]:
-        self.properties = {}
-        for slot in slots:
-            self.properties[slot["name"]] = {
+        parameters = inspect.signature(func).parameters
+        self.accepts_var_kwargs: bool = any(
+            p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()
+        )
+        self.accepted_params: FrozenSet[str] = frozenset(parameters)
+        self.is_coroutine: bool = inspect.iscoroutinefunction(func)
+        self.properties: Dict[str, Dict[str, Any]] = {
+            slot["name"]: {
                 k: v
                 for k, v in slot.items()
                 if k in ["type", "description", "prompt", "items"]
             }
+            for slot in slots
+        }
         required: List[str] = [
             slot["name"] for slot in slots if slot.get("required", False)
         ]
-        return {
+        self.info: Dict[str, Any] = {
             "type": "function",
             "function": {
-                "name": self.name,
-                "description": self.description,
+                "name": name,
+                "description": description,
                 "parameters": {
                     "type": "object",
                     "properties": self.properties,
@@ -85,13 +97,49 @@ class Tool:
                 },
             },
         }
+        self.slots: List[Slot] = [Slot.model_validate(slot) for slot in slots]
+
+    def new_slots(self) -> List[Slot]:
+        """Fresh copies of the slot templates for one call."""
+        return [slot.model_copy() for slot in self.slots]
+
+
+class Tool:
+    def __init__(
+        self,
+        func: Callable,
+        name: str,
+        description: str,
+        slots: List[Dict[str, Any]],
+        outputs: List[str],
+        isResponse: bool,
+        spec: Optional[ToolSpec] = None,
+    ):
+        if spec is None:
+            spec = ToolSpec(func, name, description, slots, outputs, isResponse)
+        self.spec: ToolSpec = spec
+        self.func: Callable = func
+        self.name: str = name
+        self.description: str = description
+        self.output: List[str] = outputs
+        self.slotfillapi: Optional[SlotFilling] = None
+        self.info: Dict[str, Any] = spec.info
+        self.slots: List[Slot] = spec.new_slots()
+        self.isResponse: bool = isResponse
+        self.properties: Dict[str, Dict[str, Any]] = spec.properties
+        self.llm_config: Dict[str, Any] = {}
+
+    def get_info(self, slots: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return ToolSpec(
+            self.func, self.name, self.description, slots, self.output, self.isResponse
+        ).info
 
     def init_slotfilling(self, slotfillapi: SlotFilling) -> None:
         self.slotfillapi = slotfillapi
 
     def _init_slots(self, state: MessageState) -> None:
         default_slots: List[Slot] = state.slots.get("default_slots", [])
-        logger.info(f"Default slots are: {default_slots}")
+        logger.info("Default slots are: %s", default_slots)
         if not default_slots:
             return
         response: Dict[str, Any] = {}
@@ -110,11 +158,9 @@ class Tool:
             }
         )
 
-        logger.info(f"Slots after initialization are: {self.slots}")
+        logger.info("Slots after initialization are: %s", self.slots)
 
-    def _execute(self, state: MessageState, **fixed_args: Any) -> MessageState:
-        slot_verification: bool = False
-        reason: str = ""
+    def _load_slots(self, state: MessageState) -> str:
         # if this tool has been called before, then load the previous slots status
         if state.slots.get(self.name):
             self.slots = state.slots[self.name]
@@ -122,98 +168,78 @@ class Tool:
             state.slots[self.name] = self.slots
         # init slot values saved in default slots
         self._init_slots(state)
-        # do slotfilling
-        chat_history_str: str = format_chat_history(state.function_calling_trajectory)
-        slots: List[Slot] = self.slotfillapi.execute(
-            self.slots, chat_history_str, self.llm_config
-        )
-        logger.info(f"{slots=}")
-        if not all([slot.value and slot.verified for slot in slots if slot.required]):
-            for slot in slots:
-                # if there is extracted slots values but haven't been verified
-                if slot.value and not slot.verified:
-                    # check whether it verified or not
-                    verification_needed: bool
-                    thought: str
-                    verification_needed, thought = self.slotfillapi.verify_needed(
-                        slot, chat_history_str, self.llm_config
-                    )
-                    if verification_needed:
-                        response: str = slot.prompt + "The reason is: " + thought
-                        slot_verification = True
-                        reason = thought
-                        break
-                    else:
-                        slot.verified = True
-                # if there is no extracted slots values, then should prompt the user to fill the slot
-                if not slot.value:
-                    response = slot.prompt
-                    break
+        return format_chat_history(state.function_calling_trajectory)
 
-            state.status = StatusEnum.INCOMPLETE
+    def _filter_kwargs(self, combined_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Pass only the parameters accepted by the tool function
+        if self.spec.accepts_var_kwargs:
+            return combined_kwargs
+        return {
+            k: v for k, v in combined_kwargs.items() if k in self.spec.accepted_params
+        }
 
-        # if slot.value is not empty for all slots, and all the slots has been verified, then execute the function
-        tool_success: bool = False
-        if all([slot.value and slot.verified for slot in slots if slot.required]):
-            logger.info("all slots filled")
-            kwargs: Dict[str, Any] = {slot.name: slot.value for slot in slots}
-            combined_kwargs: Dict[str, Any] = {
-                **kwargs,
-                **fixed_args,
-                **self.llm_config,
-            }
-            # Pass only the parameters accepted by the tool function
-            sig = inspect.signature(self.func)
-            if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values()):
-                filtered_kwargs = combined_kwargs
-            else:
-                filtered_kwargs = {
-                    k: v for k, v in combined_kwargs.items() if k in sig.parameters
-                }
+    def _call_kwargs(
+        self, slots: List[Slot], fixed_args: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        kwargs: Dict[str, Any] = {slot.name: slot.value for slot in slots}
+        combined_kwargs: Dict[str, Any] = {
+            **kwargs,
+            **fixed_args,
+            **self.llm_config,
+        }
+        return kwargs, self._filter_kwargs(combined_kwargs)
 
-            try:
-                response = self.func(**filtered_kwargs)
-                tool_success = True
-            except ToolExecutionError as tee:
-                logger.error(traceback.format_exc())
-                response = tee.extra_message
-            except AuthenticationError as ae:
-                logger.error(traceback.format_exc())
-                response = str(ae)
-            except Exception as e:
-                logger.error(traceback.format_exc())
-                response = str(e)
-            logger.info(f"Tool {self.name} response: {response}")
-            call_id: str = str(uuid.uuid4())
-            state.function_calling_trajectory.append(
-                {
-                    "content": None,
-                    "role": "assistant",
-                    "tool_calls": [
-                        {
-                            "function": {
-                                "arguments": json.dumps(kwargs),
-                                "name": self.name,
-                            },
-                            "id": call_id,
-                            "type": "function",
-                        }
-                    ],
-                    "function_call": None,
-                }
-            )
-            state.function_calling_trajectory.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": call_id,
-                    "name": self.name,
-                    "content": response,
-                }
-            )
-            state.status = (
-                StatusEnum.COMPLETE if tool_success else StatusEnum.INCOMPLETE
-            )
+    def _handle_func_error(self, error: Exception) -> str:
+        logger.error(traceback.format_exc())
+        if isinstance(error, ToolExecutionError):
+            return error.extra_message
+        return str(error)
 
+    def _record_call(
+        self,
+        state: MessageState,
+        kwargs: Dict[str, Any],
+        response: Any,
+        tool_success: bool,
+    ) -> None:
+        logger.info("Tool %s response: %s", self.name, response)
+        call_id: str = str(uuid.uuid4())
+        state.function_calling_trajectory.append(
+            {
+                "content": None,
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "function": {
+                            "arguments": json.dumps(kwargs),
+                            "name": self.name,
+                        },
+                        "id": call_id,
+                        "type": "function",
+                    }
+                ],
+                "function_call": None,
+            }
+        )
+        state.function_calling_trajectory.append(
+            {
+                "role": "tool",
+                "tool_call_id": call_id,
+                "name": self.name,
+                "content": response,
+            }
+        )
+        state.status = StatusEnum.COMPLETE if tool_success else StatusEnum.INCOMPLETE
+
+    def _finalize(
+        self,
+        state: MessageState,
+        slots: List[Slot],
+        response: Any,
+        tool_success: bool,
+        slot_verification: bool,
+        reason: str,
+    ) -> MessageState:
         state.trajectory[-1][-1].input = slots
         state.trajectory[-1][-1].output = response
 
@@ -246,11 +272,94 @@ class Tool:
         state.slots[self.name] = slots
         return state
 
+    def _call_func(self, kwargs: Dict[str, Any]) -> Any:
+        return self.func(**kwargs)
+
+    async def _acall_func(self, kwargs: Dict[str, Any]) -> Any:
+        # coroutine tools run on the loop, blocking ones in a worker thread
+        if self.spec.is_coroutine:
+            return await self.func(**kwargs)
+        return await asyncio.to_thread(self.func, **kwargs)
+
+    def _steps(
+        self, state: MessageState, fixed_args: Dict[str, Any]
+    ) -> Generator[Step, Any, MessageState]:
+        """Slot filling, verification and the call, shared by _execute and _aexecute."""
+        slot_verification: bool = False
+        reason: str = ""
+        response: Any = ""
+        chat_history_str: str = self._load_slots(state)
+        # do slotfilling
+        with span(TraceRunName.SlotFilling.value, tool=self.name):
+            slots: List[Slot] = yield (
+                self.slotfillapi.execute,
+                self.slotfillapi.aexecute,
+                (self.slots, chat_history_str, self.llm_config),
+            )
+        logger.info("slots=%r", slots)
+        if not all([slot.value and slot.verified for slot in slots if slot.required]):
+            for slot in slots:
+                # if there is extracted slots values but haven't been verified
+                if slot.value and not slot.verified:
+                    # check whether it verified or not
+                    verification_needed: bool
+                    thought: str
+                    with span(TraceRunName.SlotVerification.value, slot=slot.name):
+                        verification_needed, thought = yield (
+                            self.slotfillapi.verify_needed,
+                            self.slotfillapi.averify_needed,
+                            (slot, chat_history_str, self.llm_config),
+                        )
+                    if verification_needed:
+                        response = slot.prompt + "The reason is: " + thought
+                        slot_verification = True
+                        reason = thought
+                        break
+                    else:
+                        slot.verified = True
+                # if there is no extracted slots values, then should prompt the user to fill the slot
+                if not slot.value:
+                    response = slot.prompt
+                    break
+
+            state.status = StatusEnum.INCOMPLETE
+
+        # if slot.value is not empty for all slots, and all the slots has been verified, then execute the function
+        tool_success: bool = False
+        if all([slot.value and slot.verified for slot in slots if slot.required]):
+            logger.info("all slots filled")
+            kwargs, filtered_kwargs = self._call_kwargs(slots, fixed_args)
+            try:
+                response = yield (
+                    self._call_func,
+                    self._acall_func,
+                    (filtered_kwargs,),
+                )
+                tool_success = True
+            except Exception as e:
+                response = self._handle_func_error(e)
+            self._record_call(state, kwargs, response, tool_success)
+
+        return self._finalize(
+            state, slots, response, tool_success, slot_verification, reason
+        )
+
+    def _execute(self, state: MessageState, **fixed_args: Any) -> MessageState:
+        return run_steps(self._steps(state, fixed_args))
+
+    async def _aexecute(self, state: MessageState, **fixed_args: Any) -> MessageState:
+        return await arun_steps(self._steps(state, fixed_args))
+
     def execute(self, state: MessageState, **fixed_args: Any) -> MessageState:
         self.llm_config = state.bot_config.llm_config.model_dump()
         state = self._execute(state, **fixed_args)
         return state
 
+    async def aexecute(self, state: MessageState, **fixed_args: Any) -> MessageState:
+        self.llm_config = state.bot_config.llm_config.model_dump()
+        state = await self._aexecute(state, **fixed_args)
+        return state
+
     def __str__(self) -> str:
         return f"{self.__class__.__name__}"
 
@@ -3,13 +3,12 @@ import inspect
 from typing import Dict
 
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 
 from arklex.env.prompts import load_prompts
 from arklex.types import EventType
 from arklex.utils.graph_state import MessageState
-from arklex.utils.model_provider_config import PROVIDER_MAP
+from arklex.utils.model_provider_config import model_client_pool
 
 
 logger = logging.getLogger(__name__)
@@ -22,8 +21,8 @@ class ToolGenerator:
         user_message = state.user_message
 
         prompts: Dict[str, str] = load_prompts(state.bot_config)
-        llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path, temperature=0.1
+        llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path, temperature=0.1
         )
         prompt: PromptTemplate = PromptTemplate.from_template(
             prompts["generator_prompt"]
@@ -41,8 +40,8 @@ class ToolGenerator:
     @staticmethod
     def context_generate(state: MessageState) -> MessageState:
         llm_config = state.bot_config.llm_config
-        llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path, temperature=0.1
+        llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path, temperature=0.1
         )
         # get the input message
         user_message = state.user_message
@@ -99,8 +98,8 @@ class ToolGenerator:
     @staticmethod
     def stream_context_generate(state: MessageState) -> MessageState:
         llm_config = state.bot_config.llm_config
-        llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path, temperature=0.1
+        llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path, temperature=0.1
         )
         # get the input message
         user_message = state.user_message
@@ -164,8 +163,8 @@ class ToolGenerator:
 
         prompts: Dict[str, str] = load_prompts(state.bot_config)
         llm_config = state.bot_config.llm_config
-        llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path, temperature=0.1
+        llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path, temperature=0.1
         )
         prompt: PromptTemplate = PromptTemplate.from_template(
             prompts["generator_prompt"]
@@ -15,6 +15,7 @@ logger = logging.getLogger(__name__)
 @register_worker
 class FaissRAGWorker(BaseWorker):
     description: str = "Answer the user's questions based on the company's internal documentations (unstructured text data), such as the policies, FAQs, and product information"
+    thread_safe: bool = True
 
     def __init__(
         self,
@@ -23,7 +24,6 @@ class FaissRAGWorker(BaseWorker):
         stream_response: bool = True,
     ) -> None:
         super().__init__()
-        self.action_graph: StateGraph = self._create_action_graph()
         self.stream_response: bool = stream_response
 
     def choose_tool_generator(self, state: MessageState) -> str:
@@ -46,6 +46,6 @@ class FaissRAGWorker(BaseWorker):
         return workflow
 
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        graph = self.action_graph.compile()
+        graph = self._get_compiled_graph()
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
@@ -1,9 +1,8 @@
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict
 
 from langgraph.graph import StateGraph, START
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models import BaseChatModel
 
@@ -12,7 +11,7 @@ from arklex.env.prompts import load_prompts
 from arklex.env.tools.utils import trace
 from arklex.types import EventType
 from arklex.utils.graph_state import MessageState
-from arklex.utils.model_provider_config import PROVIDER_MAP
+from arklex.utils.model_provider_config import model_client_pool
 
 
 logger = logging.getLogger(__name__)
@@ -21,11 +20,15 @@ logger = logging.getLogger(__name__)
 @register_worker
 class MessageWorker(BaseWorker):
     description: str = "The worker that used to deliver the message to the user, either a question or provide some information."
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.action_graph: StateGraph = self._create_action_graph()
-        self.llm: Optional[BaseChatModel] = None
+    thread_safe: bool = True
+
+    @staticmethod
+    def _get_llm(state: MessageState) -> BaseChatModel:
+        # resolved per call, conversations sharing this worker may use different models
+        return model_client_pool.get_llm(
+            state.bot_config.llm_config.llm_provider,
+            state.bot_config.llm_config.model_type_or_path,
+        )
 
     def generator(self, state: MessageState) -> MessageState:
         # get the input message
@@ -69,7 +72,7 @@ class MessageWorker(BaseWorker):
                 }
             )
         logger.info(f"Prompt: {input_prompt.text}")
-        final_chain = self.llm | StrOutputParser()
+        final_chain = self._get_llm(state) | StrOutputParser()
         answer: str = final_chain.invoke(input_prompt.text)
 
         state.message_flow = ""
@@ -124,7 +127,7 @@ class MessageWorker(BaseWorker):
                 }
             )
         logger.info(f"Prompt: {input_prompt.text}")
-        final_chain = self.llm | StrOutputParser()
+        final_chain = self._get_llm(state) | StrOutputParser()
         answer: str = ""
         for chunk in final_chain.stream(input_prompt.text):
             answer += chunk
@@ -147,9 +150,6 @@ class MessageWorker(BaseWorker):
         return workflow
 
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        self.llm = PROVIDER_MAP.get(
-            msg_state.bot_config.llm_config.llm_provider, ChatOpenAI
-        )(model=msg_state.bot_config.llm_config.model_type_or_path)
-        graph = self.action_graph.compile()
+        graph = self._get_compiled_graph()
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
@@ -1,6 +1,7 @@
+import json
 import logging
 from functools import partial
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Hashable
 from langgraph.graph import StateGraph, START
 
 from arklex.env.workers.worker import BaseWorker, register_worker
@@ -15,6 +16,7 @@ logger = logging.getLogger(__name__)
 @register_worker
 class MilvusRAGWorker(BaseWorker):
     description: str = "Answer the user's questions based on the company's internal documentations (unstructured text data), such as the policies, FAQs, and product information"
+    thread_safe: bool = True
 
     def __init__(
         self,
@@ -24,8 +26,6 @@ class MilvusRAGWorker(BaseWorker):
     ) -> None:
         super().__init__()
         self.stream_response: bool = stream_response
-        self.tags: Dict[str, Any] = {}
-        self.action_graph: Optional[StateGraph] = None
 
     def choose_tool_generator(self, state: MessageState) -> str:
         if self.stream_response and state.is_stream:
@@ -47,9 +47,12 @@ class MilvusRAGWorker(BaseWorker):
         workflow.add_conditional_edges("retriever", self.choose_tool_generator)
         return workflow
 
+    def _build_action_graph(self, key: Hashable) -> StateGraph:
+        return self._create_action_graph(json.loads(key))
+
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        self.tags = kwargs.get("tags", {})
-        self.action_graph = self._create_action_graph(self.tags)
-        graph = self.action_graph.compile()
+        # the retriever node binds the tags, so one graph is compiled per tag set
+        tags: Dict[str, Any] = kwargs.get("tags", {})
+        graph = self._get_compiled_graph(json.dumps(tags, sort_keys=True))
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
@@ -21,11 +21,11 @@ class NewsEventWorker(BaseWorker):
     description: str = (
         "Monitor news feeds and provide recent articles as context for analysis"
     )
+    thread_safe: bool = True
 
     def __init__(self, feeds: Optional[List[str]] = None) -> None:
         super().__init__()
         self.feeds = feeds or []
-        self.action_graph: StateGraph = self._create_action_graph()
 
     async def _fetch_feed(self, url: str) -> List[str]:
         """Fetch up to 3 article titles from an RSS/Atom feed."""
@@ -82,6 +82,6 @@ class NewsEventWorker(BaseWorker):
         return workflow
 
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        graph = self.action_graph.compile()
+        graph = self._get_compiled_graph()
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
\ No newline at end of file
@@ -1,8 +1,8 @@
+import json
 import logging
 from functools import partial
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Hashable
 from langgraph.graph import StateGraph, START
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models import BaseChatModel
@@ -12,7 +12,7 @@ from arklex.env.tools.RAG.retrievers.milvus_retriever import RetrieveEngine
 from arklex.env.prompts import load_prompts
 from arklex.env.workers.message_worker import MessageWorker
 from arklex.utils.graph_state import MessageState
-from arklex.utils.model_provider_config import PROVIDER_MAP
+from arklex.utils.model_provider_config import model_client_pool
 
 
 logger = logging.getLogger(__name__)
@@ -21,12 +21,10 @@ logger = logging.getLogger(__name__)
 @register_worker
 class RagMsgWorker(BaseWorker):
     description: str = "A combination of RAG and Message Workers"
+    thread_safe: bool = True
 
     def __init__(self) -> None:
         super().__init__()
-        self.llm: Optional[BaseChatModel] = None
-        self.tags: Dict[str, Any] = {}
-        self.action_graph: Optional[StateGraph] = None
 
     def _choose_retriever(self, state: MessageState) -> str:
         prompts: Dict[str, str] = load_prompts(state.bot_config)
@@ -37,7 +35,11 @@ class RagMsgWorker(BaseWorker):
         logger.info(
             f"Prompt for choosing the retriever in RagMsgWorker: {input_prompt.text}"
         )
-        final_chain = self.llm | StrOutputParser()
+        llm: BaseChatModel = model_client_pool.get_llm(
+            state.bot_config.llm_config.llm_provider,
+            state.bot_config.llm_config.model_type_or_path,
+        )
+        final_chain = llm | StrOutputParser()
         answer: str = final_chain.invoke(input_prompt.text)
         logger.info(f"Choose retriever in RagMsgWorker: {answer}")
         if "yes" in answer.lower():
@@ -57,12 +59,12 @@ class RagMsgWorker(BaseWorker):
         workflow.add_edge("retriever", "message_worker")
         return workflow
 
+    def _build_action_graph(self, key: Hashable) -> StateGraph:
+        return self._create_action_graph(json.loads(key))
+
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        self.llm = PROVIDER_MAP.get(
-            msg_state.bot_config.llm_config.llm_provider, ChatOpenAI
-        )(model=msg_state.bot_config.llm_config.model_type_or_path)
-        self.tags = kwargs.get("tags", {})
-        self.action_graph = self._create_action_graph(self.tags)
-        graph = self.action_graph.compile()
+        # the retriever node binds the tags, so one graph is compiled per tag set
+        tags: Dict[str, Any] = kwargs.get("tags", {})
+        graph = self._get_compiled_graph(json.dumps(tags, sort_keys=True))
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
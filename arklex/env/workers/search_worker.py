@@ -18,10 +18,7 @@ class SearchWorker(BaseWorker):
     description: str = (
         "Answer the user's questions based on real-time online search results"
     )
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.action_graph: StateGraph = self._create_action_graph()
+    thread_safe: bool = True
 
     def _create_action_graph(self) -> StateGraph:
         workflow: StateGraph = StateGraph(MessageState)
@@ -35,6 +32,6 @@ class SearchWorker(BaseWorker):
         return workflow
 
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
-        graph = self.action_graph.compile()
+        graph = self._get_compiled_graph()
         result: Dict[str, Any] = graph.invoke(msg_state)
         return result
@@ -1,5 +1,7 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Type, TypeVar
+from typing import Any, Dict, Hashable, Optional, Type, TypeVar
 from arklex.utils.graph_state import MessageState, StatusEnum
 import logging
 import traceback
@@ -17,6 +19,16 @@ def register_worker(cls: Type[T]) -> Type[T]:
 
 class BaseWorker(ABC):
     description: Optional[str] = None
+    # Thread-safety contract: a worker sets thread_safe to True when its
+    # execution keeps no per-call state on the instance, i.e. everything that
+    # varies between calls flows through MessageState and the call kwargs and
+    # the instance is only read after construction. Env then builds one
+    # instance per worker id (and so per fixed_args) and shares it between
+    # concurrent conversations. Other workers are built for every call.
+    thread_safe: bool = False
+
+    # guards the first compilation of every worker's action graphs
+    _graph_lock: threading.Lock = threading.Lock()
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}"
@@ -24,22 +36,62 @@ class BaseWorker(ABC):
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}"
 
+    def _build_action_graph(self, key: Hashable) -> Any:
+        """Build the uncompiled action graph for key, workers with a single graph ignore the key."""
+        return self._create_action_graph()
+
+    def _get_compiled_graph(self, key: Hashable = None) -> Any:
+        """Compile the action graph for key once and reuse it on every later call.
+
+        A compiled graph only holds the node functions, the state of a call
+        lives in the MessageState passed to invoke, so it is safe to share.
+        """
+        graphs: Dict[Hashable, Any] = self.__dict__.setdefault("_compiled_graphs", {})
+        graph: Optional[Any] = graphs.get(key)
+        if graph is None:
+            with BaseWorker._graph_lock:
+                graph = graphs.get(key)
+                if graph is None:
+                    graph = self._build_action_graph(key).compile()
+                    graphs[key] = graph
+        return graph
+
     @abstractmethod
     def _execute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
         pass
 
+    async def _aexecute(self, msg_state: MessageState, **kwargs: Any) -> Dict[str, Any]:
+        """Async counterpart of _execute.
+
+        Workers with a native async implementation override this; the default
+        runs the blocking _execute in a worker thread so the event loop stays free.
+        """
+        return await asyncio.to_thread(self._execute, msg_state, **kwargs)
+
+    def _postprocess(self, response_return: Dict[str, Any]) -> MessageState:
+        response_state: MessageState = MessageState.model_validate(response_return)
+        response_state.trajectory[-1][-1].output = (
+            response_state.response
+            if response_state.response
+            else response_state.message_flow
+        )
+        if response_state.status == StatusEnum.INCOMPLETE:
+            response_state.status = StatusEnum.COMPLETE
+        return response_state
+
     def execute(self, msg_state: MessageState, **kwargs: Any) -> MessageState:
         try:
             response_return: Dict[str, Any] = self._execute(msg_state, **kwargs)
-            response_state: MessageState = MessageState.model_validate(response_return)
-            response_state.trajectory[-1][-1].output = (
-                response_state.response
-                if response_state.response
-                else response_state.message_flow
-            )
-            if response_state.status == StatusEnum.INCOMPLETE:
-                response_state.status = StatusEnum.COMPLETE
-            return response_state
+            return self._postprocess(response_return)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            msg_state.status = StatusEnum.INCOMPLETE
+            return msg_state
+
+    async def aexecute(self, msg_state: MessageState, **kwargs: Any) -> MessageState:
+        try:
+            response_return: Dict[str, Any] = await self._aexecute(msg_state, **kwargs)
+            return self._postprocess(response_return)
         except Exception as e:
             logger.error(traceback.format_exc())
             msg_state.status = StatusEnum.INCOMPLETE
@@ -1,5 +1,11 @@
-from .core import ShortTermMemory
+from .core import (
+    ShortTermMemory,
+    personalize_in_background,
+    personalized_intent_cache,
+)
 
 __all__ = [
     "ShortTermMemory",
+    "personalize_in_background",
+    "personalized_intent_cache",
 ]
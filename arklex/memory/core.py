@@ -1,24 +1,30 @@
 # TODO(christian): fix annotations in this file.
 
 import asyncio
+import hashlib
+import json
+import logging
 import re
-from typing import List, Tuple, Optional, Dict
-from functools import lru_cache
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple, Optional, Dict, Set
 
 import numpy as np
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from sklearn.metrics.pairwise import cosine_similarity
 
-from arklex.memory.prompts import intro, final_examples, output_instructions
+from arklex.memory.prompts import (
+    intro,
+    final_examples,
+    output_instructions,
+    batch_output_instructions,
+)
 from arklex.utils.graph_state import ResourceRecord, LLMConfig
 from arklex.utils.model_config import MODEL
-from arklex.utils.model_provider_config import (
-    PROVIDER_MAP,
-    PROVIDER_EMBEDDINGS,
-    PROVIDER_EMBEDDING_MODELS,
-)
+from arklex.utils.model_provider_config import model_client_pool
 from Levenshtein import ratio
 
+logger = logging.getLogger(__name__)
+
 
 class ShortTermMemory:
     def __init__(
@@ -63,38 +69,79 @@ class ShortTermMemory:
         # Take last 5 turns
         self.chat_history = "\n".join(turns[-5:])
 
-        # Initialize embedding model with caching
-        self.embedding_model = PROVIDER_EMBEDDINGS.get(
-            llm_config.llm_provider, OpenAIEmbeddings
-        )(
-            **{"model": PROVIDER_EMBEDDING_MODELS[llm_config.llm_provider]}
-            if llm_config.llm_provider != "anthropic"
-            else {"model_name": PROVIDER_EMBEDDING_MODELS[llm_config.llm_provider]}
+        # Embedding and chat clients are shared across turns through the pool
+        self.embedding_model = model_client_pool.get_embedding_model(
+            llm_config.llm_provider
         )
-        self.llm = PROVIDER_MAP.get(llm_config.llm_provider, ChatOpenAI)(
-            model=llm_config.model_type_or_path
+        self.llm = model_client_pool.get_llm(
+            llm_config.llm_provider, llm_config.model_type_or_path
         )
 
-        # Initialize embedding cache
-        self._embedding_cache = {}
+        # Unit-normalized embeddings of the texts seen by this memory, so the
+        # cosine similarity against the query is a plain dot product
+        self._embedding_cache: Dict[str, np.ndarray] = {}
+        self._query_embedding_cache: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        # zero vectors keep a zero similarity, as with sklearn's cosine_similarity
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a (len(texts), dim) matrix with a single batched call for the uncached ones."""
+        missing = list(
+            dict.fromkeys(t for t in texts if t not in self._embedding_cache)
+        )
+        if missing:
+            embeddings = self._normalize(
+                np.array(
+                    self.embedding_model.embed_documents(missing), dtype=np.float64
+                )
+            )
+            for text, embedding in zip(missing, embeddings):
+                self._embedding_cache[text] = embedding
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float64)
+        return np.stack([self._embedding_cache[t] for t in texts])
+
+    def _get_query_embedding(self, query: str) -> np.ndarray:
+        """Embed the query once and share it between retrieve_records and retrieve_intent."""
+        if query not in self._query_embedding_cache:
+            self._query_embedding_cache[query] = self._normalize(
+                np.array(self.embedding_model.embed_query(query), dtype=np.float64)
+            )
+        return self._query_embedding_cache[query]
 
-    @lru_cache(maxsize=1000)
     def _get_embedding(self, text: str) -> np.ndarray:
         """Get embedding for text with caching."""
-        if text not in self._embedding_cache:
-            self._embedding_cache[text] = np.array(
-                self.embedding_model.embed_query(text)
-            ).reshape(1, -1)
-        return self._embedding_cache[text]
-
-    async def _batch_get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
-        """Get embeddings for multiple texts in parallel."""
-        tasks = [asyncio.create_task(self._get_embedding_async(text)) for text in texts]
-        return await asyncio.gather(*tasks)
-
-    async def _get_embedding_async(self, text: str) -> np.ndarray:
-        """Async wrapper for getting embeddings."""
-        return self._get_embedding(text)
+        return self._embed_texts([text])
+
+    def _similarities(self, query: str, texts: List[str]) -> np.ndarray:
+        """Cosine similarity between the query and every text, computed with one matmul."""
+        if not texts:
+            return np.zeros(0, dtype=np.float64)
+        return self._embed_texts(texts) @ self._get_query_embedding(query)
+
+    @staticmethod
+    def _parse_personalized_intent(
+        record: ResourceRecord,
+    ) -> Optional[Tuple[str, str, str]]:
+        if not record.personalized_intent:
+            return None
+        match = re.search(
+            r"intent:\s*(.+?)\s*product:\s*(.+?)\s*attribute:\s*(.+)",
+            record.personalized_intent,
+            re.IGNORECASE,
+        )
+        if not match:
+            return None
+        return (
+            match.group(1).strip().lower(),
+            match.group(2).strip().lower(),
+            match.group(3).strip().lower(),
+        )
 
     def retrieve_records(
         self,
@@ -119,109 +166,83 @@ class ShortTermMemory:
         if not self.trajectory:
             return False, []
 
-        query_embedding = self._get_embedding(query)
-        scored_records = []
-
-        weights = {
-            "task": 0.1,
-            "intent": 0.50,  # Increased weight for intent
-            "context": 0.15,
-            "output": 0.2,
-            "recency": 0.05,  # Reduced weight for recency
-        }
+        components = ["task", "intent", "context", "output", "recency"]
+        weights = np.array(
+            [
+                0.1,  # task
+                0.50,  # intent, increased weight
+                0.15,  # context
+                0.2,  # output
+                0.05,  # recency, reduced weight
+            ]
+        )
 
-        # Loop through the trajectory and score the records
+        # Collect every text to compare against the query, so they are embedded
+        # in one batch and scored with one matmul
+        records: List[ResourceRecord] = []
+        recency: List[float] = []
+        parsed_intents: List[Optional[Tuple[str, str, str]]] = []
+        texts: List[str] = []
+        # (record index, component index, index into texts)
+        text_slots: List[Tuple[int, int, int]] = []
         for turn_idx, turn in enumerate(self.trajectory):
             if not turn:  # Skip empty turns
                 continue
-
-            recency_score = (turn_idx + 1) / 5
             for record in turn:
-                score_components = {
-                    "task": 0.0,
-                    "intent": 0.0,
-                    "context": 0.0,
-                    "output": 0.0,
-                    "recency": recency_score,
-                }
-
-                # Calculate task similarity
-                task = record.info.get("attribute", {}).get("task")
+                record_idx = len(records)
+                records.append(record)
+                recency.append((turn_idx + 1) / 5)
 
+                task = record.info.get("attribute", {}).get("task")
                 if task:
-                    task_embedding = self._get_embedding(task)
-                    task_similarity = cosine_similarity(
-                        query_embedding, task_embedding
-                    )[0][0]
-                    score_components["task"] = task_similarity
+                    text_slots.append((record_idx, 0, len(texts)))
+                    texts.append(task)
 
-                # Calculate intent similarity
-                if record.personalized_intent:
-                    match = re.search(
-                        r"intent:\s*(.+?)\s*product:\s*(.+?)\s*attribute:\s*(.+)",
-                        record.personalized_intent,
-                        re.IGNORECASE,
-                    )
-                    if match:
-                        personalized_intent = match.group(1).strip().lower()
-                        product = match.group(2).strip().lower()
-                        attribute = match.group(3).strip().lower()
-
-                        # First check cosine similarity of personalized intent as a filter
-                        intent_embedding = self._get_embedding(personalized_intent)
-                        cosine_similarity_score = cosine_similarity(
-                            query_embedding, intent_embedding
-                        )[0][0]
-
-                        # Only proceed with string comparison if cosine similarity is above threshold
-                        if cosine_similarity_score > cosine_threshold:
-                            # Combine product and attribute for string comparison
-                            combined = f"{attribute} {product}"
-                            string_similarity = ratio(query, combined)
-                            score_components["intent"] = string_similarity
-                        else:
-                            score_components["intent"] = 0.0
-                    else:
-                        score_components["intent"] = 0.0
-                else:
-                    score_components["intent"] = 0.0
+                parsed = self._parse_personalized_intent(record)
+                parsed_intents.append(parsed)
+                if parsed:
+                    text_slots.append((record_idx, 1, len(texts)))
+                    texts.append(parsed[0])
 
-                # Calculate context similarity
                 for step in record.steps or []:
                     if isinstance(step, dict) and "context_generate" in step:
-                        context_embedding = self._get_embedding(
-                            step["context_generate"]
-                        )
-                        context_similarity = cosine_similarity(
-                            query_embedding, context_embedding
-                        )[0][0]
-                        score_components["context"] = context_similarity
+                        text_slots.append((record_idx, 2, len(texts)))
+                        texts.append(step["context_generate"])
                         break
 
-                # Calculate output similarity
                 if record.output:
-                    output_embedding = self._get_embedding(record.output)
-                    output_similarity = cosine_similarity(
-                        query_embedding, output_embedding
-                    )[0][0]
-                    score_components["output"] = output_similarity
-
-                # Compute weighted score
-                weighted_score = sum(
-                    score_components[key] * weights[key] for key in score_components
-                )
-                # Normalize weighted score (optional)
-                weighted_score /= sum(weights.values())
-                scored_records.append({"record": record, "score": weighted_score})
+                    text_slots.append((record_idx, 3, len(texts)))
+                    texts.append(record.output)
+
+        if not records:
+            return False, []
+
+        similarities = self._similarities(query, texts)
+        scores = np.zeros((len(records), len(components)))
+        scores[:, 4] = recency
+        for record_idx, component_idx, text_idx in text_slots:
+            if component_idx == 1:
+                # The personalized intent only counts when it is semantically close,
+                # then product and attribute are compared as strings
+                if similarities[text_idx] > cosine_threshold:
+                    _, product, attribute = parsed_intents[record_idx]
+                    scores[record_idx, 1] = ratio(query, f"{attribute} {product}")
+            else:
+                scores[record_idx, component_idx] = similarities[text_idx]
+
+        # Normalized weighted score of every record
+        weighted_scores = scores @ weights / weights.sum()
 
         # Filter out the records that have a score below the threshold
-        relevant_records = [r for r in scored_records if r["score"] >= threshold]
-        if not relevant_records:
+        relevant_idx = [
+            i for i in range(len(records)) if weighted_scores[i] >= threshold
+        ]
+        if not relevant_idx:
             return False, []
 
         # Sort the relevant records by score and return the top_k
-        relevant_records.sort(key=lambda x: x["score"], reverse=True)
-        return True, [r["record"] for r in relevant_records[:top_k]]
+        relevant_idx.sort(key=lambda i: weighted_scores[i], reverse=True)
+        return True, [records[i] for i in relevant_idx[:top_k]]
 
     def retrieve_intent(
         self, query: str, string_threshold: float = 0.4, cosine_threshold: float = 0.7
@@ -242,40 +263,28 @@ class ShortTermMemory:
         if not self.trajectory:
             return False, None
 
-        query_embedding = self._get_embedding(query)
+        candidates: List[Tuple[ResourceRecord, Tuple[str, str, str]]] = []
+        for turn in self.trajectory:
+            for record in turn:
+                parsed = self._parse_personalized_intent(record)
+                if parsed:
+                    candidates.append((record, parsed))
+
+        similarities = self._similarities(
+            query, [parsed[0] for _, parsed in candidates]
+        )
         best_score = -1
         best_intent = None
-
-        # Loop through the trajectory and score the records
-        for turn_idx, turn in enumerate(self.trajectory):
-            for record in turn:
-                if record.personalized_intent:
-                    match = re.search(
-                        r"intent:\s*(.+?)\s*product:\s*(.+?)\s*attribute:\s*(.+)",
-                        record.personalized_intent,
-                        re.IGNORECASE,
-                    )
-                    if match:
-                        personalized_intent = match.group(1).strip().lower()
-                        product = match.group(2).strip().lower()
-                        attribute = match.group(3).strip().lower()
-
-                        # First check cosine similarity of personalized intent as a filter
-                        intent_embedding = self._get_embedding(personalized_intent)
-                        cosine_similarity_score = cosine_similarity(
-                            query_embedding, intent_embedding
-                        )[0][0]
-
-                        # Only proceed with string comparison if cosine similarity is above threshold
-                        if cosine_similarity_score > cosine_threshold:
-                            # Combine product and attribute for string comparison
-                            combined = f"{attribute} {product}"
-                            string_similarity = ratio(query, combined)
-
-                            # Use string similarity as the final score
-                            if string_similarity > best_score:
-                                best_score = string_similarity
-                                best_intent = record.intent
+        for (record, (_, product, attribute)), similarity in zip(
+            candidates, similarities
+        ):
+            # Only proceed with string comparison if cosine similarity is above threshold
+            if similarity > cosine_threshold:
+                # Use string similarity of product and attribute as the final score
+                string_similarity = ratio(query, f"{attribute} {product}")
+                if string_similarity > best_score:
+                    best_score = string_similarity
+                    best_intent = record.intent
 
         # If the best score is above the threshold, return the intent
         if best_score >= string_threshold:
@@ -283,54 +292,94 @@ class ShortTermMemory:
         else:
             return False, None
 
-    async def personalize(self):
-        """
-        Loops through the last 5 records in the trajectory and generates personalized intents
-        only if not already computed, storing them as `personalized_intent`.
+    def apply_personalized_intents(self) -> int:
+        """Fill personalized intents computed by earlier turns, return how many are still missing."""
+        missing = 0
+        for turn, user_utterance in zip(self.trajectory, self._turn_utterances()):
+            for record in turn:
+                if record.personalized_intent:
+                    continue
+                cached = personalized_intent_cache.get(
+                    record_fingerprint(record, user_utterance)
+                )
+                if cached:
+                    record.personalized_intent = cached
+                else:
+                    missing += 1
+        return missing
+
+    def _turn_utterances(self) -> List[str]:
+        """User utterance of every turn in the trajectory.
+
+        Both the trajectory and the chat history end with the current turn, so
+        they are aligned from the end.
         """
-        # Get all user utterances from chat history
         user_utterances = []
         for line in self.chat_history.split("\n"):
             if line.startswith("user:"):
                 user_utterances.append(line.replace("user:", "").strip())
+        offset = len(user_utterances) - len(self.trajectory)
+        return [
+            user_utterances[turn_idx + offset] if turn_idx + offset >= 0 else ""
+            for turn_idx in range(len(self.trajectory))
+        ]
+
+    async def personalize(self):
+        """
+        Generates personalized intents for the records of the last 5 turns that do not
+        have one yet, storing them as `personalized_intent`. Intents computed by earlier
+        turns are reused, and the missing records of a turn share a single LLM call.
+        """
+        self.apply_personalized_intents()
 
-        # Loop through the trajectory and score the records
         tasks = []
-        for turn_idx, turn in enumerate(self.trajectory):
-            # Get corresponding user utterance for this turn
-            user_utterance = (
-                user_utterances[turn_idx] if turn_idx < len(user_utterances) else ""
-            )
+        for turn, user_utterance in zip(self.trajectory, self._turn_utterances()):
+            records = []
+            fingerprints = []
             for record in turn:
-                # Check if personalized_intent is already set
-                if not record.personalized_intent:
-                    tasks.append(self._set_personalized_intent(record, user_utterance))
+                if record.personalized_intent:
+                    continue
+                fingerprint = record_fingerprint(record, user_utterance)
+                # another turn of this conversation may already be computing it
+                if personalized_intent_cache.claim(fingerprint):
+                    records.append(record)
+                    fingerprints.append(fingerprint)
+            if records:
+                tasks.append(
+                    self._set_personalized_intents(
+                        records, fingerprints, user_utterance
+                    )
+                )
 
         if tasks:
             await asyncio.gather(*tasks)
 
-    async def _set_personalized_intent(
-        self, record: ResourceRecord, user_utterance: str
+    async def _set_personalized_intents(
+        self,
+        records: List[ResourceRecord],
+        fingerprints: List[str],
+        user_utterance: str,
     ):
-        record.personalized_intent = (
-            await self.generate_personalized_product_attribute_intent(
-                record, user_utterance
-            )
-        )
-
-    async def generate_personalized_product_attribute_intent(
-        self, record: ResourceRecord, user_utterance: str
-    ) -> str:
-        """
-        Args:
-            user_utterance (str): User utterance in chat_history corresponding to the record.
-            record (ResourceRecord): Record having the information about agent trajectory.
-
-        Returns:
-            personalized_intent (str):Generate a more personalized intent using task, tool output, context generate, and intent,
-        focusing on product and attribute mentioned or inferred.
-        """
-
+        try:
+            if len(records) == 1:
+                intents = [
+                    await self.generate_personalized_product_attribute_intent(
+                        records[0], user_utterance
+                    )
+                ]
+            else:
+                intents = await self.generate_personalized_product_attribute_intents(
+                    records, user_utterance
+                )
+            for record, fingerprint, intent in zip(records, fingerprints, intents):
+                if intent:
+                    record.personalized_intent = intent
+                    personalized_intent_cache.put(fingerprint, intent)
+        finally:
+            personalized_intent_cache.release(fingerprints)
+
+    @staticmethod
+    def _format_record_inputs(record: ResourceRecord, user_utterance: str) -> str:
         task = record.info.get("attribute", {}).get("task", "") or ""
         tool_output = record.output or ""
         context_generate = ""
@@ -340,9 +389,7 @@ class ShortTermMemory:
                 break
         user_intent = record.intent or ""
 
-        # Input Section
-        inputs_section = f"""
-            This is the input information:
+        return f"""
             - Tool's final raw output: {tool_output}
             - Task performed by the tool: {task}
             - Tool's context generated response: {context_generate}
@@ -350,6 +397,31 @@ class ShortTermMemory:
             - User utterance: {user_utterance}
             """
 
+    @staticmethod
+    def _parse_personalized_intent_response(content: str) -> str:
+        match = re.search(
+            r"Personalized Intent:\s*(.+)", content, re.IGNORECASE | re.DOTALL
+        )
+        return match.group(1).strip() if match else content.strip()
+
+    async def generate_personalized_product_attribute_intent(
+        self, record: ResourceRecord, user_utterance: str
+    ) -> str:
+        """
+        Args:
+            user_utterance (str): User utterance in chat_history corresponding to the record.
+            record (ResourceRecord): Record having the information about agent trajectory.
+
+        Returns:
+            personalized_intent (str):Generate a more personalized intent using task, tool output, context generate, and intent,
+        focusing on product and attribute mentioned or inferred.
+        """
+        # Input Section
+        inputs_section = (
+            "\n            This is the input information:"
+            + self._format_record_inputs(record, user_utterance)
+        )
+
         prompt = (
             intro.strip()
             + "\nHere are the exemplars.\n"
@@ -366,10 +438,171 @@ class ShortTermMemory:
             else getattr(response, "content", "")
         )
 
-        match = re.search(
-            r"Personalized Intent:\s*(.+)", content, re.IGNORECASE | re.DOTALL
+        return self._parse_personalized_intent_response(content)
+
+    async def generate_personalized_product_attribute_intents(
+        self, records: List[ResourceRecord], user_utterance: str
+    ) -> List[str]:
+        """
+        Args:
+            records (List[ResourceRecord]): Records of a single turn.
+            user_utterance (str): User utterance of that turn.
+
+        Returns:
+            List[str]: The personalized intent of every record generated with a single LLM
+        call, empty for the records the model did not answer.
+        """
+        inputs_section = "This is the input information:\n" + "\n".join(
+            f"Record {i + 1}:" + self._format_record_inputs(record, user_utterance)
+            for i, record in enumerate(records)
+        )
+        prompt = (
+            intro.strip()
+            + "\nHere are the exemplars.\n"
+            + final_examples.strip()
+            + "\n\n"
+            + output_instructions.strip()
+            + "\n\n"
+            + batch_output_instructions.strip()
+            + "\n\n"
+            + inputs_section.strip()
+        )
+        response = await self.llm.ainvoke(prompt)
+        content = (
+            response.get("content")
+            if isinstance(response, dict)
+            else getattr(response, "content", "")
         )
 
-        personalized_intent = match.group(1).strip() if match else content.strip()
+        sections = re.split(r"^\s*\**Record\s+(\d+)\**\s*:", content, flags=re.M)
+        answers: Dict[int, str] = {}
+        # re.split alternates the text before the first match, the record number and its section
+        for number, section in zip(sections[1::2], sections[2::2]):
+            answers[int(number) - 1] = self._parse_personalized_intent_response(section)
+        return [answers.get(i, "") for i in range(len(records))]
+
+
+def record_fingerprint(record: ResourceRecord, user_utterance: str) -> str:
+    """Hash of everything the personalized intent of a record is generated from."""
+    context_generate = ""
+    for step in record.steps or []:
+        if isinstance(step, dict) and "context_generate" in step:
+            context_generate = step["context_generate"]
+            break
+    payload = json.dumps(
+        [
+            record.info.get("attribute", {}).get("task", "") or "",
+            record.output or "",
+            context_generate,
+            record.intent or "",
+            user_utterance,
+        ]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PersonalizedIntentCache:
+    """Process-wide cache of personalized intents keyed by record fingerprint.
+
+    Params come back from the client on every turn without the intents that
+    were generated in the background after the previous response, so they are
+    looked up here by the content of the record. Fingerprints being computed
+    are claimed so that overlapping turns do not generate them twice.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        with self._lock:
+            intent = self._entries.get(fingerprint)
+            if intent is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            return intent
+
+    def put(self, fingerprint: str, intent: str) -> None:
+        with self._lock:
+            self._entries[fingerprint] = intent
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def claim(self, fingerprint: str) -> bool:
+        """Mark a fingerprint as being computed, False if it is cached or already claimed."""
+        with self._lock:
+            if fingerprint in self._pending or fingerprint in self._entries:
+                return False
+            self._pending.add(fingerprint)
+            return True
+
+    def release(self, fingerprints: List[str]) -> None:
+        with self._lock:
+            self._pending.difference_update(fingerprints)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+personalized_intent_cache = PersonalizedIntentCache()
+
+# Strong references to the running background tasks, the event loop only keeps weak ones
+_background_tasks: Set["asyncio.Task[None]"] = set()
+_background_executor = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="personalize"
+)
+
 
-        return personalized_intent
+async def _personalize_safely(
+    stm: ShortTermMemory, on_done: Optional[Callable[[ShortTermMemory], None]]
+) -> None:
+    try:
+        await stm.personalize()
+        if on_done is not None:
+            # e.g. a session store write, kept off the event loop
+            await asyncio.to_thread(on_done, stm)
+    except Exception as err:
+        logger.error(f"Background personalization failed: {err}")
+
+
+def personalize_in_background(
+    stm: ShortTermMemory,
+    on_done: Optional[Callable[[ShortTermMemory], None]] = None,
+) -> None:
+    """Generate the missing personalized intents of stm without blocking the caller.
+
+    Inside an event loop the work is scheduled as a task on it, otherwise it
+    runs on a small thread pool. Results reach later turns through
+    personalized_intent_cache, and on_done is called with stm once they are
+    set on its records.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        task = loop.create_task(_personalize_safely(stm, on_done))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    else:
+        _background_executor.submit(asyncio.run, _personalize_safely(stm, on_done))
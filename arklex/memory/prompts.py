@@ -107,6 +107,14 @@ Do not add explanations or extra text.
 
 Now generate the final personalized intent for the following input information:
 """
+batch_output_instructions = """
+**Batch Output Format:**
+The input information below contains several records, each introduced by "Record <n>:".
+For every record, in the given order, write "Record <n>:" on its own line followed by "Personalized Intent:" and its intent, product and attribute lines.
+Do not add explanations or extra text.
+
+Now generate the final personalized intent for each of the following records:
+"""
 # These exemplars are commented out as they are for reference only.
 # They show how to personalize intents focusing on product and attribute information.
 # Each example demonstrates how to extract and format product and attribute information from user queries.
@@ -3,9 +3,12 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[3]))
 
+import json
 import logging
 import string
-from typing import Dict, List, Any, Tuple
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 from fastapi import FastAPI, Response
 
@@ -20,8 +23,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from arklex.utils.model_provider_config import PROVIDER_MAP
-from langchain_openai import ChatOpenAI
+from arklex.utils.model_provider_config import model_client_pool
 from pydantic_ai import Agent
 from pydantic import ValidationError
 
@@ -30,52 +32,96 @@ logger = logging.getLogger(__name__)
 
 
 class NLUModelAPI:
-    def __init__(self) -> None:
+    def __init__(self, max_prompt_cache_size: int = 1024) -> None:
         self.user_prefix: str = "user"
         self.assistant_prefix: str = "assistant"
+        self.max_prompt_cache_size: int = max_prompt_cache_size
+        self._prompt_cache: "OrderedDict[str, Tuple[str, Dict[str, str]]]" = (
+            OrderedDict()
+        )
+        self._prompt_lock: threading.Lock = threading.Lock()
+        self.prompt_hits: int = 0
+        self.prompt_misses: int = 0
 
-    def get_response(
+    def _build_request(
         self,
         sys_prompt: str,
         model: Dict[str, Any],
         response_format: str = "text",
         note: str = "intent detection",
-    ) -> str:
+    ) -> Tuple[Any, Any]:
         logger.info(f"Prompt for {note}: {sys_prompt}")
         dialog_history: List[Dict[str, str]] = [
             {"role": "system", "content": sys_prompt}
         ]
-        kwargs: Dict[str, Any] = {
-            "model": model["model_type_or_path"],
-            "temperature": 0.1,
-        }
-
+        kwargs: Dict[str, Any] = {}
         if model["llm_provider"] != "anthropic":
             kwargs["n"] = 1
-        llm: Any = PROVIDER_MAP.get(model["llm_provider"], ChatOpenAI)(**kwargs)
+        llm: Any = model_client_pool.get_llm(
+            model["llm_provider"],
+            model["model_type_or_path"],
+            temperature=0.1,
+            response_format=response_format,
+            **kwargs,
+        )
 
         if model["llm_provider"] == "openai":
-            llm = llm.bind(
-                response_format={"type": "json_object"}
-                if response_format == "json"
-                else {"type": "text"}
+            return llm, dialog_history
+        messages: List[Tuple[str, str]] = [
+            (
+                "user",
+                f"{dialog_history[0]['content']} Only choose the option letter, no explanation.",
             )
-            res: Any = llm.invoke(dialog_history)
-        else:
-            messages: List[Tuple[str, str]] = [
-                (
-                    "user",
-                    f"{dialog_history[0]['content']} Only choose the option letter, no explanation.",
-                )
-            ]
-            res: Any = llm.invoke(messages)
+        ]
+        return llm, messages
+
+    def get_response(
+        self,
+        sys_prompt: str,
+        model: Dict[str, Any],
+        response_format: str = "text",
+        note: str = "intent detection",
+    ) -> str:
+        llm, messages = self._build_request(sys_prompt, model, response_format, note)
+        res: Any = llm.invoke(messages)
+        return res.content
 
+    async def aget_response(
+        self,
+        sys_prompt: str,
+        model: Dict[str, Any],
+        response_format: str = "text",
+        note: str = "intent detection",
+    ) -> str:
+        llm, messages = self._build_request(sys_prompt, model, response_format, note)
+        res: Any = await llm.ainvoke(messages)
         return res.content
 
-    def format_input(
-        self, intents: Dict[str, List[Dict[str, Any]]], chat_history_str: str
+    def compile_intents(
+        self, intents: Dict[str, List[Dict[str, Any]]], key: Optional[str] = None
     ) -> Tuple[str, Dict[str, str]]:
-        """Format input text before feeding it to the model."""
+        """Build the static part of the intent prompt and the option mapping.
+
+        Candidate intent sets are fixed per node, so the result is cached and
+        only the conversation is substituted per turn. The prefix is identical
+        across turns, which lets provider-side prompt caching reuse it. key is
+        the id the task graph gave the candidate set when precompiling it, see
+        TaskGraph.nlu_prompt_key; without one the set is keyed by its content.
+        """
+        if key is None:
+            # insertion order decides the option letters, so it is part of the key
+            key = json.dumps(intents, default=str)
+        with self._prompt_lock:
+            compiled: Optional[Tuple[str, Dict[str, str]]] = self._prompt_cache.get(
+                key
+            )
+            if compiled is not None:
+                self._prompt_cache.move_to_end(key)
+                self.prompt_hits += 1
+                # callers may change their mapping
+                return compiled[0], dict(compiled[1])
+            self.prompt_misses += 1
+
         intents_choice: str = ""
         definition_str: str = ""
         exemplars_str: str = ""
@@ -120,27 +166,44 @@ class NLUModelAPI:
 
                     count += 1
         # Base prompt without conditional sections
-        system_prompt_nlu: str = """According to the conversation, decide what is the user's intent in the last turn? \n"""
+        prefix: str = """According to the conversation, decide what is the user's intent in the last turn? \n"""
 
         # Conditionally add definitions if available
         if definition_str.strip():
-            system_prompt_nlu += (
-                """Here are the definitions for each intent:\n{definition}\n"""
-            )
+            prefix += f"""Here are the definitions for each intent:\n{definition_str}\n"""
 
         # Conditionally add exemplars if available
         if exemplars_str.strip():
-            system_prompt_nlu += """Here are some sample utterances from user that indicate each intent:\n{exemplars}\n"""
+            prefix += f"""Here are some sample utterances from user that indicate each intent:\n{exemplars_str}\n"""
 
-        # Add the rest of the prompt
-        system_prompt_nlu += """Conversation:\n{formatted_chat}\n\nOnly choose from the following options.\n{intents_choice}\n\nAnswer:"""
+        # The options precede the conversation so the whole prefix is static
+        prefix += f"""Only choose from the following options.\n{intents_choice}\n"""
 
-        system_prompt: str = system_prompt_nlu.format(
-            definition=definition_str,
-            exemplars=exemplars_str,
-            intents_choice=intents_choice,
-            formatted_chat=chat_history_str,
-        )
+        with self._prompt_lock:
+            self._prompt_cache[key] = (prefix, idx2intents_mapping)
+            while len(self._prompt_cache) > self.max_prompt_cache_size:
+                self._prompt_cache.popitem(last=False)
+        return prefix, dict(idx2intents_mapping)
+
+    def prompt_cache_stats(self) -> Dict[str, int]:
+        with self._prompt_lock:
+            return {
+                "size": len(self._prompt_cache),
+                "hits": self.prompt_hits,
+                "misses": self.prompt_misses,
+            }
+
+    def format_input(
+        self,
+        intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+        prompt_key: Optional[str] = None,
+    ) -> Tuple[str, Dict[str, str]]:
+        """Format input text before feeding it to the model."""
+        prefix: str
+        idx2intents_mapping: Dict[str, str]
+        prefix, idx2intents_mapping = self.compile_intents(intents, prompt_key)
+        system_prompt: str = f"""{prefix}Conversation:\n{chat_history_str}\n\nAnswer:"""
         return system_prompt, idx2intents_mapping
 
     def predict(
@@ -149,13 +212,37 @@ class NLUModelAPI:
         intents: Dict[str, List[Dict[str, Any]]],
         chat_history_str: str,
         model: Dict[str, Any],
+        prompt_key: Optional[str] = None,
     ) -> str:
         system_prompt: str
         idx2intents_mapping: Dict[str, str]
         system_prompt, idx2intents_mapping = self.format_input(
-            intents, chat_history_str
+            intents, chat_history_str, prompt_key
         )
         response: str = self.get_response(system_prompt, model, note="intent detection")
+        return self._postprocess_intent(response, idx2intents_mapping)
+
+    async def apredict(
+        self,
+        text: str,
+        intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+        model: Dict[str, Any],
+        prompt_key: Optional[str] = None,
+    ) -> str:
+        system_prompt: str
+        idx2intents_mapping: Dict[str, str]
+        system_prompt, idx2intents_mapping = self.format_input(
+            intents, chat_history_str, prompt_key
+        )
+        response: str = await self.aget_response(
+            system_prompt, model, note="intent detection"
+        )
+        return self._postprocess_intent(response, idx2intents_mapping)
+
+    def _postprocess_intent(
+        self, response: str, idx2intents_mapping: Dict[str, str]
+    ) -> str:
         logger.info(f"postprocessed intent response: {response}")
         try:
             pred_intent_idx: str = response.split(")")[0]
@@ -180,30 +267,36 @@ class SlotFillModelAPI:
             system_prompt: str = f"Given a user profile, extract the values for each defined slot type. Only extract values that are explicitly mentioned in the profile. If a value is not found, leave it empty.\n\nSlot definitions:\n{slots}\n\nUser profile:\n{input}\n\nFor each slot:\n1. Look for an exact match in the profile\n2. Only extract values that are clearly stated\n3. Do not make assumptions or infer values\n4. If a slot has enum values, the extracted value must match one of them exactly\n\nExtract the values:\n"
         return system_prompt
 
-    # get response from model
-    def get_response(
-        self,
-        sys_prompt: str,
-        format: Any,
-        model: Dict[str, Any],
-        note: str = "slot filling",
-    ) -> Any:
+    def _build_llm(self, model: Dict[str, Any]) -> Any:
+        kwargs: Dict[str, Any] = {}
+        # set number of chat completions to generate, isn't supported by Anthropic
+        if model["llm_provider"] != "anthropic":
+            kwargs["n"] = 1
+        return model_client_pool.get_llm(
+            model["llm_provider"],
+            model["model_type_or_path"],
+            temperature=0.7,
+            **kwargs,
+        )
+
+    def _request(
+        self, sys_prompt: str, format: Any, model: Dict[str, Any], note: str
+    ) -> Tuple[Callable[[Any], Any], Callable[[Any], Any], Any, Callable[[Any], Any]]:
+        """The call filling format for the provider of model.
+
+        Returns its sync and async functions, the input to pass them and how
+        to parse their result into format, shared by get_response and
+        aget_response.
+        """
         logger.info(f"Prompt for {note}: {sys_prompt}")
         dialog_history: List[Dict[str, str]] = [
             {"role": "system", "content": sys_prompt}
         ]
-        kwargs: Dict[str, Any] = {
-            "model": model["model_type_or_path"],
-            "temperature": 0.7,
-        }
-        # set number of chat completions to generate, isn't supported by Anthropic
-        if model["llm_provider"] != "anthropic":
-            kwargs["n"] = 1
-        llm: Any = PROVIDER_MAP.get(model["llm_provider"], ChatOpenAI)(**kwargs)
+        llm: Any = self._build_llm(model)
 
         if model["llm_provider"] == "openai":
             llm = llm.with_structured_output(schema=format)
-            response: Any = llm.invoke(dialog_history)
+            return llm.invoke, llm.ainvoke, dialog_history, lambda response: response
 
         # TODO: fix slotfilling for huggingface
         elif model["llm_provider"] == "huggingface":
@@ -216,8 +309,12 @@ class SlotFillModelAPI:
             agent: Agent = Agent(
                 f"google-gla:{model['model_type_or_path']}", result_type=format
             )
-            result: Any = agent.run_sync(dialog_history[0]["content"])
-            response: Any = result.data
+            return (
+                agent.run_sync,
+                agent.run,
+                dialog_history[0]["content"],
+                lambda result: result.data,
+            )
 
         # for claude
         else:
@@ -225,9 +322,33 @@ class SlotFillModelAPI:
                 {"role": "user", "content": dialog_history[0]["content"]}
             ]
             llm = llm.bind_tools([format])
-            res: Any = llm.invoke(messages)
-            response: Any = format(**res.tool_calls[0]["args"])
-        return response
+            return (
+                llm.invoke,
+                llm.ainvoke,
+                messages,
+                lambda res: format(**res.tool_calls[0]["args"]),
+            )
+
+    # get response from model
+    def get_response(
+        self,
+        sys_prompt: str,
+        format: Any,
+        model: Dict[str, Any],
+        note: str = "slot filling",
+    ) -> Any:
+        call, _, request, parse = self._request(sys_prompt, format, model, note)
+        return parse(call(request))
+
+    async def aget_response(
+        self,
+        sys_prompt: str,
+        format: Any,
+        model: Dict[str, Any],
+        note: str = "slot filling",
+    ) -> Any:
+        _, acall, request, parse = self._request(sys_prompt, format, model, note)
+        return parse(await acall(request))
 
     # endpoint for slot filling
     def predict(
@@ -250,28 +371,67 @@ class SlotFillModelAPI:
             )
             return slots
 
-    # endpoint for slot verification
-    def verify(
-        self,
-        slot: Dict[str, Any],
-        chat_history_str: str,
-        model: Dict[str, Any],
-    ) -> Verification:
+    async def apredict(
+        self, slots: List[Slot], input: str, model: Dict[str, Any], type: str = "chat"
+    ) -> List[Slot]:
+        try:
+            input_slots: SlotInputList
+            output_slots: Any
+            input_slots, output_slots = structured_input_output(slots)
+            system_prompt: str = self.format_input(input_slots, input, type)
+            response: Any = await self.aget_response(
+                system_prompt, output_slots, model, note="slot filling"
+            )
+            filled_slots: List[Slot] = format_slotfilling_output(slots, response)
+            logger.info(f"Updated dialogue states: {filled_slots}")
+            return filled_slots
+        except ValidationError as e:
+            logger.warning(
+                f"SlotFilling failed. The error is {e}. Returning slots without filling."
+            )
+            return slots
+
+    def format_verify_input(self, slot: Dict[str, Any], chat_history_str: str) -> str:
         reformat_slot: Dict[str, Any] = {
             key: value
             for key, value in slot.items()
             if key in ["name", "type", "value", "enum", "description", "required"]
         }
         system_prompt: str = f"Given the conversation, definition and extracted value of each dialog state, decide whether the following dialog states values need further verification from the user. Verification is needed for expressions which may cause confusion. If it is an accurate information extracted, no verification is needed. If there is a list of enum value, which means the value has to be chosen from the enum list. If the user has given the affrimative answer, no need to verify. Only Return boolean value: True or False. \nDialogue Statues:\n{reformat_slot}\nConversation:\n{chat_history_str}\n\n"
-        response: Verification = self.get_response(
-            system_prompt, format=Verification, model=model, note="slot verification"
-        )
+        return system_prompt
+
+    def _postprocess_verification(self, response: Verification) -> Verification:
         if not response:  # no need to verification, we want to make sure it is really confident that we need to ask the question again
             logger.info("Failed to verify dialogue states")
             return Verification(verification_needed=False, thought="No need to verify")
         logger.info(f"Verified dialogue states: {response}")
         return response
 
+    # endpoint for slot verification
+    def verify(
+        self,
+        slot: Dict[str, Any],
+        chat_history_str: str,
+        model: Dict[str, Any],
+    ) -> Verification:
+        system_prompt: str = self.format_verify_input(slot, chat_history_str)
+        response: Verification = self.get_response(
+            system_prompt, format=Verification, model=model, note="slot verification"
+        )
+        return self._postprocess_verification(response)
+
+    async def averify(
+        self,
+        slot: Dict[str, Any],
+        chat_history_str: str,
+        model: Dict[str, Any],
+    ) -> Verification:
+        system_prompt: str = self.format_verify_input(slot, chat_history_str)
+        response: Verification = await self.aget_response(
+            system_prompt, format=Verification, model=model, note="slot verification"
+        )
+        return self._postprocess_verification(response)
+
 
 app: FastAPI = FastAPI()
 nlu_api: NLUModelAPI = NLUModelAPI()
@@ -279,26 +439,26 @@ slotfilling_api: SlotFillModelAPI = SlotFillModelAPI()
 
 
 @app.post("/nlu/predict")
-def predict(data: Dict[str, Any], res: Response) -> Dict[str, str]:
+async def predict(data: Dict[str, Any], res: Response) -> Dict[str, str]:
     logger.info(f"Received data: {data}")
-    pred_intent: str = nlu_api.predict(**data)
+    pred_intent: str = await nlu_api.apredict(**data)
 
     logger.info(f"pred_intent: {pred_intent}")
     return {"intent": pred_intent}
 
 
 @app.post("/slotfill/predict")
-def predict(data: Dict[str, Any], res: Response) -> List[Slot]:
+async def predict(data: Dict[str, Any], res: Response) -> List[Slot]:
     logger.info(f"Received data: {data}")
-    results: List[Slot] = slotfilling_api.predict(**data)
+    results: List[Slot] = await slotfilling_api.apredict(**data)
     logger.info(f"pred_slots: {results}")
     return results
 
 
 @app.post("/slotfill/verify")
-def verify(data: Dict[str, Any], res: Response) -> Verification:
+async def verify(data: Dict[str, Any], res: Response) -> Verification:
     logger.info(f"Received data: {data}")
-    verify_needed: Verification = slotfilling_api.verify(**data)
+    verify_needed: Verification = await slotfilling_api.averify(**data)
 
     logger.info(f"verify_needed: {verify_needed}")
     return verify_needed
@@ -0,0 +1,196 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from arklex.utils.graph_state import LLMConfig
+from arklex.utils.model_provider_config import model_client_pool
+
+logger = logging.getLogger(__name__)
+
+INTENT_CLASSIFIER_MODES: List[str] = ["off", "shadow", "on"]
+
+
+class EmbeddingIntentClassifier:
+    """Nearest-neighbour intent classifier that runs ahead of the LLM NLU.
+
+    The definition and sample utterances of every intent edge are embedded
+    once, when the task graph is built. An utterance is scored against each
+    candidate option by its highest cosine similarity to the option's examples,
+    and the classifier only answers when the best option is similar enough and
+    ahead of the runner-up by at least margin. Otherwise, or for options with
+    no examples such as "others", the LLM decides.
+
+    Modes:
+        off: never classify, the LLM handles every prediction.
+        shadow: classify and still call the LLM, recording how often they agree.
+        on: use the classifier's answer when it is confident.
+    """
+
+    def __init__(
+        self,
+        graph: nx.DiGraph,
+        llm_config: LLMConfig,
+        mode: str = "off",
+        margin: float = 0.05,
+        threshold: float = 0.6,
+        unsure_intent: str = "others",
+    ) -> None:
+        if mode not in INTENT_CLASSIFIER_MODES:
+            raise ValueError(
+                f"Unknown intent classifier mode {mode}, expected one of {INTENT_CLASSIFIER_MODES}"
+            )
+        self.mode: str = mode
+        self.margin: float = margin
+        self.threshold: float = threshold
+        self.unsure_intent: str = unsure_intent
+        self.llm_config: LLMConfig = llm_config
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.lookups: int = 0
+        self.hits: int = 0
+        self.compared: int = 0
+        self.agreed: int = 0
+        if self.enabled:
+            self._embed_examples(
+                [
+                    text
+                    for _, _, attribute in graph.edges(data="attribute")
+                    for text in self._examples(attribute or {})
+                ]
+            )
+
+    @classmethod
+    def from_config(
+        cls,
+        graph: nx.DiGraph,
+        llm_config: LLMConfig,
+        config: Dict[str, Any],
+        unsure_intent: str = "others",
+    ) -> "EmbeddingIntentClassifier":
+        """Build the classifier from the "intent_classifier" entry of a task graph config."""
+        return cls(
+            graph,
+            llm_config,
+            mode=config.get("mode", "off"),
+            margin=config.get("margin", 0.05),
+            threshold=config.get("threshold", 0.6),
+            unsure_intent=unsure_intent,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @staticmethod
+    def _examples(attribute: Dict[str, Any]) -> List[str]:
+        examples: List[str] = list(attribute.get("sample_utterances") or [])
+        if attribute.get("definition"):
+            examples.append(attribute["definition"])
+        return [e for e in examples if e.strip()]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms: np.ndarray = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _embedding_model(self) -> Any:
+        return model_client_pool.get_embedding_model(self.llm_config.llm_provider)
+
+    def _embed_examples(self, texts: List[str]) -> None:
+        missing: List[str] = list(
+            dict.fromkeys(t for t in texts if t not in self._vectors)
+        )
+        if not missing:
+            return
+        vectors: np.ndarray = self._normalize(
+            np.array(self._embedding_model().embed_documents(missing), dtype=np.float64)
+        )
+        with self._lock:
+            self._vectors.update(zip(missing, vectors))
+
+    def _options(
+        self, candidate_intents: Dict[str, List[Dict[str, Any]]]
+    ) -> Dict[str, List[str]]:
+        """Examples of every option, named the way the LLM NLU names them."""
+        options: Dict[str, List[str]] = {}
+        for intent, edges in candidate_intents.items():
+            if intent == self.unsure_intent:
+                continue
+            for idx, edge in enumerate(edges or []):
+                name: str = intent if len(edges) == 1 else f"{intent}__<{idx}>"
+                options[name] = self._examples(edge.get("attribute", {}))
+        return options
+
+    def scores(
+        self, text: str, candidate_intents: Dict[str, List[Dict[str, Any]]]
+    ) -> Dict[str, float]:
+        """Highest cosine similarity between text and the examples of every option.
+
+        Empty when an option has no examples, since it could not compete.
+        """
+        options: Dict[str, List[str]] = self._options(candidate_intents)
+        if not options or not all(options.values()):
+            return {}
+        # candidates restored from Params may carry examples unseen at construction
+        self._embed_examples([e for examples in options.values() for e in examples])
+        query: np.ndarray = self._normalize(
+            np.array(self._embedding_model().embed_query(text), dtype=np.float64)
+        )
+        return {
+            name: float(np.max(np.stack([self._vectors[e] for e in examples]) @ query))
+            for name, examples in options.items()
+        }
+
+    def classify(
+        self, text: str, candidate_intents: Dict[str, List[Dict[str, Any]]]
+    ) -> Optional[str]:
+        """Return the predicted option, or None when the LLM has to decide."""
+        if not self.enabled or not text:
+            return None
+        try:
+            scores: Dict[str, float] = self.scores(text, candidate_intents)
+        except Exception as err:
+            logger.error(f"Intent classifier failed, falling back to the LLM: {err}")
+            return None
+        ranked: List[Tuple[str, float]] = sorted(
+            scores.items(), key=lambda item: item[1], reverse=True
+        )
+        with self._lock:
+            self.lookups += 1
+        if not ranked or ranked[0][1] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin:
+            return None
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Intent classifier predicted {ranked[0][0]} ({ranked[0][1]:.3f})")
+        return ranked[0][0]
+
+    def record_llm_prediction(
+        self, fast_intent: Optional[str], llm_intent: str
+    ) -> None:
+        """Compare a confident classifier prediction with the LLM's for the same turn."""
+        if fast_intent is None:
+            return
+        with self._lock:
+            self.compared += 1
+            if fast_intent.strip().lower() == llm_intent.strip().lower():
+                self.agreed += 1
+            else:
+                logger.info(
+                    f"Intent classifier predicted {fast_intent}, the LLM {llm_intent}"
+                )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "compared": self.compared,
+                "agreement": self.agreed / self.compared if self.compared else 0.0,
+            }
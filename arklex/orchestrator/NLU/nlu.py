@@ -1,6 +1,10 @@
+import asyncio
 import requests
 import logging
+import weakref
 from typing import Dict, List, Any, Tuple, Optional
+
+import httpx
 from dotenv import load_dotenv
 
 from arklex.utils.slot import Slot
@@ -9,40 +13,100 @@ from arklex.orchestrator.NLU.api import nlu_api, slotfilling_api
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# httpx connection pools are bound to the event loop that created them, so one
+# client is kept per running loop and shared by every conversation on it
+_async_clients: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]"
+) = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    client: Optional[httpx.AsyncClient] = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=None)
+        _async_clients[loop] = client
+    return client
+
 
 class NLU:
     def __init__(self, url: Optional[str]) -> None:
         self.url: Optional[str] = url
 
-    def execute(
+    def _format_data(
         self,
         text: str,
         intents: Dict[str, List[Dict[str, Any]]],
         chat_history_str: str,
         llm_config: Dict[str, Any],
-    ) -> str:
+    ) -> Dict[str, Any]:
         logger.info(f"candidates intents of NLU: {intents}")
-        data: Dict[str, Any] = {
+        return {
             "text": text,
             "intents": intents,
             "chat_history_str": chat_history_str,
             "model": llm_config,
         }
+
+    def _parse_remote_intent(self, status_code: int, results: Any) -> str:
+        if status_code == 200:
+            pred_intent: str = results["intent"]
+            logger.info(f"pred_intent is {pred_intent}")
+        else:
+            pred_intent: str = "others"
+            logger.error("Remote Server Error when predicting NLU")
+        return pred_intent
+
+    def execute(
+        self,
+        text: str,
+        intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+        llm_config: Dict[str, Any],
+        prompt_key: Optional[str] = None,
+    ) -> str:
+        data: Dict[str, Any] = self._format_data(
+            text, intents, chat_history_str, llm_config
+        )
         if self.url:
             logger.info("Using NLU API to predict the intent")
             response: requests.Response = requests.post(
                 self.url + "/predict", json=data
             )
-            if response.status_code == 200:
-                results: Dict[str, str] = response.json()
-                pred_intent: str = results["intent"]
-                logger.info(f"pred_intent is {pred_intent}")
-            else:
-                pred_intent: str = "others"
-                logger.error("Remote Server Error when predicting NLU")
+            pred_intent: str = self._parse_remote_intent(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+            )
+        else:
+            logger.info("Using NLU function to predict the intent")
+            pred_intent: str = nlu_api.predict(**data, prompt_key=prompt_key)
+            logger.info(f"pred_intent is {pred_intent}")
+
+        return pred_intent
+
+    async def aexecute(
+        self,
+        text: str,
+        intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+        llm_config: Dict[str, Any],
+        prompt_key: Optional[str] = None,
+    ) -> str:
+        data: Dict[str, Any] = self._format_data(
+            text, intents, chat_history_str, llm_config
+        )
+        if self.url:
+            logger.info("Using NLU API to predict the intent")
+            response: httpx.Response = await get_async_client().post(
+                self.url + "/predict", json=data
+            )
+            pred_intent: str = self._parse_remote_intent(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+            )
         else:
             logger.info("Using NLU function to predict the intent")
-            pred_intent: str = nlu_api.predict(**data)
+            pred_intent: str = await nlu_api.apredict(**data, prompt_key=prompt_key)
             logger.info(f"pred_intent is {pred_intent}")
 
         return pred_intent
@@ -52,6 +116,30 @@ class SlotFilling:
     def __init__(self, url: Optional[str]) -> None:
         self.url: Optional[str] = url
 
+    def _parse_remote_verification(
+        self, status_code: int, results: Any
+    ) -> Tuple[bool, str]:
+        if status_code == 200:
+            verification_needed: bool = results.get("verification_needed")
+            thought: str = results.get("thought")
+            logger.info(f"verify_needed is {verification_needed}")
+        else:
+            verification_needed: bool = False
+            thought: str = "No need to verify"
+            logger.error("Remote Server Error when verifying Slot Filling")
+        return verification_needed, thought
+
+    def _parse_remote_slots(
+        self, status_code: int, results: Any, slots: List[Slot]
+    ) -> List[Slot]:
+        if status_code == 200:
+            pred_slots: List[Slot] = results
+            logger.info(f"pred_slots is {pred_slots}")
+        else:
+            pred_slots: List[Slot] = slots
+            logger.error("Remote Server Error when predicting Slot Filling")
+        return pred_slots
+
     def verify_needed(
         self, slot: Slot, chat_history_str: str, llm_config: Dict[str, Any]
     ) -> Tuple[bool, str]:
@@ -64,14 +152,10 @@ class SlotFilling:
         if self.url:
             logger.info("Using Slot Filling API to verify the slot")
             response: requests.Response = requests.post(self.url + "/verify", json=data)
-            if response.status_code == 200:
-                verification_needed: bool = response.json().get("verification_needed")
-                thought: str = response.json().get("thought")
-                logger.info(f"verify_needed is {verification_needed}")
-            else:
-                verification_needed: bool = False
-                thought: str = "No need to verify"
-                logger.error("Remote Server Error when verifying Slot Filling")
+            verification_needed, thought = self._parse_remote_verification(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+            )
         else:
             logger.info("Using Slot Filling function to verify the slot")
             verification: Any = slotfilling_api.verify(**data)
@@ -81,6 +165,33 @@ class SlotFilling:
 
         return verification_needed, thought
 
+    async def averify_needed(
+        self, slot: Slot, chat_history_str: str, llm_config: Dict[str, Any]
+    ) -> Tuple[bool, str]:
+        logger.info(f"verify slot: {slot}")
+        data: Dict[str, Any] = {
+            "slot": slot.model_dump(),
+            "chat_history_str": chat_history_str,
+            "model": llm_config,
+        }
+        if self.url:
+            logger.info("Using Slot Filling API to verify the slot")
+            response: httpx.Response = await get_async_client().post(
+                self.url + "/verify", json=data
+            )
+            verification_needed, thought = self._parse_remote_verification(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+            )
+        else:
+            logger.info("Using Slot Filling function to verify the slot")
+            verification: Any = await slotfilling_api.averify(**data)
+            verification_needed: bool = verification.verification_needed
+            thought: str = verification.thought
+            logger.info(f"verify_needed is {verification_needed}")
+
+        return verification_needed, thought
+
     def execute(
         self,
         slots: List[Slot],
@@ -103,14 +214,46 @@ class SlotFilling:
             response: requests.Response = requests.post(
                 self.url + "/predict", json=data
             )
-            if response.status_code == 200:
-                pred_slots: List[Slot] = response.json()
-                logger.info(f"pred_slots is {pred_slots}")
-            else:
-                pred_slots: List[Slot] = slots
-                logger.error("Remote Server Error when predicting Slot Filling")
+            pred_slots: List[Slot] = self._parse_remote_slots(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+                slots,
+            )
         else:
             logger.info("Using Slot Filling function to predict the slots")
             pred_slots: List[Slot] = slotfilling_api.predict(**data)
             logger.info(f"pred_slots is {pred_slots}")
         return pred_slots
+
+    async def aexecute(
+        self,
+        slots: List[Slot],
+        context: str,
+        llm_config: Dict[str, Any],
+        type: str = "chat",
+    ) -> List[Slot]:
+        logger.info(f"extracted slots: {slots}")
+        if not slots:
+            return []
+
+        data: Dict[str, Any] = {
+            "slots": slots,
+            "input": context,
+            "type": type,
+            "model": llm_config,
+        }
+        if self.url:
+            logger.info("Using Slot Filling API to predict the slots")
+            response: httpx.Response = await get_async_client().post(
+                self.url + "/predict", json=data
+            )
+            pred_slots: List[Slot] = self._parse_remote_slots(
+                response.status_code,
+                response.json() if response.status_code == 200 else None,
+                slots,
+            )
+        else:
+            logger.info("Using Slot Filling function to predict the slots")
+            pred_slots: List[Slot] = await slotfilling_api.apredict(**data)
+            logger.info(f"pred_slots is {pred_slots}")
+        return pred_slots
@@ -1,14 +1,16 @@
 import asyncio
 import copy
+import functools
 import janus
 import json
 import logging
 import time
 from dotenv import load_dotenv
 from langchain_core.runnables import RunnableLambda
-from typing import Any, Dict, Tuple, List, Optional, Union
+from typing import Any, Callable, Dict, Generator, Tuple, List, Optional, Union
 from arklex.env.nested_graph.nested_graph import NESTED_GRAPH_ID, NestedGraph
 from arklex.env.env import Env
+from arklex.orchestrator.session_store import BaseSessionStore
 from arklex.orchestrator.task_graph import TaskGraph
 from arklex.env.tools.utils import ToolGenerator
 from arklex.types import StreamType
@@ -21,14 +23,18 @@ from arklex.utils.graph_state import (
     StatusEnum,
     LLMConfig,
     BotConfig,
+    VectorIndexConfig,
+    QueryRewriteConfig,
+    LexicalSearchConfig,
     Params,
     ResourceRecord,
     OrchestratorResp,
     NodeTypeEnum,
 )
-from arklex.utils.utils import format_chat_history
+from arklex.utils.trace import NULL_SPAN, TraceRunName, current_trace, span, start_trace
+from arklex.utils.utils import Step, arun_steps, format_chat_history, run_steps
 from arklex.utils.model_config import MODEL
-from arklex.memory import ShortTermMemory
+from arklex.memory import ShortTermMemory, personalize_in_background
 from arklex.env.workers.story_memory_worker import StoryMemoryWorker
 
 load_dotenv()
@@ -61,6 +67,8 @@ class AgentOrg:
             "taskgraph", self.product_kwargs, self.llm_config
         )
         self.env: Env = env
+        # record the spans of every turn, a request may also ask for it with "trace"
+        self.tracing: bool = bool(self.product_kwargs.get("tracing", False))
 
         # Update planner model info now that LLMConfig is defined
         self.env.planner.set_llm_config_and_build_resource_library(self.llm_config)
@@ -72,18 +80,25 @@ class AgentOrg:
                 break
 
     def init_params(
-        self, inputs: Dict[str, Any]
+        self, inputs: Dict[str, Any], session_store: Optional[BaseSessionStore] = None
     ) -> Tuple[str, str, Params, MessageState]:
         text: str = inputs["text"]
         chat_history: List[Dict[str, str]] = inputs["chat_history"]
-        input_params: Optional[Dict[str, Any]] = inputs["parameters"]
-
-        # Create base params with defaults
-        params: Params = Params()
-
-        # Update with any provided values
-        if input_params:
-            params = Params.model_validate(input_params)
+        input_params: Optional[Dict[str, Any]] = inputs.get("parameters")
+        chat_id: Optional[str] = inputs.get("chat_id")
+
+        # A stored session takes the place of the params sent by the client
+        params: Optional[Params] = None
+        if session_store is not None and chat_id:
+            params = session_store.load(chat_id)
+        if params is None:
+            # Create base params with defaults
+            params = Params()
+            # Update with any provided values
+            if input_params:
+                params = Params.model_validate(input_params)
+            if chat_id:
+                params.metadata.chat_id = chat_id
 
         # Update specific fields
         chat_history_copy: List[Dict[str, str]] = copy.deepcopy(chat_history)
@@ -114,6 +129,15 @@ class AgentOrg:
             language=self.product_kwargs.get("language", "EN"),
             bot_type=self.product_kwargs.get("bot_type", "presalebot"),
             llm_config=self.llm_config,
+            vector_index=VectorIndexConfig(
+                **self.product_kwargs.get("vector_index", {})
+            ),
+            query_rewrite=QueryRewriteConfig(
+                **self.product_kwargs.get("query_rewrite", {})
+            ),
+            lexical_search=LexicalSearchConfig(
+                **self.product_kwargs.get("lexical_search", {})
+            ),
         )
         message_state: MessageState = MessageState(
             sys_instruct=sys_instruct,
@@ -155,8 +179,27 @@ class AgentOrg:
             params.taskgraph.node_limit[curr_node] -= 1
         return params
 
+    def _turn_trace(self, inputs: Dict[str, Any]) -> Any:
+        traced: Optional[bool] = inputs.get("trace")
+        if traced is None:
+            traced = self.tracing
+        if not traced:
+            return NULL_SPAN
+        return start_trace(TraceRunName.Turn.value)
+
+    def _response_parameters(
+        self, params: Params, session_store: Optional[BaseSessionStore]
+    ) -> Dict[str, Any]:
+        params.metadata.timing.trace = current_trace()
+        if session_store is None:
+            return params.model_dump()
+        return session_store.save(params)
+
     def handl_direct_node(
-        self, node_info: NodeInfo, params: Params
+        self,
+        node_info: NodeInfo,
+        params: Params,
+        session_store: Optional[BaseSessionStore] = None,
     ) -> Tuple[bool, Optional[OrchestratorResp], Params]:
         node_attribute: Dict[str, Any] = node_info.attributes
         if node_attribute.get("direct"):
@@ -164,7 +207,8 @@ class AgentOrg:
             if node_attribute.get("value", "").strip():
                 params = self.post_process_node(node_info, params)
                 return_response: OrchestratorResp = OrchestratorResp(
-                    answer=node_attribute["value"], parameters=params.model_dump()
+                    answer=node_attribute["value"],
+                    parameters=self._response_parameters(params, session_store),
                 )
                 # Multiple choice list
                 if (
@@ -175,7 +219,7 @@ class AgentOrg:
                 return True, return_response, params
         return False, None, params
 
-    def perform_node(
+    def _prepare_node(
         self,
         message_state: MessageState,
         node_info: NodeInfo,
@@ -220,11 +264,59 @@ class AgentOrg:
         message_state.metadata = params.metadata
         message_state.is_stream = True if stream_type is not None else False
         message_state.message_queue = message_queue
+        return node_info, message_state, params
 
+    def perform_node(
+        self,
+        message_state: MessageState,
+        node_info: NodeInfo,
+        params: Params,
+        text: str,
+        chat_history_str: str,
+        stream_type: Optional[StreamType],
+        message_queue: Optional[janus.SyncQueue],
+    ) -> Tuple[NodeInfo, MessageState, Params]:
+        node_info, message_state, params = self._prepare_node(
+            message_state,
+            node_info,
+            params,
+            text,
+            chat_history_str,
+            stream_type,
+            message_queue,
+        )
         response_state: MessageState
-        response_state, params = self.env.step(
-            node_info.resource_id, message_state, params, node_info
+        with span(TraceRunName.EnvStep.value, resource=node_info.resource_name):
+            response_state, params = self.env.step(
+                node_info.resource_id, message_state, params, node_info
+            )
+        params.memory.trajectory = response_state.trajectory
+        return node_info, response_state, params
+
+    async def aperform_node(
+        self,
+        message_state: MessageState,
+        node_info: NodeInfo,
+        params: Params,
+        text: str,
+        chat_history_str: str,
+        stream_type: Optional[StreamType],
+        message_queue: Optional[janus.SyncQueue],
+    ) -> Tuple[NodeInfo, MessageState, Params]:
+        node_info, message_state, params = self._prepare_node(
+            message_state,
+            node_info,
+            params,
+            text,
+            chat_history_str,
+            stream_type,
+            message_queue,
         )
+        response_state: MessageState
+        with span(TraceRunName.EnvStep.value, resource=node_info.resource_name):
+            response_state, params = await self.env.astep(
+                node_info.resource_id, message_state, params, node_info
+            )
         params.memory.trajectory = response_state.trajectory
         return node_info, response_state, params
 
@@ -255,29 +347,56 @@ class AgentOrg:
 
         return node_info, params
 
-    def _get_response(
-        self,
-        inputs: Dict[str, Any],
-        stream_type: Optional[StreamType] = None,
-        message_queue: Optional[janus.SyncQueue] = None,
-    ) -> OrchestratorResp:
-        text: str
-        chat_history_str: str
-        params: Params
-        message_state: MessageState
-        text, chat_history_str, params, message_state = self.init_params(inputs)
-        ##### TaskGraph Chain
-        taskgraph_inputs: Dict[str, Any] = {
-            "text": text,
-            "chat_history_str": chat_history_str,
-            "parameters": params,
-            "allow_global_intent_switch": True,
-        }
+    def _create_short_term_memory(
+        self, params: Params, chat_history_str: str
+    ) -> ShortTermMemory:
+        return ShortTermMemory(
+            params.memory.trajectory, chat_history_str, llm_config=self.llm_config
+        )
 
+    def _personalize_in_background(
+        self,
+        params: Params,
+        chat_history_str: str,
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> None:
+        # params are serialized into the response concurrently, so the intents
+        # are set on shallow copies of the records, which are otherwise only read
+        offset: int = max(len(params.memory.trajectory) - 5, 0)
         stm = ShortTermMemory(
-            params.memory.trajectory, chat_history_str, llm_config=self.llm_config
+            [
+                [record.model_copy() for record in turn]
+                for turn in params.memory.trajectory[offset:]
+            ],
+            chat_history_str,
+            llm_config=self.llm_config,
         )
-        asyncio.run(stm.personalize())
+        chat_id: str = params.metadata.chat_id
+
+        def store_intents(stm: ShortTermMemory) -> None:
+            # the stored session gets them too, not only this process's cache
+            session_store.set_personalized_intents(
+                chat_id,
+                {
+                    (offset + turn_idx, record_idx): record.personalized_intent
+                    for turn_idx, turn in enumerate(stm.trajectory)
+                    for record_idx, record in enumerate(turn)
+                    if record.personalized_intent
+                },
+            )
+
+        on_done: Optional[Callable[[ShortTermMemory], None]] = (
+            store_intents if session_store is not None and chat_id else None
+        )
+        personalize_in_background(stm, on_done)
+
+    def _retrieve_memory(
+        self,
+        stm: ShortTermMemory,
+        text: str,
+        params: Params,
+        message_state: MessageState,
+    ) -> Tuple[bool, MessageState]:
         message_state.trajectory = params.memory.trajectory
 
         # Log personalized intents from trajectory
@@ -309,9 +428,114 @@ class AgentOrg:
 
         if found_records:
             message_state.relevant_records = relevant_records
-        taskgraph_chain = RunnableLambda(self.task_graph.get_node) | RunnableLambda(
-            self.task_graph.postprocess_node
+        return found_intent, message_state
+
+    def _planner_node_info(self, params: Params) -> NodeInfo:
+        return NodeInfo(
+            node_id=None,
+            type="",
+            resource_id="planner",
+            resource_name="planner",
+            can_skipped=False,
+            is_leaf=len(
+                list(self.task_graph.graph.successors(params.taskgraph.curr_node))
+            )
+            == 0,
+            attributes={"value": "", "direct": False},
+        )
+
+    def _taskgraph_chain(self) -> Any:
+        return RunnableLambda(
+            self.task_graph.get_node, afunc=self.task_graph.aget_node
+        ) | RunnableLambda(self.task_graph.postprocess_node)
+
+    def _should_stop(
+        self, node_info: NodeInfo, params: Params, msg_counter: int
+    ) -> Tuple[bool, int]:
+        # If the current node is not complete, then no need to continue to the next node
+        node_status = params.taskgraph.node_status
+        cur_node_id = params.taskgraph.curr_node
+        status = node_status.get(cur_node_id, StatusEnum.COMPLETE)
+        if status == StatusEnum.INCOMPLETE:
+            return True, msg_counter
+
+        # Check current node attributes
+        if node_info.resource_name in INFO_WORKERS:
+            msg_counter += 1
+        # If the counter of message worker or counter of planner or counter of ragmsg worker == 1, break the loop
+        if msg_counter == 1:
+            return True, msg_counter
+        if node_info.is_leaf is True:
+            return True, msg_counter
+        return False, msg_counter
+
+    def _finalize_response(
+        self,
+        message_state: MessageState,
+        params: Params,
+        stream_type: Optional[StreamType],
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> OrchestratorResp:
+        if not message_state.response:
+            logger.info("No response, do context generation")
+            with span(TraceRunName.Generation.value, stream=bool(stream_type)):
+                if not stream_type:
+                    message_state = ToolGenerator.context_generate(message_state)
+                else:
+                    message_state = ToolGenerator.stream_context_generate(message_state)
+
+        if self.story_memory_worker:
+            try:
+                self.story_memory_worker.add_story(message_state)
+            except Exception as err:
+                logger.error(f"StoryMemoryWorker add_story failed: {err}")
+
+        return OrchestratorResp(
+            answer=message_state.response,
+            parameters=self._response_parameters(params, session_store),
+            human_in_the_loop=params.metadata.hitl,
+        )
+
+    def _response_steps(
+        self,
+        inputs: Dict[str, Any],
+        stream_type: Optional[StreamType] = None,
+        message_queue: Optional[janus.SyncQueue] = None,
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> Generator[Step, Any, OrchestratorResp]:
+        """The turn, shared by _get_response and _aget_response.
+
+        The blocking calls are yielded as steps, see run_steps: the sync turn
+        makes them in place, the async one awaits them, moving the memory
+        retrieval and the final response (embedding the query, reading and
+        writing the story store) to worker threads.
+        """
+        text: str
+        chat_history_str: str
+        params: Params
+        message_state: MessageState
+        text, chat_history_str, params, message_state = self.init_params(
+            inputs, session_store
         )
+        ##### TaskGraph Chain
+        taskgraph_inputs: Dict[str, Any] = {
+            "text": text,
+            "chat_history_str": chat_history_str,
+            "parameters": params,
+            "allow_global_intent_switch": True,
+        }
+
+        stm = self._create_short_term_memory(params, chat_history_str)
+        # intents generated in the background after earlier turns, no LLM call here
+        with span(TraceRunName.Personalize.value):
+            stm.apply_personalized_intents()
+        with span(TraceRunName.MemoryRetrieval.value):
+            found_intent, message_state = yield (
+                self._retrieve_memory,
+                functools.partial(asyncio.to_thread, self._retrieve_memory),
+                (stm, text, params, message_state),
+            )
+        taskgraph_chain = self._taskgraph_chain()
 
         # TODO: when planner is re-implemented, execute/break the loop based on whether the planner should be used (bot config).
         msg_counter = 0
@@ -322,22 +546,14 @@ class AgentOrg:
             taskgraph_start_time = time.time()
             if found_intent:
                 taskgraph_inputs["allow_global_intent_switch"] = False
-                node_info = NodeInfo(
-                    node_id=None,
-                    type="",
-                    resource_id="planner",
-                    resource_name="planner",
-                    can_skipped=False,
-                    is_leaf=len(
-                        list(
-                            self.task_graph.graph.successors(params.taskgraph.curr_node)
-                        )
-                    )
-                    == 0,
-                    attributes={"value": "", "direct": False},
-                )
+                node_info = self._planner_node_info(params)
             else:
-                node_info, params = taskgraph_chain.invoke(taskgraph_inputs)
+                with span(TraceRunName.TaskGraph.value):
+                    node_info, params = yield (
+                        taskgraph_chain.invoke,
+                        taskgraph_chain.ainvoke,
+                        (taskgraph_inputs,),
+                    )
             taskgraph_inputs["allow_global_intent_switch"] = False
             params.metadata.timing.taskgraph = time.time() - taskgraph_start_time
             # Check if current node can be skipped
@@ -349,57 +565,62 @@ class AgentOrg:
 
             # handle direct node
             is_direct_node, direct_response, params = self.handl_direct_node(
-                node_info, params
+                node_info, params, session_store
             )
             if is_direct_node:
+                self._personalize_in_background(params, chat_history_str, session_store)
                 return direct_response
             # perform node
 
-            node_info, message_state, params = self.perform_node(
-                message_state,
-                node_info,
-                params,
-                text,
-                chat_history_str,
-                stream_type,
-                message_queue,
+            node_info, message_state, params = yield (
+                self.perform_node,
+                self.aperform_node,
+                (
+                    message_state,
+                    node_info,
+                    params,
+                    text,
+                    chat_history_str,
+                    stream_type,
+                    message_queue,
+                ),
             )
             params = self.post_process_node(node_info, params)
 
             n_node_performed += 1
-            # If the current node is not complete, then no need to continue to the next node
-            node_status = params.taskgraph.node_status
-            cur_node_id = params.taskgraph.curr_node
-            status = node_status.get(cur_node_id, StatusEnum.COMPLETE)
-            if status == StatusEnum.INCOMPLETE:
+            stop, msg_counter = self._should_stop(node_info, params, msg_counter)
+            if stop:
                 break
 
-            # Check current node attributes
-            if node_info.resource_name in INFO_WORKERS:
-                msg_counter += 1
-            # If the counter of message worker or counter of planner or counter of ragmsg worker == 1, break the loop
-            if msg_counter == 1:
-                break
-            if node_info.is_leaf is True:
-                break
-
-        if not message_state.response:
-            logger.info("No response, do context generation")
-            if not stream_type:
-                message_state = ToolGenerator.context_generate(message_state)
-            else:
-                message_state = ToolGenerator.stream_context_generate(message_state)
+        orchestrator_response = yield (
+            self._finalize_response,
+            functools.partial(asyncio.to_thread, self._finalize_response),
+            (message_state, params, stream_type, session_store),
+        )
+        # personalization is off the critical path, the next turn reads the results
+        self._personalize_in_background(params, chat_history_str, session_store)
+        return orchestrator_response
 
-        if self.story_memory_worker:
-            try:
-                self.story_memory_worker.add_story(message_state)
-            except Exception as err:
-                logger.error(f"StoryMemoryWorker add_story failed: {err}")
+    def _get_response(
+        self,
+        inputs: Dict[str, Any],
+        stream_type: Optional[StreamType] = None,
+        message_queue: Optional[janus.SyncQueue] = None,
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> OrchestratorResp:
+        return run_steps(
+            self._response_steps(inputs, stream_type, message_queue, session_store)
+        )
 
-        return OrchestratorResp(
-            answer=message_state.response,
-            parameters=params.model_dump(),
-            human_in_the_loop=params.metadata.hitl,
+    async def _aget_response(
+        self,
+        inputs: Dict[str, Any],
+        stream_type: Optional[StreamType] = None,
+        message_queue: Optional[janus.SyncQueue] = None,
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> OrchestratorResp:
+        return await arun_steps(
+            self._response_steps(inputs, stream_type, message_queue, session_store)
         )
 
     def get_response(
@@ -407,6 +628,29 @@ class AgentOrg:
         inputs: Dict[str, Any],
         stream_type: Optional[StreamType] = None,
         message_queue: Optional[janus.SyncQueue] = None,
+        session_store: Optional[BaseSessionStore] = None,
+    ) -> Dict[str, Any]:
+        with self._turn_trace(inputs):
+            orchestrator_response = self._get_response(
+                inputs, stream_type, message_queue, session_store
+            )
+        return orchestrator_response.model_dump()
+
+    async def aget_response(
+        self,
+        inputs: Dict[str, Any],
+        stream_type: Optional[StreamType] = None,
+        message_queue: Optional[janus.SyncQueue] = None,
+        session_store: Optional[BaseSessionStore] = None,
     ) -> Dict[str, Any]:
-        orchestrator_response = self._get_response(inputs, stream_type, message_queue)
+        """Async counterpart of get_response.
+
+        NLU, slot filling, tools and workers are awaited (blocking resources are
+        moved to worker threads), so a single event loop can serve many
+        conversations at once.
+        """
+        with self._turn_trace(inputs):
+            orchestrator_response = await self._aget_response(
+                inputs, stream_type, message_queue, session_store
+            )
         return orchestrator_response.model_dump()
@@ -0,0 +1,164 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from arklex.env.env import BaseResourceInitializer, Env
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.utils.model_config import MODEL
+
+logger = logging.getLogger(__name__)
+
+
+class OrchestratorRegistry:
+    """Process-wide cache of compiled AgentOrg engines.
+
+    Building an AgentOrg parses the taskgraph, rebuilds the networkx graph and
+    (with the ReAct planner enabled) embeds every tool and worker into a new
+    FAISS store. None of that depends on the conversation, so each
+    (taskgraph, model, resources) combination is compiled once and the same
+    engine then serves every conversation; only the per-conversation Params
+    travel with each turn.
+    """
+
+    def __init__(self, max_size: int = 32) -> None:
+        self.max_size: int = max_size
+        self._engines: "OrderedDict[str, AgentOrg]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def make_key(
+        config: Union[str, Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        workers: Optional[List[Dict[str, Any]]] = None,
+        slotsfillapi: Optional[str] = None,
+        planner_enabled: bool = False,
+        resource_inizializer: Optional[BaseResourceInitializer] = None,
+    ) -> str:
+        if isinstance(config, dict):
+            taskgraph: Any = config
+        else:
+            # a taskgraph file is identified by its path and mtime, so an
+            # edited taskgraph is recompiled without reading it on every turn
+            path: str = os.path.abspath(config)
+            taskgraph = f"{path}:{os.path.getmtime(path)}"
+        payload: Dict[str, Any] = {
+            "taskgraph": taskgraph,
+            "default_model": MODEL,
+            "tools": tools,
+            "workers": workers,
+            "slotsfillapi": slotsfillapi,
+            "planner_enabled": planner_enabled,
+            "resource_inizializer": type(resource_inizializer).__name__,
+        }
+        serialized: str = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        config: Union[str, Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        workers: Optional[List[Dict[str, Any]]] = None,
+        slotsfillapi: Optional[str] = None,
+        planner_enabled: bool = False,
+        resource_inizializer: Optional[BaseResourceInitializer] = None,
+    ) -> AgentOrg:
+        """Return the engine for the given taskgraph, compiling it on first use.
+
+        Args:
+            config: Path to a taskgraph.json or the already loaded taskgraph dict.
+            tools: Tools for the Env; defaults to the ones declared in the taskgraph.
+            workers: Workers for the Env; defaults to the ones declared in the taskgraph.
+            slotsfillapi: Slot filling endpoint; defaults to the taskgraph value.
+            planner_enabled: Whether the Env uses the ReAct planner.
+            resource_inizializer: Custom resource initializer for the Env.
+        """
+        key: str = self.make_key(
+            config,
+            tools,
+            workers,
+            slotsfillapi,
+            planner_enabled,
+            resource_inizializer,
+        )
+
+        engine: Optional[AgentOrg] = self._lookup(key)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            build_lock: threading.Lock = self._build_locks.setdefault(
+                key, threading.Lock()
+            )
+        # only one thread compiles a given engine, the others wait for it
+        with build_lock:
+            engine = self._lookup(key)
+            if engine is not None:
+                return engine
+            logger.info(f"Compiling orchestrator engine {key[:12]}")
+            try:
+                if isinstance(config, dict):
+                    # the engine keeps references into the taskgraph, so it
+                    # must not share it with the caller
+                    product_kwargs: Dict[str, Any] = copy.deepcopy(config)
+                else:
+                    with open(config) as f:
+                        product_kwargs = json.load(f)
+                if tools is None:
+                    tools = product_kwargs.get("tools", [])
+                if workers is None:
+                    workers = product_kwargs.get("workers", [])
+                if slotsfillapi is None:
+                    slotsfillapi = product_kwargs.get("slotfillapi", "")
+                env: Env = Env(
+                    tools=tools,
+                    workers=workers,
+                    slotsfillapi=slotsfillapi,
+                    resource_inizializer=resource_inizializer,
+                    planner_enabled=planner_enabled,
+                )
+                engine = AgentOrg(config=product_kwargs, env=env)
+            except Exception:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+                raise
+            with self._lock:
+                self.misses += 1
+                self._engines[key] = engine
+                self._build_locks.pop(key, None)
+                while len(self._engines) > self.max_size:
+                    evicted_key, _ = self._engines.popitem(last=False)
+                    logger.info(f"Evicted orchestrator engine {evicted_key[:12]}")
+        return engine
+
+    def _lookup(self, key: str) -> Optional[AgentOrg]:
+        with self._lock:
+            engine: Optional[AgentOrg] = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                self.hits += 1
+            return engine
+
+    def clear(self) -> None:
+        with self._lock:
+            self._engines.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._engines),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+orchestrator_registry: OrchestratorRegistry = OrchestratorRegistry()
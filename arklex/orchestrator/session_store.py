@@ -0,0 +1,404 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from arklex.utils.graph_state import Params, PathNode, ResourceRecord
+
+logger = logging.getLogger(__name__)
+
+# ShortTermMemory reads the last five turns, they are never compacted
+MIN_COMPACTION_WINDOW: int = 5
+SUMMARY_OUTPUT_CHARS: int = 500
+
+
+def summarize_turn(turn: List[ResourceRecord]) -> ResourceRecord:
+    """One record standing for a whole turn, without the tool inputs and steps."""
+    intents: List[str] = [r.intent for r in turn if r.intent]
+    personalized: List[str] = [
+        r.personalized_intent for r in turn if r.personalized_intent
+    ]
+    output: str = "\n".join(r.output for r in turn if r.output)
+    return ResourceRecord(
+        info={
+            "id": "summary",
+            "name": "summary",
+            "compacted": True,
+            "resources": [r.info.get("name", "") for r in turn],
+        },
+        intent=intents[0] if intents else "",
+        output=output[:SUMMARY_OUTPUT_CHARS],
+        personalized_intent=personalized[0] if personalized else "",
+    )
+
+
+def is_summary(turn: List[ResourceRecord]) -> bool:
+    return len(turn) == 1 and bool(turn[0].info.get("compacted"))
+
+
+def fill_personalized_intents(
+    params: Params, intents: Dict[Tuple[int, int], str]
+) -> int:
+    """Set the intents keyed by (turn, record) position on the records still without one.
+
+    Turns compacted since are skipped. Returns the number of records set.
+    """
+    trajectory: List[List[ResourceRecord]] = params.memory.trajectory
+    filled: int = 0
+    for (turn_idx, record_idx), intent in intents.items():
+        if turn_idx >= len(trajectory) or is_summary(trajectory[turn_idx]):
+            continue
+        turn: List[ResourceRecord] = trajectory[turn_idx]
+        if record_idx < len(turn) and not turn[record_idx].personalized_intent:
+            turn[record_idx].personalized_intent = intent
+            filled += 1
+    return filled
+
+
+def compact_trajectory(trajectory: List[List[ResourceRecord]], window: int) -> int:
+    """Replace the turns older than the last window ones by summaries.
+
+    Turns keep their position, so the trajectory still has one entry per turn
+    of the conversation. Returns the number of turns compacted.
+    """
+    if window < MIN_COMPACTION_WINDOW:
+        raise ValueError(
+            f"compaction window must keep at least {MIN_COMPACTION_WINDOW} turns"
+        )
+    compacted: int = 0
+    for i in range(len(trajectory) - window - 1, -1, -1):
+        if is_summary(trajectory[i]):
+            # older turns were compacted by earlier saves
+            break
+        if trajectory[i]:
+            trajectory[i] = [summarize_turn(trajectory[i])]
+            compacted += 1
+    return compacted
+
+
+class SessionMarks:
+    """What a saved session looked like, to tell which entries changed since.
+
+    Path nodes and the personalized intents of past records are updated in
+    place by later turns, so those are marked by value. The function calling
+    trajectory is only ever appended to and is marked by its length.
+    """
+
+    def __init__(
+        self,
+        path: List[List[Any]],
+        trajectory: List[List[Any]],
+        function_calls: int,
+    ):
+        self.path: List[List[Any]] = path
+        self.trajectory: List[List[Any]] = trajectory
+        self.function_calls: int = function_calls
+
+    @staticmethod
+    def path_mark(node: PathNode) -> List[Any]:
+        return [
+            node.node_id,
+            node.is_skipped,
+            node.in_flow_stack,
+            node.nested_graph_node_value,
+            node.nested_graph_leaf_jump,
+            node.global_intent,
+        ]
+
+    @staticmethod
+    def turn_mark(turn: List[ResourceRecord]) -> List[Any]:
+        return [[bool(r.info.get("compacted")), r.personalized_intent] for r in turn]
+
+    @classmethod
+    def of(cls, params: Params) -> "SessionMarks":
+        return cls(
+            path=[cls.path_mark(node) for node in params.taskgraph.path],
+            trajectory=[cls.turn_mark(turn) for turn in params.memory.trajectory],
+            function_calls=len(params.memory.function_calling_trajectory),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "trajectory": self.trajectory,
+            "function_calls": self.function_calls,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionMarks":
+        return cls(data["path"], data["trajectory"], data["function_calls"])
+
+
+def _list_delta(
+    previous: List[Any], current: List[Any], items: List[Any], dump: Callable
+) -> Dict[str, Any]:
+    """Entries appended since previous, and earlier entries changed in place."""
+    offset: int = min(len(previous), len(current))
+    return {
+        "offset": offset,
+        "updates": {
+            str(i): dump(items[i]) for i in range(offset) if previous[i] != current[i]
+        },
+        "items": [dump(item) for item in items[offset:]],
+    }
+
+
+def _apply_list_delta(items: List[Any], delta: Dict[str, Any]) -> List[Any]:
+    items = items[: delta["offset"]]
+    for i, item in delta["updates"].items():
+        items[int(i)] = item
+    return items + delta["items"]
+
+
+def _dump_turn(turn: List[ResourceRecord]) -> List[Dict[str, Any]]:
+    return [record.model_dump() for record in turn]
+
+
+def params_delta(
+    params: Params, previous: Optional[SessionMarks], marks: SessionMarks
+) -> Dict[str, Any]:
+    """The parameters of a turn, with only the list entries changed since previous.
+
+    The lists growing with the conversation are sent as the entries appended
+    since the previous save and the earlier ones updated in place, see
+    apply_delta. Without previous marks the whole lists are sent.
+    """
+    if previous is None:
+        previous = SessionMarks([], [], 0)
+    taskgraph: Dict[str, Any] = params.taskgraph.model_dump(exclude={"path"})
+    taskgraph["path"] = _list_delta(
+        previous.path, marks.path, params.taskgraph.path, PathNode.model_dump
+    )
+    calls: List[Dict[str, Any]] = params.memory.function_calling_trajectory
+    calls_offset: int = min(previous.function_calls, marks.function_calls)
+    return {
+        "delta": True,
+        "metadata": params.metadata.model_dump(),
+        "taskgraph": taskgraph,
+        "memory": {
+            "trajectory": _list_delta(
+                previous.trajectory,
+                marks.trajectory,
+                params.memory.trajectory,
+                _dump_turn,
+            ),
+            # only ever appended to
+            "function_calling_trajectory": {
+                "offset": calls_offset,
+                "updates": {},
+                "items": calls[calls_offset:],
+            },
+        },
+    }
+
+
+def apply_delta(parameters: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Full parameters from the previous ones and the delta of the next turn."""
+    taskgraph: Dict[str, Any] = dict(delta["taskgraph"])
+    taskgraph["path"] = _apply_list_delta(
+        parameters.get("taskgraph", {}).get("path", []), taskgraph["path"]
+    )
+    previous_memory: Dict[str, Any] = parameters.get("memory", {})
+    memory: Dict[str, Any] = {
+        key: _apply_list_delta(previous_memory.get(key, []), delta["memory"][key])
+        for key in ["trajectory", "function_calling_trajectory"]
+    }
+    return {"metadata": delta["metadata"], "taskgraph": taskgraph, "memory": memory}
+
+
+class BaseSessionStore:
+    """Params of the conversations kept on the server, keyed by chat_id.
+
+    A client then only sends its chat_id with every turn, and gets back the
+    delta of the parameters instead of the whole conversation state.
+    """
+
+    def __init__(self, compaction_window: Optional[int] = None) -> None:
+        if compaction_window is not None and compaction_window < MIN_COMPACTION_WINDOW:
+            raise ValueError(
+                f"compaction window must keep at least {MIN_COMPACTION_WINDOW} turns"
+            )
+        self.compaction_window: Optional[int] = compaction_window
+
+    def load(self, chat_id: str) -> Optional[Params]:
+        raise NotImplementedError
+
+    def load_marks(self, chat_id: str) -> Optional[SessionMarks]:
+        raise NotImplementedError
+
+    def write(self, chat_id: str, params: Params, marks: SessionMarks) -> None:
+        raise NotImplementedError
+
+    def delete(self, chat_id: str) -> None:
+        raise NotImplementedError
+
+    def set_personalized_intents(
+        self, chat_id: str, intents: Dict[Tuple[int, int], str]
+    ) -> None:
+        """Add the personalized intents generated after a turn was saved.
+
+        The marks are left as they are, so the next save sends the records
+        updated here in its delta.
+        """
+        raise NotImplementedError
+
+    def save(self, params: Params) -> Dict[str, Any]:
+        """Store the params after a turn and return their delta since the last save."""
+        if self.compaction_window is not None:
+            compact_trajectory(params.memory.trajectory, self.compaction_window)
+        chat_id: str = params.metadata.chat_id
+        marks: SessionMarks = SessionMarks.of(params)
+        delta: Dict[str, Any] = params_delta(params, self.load_marks(chat_id), marks)
+        self.write(chat_id, params, marks)
+        return delta
+
+
+class InMemorySessionStore(BaseSessionStore):
+    """Sessions of this process, the least recently used evicted past max_size.
+
+    Params are kept as objects, so a turn neither validates nor dumps the
+    conversation state. They are copied in and out: a turn changes its own
+    copy, and the stored session only changes when the turn is saved, so a
+    turn that fails, or one running concurrently for the same chat, leaves
+    it as it was.
+    """
+
+    def __init__(
+        self, max_size: int = 10000, compaction_window: Optional[int] = None
+    ) -> None:
+        super().__init__(compaction_window)
+        self.max_size: int = max_size
+        self._sessions: "OrderedDict[str, Params]" = OrderedDict()
+        self._marks: Dict[str, SessionMarks] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def load(self, chat_id: str) -> Optional[Params]:
+        with self._lock:
+            params: Optional[Params] = self._sessions.get(chat_id)
+            if params is None:
+                self.misses += 1
+            else:
+                self._sessions.move_to_end(chat_id)
+                self.hits += 1
+        return params.model_copy(deep=True) if params is not None else None
+
+    def load_marks(self, chat_id: str) -> Optional[SessionMarks]:
+        with self._lock:
+            return self._marks.get(chat_id)
+
+    def write(self, chat_id: str, params: Params, marks: SessionMarks) -> None:
+        params = params.model_copy(deep=True)
+        with self._lock:
+            self._sessions[chat_id] = params
+            self._sessions.move_to_end(chat_id)
+            self._marks[chat_id] = marks
+            while len(self._sessions) > self.max_size:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._marks.pop(evicted, None)
+                logger.info(f"Evicted session {evicted}")
+
+    def delete(self, chat_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+            self._marks.pop(chat_id, None)
+
+    def set_personalized_intents(
+        self, chat_id: str, intents: Dict[Tuple[int, int], str]
+    ) -> None:
+        with self._lock:
+            params: Optional[Params] = self._sessions.get(chat_id)
+            if params is not None:
+                fill_personalized_intents(params, intents)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._marks.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SQLiteSessionStore(BaseSessionStore):
+    """Sessions persisted to an SQLite file, shared by processes on one host."""
+
+    def __init__(self, path: str, compaction_window: Optional[int] = None) -> None:
+        super().__init__(compaction_window)
+        self.path: str = path
+        directory: str = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock: threading.Lock = threading.Lock()
+        self._conn: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "chat_id TEXT PRIMARY KEY, params TEXT NOT NULL, "
+                "marks TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _select(self, column: str, chat_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM sessions WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load(self, chat_id: str) -> Optional[Params]:
+        data: Optional[str] = self._select("params", chat_id)
+        return Params.model_validate_json(data) if data is not None else None
+
+    def load_marks(self, chat_id: str) -> Optional[SessionMarks]:
+        data: Optional[str] = self._select("marks", chat_id)
+        return SessionMarks.from_dict(json.loads(data)) if data is not None else None
+
+    def write(self, chat_id: str, params: Params, marks: SessionMarks) -> None:
+        row = (
+            chat_id,
+            params.model_dump_json(),
+            json.dumps(marks.to_dict()),
+            time.time(),
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", row
+            )
+
+    def delete(self, chat_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+
+    def set_personalized_intents(
+        self, chat_id: str, intents: Dict[Tuple[int, int], str]
+    ) -> None:
+        with self._lock, self._conn:
+            # a turn of another process saving meanwhile waits for this update
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT params FROM sessions WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+            if row is None:
+                return
+            params: Params = Params.model_validate_json(row[0])
+            if fill_personalized_intents(params, intents):
+                self._conn.execute(
+                    "UPDATE sessions SET params = ? WHERE chat_id = ?",
+                    (params.model_dump_json(), chat_id),
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
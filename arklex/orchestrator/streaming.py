@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import janus
+import numpy as np
+
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.session_store import BaseSessionStore
+from arklex.types import EventType, StreamType
+
+logger = logging.getLogger(__name__)
+
+# events waiting for a slow client before the generation itself is paused
+DEFAULT_MAX_QUEUED_EVENTS: int = 64
+
+
+class StreamCancelled(BaseException):
+    """Raised in the orchestrator thread once nobody reads the stream anymore.
+
+    A BaseException like asyncio.CancelledError, so the except Exception
+    around workers and tools does not swallow it and the turn really stops.
+    """
+
+
+class StreamQueue:
+    """Sync side of a bounded stream, handed to the orchestrator as message_queue.
+
+    Workers put their chunks from the orchestrator thread. When the client
+    reads slower than the model writes, the queue fills up and put blocks, so
+    the generation waits for the client. Once the stream is cancelled, put
+    raises StreamCancelled, which unwinds the orchestrator and stops the model.
+    """
+
+    def __init__(
+        self, queue: "janus.Queue[Dict[str, Any]]", poll_interval: float = 0.1
+    ):
+        self.queue: "janus.Queue[Dict[str, Any]]" = queue
+        self.poll_interval: float = poll_interval
+        self._cancelled: threading.Event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        while True:
+            if self._cancelled.is_set():
+                raise StreamCancelled()
+            try:
+                self.queue.sync_q.put(event, timeout=self.poll_interval)
+                return
+            except janus.SyncQueueFull:
+                continue
+
+
+class StreamMetrics:
+    """Process-wide time to first token, total time and outcome of the streams."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._first_token: Deque[float] = deque(maxlen=window)
+        self._total: Deque[float] = deque(maxlen=window)
+        self.completed: int = 0
+        self.cancelled: int = 0
+        self.errors: int = 0
+
+    def record(self, first_token: Optional[float], total: float, outcome: str) -> None:
+        with self._lock:
+            if first_token is not None:
+                self._first_token.append(first_token)
+            self._total.append(total)
+            if outcome == "completed":
+                self.completed += 1
+            elif outcome == "cancelled":
+                self.cancelled += 1
+            else:
+                self.errors += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._first_token.clear()
+            self._total.clear()
+            self.completed = 0
+            self.cancelled = 0
+            self.errors = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "errors": self.errors,
+            }
+            for name, values in [
+                ("first_token", self._first_token),
+                ("total", self._total),
+            ]:
+                if values:
+                    p50, p95 = np.percentile(list(values), [50, 95])
+                    stats[f"{name}_p50"] = float(p50)
+                    stats[f"{name}_p95"] = float(p95)
+            return stats
+
+
+stream_metrics: StreamMetrics = StreamMetrics()
+
+
+def _run_orchestrator(
+    orchestrator: AgentOrg,
+    inputs: Dict[str, Any],
+    stream_type: StreamType,
+    stream: StreamQueue,
+    session_store: Optional[BaseSessionStore],
+) -> None:
+    try:
+        result: Dict[str, Any] = orchestrator.get_response(
+            inputs, stream_type, stream, session_store=session_store
+        )
+        stream.put({"event": EventType.LAST.value, **result})
+    except StreamCancelled:
+        logger.info("Stream cancelled, orchestrator stopped")
+    except Exception as err:
+        logger.exception("Streaming orchestrator failed")
+        try:
+            stream.put({"event": EventType.ERROR.value, "message": str(err)})
+        except StreamCancelled:
+            pass
+
+
+async def stream_response(
+    orchestrator: AgentOrg,
+    inputs: Dict[str, Any],
+    stream_type: StreamType = StreamType.TEXT,
+    session_store: Optional[BaseSessionStore] = None,
+    max_queued: int = DEFAULT_MAX_QUEUED_EVENTS,
+    metrics: StreamMetrics = stream_metrics,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Events of one turn as the orchestrator produces them.
+
+    The orchestrator runs in a worker thread and its chunk events are
+    forwarded as they arrive. The turn ends with a last event carrying the
+    answer, the parameters and the timing metrics of the stream, or with an
+    error event. Closing the iterator early, as a disconnecting client does,
+    cancels the turn.
+    """
+    queue: "janus.Queue[Dict[str, Any]]" = janus.Queue(maxsize=max_queued)
+    stream: StreamQueue = StreamQueue(queue)
+    start: float = time.perf_counter()
+    first_token: Optional[float] = None
+    outcome: str = "cancelled"
+    worker: asyncio.Future = asyncio.ensure_future(
+        asyncio.to_thread(
+            _run_orchestrator, orchestrator, inputs, stream_type, stream, session_store
+        )
+    )
+    try:
+        while True:
+            event: Dict[str, Any] = await queue.async_q.get()
+            if first_token is None and event["event"] in [
+                EventType.CHUNK.value,
+                EventType.LAST.value,
+            ]:
+                first_token = time.perf_counter() - start
+            if event["event"] == EventType.LAST.value:
+                outcome = "completed"
+                event["metrics"] = {
+                    "first_token": first_token,
+                    "total": time.perf_counter() - start,
+                }
+            elif event["event"] == EventType.ERROR.value:
+                outcome = "error"
+            yield event
+            if outcome != "cancelled":
+                break
+    finally:
+        # a no-op once the turn is over, otherwise the next put stops it
+        stream.cancel()
+        total: float = time.perf_counter() - start
+        metrics.record(first_token, total, outcome)
+        logger.info(
+            f"Stream {outcome}, first token after {first_token}s, total {total:.3f}s"
+        )
+        if worker.done():
+            queue.close()
+        else:
+            worker.add_done_callback(lambda _: queue.close())
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """An event in the text/event-stream format."""
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -1,18 +1,43 @@
+import asyncio
+import contextvars
 import copy
 import logging
 import collections
-from typing import Tuple, Dict, List, Any, Optional, Union, DefaultDict
+import threading
+import uuid
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple, Dict, List, Any, Optional, Union, DefaultDict, Generator
 
 import networkx as nx
 import numpy as np
 
 from arklex.env.nested_graph.nested_graph import NestedGraph
-from arklex.utils.utils import normalize, str_similarity
+from arklex.utils.utils import Step, arun_steps, normalize, run_steps, str_similarity
 from arklex.utils.graph_state import NodeInfo, Params, PathNode, StatusEnum, LLMConfig
 from arklex.orchestrator.NLU.nlu import NLU, SlotFilling
+from arklex.orchestrator.NLU.api import nlu_api
+from arklex.orchestrator.NLU.intent_classifier import EmbeddingIntentClassifier
+from arklex.utils.trace import TraceRunName, span
 
 logger = logging.getLogger(__name__)
 
+# threads of a bot predicting global intents alongside the local ones
+DEFAULT_SPECULATIVE_NLU_WORKERS: int = 8
+
+
+def _drop_speculation(speculation: Union[Future, "asyncio.Future[str]"]) -> None:
+    """Cancel a speculative prediction that lost, or ignore its result.
+
+    A task is cancelled even while it waits on the LLM. A prediction already
+    running in a thread cannot be interrupted: in sync mode it finishes
+    unobserved, its LLM call still made and its thread still taken.
+    """
+    if speculation.cancel() or not speculation.done() or speculation.cancelled():
+        return
+    # retrieved, so an error of the discarded call is not reported as unhandled
+    speculation.exception()
+
 
 class TaskGraphBase:
     def __init__(self, name: str, product_kwargs: Dict[str, Any]) -> None:
@@ -66,6 +91,41 @@ class TaskGraph(TaskGraphBase):
         self.slotfillapi: SlotFilling = SlotFilling(
             self.product_kwargs.get("slotfillapi")
         )
+        # embeds the intent examples once here, off unless enabled in the config
+        self.intent_classifier: EmbeddingIntentClassifier = (
+            EmbeddingIntentClassifier.from_config(
+                self.graph,
+                self.llm_config,
+                self.product_kwargs.get("intent_classifier", {}),
+                unsure_intent=self.unsure_intent["intent"],
+            )
+        )
+        # predict the global intent alongside the local one instead of after it,
+        # on a thread in sync mode (not cancelled if the local intent matches) and
+        # on a cancelled task in async mode
+        self.speculative_nlu: bool = bool(
+            self.product_kwargs.get("speculative_nlu", False)
+        )
+        # only graphs that speculate get the threads, see speculate_global_intent
+        self._speculation_executor: Optional[ThreadPoolExecutor] = None
+        self._speculation_slots: Optional[threading.BoundedSemaphore] = None
+        if self.speculative_nlu:
+            speculation_workers: int = int(
+                self.product_kwargs.get(
+                    "speculative_nlu_workers", DEFAULT_SPECULATIVE_NLU_WORKERS
+                )
+            )
+            # threads are started on the first speculation only
+            self._speculation_executor = ThreadPoolExecutor(
+                max_workers=speculation_workers, thread_name_prefix="speculative-nlu"
+            )
+            # a turn finding every thread taken predicts sequentially instead of queueing
+            self._speculation_slots = threading.BoundedSemaphore(speculation_workers)
+            # engines are built and evicted by the registry, their threads go with them
+            weakref.finalize(self, self._speculation_executor.shutdown, wait=False)
+        # the NLU prompt cache is shared by every task graph of the process
+        self._nlu_prompt_id: str = uuid.uuid4().hex
+        self.compile_nlu_prompts()
 
     def create_graph(self) -> None:
         nodes: List[Dict[str, Any]] = self.product_kwargs["nodes"]
@@ -296,15 +356,111 @@ class TaskGraph(TaskGraphBase):
 
         return False, {}, params
 
-    def global_intent_prediction(
+    def compile_nlu_prompts(self) -> None:
+        """
+        Compile the NLU prompt of every candidate intent set the graph produces, so a turn only substitutes the conversation
+        """
+        if self.nluapi.url:
+            # the remote NLU server compiles and caches its own prompts
+            return
+        available_global_intents: Dict[str, List[Dict[str, Any]]] = (
+            self.get_available_global_intents(Params())
+        )
+        excluded_intents_per_node: List[Dict[str, Any]] = [{}]
+        candidate_sets: List[Dict[str, List[Dict[str, Any]]]] = []
+        for node in self.graph.nodes:
+            curr_local_intents: Dict[str, List[Dict[str, Any]]] = self.get_local_intent(
+                node, Params()
+            )
+            if curr_local_intents:
+                candidate_sets.append(self._local_intent_candidates(curr_local_intents))
+                excluded_intents_per_node.append(
+                    {**curr_local_intents, **{"none": None}}
+                )
+        for excluded_intents in excluded_intents_per_node:
+            pred_intent, candidate_intents = self._global_intent_candidates(
+                available_global_intents, excluded_intents
+            )
+            if pred_intent is None:
+                candidate_sets.append(candidate_intents)
+        for candidate_intents in candidate_sets:
+            nlu_api.compile_intents(
+                candidate_intents, self.nlu_prompt_key(candidate_intents)
+            )
+        logger.info(f"Compiled NLU prompts: {nlu_api.prompt_cache_stats()}")
+
+    def nlu_prompt_key(self, candidate_intents: Dict[str, List[Dict[str, Any]]]) -> str:
+        """
+        Id of the NLU prompt of a candidate intent set, its intents and the edges left for each in order, which decide the content
+        """
+        return self._nlu_prompt_id + "".join(
+            f"|{intent}:"
+            + ",".join(
+                f"{edge.get('source_node')}>{edge.get('target_node')}" for edge in edges
+            )
+            for intent, edges in candidate_intents.items()
+        )
+
+    def predict_intent(
+        self,
+        text: str,
+        candidate_intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+    ) -> str:
+        """
+        Predict the intent with the embedding classifier when it is confident, the LLM NLU otherwise
+        """
+        fast_intent: Optional[str] = self.intent_classifier.classify(
+            text, candidate_intents
+        )
+        if fast_intent is not None and self.intent_classifier.mode == "on":
+            return fast_intent
+        with span(TraceRunName.NLU.value, candidates=len(candidate_intents)):
+            pred_intent: str = self.nluapi.execute(
+                text,
+                candidate_intents,
+                chat_history_str,
+                self.llm_config.model_dump(),
+                prompt_key=self.nlu_prompt_key(candidate_intents),
+            )
+        self.intent_classifier.record_llm_prediction(fast_intent, pred_intent)
+        return pred_intent
+
+    async def apredict_intent(
+        self,
+        text: str,
+        candidate_intents: Dict[str, List[Dict[str, Any]]],
+        chat_history_str: str,
+    ) -> str:
+        """
+        Async counterpart of predict_intent
+        """
+        fast_intent: Optional[str] = None
+        if self.intent_classifier.enabled:
+            # embedding the utterance is a blocking call
+            fast_intent = await asyncio.to_thread(
+                self.intent_classifier.classify, text, candidate_intents
+            )
+        if fast_intent is not None and self.intent_classifier.mode == "on":
+            return fast_intent
+        with span(TraceRunName.NLU.value, candidates=len(candidate_intents)):
+            pred_intent: str = await self.nluapi.aexecute(
+                text,
+                candidate_intents,
+                chat_history_str,
+                self.llm_config.model_dump(),
+                prompt_key=self.nlu_prompt_key(candidate_intents),
+            )
+        self.intent_classifier.record_llm_prediction(fast_intent, pred_intent)
+        return pred_intent
+
+    def _global_intent_candidates(
         self,
-        curr_node: str,
-        params: Params,
         available_global_intents: Dict[str, List[Dict[str, Any]]],
         excluded_intents: Dict[str, Any],
-    ) -> Tuple[bool, Optional[str], Dict[str, Any], Params]:
+    ) -> Tuple[Optional[str], Dict[str, List[Dict[str, Any]]]]:
         """
-        Do global intent prediction
+        Collect the candidate global intents, returns the intent directly if no prediction is needed
         """
         candidate_intents: Dict[str, List[Dict[str, Any]]] = copy.deepcopy(
             available_global_intents
@@ -312,71 +468,181 @@ class TaskGraph(TaskGraphBase):
         candidate_intents = {
             k: v for k, v in candidate_intents.items() if k not in excluded_intents
         }
-        pred_intent: Optional[str] = None
         # if only unsure_intent is available -> move directly to this intent
         if (
             len(candidate_intents) == 1
             and self.unsure_intent.get("intent") in candidate_intents.keys()
         ):
-            pred_intent = self.unsure_intent.get("intent")
-        else:  # global intent prediction
-            # if match other intent, add flow, jump over
-            candidate_intents[self.unsure_intent.get("intent")] = candidate_intents.get(
-                self.unsure_intent.get("intent"), [self.unsure_intent]
-            )
-            logger.info(
-                f"Available global intents with unsure intent: {candidate_intents}"
-            )
+            return self.unsure_intent.get("intent"), candidate_intents
+        # if match other intent, add flow, jump over
+        candidate_intents[self.unsure_intent.get("intent")] = candidate_intents.get(
+            self.unsure_intent.get("intent"), [self.unsure_intent]
+        )
+        logger.info(f"Available global intents with unsure intent: {candidate_intents}")
+        return None, candidate_intents
 
-            pred_intent = self.nluapi.execute(
-                self.text,
-                candidate_intents,
-                self.chat_history_str,
-                self.llm_config.model_dump(),
-            )
-            params.taskgraph.nlu_records.append(
-                {
-                    "candidate_intents": candidate_intents,
-                    "pred_intent": pred_intent,
-                    "no_intent": False,
-                    "global_intent": True,
-                }
-            )
-            found_pred_in_avil: bool
-            intent_idx: int
-            found_pred_in_avil, pred_intent, intent_idx = self._postprocess_intent(
-                pred_intent, available_global_intents
+    def _resolve_global_intent(
+        self,
+        curr_node: str,
+        params: Params,
+        available_global_intents: Dict[str, List[Dict[str, Any]]],
+        candidate_intents: Dict[str, List[Dict[str, Any]]],
+        pred_intent: str,
+    ) -> Tuple[bool, Optional[str], Dict[str, Any], Params]:
+        params.taskgraph.nlu_records.append(
+            {
+                "candidate_intents": candidate_intents,
+                "pred_intent": pred_intent,
+                "no_intent": False,
+                "global_intent": True,
+            }
+        )
+        found_pred_in_avil: bool
+        intent_idx: int
+        found_pred_in_avil, pred_intent, intent_idx = self._postprocess_intent(
+            pred_intent, available_global_intents
+        )
+        # if found prediction and prediction is not unsure intent and current intent
+        if found_pred_in_avil and pred_intent != self.unsure_intent.get("intent"):
+            # If the prediction is the same as the current global intent and the current node is not a leaf node, continue the current global intent
+            if (
+                pred_intent == params.taskgraph.curr_global_intent
+                and len(list(self.graph.successors(curr_node))) != 0
+                and params.taskgraph.node_status.get(curr_node, StatusEnum.INCOMPLETE)
+                == StatusEnum.INCOMPLETE
+            ):
+                return False, pred_intent, {}, params
+            next_node: str
+            next_intent: str
+            next_node, next_intent = self.jump_to_node(
+                pred_intent, intent_idx, curr_node
             )
-            # if found prediction and prediction is not unsure intent and current intent
-            if found_pred_in_avil and pred_intent != self.unsure_intent.get("intent"):
-                # If the prediction is the same as the current global intent and the current node is not a leaf node, continue the current global intent
-                if (
-                    pred_intent == params.taskgraph.curr_global_intent
-                    and len(list(self.graph.successors(curr_node))) != 0
-                    and params.taskgraph.node_status.get(
-                        curr_node, StatusEnum.INCOMPLETE
-                    )
-                    == StatusEnum.INCOMPLETE
-                ):
-                    return False, pred_intent, {}, params
-                next_node: str
-                next_intent: str
-                next_node, next_intent = self.jump_to_node(
-                    pred_intent, intent_idx, curr_node
-                )
-                logger.info(f"curr_node: {next_node}")
-                node_info: NodeInfo
-                node_info, params = self._get_node(
-                    next_node, params, intent=next_intent
-                )
-                # if current node is not a leaf node and jump to another node, then add it onto stack
-                if next_node != curr_node and list(self.graph.successors(curr_node)):
-                    node_info.add_flow_stack = True
-                params.taskgraph.curr_global_intent = pred_intent
-                params.taskgraph.intent = pred_intent
-                return True, pred_intent, node_info, params
+            logger.info(f"curr_node: {next_node}")
+            node_info: NodeInfo
+            node_info, params = self._get_node(next_node, params, intent=next_intent)
+            # if current node is not a leaf node and jump to another node, then add it onto stack
+            if next_node != curr_node and list(self.graph.successors(curr_node)):
+                node_info.add_flow_stack = True
+            params.taskgraph.curr_global_intent = pred_intent
+            params.taskgraph.intent = pred_intent
+            return True, pred_intent, node_info, params
         return False, pred_intent, {}, params
 
+    def speculate_global_intent(
+        self,
+        available_global_intents: Dict[str, List[Dict[str, Any]]],
+        excluded_intents: Dict[str, Any],
+        text: str,
+        chat_history_str: str,
+    ) -> Optional[Future]:
+        """
+        Start the global intent prediction in the background, None if it needs no
+        prediction, the graph does not speculate or every speculation thread is taken
+        """
+        pred_intent: Optional[str]
+        candidate_intents: Dict[str, List[Dict[str, Any]]]
+        pred_intent, candidate_intents = self._global_intent_candidates(
+            available_global_intents, excluded_intents
+        )
+        if pred_intent is not None:
+            return None
+        slots: Optional[threading.BoundedSemaphore] = self._speculation_slots
+        if self._speculation_executor is None or slots is None:
+            return None
+        if not slots.acquire(blocking=False):
+            # waiting for a thread could be slower than predicting after the local intent
+            return None
+        # the NLU span of the prediction joins the current trace
+        context: contextvars.Context = contextvars.copy_context()
+        speculation: Future = self._speculation_executor.submit(
+            context.run,
+            self.predict_intent,
+            text,
+            candidate_intents,
+            chat_history_str,
+        )
+        speculation.add_done_callback(lambda _: slots.release())
+        return speculation
+
+    def aspeculate_global_intent(
+        self,
+        available_global_intents: Dict[str, List[Dict[str, Any]]],
+        excluded_intents: Dict[str, Any],
+        text: str,
+        chat_history_str: str,
+    ) -> Optional["asyncio.Task[str]"]:
+        """
+        Async counterpart of speculate_global_intent, the prediction runs as a task
+        """
+        pred_intent: Optional[str]
+        candidate_intents: Dict[str, List[Dict[str, Any]]]
+        pred_intent, candidate_intents = self._global_intent_candidates(
+            available_global_intents, excluded_intents
+        )
+        if pred_intent is not None:
+            return None
+        return asyncio.ensure_future(
+            self.apredict_intent(text, candidate_intents, chat_history_str)
+        )
+
+    def global_intent_prediction(
+        self,
+        curr_node: str,
+        params: Params,
+        available_global_intents: Dict[str, List[Dict[str, Any]]],
+        excluded_intents: Dict[str, Any],
+        text: str,
+        chat_history_str: str,
+        speculation: Optional[Future] = None,
+    ) -> Tuple[bool, Optional[str], Dict[str, Any], Params]:
+        """
+        Do global intent prediction, using the result of speculation if it was started
+        """
+        pred_intent: Optional[str]
+        candidate_intents: Dict[str, List[Dict[str, Any]]]
+        pred_intent, candidate_intents = self._global_intent_candidates(
+            available_global_intents, excluded_intents
+        )
+        if pred_intent is not None:
+            return False, pred_intent, {}, params
+        if speculation is not None:
+            pred_intent = speculation.result()
+        else:
+            pred_intent = self.predict_intent(text, candidate_intents, chat_history_str)
+        return self._resolve_global_intent(
+            curr_node, params, available_global_intents, candidate_intents, pred_intent
+        )
+
+    async def aglobal_intent_prediction(
+        self,
+        curr_node: str,
+        params: Params,
+        available_global_intents: Dict[str, List[Dict[str, Any]]],
+        excluded_intents: Dict[str, Any],
+        text: str,
+        chat_history_str: str,
+        speculation: Optional["asyncio.Task[str]"] = None,
+    ) -> Tuple[bool, Optional[str], Dict[str, Any], Params]:
+        """
+        Do global intent prediction without blocking the event loop
+        """
+        pred_intent: Optional[str]
+        candidate_intents: Dict[str, List[Dict[str, Any]]]
+        pred_intent, candidate_intents = self._global_intent_candidates(
+            available_global_intents, excluded_intents
+        )
+        if pred_intent is not None:
+            return False, pred_intent, {}, params
+        if speculation is not None:
+            pred_intent = await speculation
+        else:
+            pred_intent = await self.apredict_intent(
+                text, candidate_intents, chat_history_str
+            )
+        return self._resolve_global_intent(
+            curr_node, params, available_global_intents, candidate_intents, pred_intent
+        )
+
     def handle_random_next_node(
         self, curr_node: str, params: Params
     ) -> Tuple[bool, Dict[str, Any], Params]:
@@ -416,15 +682,9 @@ class TaskGraph(TaskGraphBase):
             return True, node_info, params
         return False, {}, params
 
-    def local_intent_prediction(
-        self,
-        curr_node: str,
-        params: Params,
-        curr_local_intents: Dict[str, List[Dict[str, Any]]],
-    ) -> Tuple[bool, Dict[str, Any], Params]:
-        """
-        Do local intent prediction
-        """
+    def _local_intent_candidates(
+        self, curr_local_intents: Dict[str, List[Dict[str, Any]]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
         curr_local_intents_w_unsure: Dict[str, List[Dict[str, Any]]] = copy.deepcopy(
             curr_local_intents
         )
@@ -434,12 +694,16 @@ class TaskGraph(TaskGraphBase):
             )
         )
         logger.info(f"Check intent under current node: {curr_local_intents_w_unsure}")
-        pred_intent: str = self.nluapi.execute(
-            self.text,
-            curr_local_intents_w_unsure,
-            self.chat_history_str,
-            self.llm_config.model_dump(),
-        )
+        return curr_local_intents_w_unsure
+
+    def _resolve_local_intent(
+        self,
+        curr_node: str,
+        params: Params,
+        curr_local_intents: Dict[str, List[Dict[str, Any]]],
+        curr_local_intents_w_unsure: Dict[str, List[Dict[str, Any]]],
+        pred_intent: str,
+    ) -> Tuple[bool, Dict[str, Any], Params]:
         params.taskgraph.nlu_records.append(
             {
                 "candidate_intents": curr_local_intents_w_unsure,
@@ -471,6 +735,56 @@ class TaskGraph(TaskGraphBase):
             return True, node_info, params
         return False, {}, params
 
+    def local_intent_prediction(
+        self,
+        curr_node: str,
+        params: Params,
+        curr_local_intents: Dict[str, List[Dict[str, Any]]],
+        text: str,
+        chat_history_str: str,
+    ) -> Tuple[bool, Dict[str, Any], Params]:
+        """
+        Do local intent prediction
+        """
+        curr_local_intents_w_unsure: Dict[str, List[Dict[str, Any]]] = (
+            self._local_intent_candidates(curr_local_intents)
+        )
+        pred_intent: str = self.predict_intent(
+            text, curr_local_intents_w_unsure, chat_history_str
+        )
+        return self._resolve_local_intent(
+            curr_node,
+            params,
+            curr_local_intents,
+            curr_local_intents_w_unsure,
+            pred_intent,
+        )
+
+    async def alocal_intent_prediction(
+        self,
+        curr_node: str,
+        params: Params,
+        curr_local_intents: Dict[str, List[Dict[str, Any]]],
+        text: str,
+        chat_history_str: str,
+    ) -> Tuple[bool, Dict[str, Any], Params]:
+        """
+        Do local intent prediction without blocking the event loop
+        """
+        curr_local_intents_w_unsure: Dict[str, List[Dict[str, Any]]] = (
+            self._local_intent_candidates(curr_local_intents)
+        )
+        pred_intent: str = await self.apredict_intent(
+            text, curr_local_intents_w_unsure, chat_history_str
+        )
+        return self._resolve_local_intent(
+            curr_node,
+            params,
+            curr_local_intents,
+            curr_local_intents_w_unsure,
+            pred_intent,
+        )
+
     def handle_unknown_intent(
         self, curr_node: str, params: Params
     ) -> Tuple[NodeInfo, Params]:
@@ -543,15 +857,16 @@ class TaskGraph(TaskGraphBase):
 
         return curr_node, params
 
-    def get_node(self, inputs: Dict[str, Any]) -> Tuple[NodeInfo, Params]:
+    def _enter_node(self, params: Params) -> Tuple[
+        Optional[NodeInfo],
+        str,
+        Dict[str, List[Dict[str, Any]]],
+        Dict[str, List[Dict[str, Any]]],
+        Params,
+    ]:
         """
-        Get the next node
+        Locate the current node and collect its candidate intents, returns the node directly if no prediction is needed
         """
-        self.text: str = inputs["text"]
-        self.chat_history_str: str = inputs["chat_history_str"]
-        params: Params = inputs["parameters"]
-        # boolean to check if we allow global intent switch or not.
-        allow_global_intent_switch: bool = inputs["allow_global_intent_switch"]
         params.taskgraph.nlu_records = []
 
         curr_node: str
@@ -565,7 +880,7 @@ class TaskGraph(TaskGraphBase):
             curr_node, params
         )
         if is_multi_step_node:
-            return node_output, params
+            return node_output, curr_node, {}, {}, params
 
         curr_node, params = self.handle_leaf_node(curr_node, params)
 
@@ -585,6 +900,57 @@ class TaskGraph(TaskGraphBase):
         curr_local_intents: Dict[str, List[Dict[str, Any]]] = self.get_local_intent(
             curr_node, params
         )
+        return None, curr_node, available_global_intents, curr_local_intents, params
+
+    def _exit_node(
+        self, curr_node: str, params: Params, pred_intent: Optional[str]
+    ) -> Tuple[NodeInfo, Params]:
+        """
+        Choose the next node when no intent prediction matched
+        """
+        if pred_intent and pred_intent != self.unsure_intent.get(
+            "intent"
+        ):  # if not unsure intent
+            # If user didn't indicate all the intent of children nodes under the current node,
+            # then we could randomly choose one of Nones to continue the dialog flow
+            has_random_next_node: bool
+            node_output: Dict[str, Any]
+            has_random_next_node, node_output, params = self.handle_random_next_node(
+                curr_node, params
+            )
+            if has_random_next_node:
+                return node_output, params
+
+        # if none of the available intents can represent user's utterance or it is an unsure intents,
+        # transfer to the planner to let it decide for the next step
+        node_output: NodeInfo
+        node_output, params = self.handle_unknown_intent(curr_node, params)
+        return node_output, params
+
+    def _node_steps(
+        self, inputs: Dict[str, Any]
+    ) -> Generator[Step, Any, Tuple[NodeInfo, Params]]:
+        """
+        Transitions to the next node, shared by get_node and aget_node
+
+        The intent predictions are yielded as steps, see run_steps, so that
+        get_node blocks on them and aget_node awaits them.
+        """
+        text: str = inputs["text"]
+        chat_history_str: str = inputs["chat_history_str"]
+        params: Params = inputs["parameters"]
+        # boolean to check if we allow global intent switch or not.
+        allow_global_intent_switch: bool = inputs["allow_global_intent_switch"]
+
+        node_output: Optional[NodeInfo]
+        curr_node: str
+        available_global_intents: Dict[str, List[Dict[str, Any]]]
+        curr_local_intents: Dict[str, List[Dict[str, Any]]]
+        node_output, curr_node, available_global_intents, curr_local_intents, params = (
+            self._enter_node(params)
+        )
+        if node_output is not None:
+            return node_output, params
 
         if (
             not curr_local_intents and allow_global_intent_switch
@@ -592,18 +958,23 @@ class TaskGraph(TaskGraphBase):
             logger.info(f"no local intent under the current node")
             is_global_intent_found: bool
             pred_intent: Optional[str]
-            node_output: NodeInfo
-            is_global_intent_found, pred_intent, node_output, params = (
-                self.global_intent_prediction(
-                    curr_node, params, available_global_intents, {}
-                )
+            is_global_intent_found, pred_intent, node_output, params = yield (
+                self.global_intent_prediction,
+                self.aglobal_intent_prediction,
+                (
+                    curr_node,
+                    params,
+                    available_global_intents,
+                    {},
+                    text,
+                    chat_history_str,
+                ),
             )
             if is_global_intent_found:
                 return node_output, params
 
         # if current node is incompleted -> return current node
         is_incomplete_node: bool
-        node_output: Dict[str, Any]
         is_incomplete_node, node_output, params = self.handle_incomplete_node(
             curr_node, params
         )
@@ -616,7 +987,6 @@ class TaskGraph(TaskGraphBase):
                 f"no local or global intent found, move to the next connected node(s)"
             )
             has_random_next_node: bool
-            node_output: Dict[str, Any]
             has_random_next_node, node_output, params = self.handle_random_next_node(
                 curr_node, params
             )
@@ -624,46 +994,67 @@ class TaskGraph(TaskGraphBase):
                 return node_output, params
 
         logger.info("Finish global condition, start local intent prediction")
-        is_local_intent_found: bool
-        node_output: Dict[str, Any]
-        is_local_intent_found, node_output, params = self.local_intent_prediction(
-            curr_node, params, curr_local_intents
-        )
+        excluded_intents: Dict[str, Any] = {**curr_local_intents, **{"none": None}}
+        # a Future of a thread in sync mode, a task in async mode
+        speculation: Optional[Union[Future, "asyncio.Task[str]"]] = None
+        if allow_global_intent_switch and self.speculative_nlu:
+            # the global prediction does not depend on the local one, start it now
+            speculation = yield (
+                self.speculate_global_intent,
+                self.aspeculate_global_intent,
+                (available_global_intents, excluded_intents, text, chat_history_str),
+            )
+        try:
+            is_local_intent_found: bool
+            is_local_intent_found, node_output, params = yield (
+                self.local_intent_prediction,
+                self.alocal_intent_prediction,
+                (curr_node, params, curr_local_intents, text, chat_history_str),
+            )
+        except BaseException:
+            if speculation is not None:
+                _drop_speculation(speculation)
+            raise
         if is_local_intent_found:
+            if speculation is not None:
+                _drop_speculation(speculation)
             return node_output, params
 
         pred_intent: Optional[str] = None
         if allow_global_intent_switch:
             is_global_intent_found: bool
-            node_output: Dict[str, Any]
-            is_global_intent_found, pred_intent, node_output, params = (
-                self.global_intent_prediction(
+            is_global_intent_found, pred_intent, node_output, params = yield (
+                self.global_intent_prediction,
+                self.aglobal_intent_prediction,
+                (
                     curr_node,
                     params,
                     available_global_intents,
-                    {**curr_local_intents, **{"none": None}},
-                )
+                    excluded_intents,
+                    text,
+                    chat_history_str,
+                    speculation,
+                ),
             )
             if is_global_intent_found:
                 return node_output, params
-        if pred_intent and pred_intent != self.unsure_intent.get(
-            "intent"
-        ):  # if not unsure intent
-            # If user didn't indicate all the intent of children nodes under the current node,
-            # then we could randomly choose one of Nones to continue the dialog flow
-            has_random_next_node: bool
-            node_output: Dict[str, Any]
-            has_random_next_node, node_output, params = self.handle_random_next_node(
-                curr_node, params
-            )
-            if has_random_next_node:
-                return node_output, params
+        return self._exit_node(curr_node, params, pred_intent)
 
-        # if none of the available intents can represent user's utterance or it is an unsure intents,
-        # transfer to the planner to let it decide for the next step
-        node_output: NodeInfo
-        node_output, params = self.handle_unknown_intent(curr_node, params)
-        return node_output, params
+    def get_node(self, inputs: Dict[str, Any]) -> Tuple[NodeInfo, Params]:
+        """
+        Get the next node
+
+        The task graph is shared by every conversation served from the same
+        orchestrator, so the per-turn text and chat history are passed down
+        explicitly instead of being stored on the instance.
+        """
+        return run_steps(self._node_steps(inputs))
+
+    async def aget_node(self, inputs: Dict[str, Any]) -> Tuple[NodeInfo, Params]:
+        """
+        Get the next node, awaiting the intent predictions instead of blocking on them
+        """
+        return await arun_steps(self._node_steps(inputs))
 
     def postprocess_node(
         self, node: Tuple[NodeInfo, Params]
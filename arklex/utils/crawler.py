@@ -0,0 +1,407 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+logger = logging.getLogger(__name__)
+
+CHROME_DRIVER_VERSION = "125.0.6422.7"
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15"
+SKIPPED_EXTENSIONS = [
+    ".pdf",
+    ".jpg",
+    ".png",
+    ".docx",
+    ".xlsx",
+    ".pptx",
+    ".zip",
+    ".jpeg",
+]
+
+
+def normalize_url(url: str) -> str:
+    return url.split("#")[0].rstrip("/")
+
+
+def is_crawlable(full_url: str, base_url: str) -> bool:
+    """Whether full_url is a page under base_url other than base_url itself."""
+    return bool(
+        full_url
+        and full_url.startswith(base_url)
+        and not any(ext in full_url for ext in SKIPPED_EXTENSIONS)
+        and full_url != base_url
+    )
+
+
+class CrawledPage:
+    def __init__(
+        self,
+        url: str,
+        title: Optional[str] = None,
+        text: Optional[str] = None,
+        links: Optional[List[str]] = None,
+        error: Optional[str] = None,
+        rendered: bool = False,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        self.url = url
+        self.title = title
+        self.text = text
+        self.links = links or []
+        self.error = error
+        self.rendered = rendered
+        # validators of the response, sent back when the page is revalidated
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "title": self.title,
+            "text": self.text,
+            "links": self.links,
+            "error": self.error,
+            "rendered": self.rendered,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CrawledPage":
+        return cls(**data)
+
+
+def extract_page(url: str, html: str) -> CrawledPage:
+    """Title, text and outgoing links of a page.
+
+    Links under url are kept in the text next to their anchor, which
+    Loader.get_candidates_websites uses to rank the pages.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    text_list = []
+    for string in soup.strings:
+        anchor = string.find_parent("a")
+        if anchor:
+            href = urljoin(url, anchor.get("href"))
+            if href.startswith(url):
+                text_list.append(f"{string} {href}")
+        elif string.strip():
+            text_list.append(string)
+
+    links: Dict[str, None] = {}
+    for anchor in soup.find_all("a", href=True):
+        try:
+            links[normalize_url(urljoin(url, anchor.get("href")))] = None
+        except ValueError as err:
+            logger.error(f"Fail to process sub-url {anchor.get('href')}: {err}")
+
+    title_tag = soup.find("title")
+    return CrawledPage(
+        url=url,
+        title=title_tag.get_text() if title_tag else url,
+        text="\n".join(text_list),
+        links=list(links),
+    )
+
+
+def needs_browser(html: str, page: CrawledPage, min_text_chars: int = 200) -> bool:
+    """Whether the page looks rendered by JavaScript: scripts but barely any text."""
+    return len((page.text or "").strip()) < min_text_chars and "<script" in html
+
+
+def new_chrome_driver() -> webdriver.Chrome:
+    options = webdriver.ChromeOptions()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--headless")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-infobars")
+    options.add_argument("--remote-debugging-pipe")
+    chrome_driver_path = Path(
+        ChromeDriverManager(driver_version=CHROME_DRIVER_VERSION).install()
+    )
+    options.binary_location = str(chrome_driver_path.parent.absolute())
+    logger.info(f"chrome binary location: {options.binary_location}")
+    return webdriver.Chrome(options=options)
+
+
+class BrowserPool:
+    """Headless Chrome drivers for the pages plain HTTP cannot read.
+
+    Drivers are started on first use, at most size of them, and reused across
+    pages. A page is read once the document is complete and its body has
+    text, or after timeout seconds, instead of after a fixed sleep.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout: float = 15.0,
+        driver_factory: Callable[[], Any] = new_chrome_driver,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.driver_factory = driver_factory
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        self._drivers: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._drivers) < self.size:
+                driver = self.driver_factory()
+                self._drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def _render(self, url: str) -> str:
+        driver = self._acquire()
+        try:
+            logger.info(f"Rendering {url} in the browser")
+            driver.get(url)
+            try:
+                WebDriverWait(driver, self.timeout).until(
+                    lambda d: d.execute_script("return document.readyState")
+                    == "complete"
+                    and d.find_element(By.TAG_NAME, "body").text.strip()
+                )
+            except TimeoutException:
+                logger.warning(f"{url} was not ready after {self.timeout}s")
+            return driver.page_source
+        finally:
+            self._idle.put(driver)
+
+    async def render(self, url: str) -> str:
+        return await asyncio.to_thread(self._render, url)
+
+    def close(self) -> None:
+        with self._lock:
+            for driver in self._drivers:
+                driver.quit()
+            self._drivers = []
+            self._idle = queue.Queue()
+
+
+class CrawlState:
+    """Pages crawled so far, appended to a JSON lines file as they are fetched.
+
+    An interrupted crawl restarted with the same file skips the pages already
+    recorded and continues from the links they found. Failed pages are not
+    kept, so they are tried again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages: Dict[str, CrawledPage] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        page = CrawledPage.from_dict(json.loads(line))
+                    except (json.JSONDecodeError, TypeError):
+                        # a page interrupted mid-write is simply fetched again
+                        logger.warning(f"Ignoring truncated crawl state line in {path}")
+                        continue
+                    if page.error is None:
+                        self.pages[page.url] = page
+            with open(path, "rb+") as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # end the truncated line so the next record starts on its own
+                        f.write(b"\n")
+
+    def record(self, page: CrawledPage) -> None:
+        if page.error is not None:
+            return
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(page.to_dict()) + "\n")
+            self.pages[page.url] = page
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pages = {}
+
+
+class WebCrawler:
+    """Concurrent crawler over one pooled HTTP client.
+
+    Up to max_concurrency pages are fetched at once, at most
+    per_host_concurrency from the same host, over keep-alive connections.
+    Pages that come back as a script shell without text are rendered by the
+    browser pool instead. Fetched pages are kept, so discovering a site with
+    crawl and then fetching its pages with fetch_pages downloads each page
+    once. Pages of a previous crawl are revalidated with conditional requests
+    and reused as they were when the server answers 304 Not Modified.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_host_concurrency: int = 4,
+        timeout: float = 10.0,
+        state: Optional[CrawlState] = None,
+        browser_pool: Optional[BrowserPool] = None,
+        browser_fallback: bool = True,
+        min_text_chars: int = 200,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        previous: Optional[Dict[str, CrawledPage]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout = timeout
+        self.state = state
+        if browser_pool is None and browser_fallback:
+            browser_pool = BrowserPool()
+        self.browser_pool = browser_pool
+        self.min_text_chars = min_text_chars
+        self.transport = transport
+        self.pages: Dict[str, CrawledPage] = dict(state.pages) if state else {}
+        self.previous: Dict[str, CrawledPage] = previous or {}
+        self.not_modified: int = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            transport=self.transport,
+        )
+
+    async def _fetch(
+        self,
+        client: httpx.AsyncClient,
+        host_limits: Dict[str, asyncio.Semaphore],
+        url: str,
+    ) -> CrawledPage:
+        previous = self.previous.get(url)
+        headers: Dict[str, str] = {}
+        if previous is not None and previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous is not None and previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+        try:
+            async with host_limits[urlsplit(url).netloc]:
+                response = await client.get(url, headers=headers)
+            if response.status_code == 304 and previous is not None:
+                self.not_modified += 1
+                page = previous
+            elif response.status_code != 200:
+                raise ValueError(f"status code: {response.status_code}")
+            else:
+                html = response.text
+                page = await asyncio.to_thread(extract_page, url, html)
+                if self.browser_pool is not None and needs_browser(
+                    html, page, self.min_text_chars
+                ):
+                    html = await self.browser_pool.render(url)
+                    page = await asyncio.to_thread(extract_page, url, html)
+                    page.rendered = True
+                page.etag = response.headers.get("etag")
+                page.last_modified = response.headers.get("last-modified")
+        except Exception as err:
+            logger.error(f"Fail to get the page from {url}: {err}")
+            page = CrawledPage(url=url, title=url, error=str(err))
+        self.pages[url] = page
+        if self.state is not None:
+            self.state.record(page)
+        return page
+
+    def _host_limits(self) -> Dict[str, asyncio.Semaphore]:
+        return defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency))
+
+    async def crawl(self, base_url: str, max_num: int) -> List[str]:
+        """Breadth-first discovery of up to max_num pages under base_url."""
+        base_url = normalize_url(base_url)
+        visited: Set[str] = {base_url}
+        frontier: Deque[str] = deque([base_url])
+        crawled: List[str] = []
+        in_flight: Set[asyncio.Task] = set()
+        host_limits = self._host_limits()
+
+        def visit(page: CrawledPage) -> None:
+            crawled.append(page.url)
+            for link in page.links:
+                if link not in visited and is_crawlable(link, base_url):
+                    visited.add(link)
+                    frontier.append(link)
+
+        async with self._client() as client:
+            while frontier or in_flight:
+                while (
+                    frontier
+                    and len(in_flight) < self.max_concurrency
+                    and len(crawled) + len(in_flight) < max_num
+                ):
+                    url = frontier.popleft()
+                    known = self.pages.get(url)
+                    if known is not None and known.error is None:
+                        # resumed from the crawl state
+                        visit(known)
+                        continue
+                    in_flight.add(
+                        asyncio.create_task(self._fetch(client, host_limits, url))
+                    )
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    visit(task.result())
+        logger.info(f"URLs visited: {crawled}")
+        if self.not_modified:
+            logger.info(
+                f"{self.not_modified} pages were not modified since the last crawl"
+            )
+        return sorted(crawled[:max_num])
+
+    async def fetch_pages(self, urls: List[str]) -> List[CrawledPage]:
+        """Pages of urls in order, fetching only those not crawled yet."""
+        limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits = self._host_limits()
+
+        async with self._client() as client:
+
+            async def fetch(url: str) -> CrawledPage:
+                known = self.pages.get(url)
+                if known is not None and known.error is None:
+                    return known
+                async with limit:
+                    return await self._fetch(client, host_limits, url)
+
+            return await asyncio.gather(*(fetch(url) for url in urls))
+
+    def close(self) -> None:
+        if self.browser_pool is not None:
+            self.browser_pool.close()
@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Path of the SQLite file backing the store, only the in-memory tier is used if unset
+EMBEDDING_CACHE_PATH_ENV: str = "ARKLEX_EMBEDDING_CACHE_PATH"
+# Vectors kept in memory, about 30 MB of 1536-dimensional embeddings by default
+EMBEDDING_CACHE_SIZE_ENV: str = "ARKLEX_EMBEDDING_CACHE_SIZE"
+DEFAULT_EMBEDDING_CACHE_SIZE: int = 5000
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of the embedding of text by model."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Process-wide content-addressed store of embeddings.
+
+    Embeddings are keyed by hash(model, text), so the task descriptions, node
+    attributes and outputs that come back on every turn of every conversation
+    are only sent to the provider once. Recently used vectors are kept in an
+    in-memory LRU, and when a path is given every vector is also written to a
+    SQLite table that survives restarts and is shared between processes.
+    Every thread reads and writes SQLite on its own connection, outside the
+    lock of the in-memory tier, and a failing read is counted as a miss.
+    """
+
+    def __init__(
+        self, max_size: int = DEFAULT_EMBEDDING_CACHE_SIZE, path: Optional[str] = None
+    ) -> None:
+        self.max_size: int = max_size
+        self.path: Optional[str] = path
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self._local: threading.local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        # opened lazily so importing the module never touches the disk
+        if not self.path:
+            return None
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            directory: str = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._lock:
+                self._conns.append(conn)
+            self._local.conn = conn
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            conn.commit()
+        return conn
+
+    def _read(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        try:
+            conn: Optional[sqlite3.Connection] = self._connect()
+            if conn is None:
+                return found
+            # stay under SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk: List[str] = keys[start : start + 500]
+                rows = conn.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as err:
+            # the texts not found are embedded again
+            logger.warning(f"Failed to read embeddings: {err}")
+        return found
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the stored embedding of every text, None where it is missing."""
+        keys: List[str] = [embedding_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        on_disk: List[int] = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector: Optional[np.ndarray] = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    on_disk.append(i)
+
+        found: Dict[str, np.ndarray] = {}
+        if on_disk and self.path:
+            found = self._read(list(dict.fromkeys(keys[i] for i in on_disk)))
+        with self._lock:
+            for i in on_disk:
+                vector = found.get(keys[i])
+                if vector is not None:
+                    self._remember(keys[i], vector)
+                    results[i] = vector
+                    self.disk_hits += 1
+            self.misses += sum(1 for vector in results if vector is None)
+        return results
+
+    def put_many(
+        self, model: str, texts: List[str], vectors: List[Any]
+    ) -> List[np.ndarray]:
+        """Store the embeddings of texts and return them as stored."""
+        stored: List[np.ndarray] = [np.asarray(v, dtype=np.float32) for v in vectors]
+        keys: List[str] = [embedding_key(model, text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, stored):
+                self._remember(key, vector)
+        if self.path:
+            try:
+                conn: Optional[sqlite3.Connection] = self._connect()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(k, v.tobytes()) for k, v in zip(keys, stored)],
+                )
+                conn.commit()
+            except sqlite3.Error as err:
+                # the memory tier still holds the vectors
+                logger.warning(f"Failed to persist embeddings: {err}")
+        return stored
+
+    def get_or_compute(
+        self,
+        model: str,
+        texts: List[str],
+        compute: Callable[[List[str]], List[List[float]]],
+    ) -> List[np.ndarray]:
+        """Return the embedding of every text, computing the missing ones in one call."""
+        results: List[Optional[np.ndarray]] = self.get_many(model, texts)
+        missing: List[str] = list(
+            dict.fromkeys(t for t, v in zip(texts, results) if v is None)
+        )
+        if missing:
+            computed: Dict[str, np.ndarray] = dict(
+                zip(missing, self.put_many(model, missing, compute(missing)))
+            )
+            results = [
+                v if v is not None else computed[t] for t, v in zip(texts, results)
+            ]
+        return results
+
+    def clear(self) -> None:
+        """Drop the in-memory tier and reset the counters, the SQLite file is kept."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+            # connections are opened again on the next use, in every thread
+            self._local = threading.local()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups: int = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+                ),
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings client that looks texts up in an EmbeddingStore before calling the provider.
+
+    Queries and documents are stored under different models, since some
+    providers embed them differently. Providers that do not are symmetric,
+    and their queries can be embedded in batches with embed_queries.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        store: Optional[EmbeddingStore] = None,
+        symmetric: bool = False,
+    ) -> None:
+        self.embeddings: Embeddings = embeddings
+        self.model: str = model
+        self.store: EmbeddingStore = store if store is not None else embedding_store
+        self.symmetric: bool = symmetric
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[np.ndarray] = self.store.get_or_compute(
+            f"{self.model}:document", texts, self.embeddings.embed_documents
+        )
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        vectors: List[np.ndarray] = self.store.get_or_compute(
+            f"{self.model}:query",
+            [text],
+            lambda texts: [self.embeddings.embed_query(texts[0])],
+        )
+        return vectors[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries, in one provider request when the provider is symmetric."""
+        if self.symmetric:
+            compute: Callable[[List[str]], List[List[float]]] = (
+                self.embeddings.embed_documents
+            )
+        else:
+            compute = lambda texts: [self.embeddings.embed_query(t) for t in texts]
+        vectors: List[np.ndarray] = self.store.get_or_compute(
+            f"{self.model}:query", texts, compute
+        )
+        return [v.tolist() for v in vectors]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        model: str = f"{self.model}:document"
+        results: List[Optional[np.ndarray]] = self.store.get_many(model, texts)
+        missing: List[str] = list(
+            dict.fromkeys(t for t, v in zip(texts, results) if v is None)
+        )
+        if missing:
+            computed: Dict[str, np.ndarray] = dict(
+                zip(
+                    missing,
+                    self.store.put_many(
+                        model, missing, await self.embeddings.aembed_documents(missing)
+                    ),
+                )
+            )
+            results = [
+                v if v is not None else computed[t] for t, v in zip(texts, results)
+            ]
+        return [v.tolist() for v in results]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        model: str = f"{self.model}:query"
+        vector: Optional[np.ndarray] = self.store.get_many(model, [text])[0]
+        if vector is None:
+            vector = self.store.put_many(
+                model, [text], [await self.embeddings.aembed_query(text)]
+            )[0]
+        return vector.tolist()
+
+
+def embed_queries(embeddings: Any, texts: List[str]) -> List[List[float]]:
+    """Embed many queries with any embeddings client, batched when it supports it."""
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+embedding_store: EmbeddingStore = EmbeddingStore(
+    max_size=int(
+        os.environ.get(EMBEDDING_CACHE_SIZE_ENV, DEFAULT_EMBEDDING_CACHE_SIZE)
+    ),
+    path=os.environ.get(EMBEDDING_CACHE_PATH_ENV),
+)
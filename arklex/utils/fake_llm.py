@@ -0,0 +1,304 @@
+import asyncio
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# the options of the intent detection prompt, see IntentDetector.compile_intents
+INTENT_OPTIONS_MARKER: str = "Only choose from the following options."
+_INTENT_OPTION: re.Pattern = re.compile(r"^([a-z])\) (.+)$")
+_WORD: re.Pattern = re.compile(r"\w+")
+_VOCABULARY: List[str] = (
+    "the order ship product account store price return help please thanks "
+    "available policy delivery schedule time support item question answer"
+).split()
+
+
+def _digest(text: str) -> int:
+    # stable across processes, unlike hash()
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class FakeLLMSettings:
+    """Process-wide behaviour of the fake provider.
+
+    Clients are pooled by model_client_pool, so they read their latency and
+    scripted intents from here at call time, and a benchmark can change them
+    between runs without rebuilding the clients.
+    """
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        # seconds before the response, and between streamed words
+        self.latency: float = 0.0
+        self.token_latency: float = 0.0
+        self.embedding_latency: float = 0.0
+        self.response_words: int = 30
+        self._intents: Deque[str] = deque()
+        self.calls: int = 0
+        self.embedding_calls: int = 0
+
+    def configure(
+        self,
+        latency: Optional[float] = None,
+        token_latency: Optional[float] = None,
+        embedding_latency: Optional[float] = None,
+        response_words: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            if latency is not None:
+                self.latency = latency
+            if token_latency is not None:
+                self.token_latency = token_latency
+            if embedding_latency is not None:
+                self.embedding_latency = embedding_latency
+            if response_words is not None:
+                self.response_words = response_words
+
+    def script_intents(self, intents: List[str]) -> None:
+        """Answer the next intent detections with these intents, in order.
+
+        An intent stays scripted until a detection offers it, so a local
+        intent detection before the global one does not consume it.
+        """
+        with self._lock:
+            self._intents = deque(intents)
+
+    def scripted_intent(self) -> Optional[str]:
+        with self._lock:
+            return self._intents[0] if self._intents else None
+
+    def consume_intent(self) -> None:
+        with self._lock:
+            if self._intents:
+                self._intents.popleft()
+
+    def record_call(self, embedding: bool = False) -> None:
+        with self._lock:
+            if embedding:
+                self.embedding_calls += 1
+            else:
+                self.calls += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._intents.clear()
+            self.calls = 0
+            self.embedding_calls = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "embedding_calls": self.embedding_calls,
+                "scripted_intents_left": len(self._intents),
+            }
+
+
+fake_llm_settings: FakeLLMSettings = FakeLLMSettings()
+
+
+def _placeholder(schema: Dict[str, Any]) -> Any:
+    """The value of a tool argument the fake model leaves empty."""
+    types: List[Any] = [s.get("type") for s in schema.get("anyOf", [schema])]
+    if "null" in types:
+        return None
+    return {
+        "string": "",
+        "boolean": False,
+        "integer": 0,
+        "number": 0.0,
+        "array": [],
+        "object": {},
+    }.get(types[0])
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model for offline runs, e.g. benchmarks and CI.
+
+    Intent detection prompts are answered with the next scripted intent of
+    fake_llm_settings, or with an option picked from the prompt's content.
+    Tool calls, as made by the slot filling, leave every optional argument
+    empty, so tools ask for their slots instead of calling their APIs. Any
+    other prompt gets a fixed-length text derived from the prompt.
+    """
+
+    model: str = "fake"
+    temperature: Optional[float] = None
+    n: int = 1
+    max_tokens: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> Any:
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools])
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    @staticmethod
+    def _answer_intent(prompt: str) -> str:
+        options: List[re.Match] = []
+        for line in prompt.split(INTENT_OPTIONS_MARKER, 1)[1].strip().splitlines():
+            match: Optional[re.Match] = _INTENT_OPTION.match(line.strip())
+            if match is None:
+                break
+            options.append(match)
+        if not options:
+            return "others"
+        intent: Optional[str] = fake_llm_settings.scripted_intent()
+        if intent is None:
+            chosen: re.Match = options[_digest(prompt) % len(options)]
+            return f"{chosen.group(1)}) {chosen.group(2)}"
+        for option in options:
+            name: str = option.group(2)
+            if name == intent or name.startswith(f"{intent}__<"):
+                fake_llm_settings.consume_intent()
+                return f"{option.group(1)}) {name}"
+        # not a candidate here, the NLU treats it as an unknown intent
+        return "others"
+
+    def _text(self, prompt: str) -> str:
+        seed: int = _digest(prompt)
+        return " ".join(
+            _VOCABULARY[(seed + 7 * i) % len(_VOCABULARY)]
+            for i in range(fake_llm_settings.response_words)
+        )
+
+    def _message(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        fake_llm_settings.record_call()
+        prompt: str = self._prompt(messages)
+        tool_calls: List[Dict[str, Any]] = []
+        content: str = ""
+        if kwargs.get("tools"):
+            function: Dict[str, Any] = kwargs["tools"][0]["function"]
+            properties: Dict[str, Any] = function["parameters"].get("properties", {})
+            tool_calls.append(
+                {
+                    "name": function["name"],
+                    "args": {k: _placeholder(v) for k, v in properties.items()},
+                    "id": f"call_{_digest(prompt):08x}",
+                }
+            )
+        elif INTENT_OPTIONS_MARKER in prompt:
+            content = self._answer_intent(prompt)
+        else:
+            content = self._text(prompt)
+        input_tokens: int = len(prompt.split())
+        output_tokens: int = len(content.split()) + len(tool_calls)
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(fake_llm_settings.latency)
+        message: AIMessage = self._message(messages, **kwargs)
+        time.sleep(fake_llm_settings.token_latency * len(message.content.split()))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(fake_llm_settings.latency)
+        message: AIMessage = self._message(messages, **kwargs)
+        await asyncio.sleep(
+            fake_llm_settings.token_latency * len(message.content.split())
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        words: List[str] = message.content.split(" ")
+        for i, word in enumerate(words):
+            last: bool = i == len(words) - 1
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=word if last else f"{word} ",
+                    # the usage is summed over the chunks
+                    usage_metadata=message.usage_metadata if last else None,
+                )
+            )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(fake_llm_settings.latency)
+        for chunk in self._chunks(self._message(messages, **kwargs)):
+            time.sleep(fake_llm_settings.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(fake_llm_settings.latency)
+        for chunk in self._chunks(self._message(messages, **kwargs)):
+            await asyncio.sleep(fake_llm_settings.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings, texts sharing words are close."""
+
+    def __init__(self, model: str = "fake-embedding", size: int = 256) -> None:
+        self.model: str = model
+        self.size: int = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector: np.ndarray = np.zeros(self.size, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            vector[_digest(word) % self.size] += 1.0
+        norm: float = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            vector[0] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(fake_llm_settings.embedding_latency)
+        fake_llm_settings.record_call(embedding=True)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
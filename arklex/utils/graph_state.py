@@ -11,12 +11,46 @@ class LLMConfig(BaseModel):
     llm_provider: str
 
 
+class VectorIndexConfig(BaseModel):
+    # ANN index of the Milvus collection, see arklex/env/tools/RAG/retrievers/milvus_index.py
+    index_type: str = "FLAT"
+    metric_type: str = "L2"
+    # build parameters such as M, efConstruction, nlist, m and nbits
+    params: Dict[str, Any] = {}
+    # per-query knobs such as ef for HNSW and nprobe for IVF indexes
+    search_params: Dict[str, Any] = {}
+    top_k: int = 4
+
+
+class QueryRewriteConfig(BaseModel):
+    # always: rewrite every query with the LLM before retrieval
+    # auto: only rewrite follow-ups that may refer to earlier turns
+    # parallel: as auto, and search with the raw query while the rewrite runs
+    mode: str = "auto"
+    # turns of history given to the rewrite, which also key its cache
+    history_turns: int = 3
+
+
+class LexicalSearchConfig(BaseModel):
+    # off: dense retrieval only
+    # hybrid: fuse BM25 and dense results with reciprocal rank fusion
+    # auto: as hybrid, but standalone questions naming a code found in the
+    # corpus, such as "SKU-4471", are answered from BM25 alone
+    mode: str = "off"
+    # results taken from each ranking before they are fused
+    candidates: int = 20
+    rrf_k: int = 60
+
+
 class BotConfig(BaseModel):
     bot_id: str
     version: str
     language: str
     bot_type: str
     llm_config: LLMConfig
+    vector_index: VectorIndexConfig = VectorIndexConfig()
+    query_rewrite: QueryRewriteConfig = QueryRewriteConfig()
+    lexical_search: LexicalSearchConfig = LexicalSearchConfig()
 
 
 ### Message-related classes
@@ -43,6 +77,8 @@ class StatusEnum(str, Enum):
 
 class Timing(BaseModel):
     taskgraph: Optional[float] = None
+    # spans of the last turn when it was traced, see arklex.utils.trace
+    trace: Optional[Dict[str, Any]] = None
 
 
 class ResourceRecord(BaseModel):
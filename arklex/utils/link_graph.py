@@ -0,0 +1,135 @@
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import scipy.sparse
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """Automaton finding which of many patterns occur in a text in one pass.
+
+    Matching a text costs its length plus the number of matches, whatever
+    the number of patterns, where testing every pattern with `in` costs their
+    product.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # patterns ending at a state, and the next state on the failure path with some
+        self.output: List[List[int]] = [[]]
+        self.dict_link: List[int] = [0]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.dict_link.append(0)
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.output[state].append(pattern_id)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.dict_link[child] = (
+                    self.fail[child]
+                    if self.output[self.fail[child]]
+                    else self.dict_link[self.fail[child]]
+                )
+
+    def matches(self, text: str) -> Set[int]:
+        """Ids of the patterns occurring in text."""
+        goto, fail = self.goto, self.fail
+        output, dict_link = self.output, self.dict_link
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if output[state] else dict_link[state]
+            while match:
+                found.update(output[match])
+                match = dict_link[match]
+        return found
+
+
+def link_edges(pages: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Source and target indices of the links between crawled pages.
+
+    Pages link through the out-links recorded while crawling them. Pages
+    crawled before those were recorded link to every known url occurring in
+    their content, as found by one Aho-Corasick pass.
+    """
+    index: Dict[str, int] = {page.source: i for i, page in enumerate(pages)}
+    known_urls: List[str] = list(index)
+    sources: List[int] = []
+    targets: List[int] = []
+    automaton: Optional[AhoCorasick] = None
+    for i, page in enumerate(pages):
+        if page.is_error:
+            continue
+        out_links = getattr(page, "out_links", None)
+        if out_links is not None:
+            linked = {index[link] for link in out_links if link in index}
+        else:
+            if automaton is None:
+                automaton = AhoCorasick(known_urls)
+            linked = {
+                index[known_urls[p]] for p in automaton.matches(page.content or "")
+            }
+        sources.extend([i] * len(linked))
+        targets.extend(linked)
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def pagerank(
+    n: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    alpha: float = 0.85,
+    max_iter: int = 100,
+    tol: float = 1e-6,
+) -> np.ndarray:
+    """PageRank of the n nodes of a graph given as edge arrays.
+
+    The power iteration of networkx.pagerank, with uniform teleports and
+    dangling nodes linking everywhere, run on a sparse matrix built straight
+    from the edges so it scales to graphs of hundreds of thousands of pages.
+    """
+    if n == 0:
+        return np.zeros(0)
+    # repeated links count once, like the edges of a DiGraph
+    edges = np.unique(sources * n + targets)
+    sources, targets = np.divmod(edges, n)
+    out_degree = np.bincount(sources, minlength=n).astype(np.float64)
+    transition = scipy.sparse.csr_matrix(
+        (1.0 / out_degree[sources], (targets, sources)), shape=(n, n)
+    )
+    dangling = out_degree == 0
+    teleport = np.full(n, 1.0 / n)
+    scores = teleport.copy()
+    for _ in range(max_iter):
+        previous = scores
+        scores = (
+            alpha * (transition @ previous + previous[dangling].sum() * teleport)
+            + (1 - alpha) * teleport
+        )
+        if np.abs(scores - previous).sum() < n * tol:
+            return scores
+    logger.warning(f"PageRank did not converge in {max_iter} iterations")
+    return scores
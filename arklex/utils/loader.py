@@ -1,18 +1,15 @@
 import logging
-import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import requests
 import pickle
 import uuid
 from enum import Enum
 import os
 
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium import webdriver
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-import networkx as nx
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from mistralai import Mistral
@@ -25,6 +22,15 @@ from langchain_community.document_loaders import (
 )
 import base64
 
+from arklex.utils.crawler import (
+    USER_AGENT,
+    CrawledPage,
+    WebCrawler,
+    is_crawlable,
+)
+from arklex.utils.link_graph import link_edges, pagerank
+from arklex.utils.utils import run_coroutine_sync
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,7 +39,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-CHROME_DRIVER_VERSION = "125.0.6422.7"
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 
 
@@ -73,6 +78,7 @@ class CrawledObject(DocObject):
         is_error=False,
         error_message=None,
         source_type=SourceType.WEB,
+        out_links=None,
     ):
         super().__init__(id, source)
         self.content = content
@@ -81,6 +87,8 @@ class CrawledObject(DocObject):
         self.is_error = is_error
         self.error_message = error_message
         self.source_type = source_type
+        # urls the page links to, None for documents that are not web pages
+        self.out_links = out_links
 
     def to_dict(self):
         return {
@@ -92,6 +100,7 @@ class CrawledObject(DocObject):
             "is_error": self.is_error,
             "error_message": self.error_message,
             "source_type": self.source_type,
+            "out_links": self.out_links,
         }
 
     @classmethod
@@ -105,12 +114,14 @@ class CrawledObject(DocObject):
             is_error=data["is_error"],
             error_message=data["error_message"],
             source_type=data["source_type"],
+            out_links=data.get("out_links"),
         )
 
 
 class Loader:
-    def __init__(self):
-        pass
+    def __init__(self, crawler: Optional[WebCrawler] = None):
+        # pages found by get_all_urls are reused by crawl_urls
+        self.crawler = crawler or WebCrawler()
 
     def to_crawled_url_objs(self, url_list: List[str]) -> List[CrawledObject]:
         url_objs = [DocObject(str(uuid.uuid4()), url) for url in url_list]
@@ -119,61 +130,17 @@ class Loader:
 
     def crawl_urls(self, url_objects: list[DocObject]) -> List[CrawledObject]:
         logger.info(f"Start crawling {len(url_objects)} urls")
-        options = webdriver.ChromeOptions()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--headless")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-infobars")
-        options.add_argument("--remote-debugging-pipe")
-        chrome_driver_path = Path(
-            ChromeDriverManager(driver_version=CHROME_DRIVER_VERSION).install()
-        )
-        options.binary_location = str(chrome_driver_path.parent.absolute())
-        logger.info(f"chrome binary location: {options.binary_location}")
-        driver = webdriver.Chrome(options=options)
+        try:
+            pages: List[CrawledPage] = run_coroutine_sync(
+                self.crawler.fetch_pages([url_obj.source for url_obj in url_objects])
+            )
+        finally:
+            self.crawler.close()
 
         docs: List[CrawledObject] = []
-        for url_obj in url_objects:
-            try:
-                logger.info(f"loading url: {url_obj.source}")
-                driver.get(url_obj.source)
-                time.sleep(2)
-                html = driver.page_source
-                soup = BeautifulSoup(html, "html.parser")
-
-                text_list = []
-                for string in soup.strings:
-                    if string.find_parent("a"):
-                        href = urljoin(
-                            url_obj.source, string.find_parent("a").get("href")
-                        )
-                        if href.startswith(url_obj.source):
-                            text = f"{string} {href}"
-                            text_list.append(text)
-                    elif string.strip():
-                        text_list.append(string)
-                text_output = "\n".join(text_list)
-
-                title = url_obj.source
-                for title in soup.find_all("title"):
-                    title = title.get_text()
-                    break
-
-                docs.append(
-                    CrawledObject(
-                        id=url_obj.id,
-                        source=url_obj.source,
-                        content=text_output,
-                        metadata={"title": title, "source": url_obj.source},
-                        source_type=SourceType.WEB,
-                    )
-                )
-
-            except Exception as err:
+        for url_obj, page in zip(url_objects, pages):
+            if page.error is not None:
                 logger.info(f"error crawling {url_obj}")
-                logger.error(err)
                 docs.append(
                     CrawledObject(
                         id=url_obj.id,
@@ -181,37 +148,34 @@ class Loader:
                         content=None,
                         metadata={"title": url_obj.source, "source": url_obj.source},
                         is_error=True,
-                        error_message=str(err),
+                        error_message=page.error,
                         source_type=SourceType.WEB,
                     )
                 )
-        driver.quit()
+                continue
+            docs.append(
+                CrawledObject(
+                    id=url_obj.id,
+                    source=url_obj.source,
+                    content=page.text,
+                    metadata={"title": page.title, "source": url_obj.source},
+                    source_type=SourceType.WEB,
+                    out_links=page.links,
+                )
+            )
         return docs
 
     def get_all_urls(self, base_url: str, max_num: int) -> List[str]:
         logger.info(
             f"Getting all pages for base url: {base_url}, maximum number is: {max_num}"
         )
-        urls_visited = []
-        base_url = base_url.split("#")[0].rstrip("/")
-        urls_to_visit = [base_url]
-
-        while urls_to_visit:
-            if len(urls_visited) >= max_num:
-                break
-            current_url = urls_to_visit.pop(0)
-            if current_url not in urls_visited:
-                urls_visited.append(current_url)
-                new_urls = self.get_outsource_urls(current_url, base_url)
-                urls_to_visit.extend(new_urls)
-                urls_to_visit = list(set(urls_to_visit))
-        logger.info(f"URLs visited: {urls_visited}")
-        return sorted(urls_visited[:max_num])
+        try:
+            return run_coroutine_sync(self.crawler.crawl(base_url, max_num))
+        finally:
+            self.crawler.close()
 
     def get_outsource_urls(self, curr_url: str, base_url: str):
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15"
-        }
+        headers = {"User-Agent": USER_AGENT}
         new_urls = list()
         try:
             response = requests.get(curr_url, headers=headers, timeout=10)
@@ -237,53 +201,23 @@ class Loader:
         return list(set(new_urls))
 
     def _check_url(self, full_url, base_url):
-        kw_list = [".pdf", ".jpg", ".png", ".docx", ".xlsx", ".pptx", ".zip", ".jpeg"]
-        if (
-            full_url.startswith(base_url)
-            and full_url
-            and not any(kw in full_url for kw in kw_list)
-            and full_url != base_url
-        ):
-            return True
-        return False
+        return is_crawlable(full_url, base_url)
 
     def get_candidates_websites(
         self, urls: List[CrawledObject], top_k: int
     ) -> List[CrawledObject]:
         """Based on the pagerank algorithm of the crawled websites, return the top k websites.
-        The reason why we can do that is because we have the hreqs of the including <a> tags in the content of the website.
-        So we can use that to construct the edges and then use the tool from networkx to get the pagerank of the websites.
+        The edges are the out-links recorded while crawling each website, or for documents
+        crawled before those were recorded, the known urls found in their content.
         """
-
-        nodes = []
-        edges = []
-        url_to_id_mapping = {}
-        for url in urls:
-            url_to_id_mapping[url.source] = url.id
-
-        for url in urls:
-            if url.is_error:
-                continue
-            for url_key in url_to_id_mapping:
-                if url_key in url.content:
-                    edge = [url.id, url_to_id_mapping[url_key]]
-                    edges.append(edge)
-
-            node = [url.id, url.to_dict()]
-            nodes.append(node)
-
-        self.graph = nx.DiGraph(name="website graph")
-        self.graph.add_nodes_from(nodes)
-        self.graph.add_edges_from(edges)
-        pr = nx.pagerank(self.graph, alpha=0.9)
+        sources, targets = link_edges(urls)
+        pr = pagerank(len(urls), sources, targets, alpha=0.9)
         # sort the pagerank values in descending order
-        sorted_pr = sorted(pr.items(), key=lambda x: x[1], reverse=True)
-        logger.info(f"pagerank results: {sorted_pr}")
-        # get the top websites
-        top_k_websites = sorted_pr[:top_k]
-        urls_candidates = [self.graph.nodes[url_id] for url_id, _ in top_k_websites]
-        urls_cleaned = [CrawledObject.from_dict(doc) for doc in urls_candidates if doc]
-        return urls_cleaned
+        top_k_websites = np.argsort(-pr, kind="stable")[:top_k]
+        logger.info(
+            f"pagerank results: {[(urls[i].source, pr[i]) for i in top_k_websites]}"
+        )
+        return [urls[i] for i in top_k_websites if not urls[i].is_error]
 
     def to_crawled_text(self, text_list: List[str]) -> List[CrawledObject]:
         """Crawls a list of text."""
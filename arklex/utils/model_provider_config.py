@@ -1,4 +1,8 @@
-from typing import Dict, Type, Any, List
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Type, Any, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_anthropic import ChatAnthropic
@@ -7,19 +11,27 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
 
+from arklex.utils.embedding_cache import CachedEmbeddings
+from arklex.utils.fake_llm import FakeChatModel, FakeEmbeddings
+from arklex.utils.trace import span_callback_handler
+
+logger = logging.getLogger(__name__)
+
 
 def get_huggingface_llm(model: str, **kwargs: Any) -> ChatHuggingFace:
     llm = HuggingFaceEndpoint(repo_id=model, task="text-generation", **kwargs)
     return ChatHuggingFace(llm=llm)
 
 
-LLM_PROVIDERS: List[str] = ["openai", "gemini", "anthropic", "huggingface"]
+# "fake" answers offline and deterministically, see arklex/utils/fake_llm.py
+LLM_PROVIDERS: List[str] = ["openai", "gemini", "anthropic", "huggingface", "fake"]
 
 PROVIDER_MAP: Dict[str, Type] = {
     "anthropic": ChatAnthropic,
     "gemini": ChatGoogleGenerativeAI,
     "openai": ChatOpenAI,
     "huggingface": get_huggingface_llm,
+    "fake": FakeChatModel,
 }
 
 PROVIDER_EMBEDDINGS: Dict[str, Type] = {
@@ -27,11 +39,170 @@ PROVIDER_EMBEDDINGS: Dict[str, Type] = {
     "gemini": GoogleGenerativeAIEmbeddings,
     "openai": OpenAIEmbeddings,
     "huggingface": HuggingFaceEmbeddings,
+    "fake": FakeEmbeddings,
 }
 
+# Providers whose embed_query is embed_documents of a single text
+SYMMETRIC_EMBEDDING_PROVIDERS: List[str] = [
+    "anthropic",
+    "openai",
+    "huggingface",
+    "fake",
+]
+
 PROVIDER_EMBEDDING_MODELS: Dict[str, str] = {
     "anthropic": "sentence-transformers/sentence-t5-base",
     "gemini": "models/embedding-001",
     "openai": "text-embedding-ada-002",
     "huggingface": "sentence-transformers/all-mpnet-base-v2",
+    "fake": "fake-embedding",
 }
+
+
+def default_embedding_model(llm_provider: str) -> str:
+    return PROVIDER_EMBEDDING_MODELS.get(
+        llm_provider, PROVIDER_EMBEDDING_MODELS["openai"]
+    )
+
+
+class ModelClientPool:
+    """Process-wide pool of chat and embedding clients.
+
+    Every client owns its HTTP session, so building one per call pays the TLS
+    handshake again. Clients are stateless between calls and safe to share
+    across threads, so one instance per (provider, model, temperature,
+    response_format, extra kwargs) is kept and handed out to every caller.
+    """
+
+    def __init__(self, max_size: int = 64) -> None:
+        self.max_size: int = max_size
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get_llm(
+        self,
+        llm_provider: str,
+        model: str,
+        temperature: Optional[float] = None,
+        response_format: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Return a chat model client, building it on first use.
+
+        Args:
+            llm_provider: Key of PROVIDER_MAP, unknown providers fall back to OpenAI.
+            model: Model name or path.
+            temperature: Sampling temperature, the provider default if None.
+            response_format: "json" or "text" to bind an OpenAI response format.
+            kwargs: Extra constructor arguments, e.g. n or max_tokens.
+        """
+        if llm_provider != "openai":
+            # only bound on OpenAI clients, the others are the same either way
+            response_format = None
+        key: str = self._make_key(
+            "llm", llm_provider, model, temperature, response_format, kwargs
+        )
+
+        def build() -> Any:
+            # counts the calls and tokens of the traced turns
+            client_kwargs: Dict[str, Any] = {
+                "model": model,
+                "callbacks": [span_callback_handler],
+                **kwargs,
+            }
+            if temperature is not None:
+                client_kwargs["temperature"] = temperature
+            llm: Any = PROVIDER_MAP.get(llm_provider, ChatOpenAI)(**client_kwargs)
+            if response_format is not None:
+                llm = llm.bind(
+                    response_format=(
+                        {"type": "json_object"}
+                        if response_format == "json"
+                        else {"type": "text"}
+                    )
+                )
+            return llm
+
+        return self._get_or_build(key, build)
+
+    def get_embedding_model(
+        self, llm_provider: str, model: Optional[str] = None
+    ) -> Any:
+        """Return an embedding client, defaulting to the provider's embedding model."""
+        if model is None:
+            model = default_embedding_model(llm_provider)
+        key: str = self._make_key("embedding", llm_provider, model, None, None, {})
+
+        def build() -> Any:
+            client: Any = PROVIDER_EMBEDDINGS.get(llm_provider, OpenAIEmbeddings)(
+                **(
+                    {"model": model}
+                    if llm_provider != "anthropic"
+                    else {"model_name": model}
+                )
+            )
+            # texts seen by any caller are only sent to the provider once
+            return CachedEmbeddings(
+                client,
+                f"{llm_provider}:{model}",
+                symmetric=llm_provider in SYMMETRIC_EMBEDDING_PROVIDERS
+                or llm_provider not in PROVIDER_EMBEDDINGS,
+            )
+
+        return self._get_or_build(key, build)
+
+    @staticmethod
+    def _make_key(
+        kind: str,
+        llm_provider: str,
+        model: str,
+        temperature: Optional[float],
+        response_format: Optional[str],
+        kwargs: Dict[str, Any],
+    ) -> str:
+        return json.dumps(
+            [kind, llm_provider, model, temperature, response_format, kwargs],
+            sort_keys=True,
+            default=str,
+        )
+
+    def _get_or_build(self, key: str, build: Any) -> Any:
+        with self._lock:
+            client: Any = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+        # construction can load local models, so it runs outside the lock; a
+        # concurrent duplicate build is harmless and the first one inserted wins
+        client = build()
+        with self._lock:
+            existing: Any = self._clients.get(key)
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self.misses += 1
+            self._clients[key] = client
+            while len(self._clients) > self.max_size:
+                evicted_key, _ = self._clients.popitem(last=False)
+                logger.info(f"Evicted model client {evicted_key}")
+        return client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+model_client_pool: ModelClientPool = ModelClientPool()
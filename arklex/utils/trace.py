@@ -1,4 +1,12 @@
+import contextvars
+import os
+import threading
+import time
 from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
 
 
 class TraceRunName(str, Enum):
@@ -7,3 +15,222 @@ class TraceRunName(str, Enum):
     OrchestResponse = "OrchestResponse"
     NLU = "NLU"
     SlotFilling = "SlotFilling"
+    SlotVerification = "SlotVerification"
+    Turn = "Turn"
+    Personalize = "Personalize"
+    MemoryRetrieval = "MemoryRetrieval"
+    EnvStep = "EnvStep"
+    Generation = "Generation"
+
+
+# the span code is running in, None when the turn is not traced
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "arklex_current_span", default=None
+)
+
+
+class Span:
+    """A timed section of a turn, with the LLM calls made while it was open.
+
+    Like their duration, the LLM call and token counts of a span include the
+    ones of its children. Spans nest through a context variable, so a span
+    opened in code awaited by, or run with asyncio.to_thread from, an open
+    span becomes its child.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name: str = name
+        self.parent: Optional[Span] = parent
+        self.trace_id: str = parent.trace_id if parent else os.urandom(16).hex()
+        self.lock: threading.Lock = parent.lock if parent else threading.Lock()
+        self.span_id: str = os.urandom(8).hex()
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.children: List[Span] = []
+        self.llm_calls: int = 0
+        self.input_tokens: int = 0
+        self.output_tokens: int = 0
+        self.start_ns: int = 0
+        self.end_ns: Optional[int] = None
+        self._token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        if self.parent is not None:
+            with self.lock:
+                self.parent.children.append(self)
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_llm_call(self, input_tokens: int, output_tokens: int) -> None:
+        with self.lock:
+            span: Optional[Span] = self
+            while span is not None:
+                span.llm_calls += 1
+                span.input_tokens += input_tokens
+                span.output_tokens += output_tokens
+                span = span.parent
+
+    def to_dict(self, now_ns: Optional[int] = None) -> Dict[str, Any]:
+        """The span and its children, the ones still open end at now_ns."""
+        if now_ns is None:
+            now_ns = time.time_ns()
+        end_ns: int = self.end_ns if self.end_ns is not None else now_ns
+        with self.lock:
+            children: List[Span] = list(self.children)
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration": (end_ns - self.start_ns) / 1e9,
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "attributes": dict(self.attributes),
+            "children": [child.to_dict(now_ns) for child in children],
+        }
+
+
+class _NullSpan:
+    """Stands for every span of a turn that is not traced."""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+NULL_SPAN: _NullSpan = _NullSpan()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """A child of the current span, or a no-op when the turn is not traced."""
+    parent: Optional[Span] = _current_span.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(name, parent, attributes)
+
+
+def start_trace(name: str = TraceRunName.Turn.value, **attributes: Any) -> Span:
+    """The root span of a new trace, open it with `with`."""
+    return Span(name, None, attributes)
+
+
+def current_trace() -> Optional[Dict[str, Any]]:
+    """The trace the current span belongs to, None when not tracing."""
+    root: Optional[Span] = _current_span.get()
+    if root is None:
+        return None
+    while root.parent is not None:
+        root = root.parent
+    return {"trace_id": root.trace_id, "spans": [root.to_dict()]}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Dict[str, Any], service_name: str = "arklex") -> Dict[str, Any]:
+    """A trace of current_trace as OpenTelemetry OTLP/JSON, for any collector."""
+    spans: List[Dict[str, Any]] = []
+
+    def add(span: Dict[str, Any], parent_id: str) -> None:
+        attributes: Dict[str, Any] = {
+            **span["attributes"],
+            "llm.calls": span["llm_calls"],
+            "llm.input_tokens": span["input_tokens"],
+            "llm.output_tokens": span["output_tokens"],
+        }
+        spans.append(
+            {
+                "traceId": trace["trace_id"],
+                "spanId": span["span_id"],
+                "parentSpanId": parent_id,
+                "name": span["name"],
+                # SPAN_KIND_INTERNAL
+                "kind": 1,
+                "startTimeUnixNano": str(span["start_time_unix_nano"]),
+                "endTimeUnixNano": str(span["end_time_unix_nano"]),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in attributes.items()
+                ],
+                # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+                "status": {"code": 2 if "error" in span["attributes"] else 0},
+            }
+        )
+        for child in span["children"]:
+            add(child, span["span_id"])
+
+    for root in trace["spans"]:
+        add(root, "")
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": _otlp_value(service_name)}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "arklex"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def token_usage(response: LLMResult) -> Tuple[int, int]:
+    """Input and output tokens of an LLM response, 0 when the provider omits them."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage: Optional[Dict[str, int]] = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if input_tokens or output_tokens:
+        return input_tokens, output_tokens
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class SpanCallbackHandler(BaseCallbackHandler):
+    """Counts the LLM calls and tokens of the span they are made in."""
+
+    # in the caller's context, the current span is read from it
+    run_inline: bool = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        span: Optional[Span] = _current_span.get()
+        if span is not None:
+            span.record_llm_call(*token_usage(response))
+
+
+span_callback_handler: SpanCallbackHandler = SpanCallbackHandler()
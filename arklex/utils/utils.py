@@ -1,15 +1,29 @@
 import os
 import sys
 import json
+import asyncio
 import logging
+import concurrent.futures
 from logging.handlers import RotatingFileHandler
-from typing import List, Dict, Any, Optional
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import tiktoken
 import Levenshtein
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 def init_logger(
     log_level: int = logging.INFO, filename: Optional[str] = None
@@ -139,3 +153,64 @@ def format_truncated_chat_history(
     for turn in chat_history:
         chat_history_str += f"{turn['role']}: {truncate_string(turn['content'], max_length) if turn['content'] else turn['content']}\n"
     return chat_history_str.strip()
+
+
+def run_coroutine_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine from synchronous code.
+
+    asyncio.run cannot be used while an event loop is already running in the
+    current thread (e.g. a sync handler called from an async server), so the
+    coroutine is run on a fresh loop in a helper thread in that case.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+# A call of a flow written once for sync and async code: the sync function,
+# its async counterpart and their arguments, see run_steps
+Step = Tuple[Callable[..., Any], Callable[..., Any], Tuple[Any, ...]]
+
+
+def run_steps(steps: Generator[Step, Any, T]) -> T:
+    """Run a flow that yields its blocking calls as steps, calling the sync functions.
+
+    The result of every step is sent back into the flow, and its exception
+    raised at the yield, so the flow handles both as if it made the call.
+    """
+    result: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        try:
+            step: Step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            result = step[0](*step[2])
+        except BaseException as err:
+            error = err
+
+
+async def arun_steps(steps: Generator[Step, Any, T]) -> T:
+    """Async counterpart of run_steps, calling the async functions.
+
+    Coroutines they return are awaited, tasks are sent back as they are.
+    """
+    result: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        try:
+            step: Step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            result = step[1](*step[2])
+            if asyncio.iscoroutine(result):
+                result = await result
+        except BaseException as err:
+            error = err
@@ -0,0 +1,96 @@
+"""Per-turn orchestrator setup cost: building AgentOrg on every turn vs. the registry.
+
+Before the OrchestratorRegistry every turn of run.py / model_api.py created a new
+Env and AgentOrg, re-parsing the taskgraph and rebuilding the task graph (and the
+planner resource library when the planner is enabled). This script replays that
+per-turn setup against the ``examples/*/taskgraph.json`` graphs and compares it
+with fetching the compiled engine from the registry. LLM calls are not part of
+the measurement, so the reported turns/sec is the ceiling the setup path alone
+allows.
+
+Usage:
+    python -m benchmark.orchestrator.engine_setup --turns 50
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from arklex.env.env import Env
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.registry import OrchestratorRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def per_turn_construction(config: Dict[str, Any], turns: int, planner: bool) -> float:
+    start: float = time.perf_counter()
+    for _ in range(turns):
+        env = Env(
+            tools=config.get("tools", []),
+            workers=config.get("workers", []),
+            slotsfillapi=config.get("slotfillapi", ""),
+            planner_enabled=planner,
+        )
+        AgentOrg(config=json.loads(json.dumps(config)), env=env)
+    return time.perf_counter() - start
+
+
+def registry_lookup(config: Dict[str, Any], turns: int, planner: bool) -> float:
+    registry: OrchestratorRegistry = OrchestratorRegistry()
+    start: float = time.perf_counter()
+    for _ in range(turns):
+        registry.get(config, planner_enabled=planner)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples-dir", type=str, default="./examples")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument(
+        "--planner",
+        action="store_true",
+        help="enable the ReAct planner (embeds the resource library, needs an embedding API)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    rows: List[Dict[str, Any]] = []
+    for path in sorted(
+        glob.glob(os.path.join(args.examples_dir, "*", "taskgraph.json"))
+    ):
+        with open(path) as f:
+            config: Dict[str, Any] = json.load(f)
+        try:
+            # workers such as the StoryMemoryWorker create their files in DATA_DIR
+            with tempfile.TemporaryDirectory() as data_dir:
+                os.environ["DATA_DIR"] = data_dir
+                before: float = per_turn_construction(config, args.turns, args.planner)
+                after: float = registry_lookup(config, args.turns, args.planner)
+        except Exception as err:
+            print(f"skip {path}: {err}")
+            continue
+        rows.append(
+            {
+                "taskgraph": os.path.basename(os.path.dirname(path)),
+                "before": args.turns / before,
+                "after": args.turns / after,
+            }
+        )
+
+    print(f"{'taskgraph':<24}{'before (turns/s)':>18}{'after (turns/s)':>18}{'speedup':>10}")
+    for row in rows:
+        print(
+            f"{row['taskgraph']:<24}{row['before']:>18.1f}{row['after']:>18.1f}"
+            f"{row['after'] / row['before']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
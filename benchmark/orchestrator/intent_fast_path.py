@@ -0,0 +1,106 @@
+"""Hit rate and accuracy of the embedding intent classifier against the LLM NLU.
+
+Every user turn of a set of simulated conversations (the ``convos`` written by
+``arklex.evaluation.simulate_first_pass_convos``) is classified against the
+task graph's global intents twice: by the EmbeddingIntentClassifier and by
+the LLM NLU used today. The LLM answer is taken as the reference, so the
+reported accuracy is the agreement on the turns where the classifier was
+confident enough to skip the LLM. Latency of both paths is reported too.
+Both paths call the configured provider, so an API key is required.
+
+Usage:
+    python -m benchmark.orchestrator.intent_fast_path \
+        --input-dir ./examples/customer_service --convos ./p1_sample_convos.json \
+        --margin 0.05 --threshold 0.6
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.graph_state import LLMConfig, Params
+from arklex.utils.model_config import MODEL
+from arklex.utils.utils import format_chat_history
+
+logger = logging.getLogger(__name__)
+
+
+def user_turns(convo: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """(text, chat_history_str) of every user turn, the system prompt excluded."""
+    history: List[Dict[str, str]] = []
+    turns: List[Dict[str, Any]] = []
+    for message in convo:
+        if message.get("role") not in ["user", "assistant"]:
+            continue
+        history.append({"role": message["role"], "content": message["content"]})
+        if message["role"] == "user":
+            turns.append(
+                {
+                    "text": message["content"],
+                    "chat_history_str": format_chat_history(history),
+                }
+            )
+    return turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dir", type=str, required=True)
+    parser.add_argument("--convos", type=str, required=True)
+    parser.add_argument("--margin", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--max-turns", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(os.path.join(args.input_dir, "taskgraph.json")) as f:
+        config: Dict[str, Any] = json.load(f)
+    config["intent_classifier"] = {
+        "mode": "shadow",
+        "margin": args.margin,
+        "threshold": args.threshold,
+    }
+    with open(args.convos) as f:
+        convos: List[List[Dict[str, Any]]] = json.load(f)
+
+    task_graph: TaskGraph = TaskGraph(
+        "taskgraph", config, LLMConfig(**config.get("model", MODEL))
+    )
+    candidate_intents: Dict[str, List[Dict[str, Any]]] = (
+        task_graph.get_available_global_intents(Params())
+    )
+    turns: List[Dict[str, Any]] = [t for c in convos for t in user_turns(c)]
+    turns = turns[: args.max_turns]
+
+    fast_seconds: float = 0.0
+    llm_seconds: float = 0.0
+    for turn in turns:
+        start: float = time.perf_counter()
+        fast_intent: Optional[str] = task_graph.intent_classifier.classify(
+            turn["text"], candidate_intents
+        )
+        fast_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        llm_intent: str = task_graph.nluapi.execute(
+            turn["text"],
+            candidate_intents,
+            turn["chat_history_str"],
+            task_graph.llm_config.model_dump(),
+        )
+        llm_seconds += time.perf_counter() - start
+        task_graph.intent_classifier.record_llm_prediction(fast_intent, llm_intent)
+
+    stats: Dict[str, float] = task_graph.intent_classifier.stats()
+    n_turns: int = max(len(turns), 1)
+    print(f"user turns:            {len(turns)}")
+    print(f"fast-path hit rate:    {stats['hit_rate']:.1%}")
+    print(f"accuracy vs LLM:       {stats['agreement']:.1%} ({stats['compared']} hits)")
+    print(f"classifier latency:    {fast_seconds / n_turns * 1000:.1f} ms/turn")
+    print(f"LLM NLU latency:       {llm_seconds / n_turns * 1000:.1f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Offline per-turn latency, CPU time and allocations of the orchestrator.
+
+Conversations are replayed turn by turn through AgentOrg against the
+``examples/*/taskgraph.json`` graphs, with every LLM and embedding call
+answered by the deterministic ``fake`` provider (arklex/utils/fake_llm.py),
+so no API key nor network is needed and two runs make the same calls. What
+is measured is the orchestrator itself, plus the configured fake latency.
+
+Without ``--convos``, each example replays synthetic conversations walking
+its global intents, which are scripted as the NLU answers. With ``--convos``
+the user turns of recorded conversations (as written by
+``arklex.evaluation.simulate_first_pass_convos``) are replayed instead and
+the fake model picks the intents. The FaissRAGWorker searches a small corpus
+built from the graph's own texts. Workers that need a service (search,
+Milvus, databases, human in the loop) are replaced by the MessageWorker, and
+so are tools without required slots; the other tools only run their slot
+filling, since the fake model leaves slots empty and they ask for them.
+
+``--speculative-nlu`` turns on the bot's speculative_nlu switch, which
+predicts the global intent alongside the local one; run with some
+``--latency`` to see its effect on the turn latency.
+
+Latency and CPU time come from a first pass over the conversations, the
+allocations (peak traced memory above the start of the turn) from a second
+one with tracemalloc on, since tracing slows every allocation down.
+
+Usage:
+    python -m benchmark.orchestrator.replay --conversations 5 --turns 6 \
+        --latency 0.02 --output replay.json
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from arklex.env.env import Env
+from arklex.env.tools.RAG.retrievers.chunk_store import CHUNK_STORE_DIR, ChunkStore
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.fake_llm import fake_llm_settings
+from arklex.utils.graph_state import LLMConfig, Params
+
+logger = logging.getLogger(__name__)
+
+FAKE_MODEL: Dict[str, str] = {"model_type_or_path": "fake", "llm_provider": "fake"}
+OFFLINE_WORKERS: List[str] = ["MessageWorker", "FaissRAGWorker"]
+UNSURE_INTENT: str = "others"
+
+
+def offline_engine(
+    config: Dict[str, Any], speculative_nlu: bool = False
+) -> Tuple[AgentOrg, int]:
+    """The orchestrator of config on the fake provider, and the nodes rerouted."""
+    config = json.loads(json.dumps(config))
+    config["model"] = FAKE_MODEL
+    config["speculative_nlu"] = speculative_nlu
+    workers: List[Dict[str, Any]] = [
+        w for w in config.get("workers", []) if w["name"] in OFFLINE_WORKERS
+    ]
+    env: Env = Env(
+        tools=config.get("tools", []),
+        workers=workers,
+        slotsfillapi=config.get("slotfillapi", ""),
+    )
+    resources: List[str] = [
+        r["id"] for r in config.get("workers", []) + config.get("tools", [])
+    ]
+    message_worker: str = env.name2id["MessageWorker"]
+    rerouted: int = 0
+    for _, node in config["nodes"]:
+        resource_id: Optional[str] = node.get("resource", {}).get("id")
+        # nested graphs and the like are not resources of the env
+        if resource_id in env.workers or resource_id not in resources:
+            continue
+        if resource_id in env.tools and any(
+            slot.required for slot in env.tools[resource_id]["execute"].spec.slots
+        ):
+            continue
+        node["resource"] = {"id": message_worker, "name": "MessageWorker"}
+        rerouted += 1
+    return AgentOrg(config=config, env=env), rerouted
+
+
+def write_corpus(config: Dict[str, Any], data_dir: str) -> None:
+    """A chunk store of the graph's own texts, for the FaissRAGWorker."""
+    texts: List[str] = [config.get("intro", ""), config.get("role", "")]
+    for _, node in config["nodes"]:
+        attribute: Dict[str, Any] = node.get("attribute", {})
+        texts += [attribute.get("task", ""), attribute.get("value", "")]
+    for _, _, edge in config["edges"]:
+        texts.append(edge.get("attribute", {}).get("definition", ""))
+    documents: List[Document] = [
+        Document(page_content=text, metadata={"source": f"chunk-{i}"})
+        for i, text in enumerate(t for t in texts if isinstance(t, str) and t.strip())
+    ]
+    ChunkStore.write(os.path.join(data_dir, CHUNK_STORE_DIR), documents)
+
+
+def synthetic_conversations(
+    config: Dict[str, Any], conversations: int, turns: int
+) -> List[List[Tuple[str, Optional[str]]]]:
+    """(user text, scripted intent) turns walking the graph's global intents."""
+    task_graph: TaskGraph = TaskGraph("taskgraph", config, LLMConfig(**FAKE_MODEL))
+    global_intents: Dict[str, List[Dict[str, Any]]] = (
+        task_graph.get_available_global_intents(Params())
+    )
+    utterances: List[Tuple[str, str]] = []
+    for intent, edges in global_intents.items():
+        if intent == UNSURE_INTENT:
+            continue
+        samples: List[str] = edges[0].get("attribute", {}).get("sample_utterances")
+        utterances.append((samples[0] if samples else f"I need help: {intent}", intent))
+    if not utterances:
+        utterances = [("Hello, can you help me?", None)]
+    return [
+        [utterances[(c + t) % len(utterances)] for t in range(turns)]
+        for c in range(conversations)
+    ]
+
+
+def recorded_conversations(path: str) -> List[List[Tuple[str, Optional[str]]]]:
+    with open(path) as f:
+        convos: List[List[Dict[str, Any]]] = json.load(f)
+    return [
+        [(m["content"], None) for m in convo if m.get("role") == "user"]
+        for convo in convos
+    ]
+
+
+def replay(
+    orchestrator: AgentOrg,
+    conversations: List[List[Tuple[str, Optional[str]]]],
+    allocations: bool = False,
+) -> List[Dict[str, float]]:
+    """Latency, CPU time, LLM calls and, if asked, allocations of every turn."""
+    turns: List[Dict[str, float]] = []
+    for conversation in conversations:
+        history: List[Dict[str, str]] = []
+        parameters: Dict[str, Any] = {}
+        for text, intent in conversation:
+            fake_llm_settings.script_intents([intent] if intent else [])
+            calls: int = fake_llm_settings.stats()["calls"]
+            inputs: Dict[str, Any] = {
+                "text": text,
+                "chat_history": history,
+                "parameters": parameters,
+            }
+            if allocations:
+                tracemalloc.reset_peak()
+                start_memory: int = tracemalloc.get_traced_memory()[0]
+            start_cpu: float = time.process_time()
+            start: float = time.perf_counter()
+            result: Dict[str, Any] = orchestrator.get_response(inputs)
+            turn: Dict[str, float] = {
+                "latency": time.perf_counter() - start,
+                "cpu": time.process_time() - start_cpu,
+                "llm_calls": fake_llm_settings.stats()["calls"] - calls,
+            }
+            if allocations:
+                turn["allocated"] = tracemalloc.get_traced_memory()[1] - start_memory
+            turns.append(turn)
+            history = history + [
+                {"role": "user", "content": text},
+                {"role": "assistant", "content": result["answer"]},
+            ]
+            parameters = result["parameters"]
+    return turns
+
+
+def summarize(
+    turns: List[Dict[str, float]], allocated: List[Dict[str, float]]
+) -> Dict[str, float]:
+    latency: np.ndarray = np.array([t["latency"] for t in turns])
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+    summary: Dict[str, float] = {
+        "turns": len(turns),
+        "latency_p50_ms": float(p50) * 1000,
+        "latency_p95_ms": float(p95) * 1000,
+        "latency_p99_ms": float(p99) * 1000,
+        "cpu_ms_per_turn": float(np.mean([t["cpu"] for t in turns])) * 1000,
+        "llm_calls_per_turn": float(np.mean([t["llm_calls"] for t in turns])),
+    }
+    if allocated:
+        summary["allocated_kib_per_turn"] = (
+            float(np.mean([t["allocated"] for t in allocated])) / 1024
+        )
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples-dir", type=str, default="./examples")
+    parser.add_argument(
+        "--examples",
+        type=str,
+        nargs="*",
+        default=None,
+        help="example names, all of them by default",
+    )
+    parser.add_argument("--convos", type=str, default=None)
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake seconds per LLM call"
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="fake seconds per word"
+    )
+    parser.add_argument("--embedding-latency", type=float, default=0.0)
+    parser.add_argument("--speculative-nlu", action="store_true")
+    parser.add_argument("--warmup", type=int, default=1, help="conversations")
+    parser.add_argument("--no-allocations", action="store_true")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    fake_llm_settings.configure(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        embedding_latency=args.embedding_latency,
+    )
+    report: Dict[str, Dict[str, float]] = {}
+    all_turns: List[Dict[str, float]] = []
+    all_allocated: List[Dict[str, float]] = []
+    paths: List[str] = sorted(
+        glob.glob(os.path.join(args.examples_dir, "*", "taskgraph.json"))
+    )
+    for path in paths:
+        name: str = os.path.basename(os.path.dirname(path))
+        if args.examples and name not in args.examples:
+            continue
+        with open(path) as f:
+            config: Dict[str, Any] = json.load(f)
+        with tempfile.TemporaryDirectory() as data_dir:
+            os.environ["DATA_DIR"] = data_dir
+            write_corpus(config, data_dir)
+            orchestrator, rerouted = offline_engine(config, args.speculative_nlu)
+            conversations: List[List[Tuple[str, Optional[str]]]] = (
+                recorded_conversations(args.convos)
+                if args.convos
+                else synthetic_conversations(config, args.conversations, args.turns)
+            )
+            # client pools, indexes and caches are built by the first turns
+            replay(orchestrator, conversations[: args.warmup])
+            turns: List[Dict[str, float]] = replay(orchestrator, conversations)
+            allocated: List[Dict[str, float]] = []
+            if not args.no_allocations:
+                tracemalloc.start()
+                allocated = replay(orchestrator, conversations, allocations=True)
+                tracemalloc.stop()
+        report[name] = {**summarize(turns, allocated), "rerouted_nodes": rerouted}
+        all_turns += turns
+        all_allocated += allocated
+
+    if not all_turns:
+        print(f"No taskgraph.json found under {args.examples_dir}")
+        return
+    report["all"] = summarize(all_turns, all_allocated)
+    columns: List[str] = [
+        "turns",
+        "latency_p50_ms",
+        "latency_p95_ms",
+        "latency_p99_ms",
+        "cpu_ms_per_turn",
+        "allocated_kib_per_turn",
+        "llm_calls_per_turn",
+    ]
+    print(f"{'example':24}" + "".join(f"{c.split('_per')[0]:>16}" for c in columns))
+    for name, summary in report.items():
+        print(
+            f"{name:24}"
+            + "".join(f"{summary.get(c, float('nan')):>16.1f}" for c in columns)
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Overhead of Env.step per tool call, without the LLM.
+
+A tool with --slots slots is registered with register_tool and called
+through Env.step with a stub slot filler that fills and verifies every slot
+at once, so what is timed is the orchestration around the tool: building
+the Tool, preparing its slots, filtering the call arguments and recording
+the call. Two ways of building the Tool are compared:
+
+- Compiled: the register_tool factory, sharing the ToolSpec compiled at
+  registration and copying the slot templates.
+- Legacy: a Tool compiled from scratch on every call, with the signature
+  inspected again on every call, as before ToolSpec.
+
+Usage:
+    python -m benchmark.orchestrator.tool_step --calls 20000 --slots 8
+"""
+
+import argparse
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+from arklex.env.env import BaseResourceInitializer, Env
+from arklex.env.tools.tools import Tool, register_tool
+from arklex.utils.graph_state import (
+    BotConfig,
+    LLMConfig,
+    MessageState,
+    NodeInfo,
+    Params,
+    ResourceRecord,
+)
+from arklex.utils.slot import Slot
+
+
+class LegacyTool(Tool):
+    def _filter_kwargs(self, combined_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        sig = inspect.signature(self.func)
+        if any(
+            p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values()
+        ):
+            return combined_kwargs
+        return {k: v for k, v in combined_kwargs.items() if k in sig.parameters}
+
+
+class FilledSlots:
+    def execute(
+        self, slots: List[Slot], chat_history_str: str, llm_config: Dict[str, Any]
+    ) -> List[Slot]:
+        for slot in slots:
+            slot.value = f"{slot.name}-value"
+            slot.verified = True
+        return slots
+
+
+class Resources(BaseResourceInitializer):
+    def __init__(self, factory: Callable[[], Tool]):
+        self.factory = factory
+
+    def init_tools(self, tools: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {
+            "tool": {
+                "name": "lookup",
+                "description": "Look up an order",
+                "execute": self.factory,
+                "fixed_args": {"shop_id": "shop-1"},
+            }
+        }
+
+    def init_workers(self, workers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {}
+
+
+def slot_configs(n: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": f"slot_{i}",
+            "type": "str",
+            "enum": [],
+            "description": f"Value number {i} the tool needs",
+            "prompt": f"Could you tell me value number {i}?",
+            "required": True,
+        }
+        for i in range(n)
+    ]
+
+
+def new_state() -> MessageState:
+    return MessageState(
+        bot_config=BotConfig(
+            bot_id="benchmark",
+            version="0",
+            language="EN",
+            bot_type="benchmark",
+            llm_config=LLMConfig(
+                model_type_or_path="gpt-4o-mini", llm_provider="openai"
+            ),
+        ),
+        function_calling_trajectory=[],
+        trajectory=[[ResourceRecord(info={})]],
+        slots={},
+    )
+
+
+def time_steps(factory: Callable[[], Tool], calls: int) -> float:
+    env = Env(tools=[], workers=[], resource_inizializer=Resources(factory))
+    env.slotfillapi = FilledSlots()
+    states: List[MessageState] = [new_state() for _ in range(calls)]
+    start: float = time.perf_counter()
+    for state in states:
+        env.step("tool", state, Params(), NodeInfo())
+    return (time.perf_counter() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--slots", type=int, default=8)
+    args = parser.parse_args()
+    # the per-call log lines would dominate the timings
+    logging.disable(logging.INFO)
+
+    slots: List[Dict[str, Any]] = slot_configs(args.slots)
+
+    def lookup(shop_id: str, **kwargs: Any) -> str:
+        return f"{len(kwargs)} values for {shop_id}"
+
+    compiled: Callable[[], Tool] = register_tool("Look up", slots, ["result"])(lookup)
+
+    def legacy() -> Tool:
+        return LegacyTool(lookup, "lookup", "Look up", slots, ["result"], False)
+
+    for name, factory in [("legacy", legacy), ("compiled", compiled)]:
+        # warm up imports and pydantic validators before timing
+        time_steps(factory, 100)
+        seconds: float = time_steps(factory, args.calls)
+        print(f"{name:<9} {args.slots:>3} slots {seconds * 1e6:8.1f} us/step")
+
+
+if __name__ == "__main__":
+    main()
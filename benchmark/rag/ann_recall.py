@@ -0,0 +1,205 @@
+"""Recall against latency of the ANN index types MilvusRetriever can build.
+
+Clustered synthetic vectors are indexed with FLAT, HNSW, IVF_FLAT and
+IVF_PQ, using the same build parameters as
+arklex.env.tools.RAG.retrievers.milvus_index. Each index is then searched
+with a sweep of its ef/nprobe knob. Recall@k is measured against an exact
+numpy scan. With --milvus-uri the indexes are built in a Milvus server.
+Without it, the FAISS equivalents of the same index types are used, which
+gives a local estimate with no server.
+
+Usage:
+    python -m benchmark.rag.ann_recall --vectors 100000 --dimension 256 --top-k 4
+    python -m benchmark.rag.ann_recall --milvus-uri http://localhost:19530
+"""
+
+import argparse
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from arklex.env.tools.RAG.retrievers.milvus_index import (
+    embedding_index,
+    index_build_params,
+    search_params,
+)
+from arklex.utils.graph_state import VectorIndexConfig
+
+
+def synthetic_vectors(
+    n: int, n_queries: int, dimension: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectors around a few hundred centroids, closer to real embeddings than uniform noise."""
+    rng: np.random.Generator = np.random.default_rng(seed)
+    centroids: np.ndarray = rng.standard_normal((256, dimension))
+    data: np.ndarray = centroids[rng.integers(0, 256, n)] + 0.3 * rng.standard_normal(
+        (n, dimension)
+    )
+    queries: np.ndarray = centroids[
+        rng.integers(0, 256, n_queries)
+    ] + 0.3 * rng.standard_normal((n_queries, dimension))
+    return data.astype(np.float32), queries.astype(np.float32)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances: np.ndarray = (
+        (queries**2).sum(1)[:, None] - 2 * queries @ data.T + (data**2).sum(1)[None]
+    )
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def recall(found: List[List[int]], truth: np.ndarray) -> float:
+    k: int = truth.shape[1]
+    return float(
+        np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth.tolist())])
+    )
+
+
+class FaissIndex:
+    def __init__(self, config: VectorIndexConfig, data: np.ndarray) -> None:
+        import faiss
+
+        dimension: int = data.shape[1]
+        params: Dict[str, Any] = index_build_params(config)
+        if config.index_type == "FLAT":
+            self.index = faiss.IndexFlatL2(dimension)
+        elif config.index_type == "HNSW":
+            self.index = faiss.IndexHNSWFlat(dimension, params["M"])
+            self.index.hnsw.efConstruction = params["efConstruction"]
+        elif config.index_type == "IVF_FLAT":
+            self.quantizer = faiss.IndexFlatL2(dimension)
+            self.index = faiss.IndexIVFFlat(self.quantizer, dimension, params["nlist"])
+        else:
+            self.quantizer = faiss.IndexFlatL2(dimension)
+            self.index = faiss.IndexIVFPQ(
+                self.quantizer, dimension, params["nlist"], params["m"], params["nbits"]
+            )
+        if not self.index.is_trained:
+            self.index.train(data)
+        self.index.add(data)
+
+    def search(self, query: np.ndarray, k: int, params: Dict[str, Any]) -> List[int]:
+        if "ef" in params:
+            self.index.hnsw.efSearch = params["ef"]
+        if "nprobe" in params:
+            self.index.nprobe = params["nprobe"]
+        return self.index.search(query[None], k)[1][0].tolist()
+
+
+class MilvusIndex:
+    def __init__(
+        self, config: VectorIndexConfig, data: np.ndarray, client: Any, name: str
+    ) -> None:
+        from pymilvus import DataType, MilvusClient
+
+        self.client = client
+        self.name: str = name
+        self.metric_type: str = config.metric_type
+        self.index_type: str = config.index_type
+        if client.has_collection(name):
+            client.drop_collection(name)
+        schema = MilvusClient.create_schema(auto_id=False)
+        schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+        schema.add_field(
+            field_name="embedding", datatype=DataType.FLOAT_VECTOR, dim=data.shape[1]
+        )
+        index_params = client.prepare_index_params()
+        index_params.add_index(**embedding_index(config, data.shape[1]))
+        client.create_collection(
+            collection_name=name, schema=schema, index_params=index_params
+        )
+        for start in range(0, len(data), 5000):
+            client.insert(
+                collection_name=name,
+                data=[
+                    {"id": start + i, "embedding": v.tolist()}
+                    for i, v in enumerate(data[start : start + 5000])
+                ],
+            )
+        client.flush(name)
+        client.load_collection(name)
+
+    def search(self, query: np.ndarray, k: int, params: Dict[str, Any]) -> List[int]:
+        res = self.client.search(
+            collection_name=self.name,
+            data=[query.tolist()],
+            limit=k,
+            search_params={"metric_type": self.metric_type, "params": params},
+        )
+        return [r["id"] for r in res[0]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--ef", type=str, default="16,32,64,128")
+    parser.add_argument("--nprobe", type=str, default="1,4,16,64")
+    parser.add_argument("--milvus-uri", type=str, default="")
+    args = parser.parse_args()
+
+    data, queries = synthetic_vectors(args.vectors, args.queries, args.dimension)
+    truth: np.ndarray = exact_neighbours(data, queries, args.top_k)
+    configs: List[VectorIndexConfig] = [
+        VectorIndexConfig(index_type="FLAT"),
+        VectorIndexConfig(index_type="HNSW"),
+        VectorIndexConfig(index_type="IVF_FLAT", params={"nlist": args.nlist}),
+        VectorIndexConfig(
+            index_type="IVF_PQ", params={"nlist": args.nlist, "m": args.pq_m}
+        ),
+    ]
+    sweeps: Dict[str, List[Dict[str, Any]]] = {
+        "ef": [{"ef": int(v)} for v in args.ef.split(",")],
+        "nprobe": [{"nprobe": int(v)} for v in args.nprobe.split(",")],
+    }
+    client: Any = None
+    if args.milvus_uri:
+        from pymilvus import MilvusClient
+
+        client = MilvusClient(uri=args.milvus_uri, token=os.getenv("MILVUS_TOKEN", ""))
+
+    print(f"{args.vectors} vectors of dimension {args.dimension}, recall@{args.top_k}")
+    print(
+        f"{'index':10} {'knob':12} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}"
+    )
+    for config in configs:
+        start: float = time.perf_counter()
+        if client is not None:
+            index: Any = MilvusIndex(
+                config, data, client, f"ann_benchmark_{config.index_type.lower()}"
+            )
+        else:
+            index = FaissIndex(config, data)
+        build_seconds: float = time.perf_counter() - start
+        knob: str = {"HNSW": "ef", "FLAT": ""}.get(config.index_type, "nprobe")
+        for override in sweeps.get(knob, [{}]):
+            params: Dict[str, Any] = search_params(
+                config.index_type,
+                config.metric_type,
+                config.model_copy(update={"search_params": override}),
+                args.top_k,
+            )["params"]
+            latencies: List[float] = []
+            found: List[List[int]] = []
+            for query in queries:
+                start = time.perf_counter()
+                found.append(index.search(query, args.top_k, params))
+                latencies.append((time.perf_counter() - start) * 1000)
+            label: str = ",".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(
+                f"{config.index_type:10} {label:12} {recall(found, truth):8.3f} "
+                f"{np.percentile(latencies, 50):8.2f} {np.percentile(latencies, 99):8.2f} "
+                f"{build_seconds:8.1f}"
+            )
+        if client is not None:
+            client.drop_collection(index.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Cost of ranking crawled pages with Loader.get_candidates_websites.
+
+A synthetic site is generated: pages link to a power-law number of other
+pages, popular pages attract most links, and every link is written into
+the page text the way the crawler writes it. The site is ranked three ways:
+
+- Out-links: the edges recorded while crawling, on every page.
+- Aho-Corasick: the fallback that scans page content for known urls, for
+  pages crawled before out-links were recorded. Run on --fallback-pages
+  pages.
+- Legacy: a substring test of every url against every page, then a
+  networkx graph. Run on --legacy-pages pages, because it grows
+  quadratically.
+
+The legacy and Aho-Corasick rankings are computed on the same pages and
+should agree, which the benchmark checks.
+
+Usage:
+    python -m benchmark.rag.link_graph --pages 100000
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+from arklex.utils.link_graph import link_edges, pagerank
+from arklex.utils.loader import CrawledObject
+
+BASE_URL = "https://shop.example.com"
+
+
+def synthetic_site(n: int, mean_links: float, seed: int = 0) -> List[CrawledObject]:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    urls: List[str] = [f"{BASE_URL}/page/{i}/" for i in range(n)]
+    # Zipf-like popularity, so a few hub pages collect most links
+    popularity: np.ndarray = 1.0 / np.arange(1, n + 1)
+    popularity /= popularity.sum()
+    degrees: np.ndarray = np.minimum(
+        rng.pareto(2.0, n) * mean_links / 2 + 1, n - 1
+    ).astype(int)
+    pages: List[CrawledObject] = []
+    for i, degree in enumerate(degrees):
+        links: List[str] = [urls[j] for j in rng.choice(n, degree, p=popularity)]
+        content: str = "\n".join(
+            f"Product description {i}" if k % 2 else f"see {link} {link}"
+            for k, link in enumerate(links)
+        )
+        pages.append(
+            CrawledObject(id=str(i), source=urls[i], content=content, out_links=links)
+        )
+    return pages
+
+
+def legacy_ranking(pages: List[CrawledObject], top_k: int) -> List[str]:
+    edges: List[Tuple[str, str]] = [
+        (page.id, other.id)
+        for page in pages
+        for other in pages
+        if other.source in page.content
+    ]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(page.id for page in pages)
+    graph.add_edges_from(edges)
+    scores: Dict[str, float] = nx.pagerank(graph, alpha=0.9)
+    return [i for i, _ in sorted(scores.items(), key=lambda x: -x[1])[:top_k]]
+
+
+def ranking(pages: List[CrawledObject], top_k: int) -> List[str]:
+    sources, targets = link_edges(pages)
+    scores: np.ndarray = pagerank(len(pages), sources, targets, alpha=0.9)
+    return [pages[i].id for i in np.argsort(-scores, kind="stable")[:top_k]]
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start: float = time.perf_counter()
+    result: Any = fn()
+    return result, time.perf_counter() - start
+
+
+def without_out_links(pages: List[CrawledObject]) -> List[CrawledObject]:
+    return [CrawledObject(id=p.id, source=p.source, content=p.content) for p in pages]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--fallback-pages", type=int, default=10000)
+    parser.add_argument("--legacy-pages", type=int, default=1000)
+    parser.add_argument("--mean-links", type=float, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    pages: List[CrawledObject] = synthetic_site(args.pages, args.mean_links)
+    edges: int = sum(len(page.out_links) for page in pages)
+    _, seconds = timed(lambda: ranking(pages, args.top_k))
+    print(f"out-links     {args.pages:>7} pages {edges:>9} links {seconds:8.2f}s")
+
+    fallback: List[CrawledObject] = without_out_links(pages[: args.fallback_pages])
+    _, seconds = timed(lambda: ranking(fallback, args.top_k))
+    print(f"aho-corasick  {len(fallback):>7} pages {seconds:26.2f}s")
+
+    legacy: List[CrawledObject] = without_out_links(pages[: args.legacy_pages])
+    expected, legacy_seconds = timed(lambda: legacy_ranking(legacy, args.top_k))
+    found, seconds = timed(lambda: ranking(legacy, args.top_k))
+    print(f"legacy        {len(legacy):>7} pages {legacy_seconds:26.2f}s")
+    print(f"aho-corasick  {len(legacy):>7} pages {seconds:26.2f}s")
+    print(f"same top {args.top_k}:   {set(found) == set(expected)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Throughput of batched Milvus ingestion against one embedding request per chunk.
+
+Synthetic chunks are embedded by the FakeEmbedder, which sleeps for
+--embed-latency per request to stand in for the provider round trip, and
+upserted into an in-memory collection that sleeps for --upsert-latency per
+call, or into a real Milvus collection when --milvus-uri is given. The
+per-chunk baseline reproduces the old add_documents path (embed one chunk,
+upsert it, repeat), so no API key is needed.
+
+Usage:
+    python -m benchmark.rag.milvus_ingest --chunks 20000 --batch-size 256
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from arklex.env.tools.RAG.retrievers.ingestion import (
+    FakeEmbedder,
+    IngestionCheckpoint,
+    ingest_documents,
+)
+
+
+class SyntheticChunk:
+    def __init__(self, i: int, length: int) -> None:
+        self.id: str = f"chunk-{i}"
+        self.text: str = f"synthetic chunk {i} " + "lorem ipsum " * (length // 12)
+
+    def to_milvus_schema_dict(self, embedding: List[float]) -> Dict[str, Any]:
+        return {"id": self.id, "text": self.text, "embedding": embedding}
+
+
+class InMemoryCollection:
+    def __init__(self, latency: float) -> None:
+        self.latency: float = latency
+        self.rows: Dict[str, Dict[str, Any]] = {}
+
+    def upsert(self, collection_name: str, data: List[Dict[str, Any]]) -> None:
+        time.sleep(self.latency)
+        for row in data:
+            self.rows[row["id"]] = row
+
+
+def per_chunk(
+    client: Any, collection: str, chunks: List[SyntheticChunk], embedder: FakeEmbedder
+) -> float:
+    start: float = time.perf_counter()
+    for chunk in chunks:
+        vector: List[float] = asyncio.run(embedder.aembed([chunk.text]))[0]
+        client.upsert(
+            collection_name=collection, data=[chunk.to_milvus_schema_dict(vector)]
+        )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--chunk-length", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--embed-concurrency", type=int, default=2)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--upsert-latency", type=float, default=0.01)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--baseline-chunks", type=int, default=200)
+    parser.add_argument("--milvus-uri", type=str, default="")
+    parser.add_argument("--collection", type=str, default="ingest_benchmark")
+    args = parser.parse_args()
+
+    chunks: List[SyntheticChunk] = [
+        SyntheticChunk(i, args.chunk_length) for i in range(args.chunks)
+    ]
+    if args.milvus_uri:
+        from pymilvus import MilvusClient
+
+        client: Any = MilvusClient(
+            uri=args.milvus_uri, token=os.getenv("MILVUS_TOKEN", "")
+        )
+        if not client.has_collection(args.collection):
+            client.create_collection(
+                args.collection,
+                dimension=args.dimension,
+                id_type="string",
+                max_length=100,
+            )
+    else:
+        client = InMemoryCollection(args.upsert_latency)
+
+    # the baseline is too slow to run on every chunk, its rate is extrapolated
+    baseline_chunks: List[SyntheticChunk] = chunks[: args.baseline_chunks]
+    baseline_seconds: float = per_chunk(
+        client,
+        args.collection,
+        baseline_chunks,
+        FakeEmbedder(args.dimension, args.embed_latency),
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        stats: Dict[str, Any] = asyncio.run(
+            ingest_documents(
+                client,
+                args.collection,
+                chunks,
+                FakeEmbedder(args.dimension, args.embed_latency),
+                batch_size=args.batch_size,
+                queue_size=args.queue_size,
+                embed_concurrency=args.embed_concurrency,
+                checkpoint=IngestionCheckpoint(os.path.join(directory, "checkpoint")),
+            )
+        )
+
+    baseline_rate: float = len(baseline_chunks) / baseline_seconds
+    batched_rate: float = stats["documents"] / stats["seconds"]
+    print(f"chunks:                {stats['documents']}")
+    print(f"embedding requests:    {stats['embedding_requests']}")
+    print(f"per-chunk throughput:  {baseline_rate:.0f} chunks/s")
+    print(f"batched throughput:    {batched_rate:.0f} chunks/s")
+    print(f"speedup:               {batched_rate / baseline_rate:.1f}x")
+    print(f"time embedding:        {stats['embed_seconds']:.1f}s")
+    print(f"time upserting:        {stats['upsert_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Latency of the retrieval question rewrite per RAG turn, by rewrite policy.
+
+Every user turn of a set of simulated conversations (the ``convos`` written
+by ``arklex.evaluation.simulate_first_pass_convos``) goes through the
+retrieve_contextualize_q_prompt rewrite twice. The first pass uses the
+"always" policy, which rewrites every turn as retrieval did before. The
+second uses the "auto" policy, which skips standalone questions and caches
+rewrites. The skip rate and the mean rewrite latency added to each RAG turn
+are reported for both. The LLM is the configured provider, so an API key is
+required.
+
+Usage:
+    python -m benchmark.rag.query_rewrite --convos ./p1_sample_convos.json
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+from arklex.env.prompts import load_prompts
+from arklex.env.tools.RAG.query_rewrite import QueryRewriter, query_rewrite_cache
+from arklex.utils.graph_state import BotConfig, LLMConfig, QueryRewriteConfig
+from arklex.utils.model_config import MODEL
+from arklex.utils.model_provider_config import model_client_pool
+from benchmark.orchestrator.intent_fast_path import user_turns
+
+
+def run(rewriter: QueryRewriter, turns: List[Dict[str, Any]]) -> Dict[str, float]:
+    query_rewrite_cache.clear()
+    seconds: float = 0.0
+    for turn in turns:
+        start: float = time.perf_counter()
+        rewriter.rewrite(turn["text"], turn["chat_history_str"])
+        seconds += time.perf_counter() - start
+    stats: Dict[str, int] = query_rewrite_cache.stats()
+    return {
+        "ms_per_turn": seconds / max(len(turns), 1) * 1000,
+        "llm_calls": stats["misses"],
+        "skipped": stats["skipped"],
+        "cache_hits": stats["hits"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--convos", type=str, required=True)
+    parser.add_argument("--history-turns", type=int, default=3)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--language", type=str, default="EN")
+    args = parser.parse_args()
+
+    with open(args.convos) as f:
+        convos: List[List[Dict[str, Any]]] = json.load(f)
+    turns: List[Dict[str, Any]] = [t for c in convos for t in user_turns(c)]
+    turns = turns[: args.max_turns]
+
+    llm_config: LLMConfig = LLMConfig(**MODEL)
+    bot_config: BotConfig = BotConfig(
+        bot_id="benchmark",
+        version="benchmark",
+        language=args.language,
+        bot_type="presalebot",
+        llm_config=llm_config,
+    )
+    prompt: str = load_prompts(bot_config)["retrieve_contextualize_q_prompt"]
+    llm: Any = model_client_pool.get_llm(
+        llm_config.llm_provider, llm_config.model_type_or_path
+    )
+
+    results: Dict[str, Dict[str, float]] = {}
+    for mode in ["always", "auto"]:
+        rewriter: QueryRewriter = QueryRewriter(
+            llm,
+            prompt,
+            QueryRewriteConfig(mode=mode, history_turns=args.history_turns),
+            llm_config,
+        )
+        results[mode] = run(rewriter, turns)
+
+    print(f"user turns:                {len(turns)}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:7} rewrite: {stats['ms_per_turn']:8.1f} ms/turn, "
+            f"{stats['llm_calls']} LLM calls, {stats['skipped']} skipped, "
+            f"{stats['cache_hits']} cache hits"
+        )
+    saved: float = results["always"]["ms_per_turn"] - results["auto"]["ms_per_turn"]
+    print(f"saved per RAG turn:        {saved:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
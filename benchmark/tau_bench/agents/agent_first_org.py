@@ -35,6 +35,9 @@ class AgentFirstOrg(Agent):
                 resource_inizializer=tau_bench_resource_initializer,
             )
 
+            # compiled lazily on the first turn and reused for every task
+            self.orchestrator: Optional[AgentOrg] = None
+
             self.start_message: Optional[str] = None
             for node in taskgraph["nodes"]:
                 if node[1].get("type", "") == "start":
@@ -49,8 +52,9 @@ class AgentFirstOrg(Agent):
             "chat_history": history,
             "parameters": parameters,
         }
-        orchestrator: AgentOrg = AgentOrg(config=self.taskgraph_path, env=self.env)
-        result: Dict[str, Any] = orchestrator.get_response(data)
+        if self.orchestrator is None:
+            self.orchestrator = AgentOrg(config=self.taskgraph_path, env=self.env)
+        result: Dict[str, Any] = self.orchestrator.get_response(data)
         return result["answer"], result["parameters"]
 
     def solve(
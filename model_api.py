@@ -1,16 +1,25 @@
 import argparse
+import asyncio
 import logging
 import os
 import uvicorn
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 from arklex.utils.utils import init_logger
-from arklex.env.env import Env
 from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.registry import orchestrator_registry
+from arklex.orchestrator.session_store import (
+    BaseSessionStore,
+    InMemorySessionStore,
+    SQLiteSessionStore,
+)
+from arklex.orchestrator.streaming import sse_event, stream_metrics, stream_response
 from arklex.utils.model_config import MODEL
 from arklex.utils.model_provider_config import LLM_PROVIDERS
 
@@ -18,39 +27,134 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 app = FastAPI()
+# set from the command line, without it the client sends the parameters back
+session_store: Optional[BaseSessionStore] = None
 
 
-def get_api_bot_response(
+async def get_orchestrator(
+    args: argparse.Namespace,
+    tools: List[Dict[str, Any]],
+    workers: List[Dict[str, Any]],
+) -> AgentOrg:
+    # compiling an engine on first use is blocking, keep it off the event loop
+    return await asyncio.to_thread(
+        orchestrator_registry.get,
+        os.path.join(args.input_dir, "taskgraph.json"),
+        tools=tools,
+        workers=workers,
+        slotsfillapi="",
+    )
+
+
+def chat_inputs(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Orchestrator inputs from the body of a chat request."""
+    history: List[Dict[str, str]] = data["history"]
+    return {
+        "text": history[-1]["content"],
+        "chat_history": history[:-1],
+        # with a session store the client may send only the chat_id of the conversation
+        "parameters": data.get("parameters"),
+        "chat_id": data.get("chat_id"),
+        # per-turn spans in parameters.metadata.timing.trace
+        "trace": data.get("trace"),
+    }
+
+
+async def stream_chat(data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    orchestrator: AgentOrg = await get_orchestrator(
+        args, data["tools"], data["workers"]
+    )
+    async for event in stream_response(
+        orchestrator, chat_inputs(data), session_store=session_store
+    ):
+        yield event
+
+
+async def get_api_bot_response(
     args: argparse.Namespace,
     history: List[Dict[str, str]],
     user_text: str,
-    parameters: Dict[str, Any],
-    env: Env,
+    parameters: Optional[Dict[str, Any]],
+    tools: List[Dict[str, Any]],
+    workers: List[Dict[str, Any]],
+    chat_id: Optional[str] = None,
+    trace: Optional[bool] = None,
 ) -> Tuple[str, Dict[str, Any]]:
     data: Dict[str, Any] = {
         "text": user_text,
         "chat_history": history,
         "parameters": parameters,
+        "chat_id": chat_id,
+        "trace": trace,
     }
-    orchestrator = AgentOrg(
-        config=os.path.join(args.input_dir, "taskgraph.json"), env=env
+    orchestrator: AgentOrg = await get_orchestrator(args, tools, workers)
+    result: Dict[str, Any] = await orchestrator.aget_response(
+        data, session_store=session_store
     )
-    result: Dict[str, Any] = orchestrator.get_response(data)
 
     return result["answer"], result["parameters"]
 
 
 @app.post("/eval/chat")
-def predict(data: Dict[str, Any]) -> Dict[str, Any]:
+async def predict(data: Dict[str, Any]) -> Dict[str, Any]:
     history: List[Dict[str, str]] = data["history"]
-    params: Dict[str, Any] = data["parameters"]
+    params: Optional[Dict[str, Any]] = data.get("parameters")
+    chat_id: Optional[str] = data.get("chat_id")
     workers: List[Dict[str, Any]] = data["workers"]
     tools: List[Dict[str, Any]] = data["tools"]
     user_text: str = history[-1]["content"]
 
-    env = Env(tools=tools, workers=workers, slotsfillapi="")
-    answer, params = get_api_bot_response(args, history[:-1], user_text, params, env)
-    return {"answer": answer, "parameters": params}
+    answer, params = await get_api_bot_response(
+        args,
+        history[:-1],
+        user_text,
+        params,
+        tools,
+        workers,
+        chat_id,
+        data.get("trace"),
+    )
+    return {
+        "answer": answer,
+        "parameters": params,
+        "chat_id": params["metadata"]["chat_id"],
+    }
+
+
+@app.post("/eval/chat/stream")
+async def predict_stream(data: Dict[str, Any]) -> StreamingResponse:
+    """The answer of /eval/chat as server-sent events, chunk by chunk.
+
+    A disconnecting client closes the generator, which cancels the turn.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        async for event in stream_chat(data):
+            yield sse_event(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/eval/chat/ws")
+async def predict_ws(websocket: WebSocket) -> None:
+    """One chat request per message, answered with the events of the turn."""
+    await websocket.accept()
+    try:
+        while True:
+            data: Dict[str, Any] = await websocket.receive_json()
+            async for event in stream_chat(data):
+                await websocket.send_json(jsonable_encoder(event))
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
+
+
+@app.get("/eval/stream/metrics")
+async def stream_stats() -> Dict[str, Any]:
+    return stream_metrics.stats()
 
 
 if __name__ == "__main__":
@@ -69,6 +173,25 @@ if __name__ == "__main__":
         default="WARNING",
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
     )
+    parser.add_argument(
+        "--session-store",
+        type=str,
+        default="none",
+        choices=["none", "memory", "sqlite"],
+        help="Keep the parameters on the server and answer with their delta",
+    )
+    parser.add_argument(
+        "--session-db",
+        type=str,
+        default="sessions.sqlite",
+        help="SQLite file of the sqlite session store",
+    )
+    parser.add_argument(
+        "--session-window",
+        type=int,
+        default=20,
+        help="Stored turns kept whole, older ones are compacted into summaries",
+    )
 
     args = parser.parse_args()
     os.environ["DATA_DIR"] = args.input_dir
@@ -81,5 +204,12 @@ if __name__ == "__main__":
         filename=os.path.join(os.path.dirname(__file__), "logs", "arklex.log"),
     )
 
+    if args.session_store == "memory":
+        session_store = InMemorySessionStore(compaction_window=args.session_window)
+    elif args.session_store == "sqlite":
+        session_store = SQLiteSessionStore(
+            args.session_db, compaction_window=args.session_window
+        )
+
     # run server
     uvicorn.run(app, host="0.0.0.0", port=args.port)
@@ -8,8 +8,8 @@ from typing import Any, Dict, List, Tuple
 from dotenv import load_dotenv
 from pprint import pprint
 
-from arklex.env.env import Env
 from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.registry import orchestrator_registry
 from arklex.utils.model_config import MODEL
 from arklex.utils.model_provider_config import LLM_PROVIDERS
 from arklex.utils.utils import init_logger
@@ -30,14 +30,14 @@ def get_api_bot_response(
     history: List[Dict[str, str]],
     user_text: str,
     parameters: Dict[str, Any],
-    env: Env,
 ) -> Tuple[str, Dict[str, Any], bool]:
     data: Dict[str, Any] = {
         "text": user_text,
         "chat_history": history,
         "parameters": parameters,
     }
-    orchestrator = AgentOrg(config=config, env=env)
+    # the engine is compiled on the first turn and reused afterwards
+    orchestrator: AgentOrg = orchestrator_registry.get(config, planner_enabled=True)
     result: Dict[str, Any] = orchestrator.get_response(data)
 
     return result["answer"], result["parameters"], result["human_in_the_loop"]
@@ -73,12 +73,6 @@ if __name__ == "__main__":
         open(os.path.join(args.input_dir, "taskgraph.json"))
     )
     config["model"] = model
-    env = Env(
-        tools=config.get("tools", []),
-        workers=config.get("workers", []),
-        slotsfillapi=config["slotfillapi"],
-        planner_enabled=True,
-    )
 
     history: List[Dict[str, str]] = []
     params: Dict[str, Any] = {}
@@ -97,7 +91,7 @@ if __name__ == "__main__":
             break
         start_time: float = time.time()
         output, params, hitl = get_api_bot_response(
-            config, history, user_text, params, env
+            config, history, user_text, params
         )
         history.append({"role": user_prefix, "content": user_text})
         history.append({"role": worker_prefix, "content": output})
@@ -0,0 +1,36 @@
+import pytest
+
+from arklex.utils.fake_llm import FakeEmbeddings
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    """The fake provider's bag-of-words embeddings, recording what is embedded."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.document_calls = 0
+        self.embedded = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.document_calls += 1
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return FakeEmbeddings.embed_documents(self, [text])[0]
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # engines built by the tests write their workers' files, e.g. the
+    # StoryMemoryWorker's stories.sqlite, here rather than in the cwd
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def embeddings():
+    """Offline embeddings where texts sharing words get similar vectors."""
+    return RecordingEmbeddings()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import random
+
+import numpy as np
+
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.graph_state import LLMConfig, Params
+from arklex.utils.model_config import MODEL
+from arklex.utils.utils import arun_steps, run_coroutine_sync, run_steps
+
+
+class SeededNLU:
+    """Deterministic stand-in for the NLU client so no model is called."""
+
+    def __init__(self, seed: int) -> None:
+        self.rng = random.Random(seed)
+
+    def execute(self, text, intents, chat_history_str, llm_config, prompt_key=None):
+        return self.rng.choice(sorted(intents))
+
+    async def aexecute(
+        self, text, intents, chat_history_str, llm_config, prompt_key=None
+    ):
+        await asyncio.sleep(0)
+        return self.rng.choice(sorted(intents))
+
+
+def _walk(task_graph, seed, use_async, n_turns=4):
+    np.random.seed(seed)
+    task_graph.nluapi = SeededNLU(seed)
+    params = Params()
+    path = []
+    for _ in range(n_turns):
+        inputs = {
+            "text": "hello",
+            "chat_history_str": "user: hello",
+            "parameters": params,
+            "allow_global_intent_switch": True,
+        }
+        if use_async:
+            node_info, params = asyncio.run(task_graph.aget_node(inputs))
+        else:
+            node_info, params = task_graph.get_node(inputs)
+        path.append((node_info.node_id, node_info.resource_id))
+    return path
+
+
+def test_async_get_node_matches_sync():
+    config_path = os.path.join(
+        os.path.dirname(__file__), "data", "message_worker_taskgraph.json"
+    )
+    with open(config_path) as f:
+        config = json.load(f)
+    task_graph = TaskGraph("taskgraph", config, LLMConfig(**config.get("model", MODEL)))
+    for seed in range(5):
+        assert _walk(task_graph, seed, use_async=False) == _walk(
+            task_graph, seed, use_async=True
+        )
+
+
+def test_run_coroutine_sync_inside_running_loop():
+    async def answer():
+        return 42
+
+    async def caller():
+        # a sync helper called from async code must not hit asyncio.run's loop check
+        return run_coroutine_sync(answer())
+
+    assert run_coroutine_sync(answer()) == 42
+    assert asyncio.run(caller()) == 42
+
+
+def test_steps_run_the_same_flow_sync_and_async():
+    def half(n):
+        if n % 2:
+            raise ValueError(n)
+        return n // 2
+
+    async def ahalf(n):
+        await asyncio.sleep(0)
+        return half(n)
+
+    def flow(n):
+        halvings = []
+        while True:
+            try:
+                n = yield (half, ahalf, (n,))
+            except ValueError:
+                return halvings
+            halvings.append(n)
+
+    assert run_steps(flow(12)) == [6, 3]
+    assert asyncio.run(arun_steps(flow(12))) == [6, 3]
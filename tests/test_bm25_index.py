@@ -0,0 +1,116 @@
+import os
+import pickle
+
+import pytest
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from arklex.env.tools.RAG.retrievers import faiss_retriever
+from arklex.env.tools.RAG.retrievers.bm25_index import (
+    BM25Index,
+    identifier_terms,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from arklex.env.tools.RAG.retrievers.faiss_retriever import FaissIndexCache
+from arklex.utils.graph_state import LLMConfig, LexicalSearchConfig
+
+TEXTS = [
+    "Trail runner SKU-4471 in red, waterproof.",
+    "Road running shoes, SKU-4470, lightweight mesh.",
+    "Orders ship within two business days.",
+    "Returns are accepted within 30 days of delivery.",
+]
+
+
+def test_codes_are_indexed_whole_and_by_part():
+    assert tokenize("SKU-4471 v2") == ["sku-4471", "sku", "4471", "v2"]
+
+
+def test_only_codes_mixing_letters_and_digits_are_identifiers():
+    assert identifier_terms("Is SKU-4471 or model x200 in stock?") == [
+        "sku-4471",
+        "x200",
+    ]
+    assert identifier_terms("What was your return policy in 2024 for it?") == []
+    assert identifier_terms("order 123456 from 2024-01-05") == []
+
+
+def test_saved_index_is_memory_mapped_and_ranks_like_the_built_one(tmp_path):
+    built = BM25Index.build(TEXTS)
+    built.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert loaded.docs.__class__.__name__ == "memmap"
+    assert loaded.search("sku-4471") == built.search("sku-4471")
+    assert loaded.search("sku-4471")[0][0] == 0
+    assert [i for i, _ in loaded.search("returns within days", k=2)] == [3, 2]
+    assert loaded.search("unknown words") == []
+    assert loaded.matches_identifier("is SKU-4470 in stock?")
+    assert not loaded.matches_identifier("is SKU-9999 in stock?")
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion_rewards_items_ranked_by_both():
+    fused = reciprocal_rank_fusion(
+        [["a", "b", "c"], ["c", "d", "b"]], key=lambda item: item, k=3, rrf_k=1
+    )
+    assert [item for item, _ in fused] == ["c", "b", "a"]
+
+
+def test_identifier_questions_skip_the_rewrite_and_the_embedding(
+    tmp_path, monkeypatch, embeddings
+):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embeddings,
+    )
+    documents = [Document(page_content=t, metadata={}) for t in TEXTS]
+    with open(os.path.join(tmp_path, "chunked_documents.pkl"), "wb") as f:
+        pickle.dump(documents, f)
+    # corpora built before the lexical index get one on first load
+    executor = FaissIndexCache().get(
+        str(tmp_path),
+        LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai"),
+    )
+    assert os.path.exists(os.path.join(tmp_path, "bm25", "CURRENT"))
+    executor.llm = RunnableLambda(lambda prompt: pytest.fail("rewrote the question"))
+    embeddings.queries.clear()
+
+    _, returns = executor.search(
+        "user: is SKU-4471 waterproof?",
+        "{chat_history}",
+        query="is SKU-4471 waterproof?",
+        lexical_config=LexicalSearchConfig(mode="auto"),
+    )
+    assert returns[0]["content"] == TEXTS[0]
+    # BM25 scores are not distances, they are returned apart
+    assert returns[0]["confidence"] is None and returns[0]["lexical_score"] > 0
+    assert len(embeddings.queries) == 0
+
+    # a follow-up naming a code is made standalone before any search
+    executor.llm = RunnableLambda(lambda prompt: "is SKU-4470 waterproof?")
+    _, returns = executor.search(
+        "user: tell me about SKU-4471\nassistant: it is a trail runner\n"
+        "user: is SKU-4470 like it?",
+        "{chat_history}",
+        query="is SKU-4470 like it?",
+        lexical_config=LexicalSearchConfig(mode="auto"),
+    )
+    assert len(embeddings.queries) == 1
+    assert "lexical_score" not in returns[0]
+    assert all(isinstance(r["fused_score"], float) for r in returns)
+    assert all(
+        r["confidence"] is None or isinstance(r["confidence"], float) for r in returns
+    )
+    embeddings.queries.clear()
+
+    # other questions fuse the dense and lexical rankings
+    hybrid = executor.retrieve_hybrid(
+        "when are returns accepted", LexicalSearchConfig(mode="hybrid")
+    )
+    assert len(embeddings.queries) == 1
+    assert hybrid[0][0].page_content == TEXTS[3]
@@ -0,0 +1,95 @@
+import os
+import pickle
+
+import pytest
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from arklex.env.tools.RAG.retrievers import faiss_retriever
+from arklex.env.tools.RAG.retrievers.bm25_index import BM25Index
+from arklex.env.tools.RAG.retrievers.chunk_store import ChunkStore
+from arklex.env.tools.RAG.retrievers.faiss_retriever import (
+    FaissIndexCache,
+    load_bm25_index,
+)
+from arklex.utils.graph_state import LLMConfig
+
+DOCUMENTS = [
+    Document(page_content="Red apples", metadata={"source": "a.txt", "title": "A"}),
+    Document(page_content="", metadata={"source": "a.txt", "title": "A"}),
+    Document(page_content="绿色的梨 pears", metadata={"source": "b.txt"}),
+    Document(page_content="blue berries", metadata={}),
+]
+
+
+def test_store_round_trips_documents_and_shares_metadata_rows(tmp_path):
+    path = os.path.join(tmp_path, "chunks")
+    ChunkStore.write(path, DOCUMENTS)
+    store = ChunkStore.open(path)
+
+    assert len(store) == len(DOCUMENTS)
+    assert list(store) == DOCUMENTS
+    assert store[-1] == DOCUMENTS[-1]
+    assert list(store.texts()) == [doc.page_content for doc in DOCUMENTS]
+    # chunks of the same source point at one metadata row
+    assert len(store.metadata_offsets) - 1 == 3
+    # callers may edit the metadata of a returned document
+    store[0].metadata["title"] = "changed"
+    assert store[1].metadata["title"] == "A"
+
+    ChunkStore.write(path, DOCUMENTS[:1])
+    assert list(ChunkStore.open(path)) == DOCUMENTS[:1]
+    assert ChunkStore.open(os.path.join(tmp_path, "missing")) is None
+
+
+def test_legacy_pickle_is_converted_and_served_from_the_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embedding,
+    )
+    with open(os.path.join(tmp_path, "chunked_documents.pkl"), "wb") as f:
+        pickle.dump(DOCUMENTS, f)
+    llm_config = LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai")
+
+    executor = FaissIndexCache().get(str(tmp_path), llm_config)
+    assert isinstance(executor.texts, ChunkStore)
+    assert not os.path.exists(os.path.join(tmp_path, "index", "index.pkl"))
+    docs_and_scores = executor.retrieve_w_score("blue berries")
+    assert docs_and_scores[0][0] == DOCUMENTS[3]
+
+    # a fresh process maps the saved index and store without re-embedding
+    monkeypatch.setattr(
+        DeterministicFakeEmbedding,
+        "embed_documents",
+        lambda self, texts: pytest.fail("re-embedded the corpus"),
+    )
+    reloaded = FaissIndexCache().get(str(tmp_path), llm_config)
+    assert reloaded.retriever.vectorstore.index.ntotal == len(DOCUMENTS)
+    assert reloaded.retrieve_w_score("blue berries")[0][0] == DOCUMENTS[3]
+
+
+def test_rewrites_are_new_versions_told_apart_by_content(tmp_path):
+    path = os.path.join(tmp_path, "chunks")
+    ChunkStore.write(path, DOCUMENTS)
+    first = ChunkStore.open(path)
+    bm25_path = os.path.join(tmp_path, "bm25")
+    BM25Index.build(list(first.texts())).save(bm25_path)
+
+    # as many chunks, other texts
+    renamed = [Document(page_content=d.page_content + "!") for d in DOCUMENTS]
+    ChunkStore.write(path, renamed)
+    second = ChunkStore.open(path)
+    assert second.corpus_hash != first.corpus_hash
+    # the mapped previous version stays readable
+    assert list(first) == DOCUMENTS
+    lexical_index = load_bm25_index(str(tmp_path), second)
+    assert lexical_index.corpus_hash == second.corpus_hash
+    assert BM25Index.load(bm25_path).corpus_hash == second.corpus_hash
+
+    ChunkStore.write(path, DOCUMENTS[:1])
+    # the current version and the previous one
+    assert len([name for name in os.listdir(path) if name.startswith("v-")]) == 2
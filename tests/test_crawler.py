@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+
+from arklex.utils.crawler import CrawlState, WebCrawler
+from arklex.utils.loader import DocObject, Loader
+
+BASE_URL = "https://shop.example.com"
+PAGES = {
+    "": ["/a", "/b", "/c"],
+    "/a": ["/a/1", "/a/2", "/b", "/report.pdf"],
+    "/b": ["/", "/b/1", "https://other.example.com/x"],
+    "/c": [],
+    "/a/1": [],
+    "/a/2": ["/a/1"],
+    "/b/1": [],
+}
+TEXT = "Plenty of text about the products of this page. " * 5
+
+
+class FakeSite:
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def handler(self, request):
+        self.requests.append(str(request.url))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.latency)
+        self.active -= 1
+        path = request.url.path.rstrip("/")
+        if path == "/js":
+            html = "<html><body><div id='root'></div><script src='app.js'></script></body></html>"
+            return httpx.Response(200, html=html)
+        if path not in PAGES:
+            return httpx.Response(404)
+        links = "".join(f"<a href='{link}'>{link}</a>" for link in PAGES[path])
+        html = f"<html><head><title>Page {path}</title></head><body><p>{TEXT}</p>{links}</body></html>"
+        return httpx.Response(200, html=html)
+
+
+class FakeBrowserPool:
+    def __init__(self):
+        self.rendered = []
+
+    async def render(self, url):
+        self.rendered.append(url)
+        return f"<html><body><p>{TEXT}</p></body></html>"
+
+    def close(self):
+        pass
+
+
+def crawler(site, **kwargs):
+    kwargs.setdefault("browser_fallback", False)
+    return WebCrawler(transport=httpx.MockTransport(site.handler), **kwargs)
+
+
+def test_crawl_discovers_pages_concurrently_within_host_limit():
+    site = FakeSite()
+    urls = asyncio.run(
+        crawler(site, per_host_concurrency=2).crawl(BASE_URL + "/", max_num=20)
+    )
+    assert urls == sorted(BASE_URL + path for path in PAGES)
+    # every page once, nothing off-site or filtered out
+    assert len(site.requests) == len(PAGES)
+    assert site.max_active == 2
+
+    limited = asyncio.run(crawler(FakeSite()).crawl(BASE_URL, max_num=3))
+    assert len(limited) == 3 and BASE_URL in limited
+
+
+def test_loader_reuses_discovered_pages_and_falls_back_to_browser():
+    site = FakeSite()
+    pool = FakeBrowserPool()
+    loader = Loader(crawler(site, browser_pool=pool))
+    urls = loader.get_all_urls(BASE_URL, max_num=3)
+    docs = loader.crawl_urls(
+        [DocObject(str(i), url) for i, url in enumerate(urls + [BASE_URL + "/js"])]
+    )
+    # only the page not seen during discovery is fetched again
+    assert len(site.requests) == 4
+    assert docs[0].metadata["title"] == "Page "
+    assert TEXT.strip() in docs[0].content
+    assert pool.rendered == [BASE_URL + "/js"]
+    assert TEXT.strip() in docs[-1].content
+
+    missing = loader.crawl_urls([DocObject("x", BASE_URL + "/missing")])
+    assert missing[0].is_error and "404" in missing[0].error_message
+
+
+def test_interrupted_crawl_resumes_from_its_state(tmp_path):
+    path = str(tmp_path / "crawl_state.jsonl")
+    asyncio.run(crawler(FakeSite(), state=CrawlState(path)).crawl(BASE_URL, 3))
+    with open(path, "a") as f:
+        f.write('{"url": "https://shop.exa')
+
+    site = FakeSite()
+    urls = asyncio.run(crawler(site, state=CrawlState(path)).crawl(BASE_URL, 20))
+    assert len(urls) == len(PAGES)
+    assert len(site.requests) == len(PAGES) - 3
+    assert len(CrawlState(path).pages) == len(PAGES)
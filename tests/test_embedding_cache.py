@@ -0,0 +1,100 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from arklex.utils.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as its length, counting the texts sent to the provider."""
+
+    def __init__(self) -> None:
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedded.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_cached_embeddings_reuse_vectors_across_instances():
+    store = EmbeddingStore(max_size=10)
+    provider = CountingEmbeddings()
+
+    first = CachedEmbeddings(provider, "fake", store)
+    assert first.embed_documents(["a", "bb", "a"]) == [
+        [1.0, 1.0],
+        [2.0, 1.0],
+        [1.0, 1.0],
+    ]
+    assert provider.embedded == ["a", "bb"]
+
+    # a new client for the same model, e.g. the next turn's memory, hits the store
+    second = CachedEmbeddings(provider, "fake", store)
+    assert second.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert provider.embedded == ["a", "bb", "ccc"]
+
+    # queries and documents are stored separately
+    second.embed_query("a")
+    assert provider.embedded[-1] == "a"
+    assert store.stats()["misses"] == 5
+    assert store.stats()["memory_hits"] == 1
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    provider = CountingEmbeddings()
+
+    store = EmbeddingStore(max_size=1, path=path)
+    CachedEmbeddings(provider, "fake", store).embed_documents(["a", "bb"])
+    store.close()
+
+    restarted = EmbeddingStore(max_size=1, path=path)
+    vectors = CachedEmbeddings(provider, "fake", restarted).embed_documents(["a", "bb"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert provider.embedded == ["a", "bb"]
+    assert restarted.stats()["disk_hits"] == 2
+    assert restarted.stats()["hit_rate"] == 1.0
+    restarted.close()
+
+
+class BatchCountingEmbeddings(CountingEmbeddings):
+    def __init__(self) -> None:
+        super().__init__()
+        self.document_calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls += 1
+        return super().embed_documents(texts)
+
+
+def test_symmetric_providers_embed_queries_in_one_request():
+    store = EmbeddingStore(max_size=10)
+    provider = BatchCountingEmbeddings()
+    cached = CachedEmbeddings(provider, "fake", store, symmetric=True)
+
+    assert cached.embed_queries(["a", "bb", "a"]) == [
+        [1.0, 1.0],
+        [2.0, 1.0],
+        [1.0, 1.0],
+    ]
+    assert provider.document_calls == 1 and provider.embedded == ["a", "bb"]
+    # batched queries share the store with single ones
+    assert cached.embed_query("bb") == [2.0, 1.0]
+    assert provider.embedded == ["a", "bb"]
+
+
+def test_unreadable_sqlite_file_is_a_miss(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    path.write_bytes(b"not a database" * 100)
+    provider = CountingEmbeddings()
+
+    store = EmbeddingStore(max_size=10, path=str(path))
+    assert store.get_many("fake", ["a"]) == [None]
+    vectors = CachedEmbeddings(provider, "fake", store).embed_documents(["a", "bb"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert provider.embedded == ["a", "bb"]
+    store.close()
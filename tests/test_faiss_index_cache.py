@@ -0,0 +1,76 @@
+import os
+import pickle
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from arklex.env.tools.RAG.retrievers import faiss_retriever
+from arklex.env.tools.RAG.retrievers.faiss_retriever import FaissIndexCache
+from arklex.utils.graph_state import LLMConfig
+
+
+def _write_documents(database_path, texts):
+    documents = [Document(page_content=text, metadata={}) for text in texts]
+    with open(os.path.join(database_path, "chunked_documents.pkl"), "wb") as f:
+        pickle.dump(documents, f)
+
+
+def test_index_is_loaded_once_and_reloaded_on_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embedding,
+    )
+    llm_config = LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai")
+    database_path = str(tmp_path)
+    _write_documents(database_path, ["red apples", "green pears", "blue berries"])
+    cache = FaissIndexCache(max_size=2)
+
+    first = cache.get(database_path, llm_config)
+    assert os.path.exists(os.path.join(database_path, "index", "CURRENT"))
+    assert cache.get(database_path, llm_config) is first
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+    # a rebuilt corpus is picked up without clearing the cache
+    _write_documents(database_path, ["yellow bananas"])
+    future = os.path.getmtime(os.path.join(database_path, "chunks", "CURRENT")) + 10
+    os.utime(os.path.join(database_path, "chunked_documents.pkl"), (future, future))
+    second = cache.get(database_path, llm_config)
+    assert second is not first
+    docs_and_scores = second.retrieve_w_score("yellow bananas")
+    assert [doc.page_content for doc, _ in docs_and_scores] == ["yellow bananas"]
+
+    # a fresh process maps the saved index instead of re-embedding the corpus
+    cache.clear()
+    third = cache.get(database_path, llm_config)
+    assert third.retriever.vectorstore.index.ntotal == 1
+
+
+def test_search_many_matches_single_query_search(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embedding,
+    )
+    llm_config = LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai")
+    database_path = str(tmp_path)
+    _write_documents(
+        database_path,
+        ["red apples", "green pears", "blue berries", "yellow bananas", "plums"],
+    )
+    executor = FaissIndexCache().get(database_path, llm_config)
+
+    queries = ["green pears", "plums", "something else"]
+    results = executor.search_many(queries)
+    assert len(results) == len(queries)
+    for query, docs_and_scores in zip(queries, results):
+        expected = executor.retrieve_w_score(query)
+        assert [doc.page_content for doc, _ in docs_and_scores] == [
+            doc.page_content for doc, _ in expected
+        ]
+        assert [float(s) for _, s in docs_and_scores] == [float(s) for _, s in expected]
+    assert executor.search_many([]) == []
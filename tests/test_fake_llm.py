@@ -0,0 +1,66 @@
+import json
+import os
+
+from arklex.env.env import Env
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.utils.fake_llm import fake_llm_settings
+from arklex.utils.model_provider_config import model_client_pool
+from arklex.utils.slot import Slot, Verification, structured_input_output
+
+INTENT_PROMPT = (
+    "According to the conversation, decide what is the user's intent in the last turn? \n"
+    "Only choose from the following options.\n"
+    "a) greet\nb) buy__<0>\nc) buy__<1>\nd) others\n\n"
+    "Conversation:\nuser: {text}\n\nAnswer:"
+)
+
+
+def test_intents_are_scripted_or_picked_deterministically():
+    llm = model_client_pool.get_llm("fake", "fake", temperature=0.1, n=1)
+    picked = llm.invoke(INTENT_PROMPT.format(text="hi")).content
+    assert picked == llm.invoke(INTENT_PROMPT.format(text="hi")).content
+    assert picked.split(") ")[1] in ["greet", "buy__<0>", "buy__<1>", "others"]
+
+    fake_llm_settings.script_intents(["buy", "refund"])
+    assert llm.invoke(INTENT_PROMPT.format(text="hi")).content == "b) buy__<0>"
+    # not an option, so it stays scripted for the next detection
+    assert llm.invoke(INTENT_PROMPT.format(text="hi")).content == "others"
+    assert fake_llm_settings.scripted_intent() == "refund"
+    fake_llm_settings.clear()
+
+    answer = llm.invoke("Tell me about the store").content
+    assert answer == "".join(c.content for c in llm.stream("Tell me about the store"))
+
+
+def test_tool_calls_leave_slots_empty():
+    llm = model_client_pool.get_llm("fake", "fake", temperature=0.7, n=1)
+    _, output_format = structured_input_output(
+        [Slot(name="email", type="str", description="", prompt="", required=True)]
+    )
+    call = llm.bind_tools([output_format]).invoke([("user", "my email")])
+    assert output_format(**call.tool_calls[0]["args"]).email is None
+    call = llm.bind_tools([Verification]).invoke([("user", "verify")])
+    assert Verification(**call.tool_calls[0]["args"]).verification_needed is False
+
+    embeddings = model_client_pool.get_embedding_model("fake")
+    refund, returns, weather = embeddings.embed_documents(
+        ["refund my order", "return my order", "weather today"]
+    )
+    similarity = lambda a, b: sum(x * y for x, y in zip(a, b))
+    assert similarity(refund, returns) > similarity(refund, weather)
+
+
+def test_orchestrator_turns_run_offline():
+    config_path = os.path.join(
+        os.path.dirname(__file__), "data", "message_worker_taskgraph.json"
+    )
+    with open(config_path) as f:
+        config = json.load(f)
+    config["model"] = {"model_type_or_path": "fake", "llm_provider": "fake"}
+    orchestrator = AgentOrg(config=config, env=Env(tools=[], workers=config["workers"]))
+    calls = fake_llm_settings.stats()["calls"]
+    inputs = {"text": "hi", "chat_history": [], "parameters": {}}
+    first = orchestrator.get_response(inputs)
+    second = orchestrator.get_response(inputs)
+    assert first["answer"] and first["answer"] == second["answer"]
+    assert fake_llm_settings.stats()["calls"] > calls
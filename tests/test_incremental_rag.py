@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+from langchain_core.documents import Document
+
+from arklex.env.tools.RAG import build_rag as build_rag_module
+from arklex.env.tools.RAG.build_rag import build_rag
+from arklex.env.tools.RAG.retrievers import faiss_retriever
+from arklex.env.tools.RAG.retrievers.faiss_retriever import FaissIndexCache
+from arklex.utils.crawler import WebCrawler
+from arklex.utils.graph_state import LLMConfig
+
+ALPHA = "Alpha jackets are waterproof and come in three colours."
+BETA = "Beta boots ship within two days of the order."
+GAMMA = "Gamma gloves can be returned within thirty days."
+
+
+def test_refresh_only_chunks_and_embeds_changed_sources(
+    tmp_path, monkeypatch, embeddings
+):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embeddings,
+    )
+    chunked = []
+
+    def chunk(docs):
+        # one chunk per source, the tiktoken splitter needs to download its encoding
+        chunked.extend(d.content for d in docs)
+        return [
+            Document(page_content=d.content, metadata={"source": d.source})
+            for d in docs
+        ]
+
+    monkeypatch.setattr(build_rag_module.Loader, "chunk", chunk)
+    llm_config = LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai")
+    folder = str(tmp_path)
+
+    build_rag(folder, [{"type": "text", "source": t} for t in [ALPHA, BETA]])
+    FaissIndexCache().get(folder, llm_config)
+    assert chunked == [ALPHA, BETA] and embeddings.embedded == [ALPHA, BETA]
+
+    chunked.clear()
+    embeddings.embedded.clear()
+    build_rag(
+        folder, [{"type": "text", "source": t} for t in [ALPHA, GAMMA]], refresh=True
+    )
+    executor = FaissIndexCache().get(folder, llm_config)
+    assert chunked == [GAMMA] and embeddings.embedded == [GAMMA]
+    # the chunks of the removed source are gone from the index
+    assert list(executor.texts.texts()) == [ALPHA, GAMMA]
+    assert executor.retriever.vectorstore.index.ntotal == 2
+    assert executor.retrieve_w_score(ALPHA)[0][0].page_content == ALPHA
+
+    # vectors of another embedding model are not reused, even of the same size
+    embeddings.embedded.clear()
+    fake = LLMConfig(model_type_or_path="fake", llm_provider="fake")
+    FaissIndexCache().get(folder, fake)
+    assert embeddings.embedded == [ALPHA, GAMMA]
+    embeddings.embedded.clear()
+    FaissIndexCache().get(folder, fake)
+    assert embeddings.embedded == []
+
+
+def test_unchanged_pages_are_revalidated_with_conditional_requests():
+    requests = []
+
+    def handler(request):
+        requests.append(dict(request.headers))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        html = f"<html><body><p>{ALPHA}</p></body></html>"
+        return httpx.Response(200, html=html, headers={"ETag": '"v1"'})
+
+    def crawler(**kwargs):
+        return WebCrawler(
+            transport=httpx.MockTransport(handler), browser_fallback=False, **kwargs
+        )
+
+    first = crawler()
+    asyncio.run(first.crawl("https://shop.example.com", max_num=1))
+    refresh = crawler(previous=first.pages)
+    [page] = asyncio.run(refresh.fetch_pages(["https://shop.example.com"]))
+    assert requests[-1]["if-none-match"] == '"v1"'
+    assert refresh.not_modified == 1
+    assert ALPHA in page.text
@@ -0,0 +1,83 @@
+from arklex.orchestrator.NLU import intent_classifier
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.graph_state import LLMConfig, Params
+
+
+class CountingNLU:
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def execute(self, text, intents, chat_history_str, llm_config, prompt_key=None):
+        self.calls += 1
+        return self.answer
+
+
+def _edge(source, target, intent, samples):
+    return [
+        source,
+        target,
+        {
+            "intent": intent,
+            "attribute": {
+                "weight": 1,
+                "pred": True,
+                "definition": "",
+                "sample_utterances": samples,
+            },
+        },
+    ]
+
+
+def _task_graph(monkeypatch, embeddings, mode):
+    monkeypatch.setattr(
+        intent_classifier.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embeddings,
+    )
+    config = {
+        "nodes": [
+            ["0", {"type": "start", "resource": {"id": "w", "name": "MessageWorker"}}],
+            ["1", {"resource": {"id": "w", "name": "MessageWorker"}}],
+            ["2", {"resource": {"id": "w", "name": "MessageWorker"}}],
+        ],
+        "edges": [
+            _edge("0", "1", "track order", ["where is my order", "track my package"]),
+            _edge("0", "2", "return item", ["return this item", "i want a refund"]),
+        ],
+        "intent_classifier": {"mode": mode, "margin": 0.1, "threshold": 0.5},
+    }
+    return TaskGraph(
+        "taskgraph",
+        config,
+        LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai"),
+    )
+
+
+def test_confident_predictions_skip_the_llm(monkeypatch, embeddings):
+    task_graph = _task_graph(monkeypatch, embeddings, "on")
+    task_graph.nluapi = CountingNLU("return item")
+    # includes the unsure intent, which has no examples
+    intents = task_graph.get_available_global_intents(Params())
+
+    assert task_graph.predict_intent("where is my package", intents, "") == (
+        "track order"
+    )
+    assert task_graph.nluapi.calls == 0
+    # nothing in common with either intent, the LLM decides
+    assert task_graph.predict_intent("hello there", intents, "") == "return item"
+    assert task_graph.nluapi.calls == 1
+    assert task_graph.intent_classifier.stats()["hit_rate"] == 0.5
+
+
+def test_shadow_mode_always_calls_the_llm(monkeypatch, embeddings):
+    task_graph = _task_graph(monkeypatch, embeddings, "shadow")
+    task_graph.nluapi = CountingNLU("return item")
+    intents = dict(task_graph.intents)
+
+    assert task_graph.predict_intent("where is my package", intents, "") == (
+        "return item"
+    )
+    assert task_graph.nluapi.calls == 1
+    stats = task_graph.intent_classifier.stats()
+    assert stats["compared"] == 1 and stats["agreement"] == 0.0
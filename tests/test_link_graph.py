@@ -0,0 +1,63 @@
+import random
+
+import networkx as nx
+import numpy as np
+
+from arklex.utils.link_graph import AhoCorasick, link_edges, pagerank
+from arklex.utils.loader import CrawledObject, Loader
+
+BASE_URL = "https://shop.example.com"
+
+
+def test_aho_corasick_matches_substring_search():
+    rng = random.Random(0)
+    patterns = ["".join(rng.choices("abc", k=rng.randint(1, 4))) for _ in range(40)]
+    for _ in range(50):
+        text = "".join(rng.choices("abcd", k=30))
+        expected = {i for i, p in enumerate(patterns) if p in text}
+        assert AhoCorasick(patterns).matches(text) == expected
+
+
+def test_pagerank_matches_networkx():
+    rng = np.random.default_rng(0)
+    n = 60
+    sources = rng.integers(0, n, 300)
+    targets = rng.integers(0, n, 300)
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(n))
+    graph.add_edges_from(zip(sources.tolist(), targets.tolist()))
+
+    expected = nx.pagerank(graph, alpha=0.9)
+    scores = pagerank(n, sources, targets, alpha=0.9)
+    np.testing.assert_allclose(scores, [expected[i] for i in range(n)], atol=1e-6)
+
+
+def _page(path, links=None, content=None):
+    return CrawledObject(
+        id=path,
+        source=BASE_URL + path,
+        content=content or "",
+        out_links=None if links is None else [BASE_URL + link for link in links],
+    )
+
+
+def test_candidates_are_ranked_from_out_links_or_content():
+    pages = [
+        _page("/a", links=["/hub", "/b"]),
+        _page("/b", links=["/hub"]),
+        _page("/c", links=["/hub", "/a"]),
+        # crawled before out-links were recorded
+        _page("/d", content=f"Hub {BASE_URL}/hub"),
+        _page("/hub", links=[]),
+    ]
+    sources, targets = link_edges(pages)
+    assert sorted(zip(sources.tolist(), targets.tolist())) == [
+        (0, 1),
+        (0, 4),
+        (1, 4),
+        (2, 0),
+        (2, 4),
+        (3, 4),
+    ]
+    top = Loader().get_candidates_websites(pages, 2)
+    assert [page.id for page in top] == ["/hub", "/b"]
@@ -0,0 +1,59 @@
+import pytest
+
+from arklex.env.tools.RAG.retrievers.milvus_index import (
+    confidence,
+    embedding_index,
+    search_params,
+)
+from arklex.utils.graph_state import VectorIndexConfig
+
+
+def test_index_params_merge_bot_overrides_with_defaults():
+    index = embedding_index(
+        VectorIndexConfig(index_type="HNSW", metric_type="COSINE", params={"M": 32}),
+        1536,
+    )
+    assert index == {
+        "field_name": "embedding",
+        "index_type": "HNSW",
+        "metric_type": "COSINE",
+        "params": {"M": 32, "efConstruction": 200},
+    }
+    # the default keeps the brute-force index collections were created with
+    assert embedding_index(VectorIndexConfig(), 1536)["index_type"] == "FLAT"
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        VectorIndexConfig(index_type="ANNOY"),
+        VectorIndexConfig(metric_type="HAMMING"),
+        VectorIndexConfig(index_type="IVF_PQ", params={"m": 7}),
+    ],
+)
+def test_invalid_index_configs_are_rejected(config):
+    with pytest.raises(ValueError):
+        embedding_index(config, 1536)
+
+
+def test_search_params_follow_the_collection_index():
+    config = VectorIndexConfig(
+        index_type="HNSW", search_params={"ef": 8, "nprobe": 64}, top_k=20
+    )
+    # the knobs of the bot apply to the index the collection actually has
+    assert search_params("HNSW", "L2", config, top_k=20) == {
+        "metric_type": "L2",
+        "params": {"ef": 20},
+    }
+    assert search_params("IVF_PQ", "IP", config) == {
+        "metric_type": "IP",
+        "params": {"nprobe": 64},
+    }
+    assert search_params("FLAT", "L2", config)["params"] == {}
+
+
+def test_confidence_depends_on_the_metric():
+    assert confidence(0.0, "L2") == 100.0
+    assert confidence(2.0, "L2") < 1.0
+    assert confidence(0.83, "COSINE") == 83.0
+    assert confidence(-0.2, "IP") == 0.0
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from arklex.env.tools.RAG.retrievers.ingestion import (
+    FakeEmbedder,
+    IngestionCheckpoint,
+    document_hash,
+    ingest_documents,
+    plan_sync,
+)
+
+
+class FakeMilvusClient:
+    """Records upserted rows, optionally failing after a number of batches."""
+
+    def __init__(self, fail_after=None, latency=0.0):
+        self.rows = {}
+        self.upserts = 0
+        self.fail_after = fail_after
+        self.latency = latency
+        self.lock = threading.Lock()
+
+    def upsert(self, collection_name, data):
+        if self.fail_after is not None and self.upserts >= self.fail_after:
+            raise RuntimeError("milvus unavailable")
+        time.sleep(self.latency)
+        with self.lock:
+            self.upserts += 1
+            for row in data:
+                self.rows[row["id"]] = row
+        return {"upsert_count": len(data)}
+
+
+class Chunk:
+    """The part of RetrieverDocument used by ingestion, which imports without MySQL."""
+
+    def __init__(self, i):
+        self.id = f"doc{i}"
+        self.text = f"text number {i}"
+        self.metadata = {"source": f"page{i}"}
+
+    def to_milvus_schema_dict(self, embedding):
+        return {"id": self.id, "text": self.text, "embedding": embedding}
+
+
+def _documents(n):
+    return [Chunk(i) for i in range(n)]
+
+
+def test_documents_are_embedded_in_batches():
+    client = FakeMilvusClient()
+    embedder = FakeEmbedder(dimension=8)
+    stats = asyncio.run(
+        ingest_documents(client, "c", _documents(25), embedder, batch_size=10)
+    )
+
+    assert embedder.requests == 3 and client.upserts == 3
+    assert stats["documents"] == 25 and stats["batches"] == 3
+    assert len(client.rows) == 25
+    assert len(client.rows["doc3"]["embedding"]) == 8
+    # the fake embedder is deterministic
+    assert client.rows["doc3"]["embedding"] == FakeEmbedder(8)._embed("text number 3")
+
+
+def test_interrupted_ingestion_resumes_from_the_checkpoint(tmp_path):
+    path = str(tmp_path / "ingest.checkpoint")
+    documents = _documents(30)
+
+    failing = FakeMilvusClient(fail_after=2)
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            ingest_documents(
+                failing,
+                "c",
+                documents,
+                FakeEmbedder(dimension=8),
+                batch_size=10,
+                checkpoint=IngestionCheckpoint(path),
+            )
+        )
+    assert len(failing.rows) == 20
+
+    client = FakeMilvusClient()
+    embedder = FakeEmbedder(dimension=8)
+    stats = asyncio.run(
+        ingest_documents(
+            client,
+            "c",
+            documents,
+            embedder,
+            batch_size=10,
+            checkpoint=IngestionCheckpoint(path),
+        )
+    )
+    assert stats["documents"] == 10 and embedder.requests == 1
+    assert set(client.rows) == {f"doc{i}" for i in range(20, 30)}
+
+
+def test_embedding_overlaps_upserts():
+    client = FakeMilvusClient(latency=0.05)
+    stats = asyncio.run(
+        ingest_documents(
+            client,
+            "c",
+            _documents(80),
+            FakeEmbedder(dimension=8, latency=0.05),
+            batch_size=10,
+        )
+    )
+    # embedding and upserting one batch after the other would take their sum
+    assert stats["seconds"] < 0.8 * (stats["embed_seconds"] + stats["upsert_seconds"])
+
+
+def test_sync_only_touches_changed_and_removed_chunks():
+    stored = _documents(5)
+    existing = {doc.id: document_hash(doc.text, doc.metadata) for doc in stored}
+    # metadata comes back from Milvus as JSON
+    existing["doc0"] = document_hash(stored[0].text, '{"source": "page0"}')
+
+    documents = _documents(4)
+    documents[1].text = "new text"
+    documents[2].metadata = {"source": "page2", "tags": {"lang": "en"}}
+    changed, removed = plan_sync(existing, documents)
+    assert [doc.id for doc in changed] == ["doc1", "doc2"]
+    assert removed == ["doc4"]
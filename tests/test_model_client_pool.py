@@ -0,0 +1,34 @@
+from arklex.utils.model_provider_config import ModelClientPool
+
+
+def test_pool_reuses_clients(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    pool = ModelClientPool(max_size=2)
+
+    first = pool.get_llm("openai", "gpt-4o-mini", temperature=0.1)
+    second = pool.get_llm("openai", "gpt-4o-mini", temperature=0.1)
+    assert first is second
+    assert pool.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+    # a different temperature or response format is a different client
+    assert pool.get_llm("openai", "gpt-4o-mini", temperature=0.7) is not first
+    assert (
+        pool.get_llm("openai", "gpt-4o-mini", temperature=0.1, response_format="json")
+        is not first
+    )
+
+    # other providers ignore the response format, so they share one client
+    fake = pool.get_llm("fake", "fake", temperature=0.1)
+    assert pool.get_llm("fake", "fake", temperature=0.1, response_format="text") is fake
+
+
+def test_pool_is_bounded(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    pool = ModelClientPool(max_size=2)
+
+    oldest = pool.get_embedding_model("openai", "text-embedding-ada-002")
+    pool.get_embedding_model("openai", "text-embedding-3-small")
+    pool.get_embedding_model("openai", "text-embedding-3-large")
+    assert pool.stats()["size"] == 2
+    # the least recently used client was evicted and is rebuilt on demand
+    assert pool.get_embedding_model("openai", "text-embedding-ada-002") is not oldest
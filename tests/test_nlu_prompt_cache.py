@@ -0,0 +1,65 @@
+import json
+import os
+
+from arklex.orchestrator.NLU.api import NLUModelAPI, nlu_api
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.graph_state import LLMConfig, Params
+from arklex.utils.model_config import MODEL
+
+
+def _intents(*names):
+    return {
+        name: [
+            {
+                "intent": name,
+                "attribute": {
+                    "definition": f"user asks about {name}",
+                    "sample_utterances": [f"tell me about {name}"],
+                },
+            }
+        ]
+        for name in names
+    }
+
+
+def test_prompt_prefix_is_static_and_cached():
+    api = NLUModelAPI()
+    first, mapping = api.format_input(_intents("orders", "returns"), "user: hi")
+    second, _ = api.format_input(_intents("orders", "returns"), "user: where is it")
+
+    # only the conversation at the end differs between turns
+    prefix = first[: first.index("Conversation:")]
+    assert second.startswith(prefix)
+    assert first.endswith("Conversation:\nuser: hi\n\nAnswer:")
+    assert mapping == {"a": "orders", "b": "returns"}
+    assert api.prompt_cache_stats() == {"size": 1, "hits": 1, "misses": 1}
+
+    # the option letters follow the candidate order
+    _, mapping = api.format_input(_intents("returns", "orders"), "user: hi")
+    assert mapping == {"a": "returns", "b": "orders"}
+
+    # callers get their own mapping, the cached one is left alone
+    mapping.clear()
+    _, mapping = api.format_input(_intents("returns", "orders"), "user: hi")
+    assert mapping == {"a": "returns", "b": "orders"}
+
+
+def test_task_graph_compiles_prompts_at_load():
+    config_path = os.path.join(
+        os.path.dirname(__file__), "data", "message_worker_taskgraph.json"
+    )
+    with open(config_path) as f:
+        config = json.load(f)
+    task_graph = TaskGraph("taskgraph", config, LLMConfig(**config.get("model", MODEL)))
+
+    misses = nlu_api.prompt_cache_stats()["misses"]
+    curr_node, params = task_graph.get_current_node(Params())
+    local_intents = task_graph.get_local_intent(curr_node, params)
+    candidates = task_graph._local_intent_candidates(local_intents)
+    key = task_graph.nlu_prompt_key(candidates)
+    nlu_api.format_input(candidates, "user: hello", key)
+    assert nlu_api.prompt_cache_stats()["misses"] == misses
+
+    # the turns look the prompt up by the id it was compiled under
+    nlu_api.format_input({"anything": []}, "user: hello", key)
+    assert nlu_api.prompt_cache_stats()["misses"] == misses
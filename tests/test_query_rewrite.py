@@ -0,0 +1,136 @@
+import os
+import pickle
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from arklex.env.tools.RAG.query_rewrite import (
+    QueryRewriter,
+    needs_rewrite,
+    query_rewrite_cache,
+    recent_history,
+)
+from arklex.env.tools.RAG.retrievers import faiss_retriever
+from arklex.env.tools.RAG.retrievers.faiss_retriever import FaissIndexCache
+from arklex.utils.graph_state import LLMConfig, QueryRewriteConfig
+
+PROMPT = "Make the last question standalone. {chat_history}"
+
+
+class CountingLLM:
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+        self.runnable = RunnableLambda(self._invoke)
+
+    def _invoke(self, prompt):
+        self.prompts.append(prompt.to_string())
+        return self.answer
+
+
+def test_only_follow_ups_need_a_rewrite():
+    history = "assistant: How can I help?\nuser: Do you sell running shoes?"
+    assert not needs_rewrite("Do you sell running shoes?", "user: hi")
+    assert not needs_rewrite("Do you sell running shoes?", history)
+    follow_up = history + "\nassistant: Yes.\nuser: "
+    assert needs_rewrite("How much are they?", follow_up + "How much are they?")
+    assert needs_rewrite("and in red?", follow_up + "and in red?")
+    assert needs_rewrite("price?", follow_up + "price?")
+    assert not needs_rewrite(
+        "What is your return policy for online orders?",
+        follow_up + "What is your return policy for online orders?",
+    )
+    assert needs_rewrite("这个多少钱", follow_up + "这个多少钱")
+    # acknowledgements ask nothing, even short or with "it"
+    for thanks in ["thanks", "ok", "Thank you!", "got it", "great, thanks"]:
+        assert not needs_rewrite(thanks, follow_up + thanks)
+
+
+def test_rewrites_are_skipped_and_cached():
+    query_rewrite_cache.clear()
+    llm = CountingLLM("How much are the running shoes?")
+    rewriter = QueryRewriter(
+        llm.runnable, PROMPT, QueryRewriteConfig(mode="auto", history_turns=2)
+    )
+    history = (
+        "user: Do you sell running shoes?\nassistant: Yes.\nuser: How much are they?"
+    )
+
+    assert rewriter.rewrite(
+        "Do you sell running shoes?", "user: Do you sell running shoes?"
+    ) == ("Do you sell running shoes?")
+    assert llm.prompts == []
+    for _ in range(2):
+        assert rewriter.rewrite("How much are they?", history) == (
+            "How much are the running shoes?"
+        )
+    # one LLM call, seeing only the last two turns
+    assert len(llm.prompts) == 1
+    assert "Do you sell" not in llm.prompts[0]
+    assert recent_history(history, 2) in llm.prompts[0]
+    assert query_rewrite_cache.stats() == {
+        "size": 1,
+        "hits": 1,
+        "misses": 1,
+        "skipped": 1,
+    }
+
+    # without the raw query every question is rewritten, as before
+    QueryRewriter(llm.runnable, PROMPT).rewrite(None, "user: Do you sell shoes?")
+    assert len(llm.prompts) == 2
+
+
+def test_rewrites_of_other_models_are_not_reused():
+    query_rewrite_cache.clear()
+    history = "user: Do you sell shoes?\nassistant: Yes.\nuser: How much are they?"
+    rewrites = []
+    for model in ["gpt-4o-mini", "gpt-4o", "gpt-4o-mini"]:
+        llm = CountingLLM(f"How much are the shoes? ({model})")
+        rewriter = QueryRewriter(
+            llm.runnable,
+            PROMPT,
+            llm_config=LLMConfig(model_type_or_path=model, llm_provider="openai"),
+        )
+        rewrites.append(rewriter.rewrite("How much are they?", history))
+    assert rewrites == [
+        "How much are the shoes? (gpt-4o-mini)",
+        "How much are the shoes? (gpt-4o)",
+        "How much are the shoes? (gpt-4o-mini)",
+    ]
+    assert query_rewrite_cache.stats()["hits"] == 1
+
+
+def test_parallel_mode_reranks_raw_and_rewritten_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    query_rewrite_cache.clear()
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(
+        faiss_retriever.model_client_pool,
+        "get_embedding_model",
+        lambda *args, **kwargs: embedding,
+    )
+    texts = ["red apples", "green pears", "blue berries", "yellow bananas"]
+    with open(os.path.join(tmp_path, "chunked_documents.pkl"), "wb") as f:
+        pickle.dump([Document(page_content=t, metadata={}) for t in texts], f)
+    executor = FaissIndexCache().get(
+        str(tmp_path),
+        LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai"),
+    )
+    llm = CountingLLM("blue berries")
+    executor.llm = llm.runnable
+    executor.retriever.search_kwargs["k"] = 2
+
+    _, returns = executor.search(
+        "user: green pears?\nassistant: Yes.\nuser: and those?",
+        PROMPT,
+        query="and those?",
+        rewrite_config=QueryRewriteConfig(mode="parallel"),
+    )
+    raw = [doc.page_content for doc, _ in executor.retrieve_w_score("and those?")]
+    contents = [item["content"] for item in returns]
+    assert len(llm.prompts) == 1
+    assert len(contents) == 2
+    # the exact match of the rewrite ranks first, ahead of the raw query's results
+    assert contents[0] == "blue berries"
+    assert set(contents) <= set(raw) | {"blue berries"}
@@ -0,0 +1,143 @@
+import json
+import os
+
+import pytest
+
+from arklex.env.env import Env
+from arklex.orchestrator.orchestrator import AgentOrg
+from arklex.orchestrator.session_store import (
+    InMemorySessionStore,
+    SQLiteSessionStore,
+    apply_delta,
+)
+from arklex.utils.graph_state import Params, PathNode, ResourceRecord
+
+
+def _turn(params, i):
+    """What a turn of the orchestrator appends, and updates in place."""
+    params.metadata.turn_id += 1
+    params.memory.function_calling_trajectory.extend(
+        [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": f"answer {i}"},
+        ]
+    )
+    if params.taskgraph.path:
+        params.taskgraph.path[-1].in_flow_stack = False
+    params.taskgraph.path.append(PathNode(node_id=str(i), in_flow_stack=True))
+    if params.memory.trajectory:
+        # personalized in the background after the previous turn
+        params.memory.trajectory[-1][0].personalized_intent = f"product {i}"
+    params.memory.trajectory.append(
+        [
+            ResourceRecord(
+                info={"id": "rag", "name": "RagMsgWorker"},
+                intent=f"intent {i}",
+                input=[{"name": "query", "value": "x" * 200}],
+                output=f"output {i}",
+                steps=[{"context_generate": "y" * 200}],
+            )
+        ]
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(compaction_window=5)
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite"), compaction_window=5)
+
+
+def test_deltas_rebuild_the_stored_parameters(store):
+    client = {}
+    for i in range(12):
+        params = store.load("chat") or Params.model_validate(
+            {"metadata": {"chat_id": "chat"}}
+        )
+        _turn(params, i)
+        delta = store.save(params)
+        client = apply_delta(client, delta)
+        assert client == json.loads(params.model_dump_json())
+        if i > 0:
+            memory = delta["memory"]
+            # the new turn, with the previous one personalized and one compacted
+            assert len(memory["trajectory"]["items"]) == 1
+            assert len(memory["trajectory"]["updates"]) == (1 if i < 5 else 2)
+            assert len(memory["function_calling_trajectory"]["items"]) == 2
+            assert len(delta["taskgraph"]["path"]["updates"]) == 1
+
+    trajectory = store.load("chat").memory.trajectory
+    assert len(trajectory) == 12
+    # turns past the window are summaries that keep what the memory retrieval reads
+    summary = trajectory[0][0]
+    assert summary.info["compacted"] and not summary.input and not summary.steps
+    assert (summary.intent, summary.output) == ("intent 0", "output 0")
+    assert summary.personalized_intent == "product 1"
+    assert not trajectory[-5][0].info.get("compacted")
+
+
+def test_orchestrator_resumes_a_stored_session():
+    config_path = os.path.join(
+        os.path.dirname(__file__), "data", "message_worker_taskgraph.json"
+    )
+    with open(config_path) as f:
+        config = json.load(f)
+    orchestrator = AgentOrg(config=config, env=Env(tools=[], workers=[]))
+    store = InMemorySessionStore()
+    inputs = {"text": "hi", "chat_history": [], "chat_id": "chat"}
+    _, _, params, _ = orchestrator.init_params(inputs, store)
+    assert params.metadata.chat_id == "chat"
+    store.save(params)
+
+    inputs = {
+        "text": "again",
+        "chat_history": [
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "hello"},
+        ],
+        "chat_id": "chat",
+    }
+    _, _, resumed, _ = orchestrator.init_params(inputs, store)
+    assert resumed.metadata.turn_id == 2
+    assert len(resumed.memory.trajectory) == 2
+    assert [m["content"] for m in resumed.memory.function_calling_trajectory] == [
+        "hi",
+        "hello",
+        "again",
+    ]
+    assert store.stats()["hits"] == 1
+
+
+def test_a_failed_turn_leaves_the_stored_session_unchanged(store):
+    params = Params.model_validate({"metadata": {"chat_id": "chat"}})
+    _turn(params, 0)
+    store.save(params)
+    # the caller keeps using its object after the save
+    _turn(params, 1)
+
+    loaded = store.load("chat")
+    # a turn that raises after changing its params is never saved
+    _turn(loaded, 2)
+    stored = store.load("chat")
+    assert stored.metadata.turn_id == 1
+    assert len(stored.memory.trajectory) == 1
+    assert stored is not store.load("chat")
+
+
+def test_personalized_intents_generated_after_the_save_reach_the_stored_session(
+    store,
+):
+    params = Params.model_validate({"metadata": {"chat_id": "chat"}})
+    for i in range(7):
+        _turn(params, i)
+    store.save(params)
+
+    # the last turn, and a compacted one whose records are gone
+    store.set_personalized_intents("chat", {(6, 0): "product 7", (0, 0): "other"})
+    stored = store.load("chat")
+    assert stored.memory.trajectory[6][0].personalized_intent == "product 7"
+    assert stored.memory.trajectory[0][0].personalized_intent == "product 1"
+
+    # the client gets them with the next delta
+    delta = store.save(stored)
+    assert list(delta["memory"]["trajectory"]["updates"]) == ["6"]
@@ -0,0 +1,114 @@
+import asyncio
+import re
+
+from arklex.memory import ShortTermMemory, personalized_intent_cache
+from arklex.utils.graph_state import LLMConfig, ResourceRecord
+
+
+def _record(task, intent, personalized_intent, output):
+    return ResourceRecord(
+        info={"attribute": {"task": task}},
+        intent=intent,
+        personalized_intent=personalized_intent,
+        output=output,
+        steps=[{"context_generate": output}],
+    )
+
+
+def test_scoring_batches_embeddings_and_reuses_the_query(monkeypatch, embeddings):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    trajectory = [
+        [
+            _record(
+                "answer shipping questions",
+                "ask about shipping",
+                "intent: shipping cost product: order attribute: shipping",
+                "shipping is free",
+            )
+        ],
+        [
+            _record(
+                "recommend running shoes",
+                "ask about shoes",
+                "intent: red running shoes product: shoes attribute: red",
+                "red running shoes",
+            )
+        ],
+    ]
+    memory = ShortTermMemory(
+        trajectory,
+        "user: red running shoes",
+        llm_config=LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai"),
+    )
+    memory.embedding_model = embeddings
+
+    query = "red running shoes"
+    found_records, records = memory.retrieve_records(query)
+    found_intent, intent = memory.retrieve_intent(query)
+
+    assert found_records and records[0].intent == "ask about shoes"
+    assert found_intent and intent == "ask about shoes"
+    # every candidate text is embedded in one batch and the query only once
+    assert embeddings.document_calls == 1
+    assert embeddings.queries == [query]
+
+
+def test_empty_trajectory_does_not_embed(monkeypatch, embeddings):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    memory = ShortTermMemory(
+        [[]],
+        "",
+        llm_config=LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai"),
+    )
+    memory.embedding_model = embeddings
+
+    assert memory.retrieve_records("hello") == (False, [])
+    assert memory.retrieve_intent("hello") == (False, None)
+    assert embeddings.document_calls == 0
+
+
+class BatchLLM:
+    """Answers every record of a batched personalization prompt, counting calls."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        n_records = len(re.findall(r"^Record \d+:", prompt, re.M))
+        return {
+            "content": "\n".join(
+                f"Record {i + 1}:\nPersonalized Intent: intent: record {i + 1}"
+                for i in range(n_records)
+            )
+        }
+
+
+def test_personalization_is_batched_and_reused_across_turns(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    personalized_intent_cache.clear()
+    llm_config = LLMConfig(model_type_or_path="gpt-4o-mini", llm_provider="openai")
+    chat_history = "assistant: hi\nuser: red running shoes"
+    turn = [
+        _record("recommend running shoes", "ask about shoes", "", "red shoes"),
+        _record("answer shipping questions", "ask about shipping", "", "free"),
+    ]
+
+    memory = ShortTermMemory([turn], chat_history, llm_config=llm_config)
+    llm = BatchLLM()
+    memory.llm = llm
+    asyncio.run(memory.personalize())
+    assert llm.calls == 1
+    assert [r.personalized_intent for r in turn] == [
+        "intent: record 1",
+        "intent: record 2",
+    ]
+
+    # the next turn gets the records back from the client without the intents
+    returned = [r.model_copy(update={"personalized_intent": ""}) for r in turn]
+    next_memory = ShortTermMemory([returned], chat_history, llm_config=llm_config)
+    next_memory.llm = llm
+    assert next_memory.apply_personalized_intents() == 0
+    asyncio.run(next_memory.personalize())
+    assert llm.calls == 1
+    assert returned[1].personalized_intent == "intent: record 2"
@@ -0,0 +1,167 @@
+import asyncio
+import copy
+import gc
+import json
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from arklex.orchestrator.task_graph import TaskGraph
+from arklex.utils.graph_state import LLMConfig, Params
+from arklex.utils.model_config import MODEL
+
+TEXTS = ["hello", "my order", "return it", "show the cart", "add items", "thanks"]
+
+
+class HashedNLU:
+    """Answers by the content of the call, not its order, so both modes see the same answers."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def _answer(self, text, intents):
+        with self.lock:
+            self.calls.append(sorted(intents))
+        options = sorted(intents)
+        return options[zlib.crc32(f"{text}|{options}".encode()) % len(options)]
+
+    def execute(self, text, intents, chat_history_str, llm_config, prompt_key=None):
+        time.sleep(self.delay)
+        return self._answer(text, intents)
+
+    async def aexecute(
+        self, text, intents, chat_history_str, llm_config, prompt_key=None
+    ):
+        await asyncio.sleep(self.delay)
+        return self._answer(text, intents)
+
+
+def _task_graph(name, speculative, workers=None):
+    path = os.path.join(os.path.dirname(__file__), "data", name)
+    with open(path) as f:
+        config = json.load(f)
+    config["speculative_nlu"] = speculative
+    if workers is not None:
+        config["speculative_nlu_workers"] = workers
+    return TaskGraph("taskgraph", config, LLMConfig(**MODEL))
+
+
+def _walk(task_graph, seed, use_async):
+    np.random.seed(seed)
+    task_graph.nluapi = HashedNLU()
+    params = Params()
+    decisions = []
+    for turn in range(6):
+        text = TEXTS[(seed + turn) % len(TEXTS)]
+        inputs = {
+            "text": text,
+            "chat_history_str": f"user: {text}",
+            "parameters": params,
+            "allow_global_intent_switch": True,
+        }
+        if use_async:
+            node_info, params = asyncio.run(task_graph.aget_node(inputs))
+        else:
+            node_info, params = task_graph.get_node(inputs)
+        decisions.append(
+            (
+                node_info.node_id,
+                node_info.resource_id,
+                params.taskgraph.intent,
+                params.taskgraph.curr_global_intent,
+                copy.deepcopy(params.taskgraph.nlu_records),
+            )
+        )
+    return decisions, task_graph.nluapi.calls
+
+
+def test_speculative_nlu_routes_like_sequential():
+    extra_calls = 0
+    for name in ["mc_worker_taskgraph.json", "shopify_tool_taskgraph.json"]:
+        sequential = _task_graph(name, speculative=False)
+        speculative = _task_graph(name, speculative=True)
+        for seed in range(8):
+            expected, calls = _walk(sequential, seed, use_async=False)
+            for use_async in [False, True]:
+                decisions, speculative_calls = _walk(speculative, seed, use_async)
+                assert decisions == expected
+                if not use_async:
+                    # predictions started for nothing, the local intent matched
+                    extra_calls += len(speculative_calls) - len(calls)
+    assert extra_calls > 0
+
+
+class LocalMiss(HashedNLU):
+    def _answer(self, text, intents):
+        super()._answer(text, intents)
+        if "product 1" in intents:
+            return "others"
+        return "questions about available products"
+
+
+def _local_miss_turn(task_graph, use_async, delay):
+    """A turn in the flow of node 1, whose local intents are the products."""
+    params = Params()
+    params.taskgraph.curr_node = "1"
+    task_graph.nluapi = LocalMiss(delay=delay)
+    inputs = {
+        "text": "what do you sell?",
+        "chat_history_str": "user: what do you sell?",
+        "parameters": params,
+        "allow_global_intent_switch": True,
+    }
+    start = time.perf_counter()
+    if use_async:
+        _, result = asyncio.run(task_graph.aget_node(inputs))
+    else:
+        _, result = task_graph.get_node(inputs)
+    return time.perf_counter() - start, result
+
+
+def test_global_prediction_overlaps_the_local_one():
+    task_graph = _task_graph("mc_worker_taskgraph.json", speculative=True)
+    delay = 0.3
+    for use_async in [False, True]:
+        elapsed, result = _local_miss_turn(task_graph, use_async, delay)
+        assert len(task_graph.nluapi.calls) == 2
+        assert elapsed < 2 * delay
+        assert [r["global_intent"] for r in result.taskgraph.nlu_records] == [
+            False,
+            True,
+        ]
+        assert result.taskgraph.curr_global_intent == (
+            "questions about available products"
+        )
+
+
+def test_turns_finding_every_thread_taken_predict_sequentially():
+    task_graph = _task_graph("mc_worker_taskgraph.json", speculative=True, workers=1)
+    delay = 0.2
+    # a speculation of another turn still holds the only thread
+    assert task_graph._speculation_slots.acquire(blocking=False)
+    elapsed, result = _local_miss_turn(task_graph, use_async=False, delay=delay)
+    assert elapsed >= 2 * delay
+    assert result.taskgraph.curr_global_intent == "questions about available products"
+    task_graph._speculation_slots.release()
+
+    elapsed, _ = _local_miss_turn(task_graph, use_async=False, delay=delay)
+    assert elapsed < 2 * delay
+
+
+def test_only_speculating_graphs_get_threads():
+    assert (
+        _task_graph("mc_worker_taskgraph.json", speculative=False)._speculation_executor
+        is None
+    )
+    task_graph = _task_graph("mc_worker_taskgraph.json", speculative=True)
+    executor = task_graph._speculation_executor
+    _local_miss_turn(task_graph, use_async=False, delay=0.0)
+    del task_graph
+    gc.collect()
+    # an evicted graph shuts its threads down
+    assert executor._shutdown
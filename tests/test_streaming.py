@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+import time
+
+from arklex.orchestrator.streaming import (
+    StreamCancelled,
+    StreamMetrics,
+    sse_event,
+    stream_response,
+)
+from arklex.types import EventType
+
+
+class FakeOrchestrator:
+    """Streams its chunks through message_queue like MessageWorker.stream_generator."""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.put = 0
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def get_response(self, inputs, stream_type, message_queue, session_store=None):
+        try:
+            for chunk in self.chunks:
+                message_queue.put(
+                    {"event": EventType.CHUNK.value, "message_chunk": chunk}
+                )
+                self.put += 1
+            if self.error:
+                raise self.error
+            return {"answer": "".join(self.chunks), "parameters": {"turn": 1}}
+        except StreamCancelled:
+            self.cancelled = True
+            raise
+        finally:
+            self.done.set()
+
+
+def _collect(orchestrator, metrics, **kwargs):
+    async def collect():
+        return [
+            e
+            async for e in stream_response(orchestrator, {}, metrics=metrics, **kwargs)
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_chunks_are_forwarded_then_the_answer_with_metrics():
+    metrics = StreamMetrics()
+    events = _collect(FakeOrchestrator(["Hel", "lo", "!"]), metrics)
+    assert [e.get("message_chunk") for e in events[:-1]] == ["Hel", "lo", "!"]
+    last = events[-1]
+    assert last["event"] == EventType.LAST.value and last["answer"] == "Hello!"
+    assert 0 <= last["metrics"]["first_token"] <= last["metrics"]["total"]
+    assert metrics.stats()["completed"] == 1 and "first_token_p50" in metrics.stats()
+
+    message = sse_event(events[0])
+    assert message.startswith("event: chunk\ndata: ") and message.endswith("\n\n")
+    assert json.loads(message.split("data: ")[1]) == events[0]
+
+    events = _collect(FakeOrchestrator(["a"], error=ValueError("boom")), metrics)
+    assert events[-1] == {"event": EventType.ERROR.value, "message": "boom"}
+    assert metrics.stats()["errors"] == 1
+
+
+def test_slow_client_pauses_and_disconnect_stops_the_generation():
+    metrics = StreamMetrics()
+    orchestrator = FakeOrchestrator([str(i) for i in range(1000)])
+
+    async def read_two():
+        events = stream_response(orchestrator, {}, max_queued=4, metrics=metrics)
+        received = [await events.__anext__()]
+        await asyncio.sleep(0.2)
+        # the generation waits for the client instead of running ahead
+        assert orchestrator.put <= 4 + 1
+        received.append(await events.__anext__())
+        # the client goes away
+        await events.aclose()
+        return received
+
+    received = asyncio.run(read_two())
+    assert [e["message_chunk"] for e in received] == ["0", "1"]
+    assert orchestrator.done.wait(timeout=5)
+    assert orchestrator.cancelled and orchestrator.put < 10
+    assert metrics.stats()["cancelled"] == 1
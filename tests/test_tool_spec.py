@@ -0,0 +1,104 @@
+import asyncio
+
+from arklex.env.env import BaseResourceInitializer, Env
+from arklex.env.tools.tools import Tool, register_tool
+from arklex.utils.graph_state import (
+    BotConfig,
+    LLMConfig,
+    MessageState,
+    NodeInfo,
+    Params,
+    ResourceRecord,
+)
+
+SLOTS = [
+    {
+        "name": "order_id",
+        "type": "str",
+        "description": "The id of the order",
+        "prompt": "What is your order id?",
+        "required": True,
+    },
+    {
+        "name": "email",
+        "type": "str",
+        "description": "The email of the customer",
+        "prompt": "What is your email?",
+        "required": False,
+    },
+]
+calls = []
+
+
+@register_tool("Look up an order", SLOTS, ["status"])
+def lookup_order(order_id, shop_id):
+    calls.append((order_id, shop_id))
+    return f"order {order_id} of {shop_id} shipped"
+
+
+class FilledSlots:
+    def execute(self, slots, chat_history_str, llm_config):
+        for slot in slots:
+            slot.value = f"{slot.name}-value"
+            slot.verified = True
+        return slots
+
+    async def aexecute(self, slots, chat_history_str, llm_config):
+        return self.execute(slots, chat_history_str, llm_config)
+
+
+class Resources(BaseResourceInitializer):
+    def init_tools(self, tools):
+        return {
+            "lookup": {
+                "name": lookup_order.spec.name,
+                "description": lookup_order.spec.description,
+                "execute": lookup_order,
+                "fixed_args": {"shop_id": "shop-1", "unused": "dropped"},
+            }
+        }
+
+    def init_workers(self, workers):
+        return {}
+
+
+def test_tools_share_compiled_spec_and_copy_slots():
+    first, second = lookup_order(), lookup_order()
+    assert first.spec is second.spec is lookup_order.spec
+    assert first.info is second.info
+    assert first.info["function"]["parameters"]["required"] == ["order_id"]
+    assert first.slots == second.slots and first.slots[0] is not second.slots[0]
+    first.slots[0].value = "A1"
+    assert second.slots[0].value is None and lookup_order().slots[0].value is None
+
+    # building a Tool directly still compiles the same metadata
+    direct = Tool(lookup_order.spec.func, "direct", "Look up", SLOTS, [], False)
+    assert direct.info["function"]["parameters"] == first.info["function"]["parameters"]
+
+
+def test_env_step_fills_slots_and_filters_fixed_args():
+    env = Env(tools=[], workers=[], resource_inizializer=Resources())
+    env.slotfillapi = FilledSlots()
+    calls.clear()
+    for use_async in [False, True]:
+        state = MessageState(
+            bot_config=BotConfig(
+                bot_id="test",
+                version="0",
+                language="EN",
+                bot_type="test",
+                llm_config=LLMConfig(
+                    model_type_or_path="gpt-4o-mini", llm_provider="openai"
+                ),
+            ),
+            function_calling_trajectory=[],
+            trajectory=[[ResourceRecord(info={})]],
+            slots={},
+        )
+        if use_async:
+            state, _ = asyncio.run(env.astep("lookup", state, Params(), NodeInfo()))
+        else:
+            state, _ = env.step("lookup", state, Params(), NodeInfo())
+    # fresh slots every step, and neither llm_config nor unused fixed args reach the function
+    assert calls == [("order_id-value", "shop-1")] * 2
+    assert "order order_id-value of shop-1 shipped" in state.message_flow
@@ -0,0 +1,76 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from arklex.utils.trace import (
+    NULL_SPAN,
+    TraceRunName,
+    current_trace,
+    span,
+    span_callback_handler,
+    start_trace,
+    to_otlp,
+)
+
+
+def _llm(n_calls):
+    messages = [
+        AIMessage(
+            content="ok",
+            usage_metadata={"input_tokens": 7, "output_tokens": 2, "total_tokens": 9},
+        )
+        for _ in range(n_calls)
+    ]
+    return GenericFakeChatModel(
+        messages=iter(messages), callbacks=[span_callback_handler]
+    )
+
+
+def test_spans_nest_across_threads_and_count_llm_calls():
+    llm = _llm(3)
+
+    async def turn():
+        with span(TraceRunName.TaskGraph.value):
+            with span(TraceRunName.NLU.value, candidates=4):
+                await llm.ainvoke("which intent?")
+        with span(TraceRunName.EnvStep.value, resource="MessageWorker"):
+            # blocking resources run in a worker thread
+            await asyncio.to_thread(llm.invoke, "answer")
+            await asyncio.to_thread(llm.invoke, "answer again")
+        return current_trace()
+
+    with start_trace():
+        trace = asyncio.run(turn())
+
+    [root] = trace["spans"]
+    assert root["name"] == TraceRunName.Turn.value
+    assert (root["llm_calls"], root["input_tokens"], root["output_tokens"]) == (
+        3,
+        21,
+        6,
+    )
+    taskgraph, step = root["children"]
+    assert taskgraph["children"][0]["attributes"] == {"candidates": 4}
+    assert taskgraph["llm_calls"] == taskgraph["children"][0]["llm_calls"] == 1
+    assert step["llm_calls"] == 2 and step["attributes"]["resource"] == "MessageWorker"
+    assert 0 <= step["duration"] <= root["duration"]
+
+    spans = to_otlp(trace)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    parents = {s["name"]: s["parentSpanId"] for s in spans}
+    ids = {s["name"]: s["spanId"] for s in spans}
+    assert parents == {
+        "Turn": "",
+        "TaskGraph": ids["Turn"],
+        "NLU": ids["TaskGraph"],
+        "EnvStep": ids["Turn"],
+    }
+    assert {"key": "llm.calls", "value": {"intValue": "3"}} in spans[0]["attributes"]
+
+
+def test_untraced_turns_record_nothing():
+    llm = _llm(1)
+    with span(TraceRunName.NLU.value) as nlu:
+        llm.invoke("which intent?")
+    assert nlu is NULL_SPAN
+    assert current_trace() is None
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.language_models import FakeListChatModel
+
+from arklex.env.env import Env
+from arklex.env.workers import message_worker
+from arklex.utils.graph_state import (
+    BotConfig,
+    ConvoMessage,
+    LLMConfig,
+    MessageState,
+    OrchestratorMessage,
+    ResourceRecord,
+)
+
+WORKERS = [
+    {"id": "message", "name": "MessageWorker", "path": "message_worker.py"},
+]
+
+
+def _state(model):
+    return MessageState(
+        sys_instruct="You are a helpful assistant.",
+        bot_config=BotConfig(
+            bot_id="test",
+            version="0",
+            language="EN",
+            bot_type="test",
+            llm_config=LLMConfig(model_type_or_path=model, llm_provider="openai"),
+        ),
+        user_message=ConvoMessage(history="user: hi", message="hi"),
+        orchestrator_message=OrchestratorMessage(message="greet", attribute={}),
+        trajectory=[[ResourceRecord(info={})]],
+    )
+
+
+def test_thread_safe_workers_are_shared_and_compiled_once():
+    env = Env(tools=[], workers=WORKERS)
+    worker = env._init_worker("message")
+    assert env._init_worker("message") is worker
+    assert worker._get_compiled_graph() is worker._get_compiled_graph()
+
+
+def test_shared_worker_keeps_calls_apart(monkeypatch):
+    # every model answers with its own name, a leak between calls would mix them up
+    monkeypatch.setattr(
+        message_worker.model_client_pool,
+        "get_llm",
+        lambda provider, model, **kwargs: FakeListChatModel(responses=[model]),
+    )
+    env = Env(tools=[], workers=WORKERS)
+    worker = env._init_worker("message")
+    models = [f"model-{i}" for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        states = list(pool.map(lambda m: worker.execute(_state(m)), models))
+    assert [state.response for state in states] == models